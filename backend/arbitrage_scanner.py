@@ -0,0 +1,423 @@
+"""
+跨交易所套利机会扫描
+M 个交易对 × N 个交易所的最优买卖价和挂单量保存在 numpy 矩阵中，
+每次扫描一次性计算所有交易所两两组合扣除吃单手续费后的净收益，
+超过阈值（全局阈值或策略的 min_profitability）的组合作为套利机会发布。
+最优价只用于快速筛选；策略是否命中、以及指定数量的查询，按订单簿深度计算成交均价后判断
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from exchange_connector import normalize_symbol
+from metrics import registry
+from pubsub import broadcaster
+
+logger = logging.getLogger(__name__)
+
+# 各交易所默认吃单手续费率，可用 TAKER_FEES=binance:0.00075,okx:0.0008 覆盖
+DEFAULT_TAKER_FEES = {
+    "binance": 0.001,
+    "okx": 0.001,
+    "bybit": 0.001,
+    "gate_io": 0.002,
+    "kucoin": 0.001,
+}
+
+SCANNER_MIN_PROFITABILITY = float(os.getenv('SCANNER_MIN_PROFITABILITY', '0.1'))  # 全局阈值（%）
+SCANNER_SYMBOLS = [s for s in os.getenv('SCANNER_SYMBOLS', '').split(',') if s.strip()]
+SCANNER_SYNC_INTERVAL = float(os.getenv('SCANNER_SYNC_INTERVAL', '10'))  # 同步运行中策略的间隔（秒）
+OPPORTUNITIES_TOPIC = "opportunities"
+
+scanner_scans = registry.counter("arbitrage_scans_total", "套利扫描次数")
+scanner_opportunities = registry.gauge("arbitrage_opportunities", "最近一次扫描发现的套利机会数")
+
+
+def load_taker_fees() -> Dict[str, float]:
+    fees = dict(DEFAULT_TAKER_FEES)
+    for item in os.getenv('TAKER_FEES', '').split(','):
+        if ':' in item:
+            exchange, fee = item.split(':', 1)
+            fees[exchange.strip().lower()] = float(fee)
+    return fees
+
+
+class ArbitrageScanner:
+    """向量化的跨交易所套利扫描器"""
+
+    def __init__(self, fees: Optional[Dict[str, float]] = None, capacity: int = 64,
+                 min_profitability: float = SCANNER_MIN_PROFITABILITY):
+        fees = fees or load_taker_fees()
+        self.venues: List[str] = list(fees)
+        self.venue_index = {venue: i for i, venue in enumerate(self.venues)}
+        self.fees = np.array([fees[venue] for venue in self.venues])
+        # 吃单买入的实际成本系数和吃单卖出的实际所得系数
+        self.buy_factor = 1.0 + self.fees
+        self.sell_factor = 1.0 - self.fees
+        self.min_profitability = min_profitability / 100
+
+        self.symbols: List[str] = []
+        self.symbol_index: Dict[str, int] = {}
+        self.capacity = 0
+        n = len(self.venues)
+        self.bid = np.empty((0, n))
+        self.bid_size = np.empty((0, n))
+        self.ask = np.empty((0, n))
+        self.ask_size = np.empty((0, n))
+        self.thresholds = np.empty((0, n, n))
+        self._grow(capacity)
+
+        # 策略阈值：(交易对行, 买入交易所列, 卖出交易所列) -> [(策略 ID, 阈值, 下单数量)]
+        self.watches: Dict[Tuple[int, int, int], List[Tuple[int, float, Optional[float]]]] = {}
+        self._hits: Dict[str, np.ndarray] = {}
+        self._opportunities: Optional[List[Dict]] = None
+        self.scanned_at: Optional[float] = None
+        self._dirty = False
+        self._scan_scheduled = False
+        # 上次同步的策略，未变化时不重置阈值
+        self._strategies: Optional[List[Dict]] = None
+        self._sync_task: Optional[asyncio.Task] = None
+        self.ready = asyncio.Event()
+        self.scan()
+        self._last_signature = self._signature()
+
+    def _grow(self, capacity: int):
+        """扩容矩阵，已有数据保持不变"""
+        n = len(self.venues)
+        extra = capacity - self.capacity
+        nan_rows = np.full((extra, n), np.nan)
+        self.bid = np.vstack([self.bid, nan_rows])
+        self.bid_size = np.vstack([self.bid_size, nan_rows])
+        self.ask = np.vstack([self.ask, nan_rows])
+        self.ask_size = np.vstack([self.ask_size, nan_rows])
+        self.thresholds = np.concatenate([self.thresholds, np.full((extra, n, n), self.min_profitability)])
+        self.capacity = capacity
+
+    def _row(self, symbol: str) -> int:
+        row = self.symbol_index.get(symbol)
+        if row is None:
+            row = len(self.symbols)
+            if row >= self.capacity:
+                self._grow(self.capacity * 2)
+            self.symbols.append(symbol)
+            self.symbol_index[symbol] = row
+        return row
+
+    def update_quote(self, exchange: str, symbol: str, bid: float, bid_size: float,
+                     ask: float, ask_size: float):
+        """更新某交易所某交易对的最优买卖价，变化时安排一次扫描"""
+        col = self.venue_index.get(exchange)
+        if col is None:
+            return
+        row = self._row(symbol)
+        if self.bid[row, col] == bid and self.ask[row, col] == ask \
+                and self.bid_size[row, col] == bid_size and self.ask_size[row, col] == ask_size:
+            return
+        self.bid[row, col] = bid
+        self.bid_size[row, col] = bid_size
+        self.ask[row, col] = ask
+        self.ask_size[row, col] = ask_size
+        self._mark_dirty()
+
+    def clear_quote(self, exchange: str, symbol: str):
+        """行情失效时清空报价，不再参与扫描"""
+        col = self.venue_index.get(exchange)
+        row = self.symbol_index.get(symbol)
+        if col is None or row is None:
+            return
+        for matrix in (self.bid, self.bid_size, self.ask, self.ask_size):
+            matrix[row, col] = np.nan
+        self._mark_dirty()
+
+    def on_book_event(self, book, kind: str, bids, asks):
+        """订单簿回调"""
+        if kind == "invalidate":
+            self.clear_quote(book.exchange, book.symbol)
+            return
+        best_bid, best_ask = book.bids.best(), book.asks.best()
+        if best_bid is None or best_ask is None:
+            return
+        self.update_quote(book.exchange, book.symbol, best_bid[0], best_bid[1], best_ask[0], best_ask[1])
+
+    def _mark_dirty(self):
+        """标记需要重新扫描；同一轮事件循环内的多次更新合并为一次扫描"""
+        self._dirty = True
+        if self._scan_scheduled:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._scan_scheduled = True
+        loop.call_soon(self._scheduled_scan)
+
+    def _scheduled_scan(self):
+        self._scan_scheduled = False
+        try:
+            if self._dirty:
+                self.scan()
+            self._publish()
+        except Exception as e:
+            logger.error(f"套利扫描失败: {e}")
+
+    def set_strategies(self, strategies: List[Dict]):
+        """设置策略阈值：[{"id", "market", "exchange_1", "exchange_2", "min_profitability"(%), "order_amount"}]
+
+        策略的两个交易所双向都参与判断，阈值低于全局阈值的组合也会被报告；
+        有 order_amount 时按该数量的深度成交均价判断是否达到阈值
+        """
+        self.watches = {}
+        self.thresholds[:] = self.min_profitability
+        for strategy in strategies:
+            row = self._row(normalize_symbol(strategy["market"]))
+            cols = [self.venue_index.get(str(strategy[key]).lower()) for key in ("exchange_1", "exchange_2")]
+            if None in cols or cols[0] == cols[1]:
+                continue
+            threshold = float(strategy["min_profitability"]) / 100
+            amount = float(strategy["order_amount"]) if strategy.get("order_amount") else None
+            for buy, sell in ((cols[0], cols[1]), (cols[1], cols[0])):
+                self.watches.setdefault((row, buy, sell), []).append((strategy["id"], threshold, amount))
+                self.thresholds[row, buy, sell] = min(self.thresholds[row, buy, sell], threshold)
+        self._mark_dirty()
+
+    def scan(self) -> int:
+        """计算所有交易对、所有交易所组合的净收益，返回超过阈值的机会数量
+
+        扫描只做向量化计算并保存命中的下标，机会明细在读取 opportunities 时才生成
+        """
+        m = len(self.symbols)
+        buy_cost = self.ask[:m] * self.buy_factor
+        sell_proceeds = self.bid[:m] * self.sell_factor
+        # edge[s, i, j]：在交易所 i 吃单买入、在交易所 j 吃单卖出的净收益率；缺失报价为 NaN，比较结果为 False
+        with np.errstate(invalid="ignore", divide="ignore"):
+            edge = sell_proceeds[:, None, :] / buy_cost[:, :, None] - 1.0
+            hits = edge > self.thresholds[:m]
+        rows, buys, sells = np.nonzero(hits)
+        edges = edge[rows, buys, sells]
+        order = np.argsort(-edges)
+        rows, buys, sells, edges = rows[order], buys[order], sells[order], edges[order]
+
+        self._hits = {
+            "rows": rows,
+            "buys": buys,
+            "sells": sells,
+            "edges": edges,
+            "sizes": np.minimum(self.ask_size[rows, buys], self.bid_size[rows, sells]),
+            "buy_prices": self.ask[rows, buys],
+            "sell_prices": self.bid[rows, sells],
+            "unit_profits": sell_proceeds[rows, sells] - buy_cost[rows, buys],
+        }
+        self._opportunities = None
+        self.scanned_at = time.time()
+        self._dirty = False
+        scanner_scans.inc()
+        scanner_opportunities.set(len(rows))
+        return len(rows)
+
+    @property
+    def opportunities(self) -> List[Dict]:
+        """最近一次扫描的套利机会（按净收益降序）"""
+        if self._opportunities is None:
+            hits = self._hits
+            opportunities = []
+            for k in range(len(hits["rows"])):
+                key = (int(hits["rows"][k]), int(hits["buys"][k]), int(hits["sells"][k]))
+                edge = float(hits["edges"][k])
+                size = float(hits["sizes"][k])
+                opportunities.append({
+                    "symbol": self.symbols[key[0]],
+                    "buy_exchange": self.venues[key[1]],
+                    "sell_exchange": self.venues[key[2]],
+                    "buy_price": float(hits["buy_prices"][k]),
+                    "sell_price": float(hits["sell_prices"][k]),
+                    "size": size,
+                    "profitability": edge * 100,
+                    "expected_profit": size * float(hits["unit_profits"][k]),
+                    "strategy_ids": self._matched_strategies(key, edge),
+                })
+            self._opportunities = opportunities
+        return self._opportunities
+
+    def executable_edge(self, symbol: str, buy_exchange: str, sell_exchange: str, amounts) -> Optional[Dict]:
+        """按两边订单簿深度计算各下单数量扣除手续费后的净收益率；任一侧订单簿不可用时返回 None
+
+        深度不足以成交全部数量时对应的收益率为 NaN
+        """
+        from slippage import slippage_calculator
+
+        buy = slippage_calculator.estimate(buy_exchange, symbol, "buy", amounts)
+        sell = slippage_calculator.estimate(sell_exchange, symbol, "sell", amounts)
+        if buy is None or sell is None:
+            return None
+        buy_factor = self.buy_factor[self.venue_index[buy_exchange]]
+        sell_factor = self.sell_factor[self.venue_index[sell_exchange]]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            edges = np.where(buy["fully_filled"] & sell["fully_filled"],
+                             sell["vwap"] * sell_factor / (buy["vwap"] * buy_factor) - 1.0, np.nan)
+        return {"buy": buy, "sell": sell, "edges": edges}
+
+    def _matched_strategies(self, key: Tuple[int, int, int], edge: float) -> List[int]:
+        """达到阈值的策略；有下单数量的策略按深度成交均价判断，订单簿不可用时退回最优价"""
+        watches = self.watches.get(key)
+        if not watches:
+            return []
+        amounts = [amount for _, _, amount in watches if amount]
+        depth = None
+        if amounts:
+            depth = self.executable_edge(self.symbols[key[0]], self.venues[key[1]], self.venues[key[2]], amounts)
+        matched = []
+        k = 0
+        for sid, threshold, amount in watches:
+            strategy_edge = edge
+            if amount:
+                if depth is not None:
+                    strategy_edge = depth["edges"][k]
+                k += 1
+            if strategy_edge > threshold:
+                matched.append(sid)
+        return matched
+
+    def _with_depth(self, opportunities: List[Dict], amount: float, min_profitability: Optional[float]) -> List[Dict]:
+        """按指定数量补充成交均价、滑点和深度净收益，只保留深度净收益达到阈值的机会"""
+        threshold = min_profitability if min_profitability is not None else self.min_profitability * 100
+        result = []
+        for opportunity in opportunities:
+            depth = self.executable_edge(opportunity["symbol"], opportunity["buy_exchange"],
+                                         opportunity["sell_exchange"], amount)
+            if depth is None or not np.isfinite(depth["edges"][0]):
+                continue
+            profitability = float(depth["edges"][0]) * 100
+            if profitability < threshold:
+                continue
+            buy_vwap, sell_vwap = float(depth["buy"]["vwap"][0]), float(depth["sell"]["vwap"][0])
+            result.append({
+                **opportunity,
+                "amount": amount,
+                "buy_vwap": buy_vwap,
+                "sell_vwap": sell_vwap,
+                "buy_slippage_bps": float(depth["buy"]["slippage_bps"][0]),
+                "sell_slippage_bps": float(depth["sell"]["slippage_bps"][0]),
+                "executable_profitability": profitability,
+                "executable_profit": amount * float(
+                    sell_vwap * self.sell_factor[self.venue_index[opportunity["sell_exchange"]]]
+                    - buy_vwap * self.buy_factor[self.venue_index[opportunity["buy_exchange"]]]),
+            })
+        return sorted(result, key=lambda o: o["executable_profitability"], reverse=True)
+
+    def get_opportunities(self, symbol: Optional[str] = None, min_profitability: Optional[float] = None,
+                          strategy_id: Optional[int] = None, amount: Optional[float] = None) -> List[Dict]:
+        """返回当前套利机会，min_profitability 单位为 %
+
+        指定 amount（基础币种数量）时按订单簿深度计算该数量的成交均价和净收益，并以此过滤
+        """
+        if self._dirty:
+            self.scan()
+        result = self.opportunities
+        if symbol is not None:
+            symbol = normalize_symbol(symbol)
+            result = [o for o in result if o["symbol"] == symbol]
+        if min_profitability is not None:
+            result = [o for o in result if o["profitability"] >= min_profitability]
+        if strategy_id is not None:
+            result = [o for o in result if strategy_id in o["strategy_ids"]]
+        if amount is not None:
+            result = self._with_depth(result, amount, min_profitability)
+        return result
+
+    def _signature(self):
+        hits = self._hits
+        return (hits["rows"].tobytes(), hits["buys"].tobytes(), hits["sells"].tobytes(),
+                np.round(hits["edges"], 6).tobytes())
+
+    def _publish(self):
+        """机会列表变化时推送给订阅者"""
+        if not broadcaster.has_subscribers(OPPORTUNITIES_TOPIC):
+            return
+        signature = self._signature()
+        if signature == self._last_signature:
+            return
+        self._last_signature = signature
+        broadcaster.publish(OPPORTUNITIES_TOPIC, {
+            "type": OPPORTUNITIES_TOPIC,
+            "timestamp": self.scanned_at,
+            "data": self.opportunities,
+        })
+
+    def track(self, symbols: List[str]):
+        """为交易对在所有支持的交易所订阅订单簿"""
+        from orderbook import FEEDS, order_book_service
+
+        order_book_service.add_book_listener(self.on_book_event)
+        for symbol in symbols:
+            symbol = normalize_symbol(symbol)
+            self._row(symbol)
+            for exchange in FEEDS:
+                if exchange in self.venue_index:
+                    order_book_service.subscribe(exchange, symbol)
+
+    def sync_strategies(self, strategies: Dict[str, Dict]):
+        """从运行中的策略同步跨交易所套利的交易对与阈值，并订阅相关行情；策略未变化时不重置阈值"""
+        watched = []
+        for strategy_id, strategy in strategies.items():
+            params = strategy.get("params") or {}
+            if strategy.get("status") != "running" or \
+                    any(params.get(key) is None for key in ("market", "exchange_1", "exchange_2", "min_profitability")):
+                continue
+            watched.append({"id": int(strategy_id) if str(strategy_id).isdigit() else strategy_id, **params})
+        watched.sort(key=lambda s: str(s["id"]))
+        if watched != self._strategies:
+            self.set_strategies(watched)
+            self._strategies = watched
+        for symbol in SCANNER_SYMBOLS + [s["market"] for s in watched]:
+            try:
+                self.track([symbol])
+            except ValueError as e:
+                logger.warning(f"套利扫描订阅 {symbol} 失败: {e}")
+
+    async def refresh_strategies(self):
+        """从执行注册表读取运行中的策略并同步"""
+        from hummingbot_integration import strategy_executor
+
+        self.sync_strategies(await strategy_executor.running_strategies())
+        self.ready.set()
+
+    def start(self):
+        """启动后台定期同步运行中的策略，已启动时忽略；每个 worker 都有自己的扫描器，因此不放在只在 leader 上运行的调度器中"""
+        if self._sync_task is None or self._sync_task.done():
+            self._sync_task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh_strategies()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"同步套利策略失败: {e}")
+            await asyncio.sleep(SCANNER_SYNC_INTERVAL)
+
+    async def wait_ready(self, timeout: float = 5.0) -> bool:
+        """启动同步并等待第一次同步完成，超时返回 False"""
+        self.start()
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def close(self):
+        if self._sync_task is not None:
+            self._sync_task.cancel()
+            try:
+                await self._sync_task
+            except asyncio.CancelledError:
+                pass
+            self._sync_task = None
+
+# 全局套利扫描器实例
+arbitrage_scanner = ArbitrageScanner()
@@ -0,0 +1,182 @@
+"""
+全市场最优买卖价推送
+币安订阅 !ticker@arr（所有交易对的 24 小时行情，含最优买卖价和数量），
+OKX 先拉取全部现货交易对再批量订阅 tickers 频道；每批行情一次性分发给监听者
+"""
+
+import asyncio
+import json
+import logging
+import os
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Tuple
+
+import aiohttp
+
+from exchange_connector import BINANCE_WS_URL, OKX_API_URL, OKX_WS_URL, ExchangeType, normalize_symbol
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+BOOK_TICKER_RECONNECT_DELAY = float(os.getenv('BOOK_TICKER_RECONNECT_DELAY', '1'))
+OKX_SUBSCRIBE_BATCH = 100  # OKX 单条订阅消息的交易对数量
+
+book_ticker_updates = registry.counter("book_ticker_updates_total", "收到的最优买卖价更新次数")
+
+
+@dataclass
+class BookTicker:
+    """一个交易对的最优买卖价"""
+    exchange: str
+    symbol: str
+    bid: float
+    bid_size: float
+    ask: float
+    ask_size: float
+    timestamp: int  # 毫秒
+
+
+class TickerFeed:
+    """全市场行情推送基类：负责断线重连"""
+
+    def __init__(self, exchange: str, on_batch: Callable[[List[BookTicker]], None]):
+        self.exchange = exchange
+        self.on_batch = on_batch
+
+    async def run(self):
+        while True:
+            try:
+                async with aiohttp.ClientSession() as session:
+                    await self._stream(session)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"{self.exchange} 全市场行情推送中断: {e}")
+            await asyncio.sleep(BOOK_TICKER_RECONNECT_DELAY)
+
+    async def _stream(self, session: aiohttp.ClientSession):
+        raise NotImplementedError
+
+
+class BinanceTickerFeed(TickerFeed):
+    """币安 !ticker@arr：每秒推送一次所有有变化的交易对"""
+
+    async def _stream(self, session: aiohttp.ClientSession):
+        async with session.ws_connect(f"{BINANCE_WS_URL}/!ticker@arr", heartbeat=30) as ws:
+            async for message in ws:
+                if message.type != aiohttp.WSMsgType.TEXT:
+                    break
+                batch = []
+                for item in json.loads(message.data):
+                    symbol = normalize_symbol(item["s"])
+                    # 无法识别计价币种的交易对无法拆分，跳过
+                    if "/" not in symbol:
+                        continue
+                    batch.append(BookTicker(
+                        exchange=self.exchange,
+                        symbol=symbol,
+                        bid=float(item["b"]),
+                        bid_size=float(item["B"]),
+                        ask=float(item["a"]),
+                        ask_size=float(item["A"]),
+                        timestamp=item["E"],
+                    ))
+                if batch:
+                    self.on_batch(batch)
+
+
+class OKXTickerFeed(TickerFeed):
+    """OKX tickers 频道：订阅所有现货交易对"""
+
+    async def _stream(self, session: aiohttp.ClientSession):
+        async with session.get(f"{OKX_API_URL}/api/v5/public/instruments", params={"instType": "SPOT"}) as response:
+            response.raise_for_status()
+            instruments = [item["instId"] for item in (await response.json())["data"] if item.get("state") == "live"]
+
+        async with session.ws_connect(OKX_WS_URL) as ws:
+            for i in range(0, len(instruments), OKX_SUBSCRIBE_BATCH):
+                await ws.send_json({
+                    "op": "subscribe",
+                    "args": [{"channel": "tickers", "instId": inst_id} for inst_id in instruments[i:i + OKX_SUBSCRIBE_BATCH]]
+                })
+            keepalive = asyncio.create_task(self._keepalive(ws))
+            try:
+                async for message in ws:
+                    if message.type != aiohttp.WSMsgType.TEXT:
+                        break
+                    if message.data == "pong":
+                        continue
+                    payload = json.loads(message.data)
+                    if payload.get("event") == "error":
+                        raise RuntimeError(payload.get("msg"))
+                    batch = [BookTicker(
+                        exchange=self.exchange,
+                        symbol=normalize_symbol(item["instId"]),
+                        bid=float(item["bidPx"] or 0),
+                        bid_size=float(item["bidSz"] or 0),
+                        ask=float(item["askPx"] or 0),
+                        ask_size=float(item["askSz"] or 0),
+                        timestamp=int(item["ts"]),
+                    ) for item in payload.get("data", [])]
+                    if batch:
+                        self.on_batch(batch)
+            finally:
+                keepalive.cancel()
+
+    @staticmethod
+    async def _keepalive(ws):
+        while True:
+            await asyncio.sleep(20)
+            await ws.send_str("ping")
+
+
+TICKER_FEEDS = {
+    ExchangeType.BINANCE.value: BinanceTickerFeed,
+    ExchangeType.OKX.value: OKXTickerFeed,
+}
+
+
+class BookTickerService:
+    """全市场最优买卖价服务：按交易所订阅，保存最新行情并批量分发给监听者"""
+
+    def __init__(self):
+        self.listeners: List[Callable[[List[BookTicker]], None]] = []
+        self.tickers: Dict[Tuple[str, str], BookTicker] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def add_listener(self, listener: Callable[[List[BookTicker]], None]):
+        if listener not in self.listeners:
+            self.listeners.append(listener)
+
+    def subscribe(self, exchange: str):
+        """订阅交易所的全市场行情，已订阅时忽略"""
+        exchange = exchange.lower()
+        if exchange in self._tasks:
+            return
+        if exchange not in TICKER_FEEDS:
+            raise ValueError(f"不支持的交易所类型: {exchange}")
+        self._tasks[exchange] = asyncio.create_task(TICKER_FEEDS[exchange](exchange, self.dispatch).run())
+        logger.info(f"订阅全市场行情 {exchange}")
+
+    def dispatch(self, batch: List[BookTicker]):
+        """保存并分发一批行情"""
+        book_ticker_updates.inc(len(batch), exchange=batch[0].exchange)
+        tickers = self.tickers
+        for ticker in batch:
+            tickers[(ticker.exchange, ticker.symbol)] = ticker
+        for listener in self.listeners:
+            try:
+                listener(batch)
+            except Exception as e:
+                logger.error(f"行情回调执行失败: {e}")
+
+    async def close(self):
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+
+
+# 全局全市场行情服务实例
+book_ticker_service = BookTickerService()
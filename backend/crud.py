@@ -1,12 +1,18 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import desc, func
+from sqlalchemy import desc, func, case, or_
 from typing import List, Optional
+from datetime import date, datetime, time, timedelta, timezone
 import asyncio
 import logging
 import models, schemas
+from singleflight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
+# 合并并发的余额刷新：同一账户、同一分页的刷新只会打一次交易所
+account_balance_flight = SingleFlight("account_balance")
+accounts_balance_flight = SingleFlight("accounts_real_time_balance")
+
 # Strategy CRUD operations
 def get_strategies(db: Session, skip: int = 0, limit: int = 100) -> List[models.Strategy]:
     return db.query(models.Strategy).offset(skip).limit(limit).all()
@@ -21,6 +27,16 @@ def create_strategy(db: Session, strategy: schemas.StrategyCreate) -> models.Str
     db.refresh(db_strategy)
     return db_strategy
 
+def create_strategies(db: Session, rows: List[dict]) -> List[int]:
+    """在一个事务中批量创建策略，返回按输入顺序排列的策略 ID"""
+    from sqlalchemy import insert
+
+    if not rows:
+        return []
+    ids = db.scalars(insert(models.Strategy).returning(models.Strategy.id, sort_by_parameter_order=True), rows).all()
+    db.commit()
+    return list(ids)
+
 def update_strategy(db: Session, strategy_id: int, strategy: schemas.StrategyUpdate) -> Optional[models.Strategy]:
     db_strategy = get_strategy(db, strategy_id)
     if db_strategy:
@@ -48,8 +64,11 @@ def update_strategy_status(db: Session, strategy_id: int, status: str) -> Option
     return db_strategy
 
 # Account CRUD operations
+def _active_accounts(db: Session, skip: int, limit: int):
+    return db.query(models.Account).filter(models.Account.is_active == True).offset(skip).limit(limit)
+
 def get_accounts(db: Session, skip: int = 0, limit: int = 100) -> List[models.Account]:
-    return db.query(models.Account).filter(models.Account.is_active == True).offset(skip).limit(limit).all()
+    return _active_accounts(db, skip, limit).all()
 
 def get_account(db: Session, account_id: int) -> Optional[models.Account]:
     return db.query(models.Account).filter(models.Account.id == account_id).first()
@@ -76,14 +95,34 @@ async def create_account(db: Session, account: schemas.AccountCreate) -> models.
     return db_account
 
 async def update_account_balance(db: Session, account_id: int) -> Optional[models.Account]:
-    """更新账户实时余额"""
-    from exchange_connector import exchange_manager, create_connector
-    
-    db_account = get_account(db, account_id)
-    if not db_account or not db_account.is_active:
+    """更新账户实时余额，同一账户的并发刷新共享一次交易所请求
+
+    账户不存在、未激活或刷新出错时返回 None；交易所未返回余额时返回未更新的账户
+    """
+    refreshed = await account_balance_flight.do(account_id, lambda: _refresh_account_balance(account_id))
+    if refreshed is None:
         return None
-    
+    # 刷新在独立会话中提交，调用者会话中已加载的对象需要重新读取
+    db_account = get_account(db, account_id)
+    if db_account is not None:
+        db.refresh(db_account)
+    return db_account
+
+async def _refresh_account_balance(account_id: int) -> Optional[bool]:
+    """从交易所拉取余额并写入数据库，返回是否更新；账户不存在、未激活或出错时返回 None
+
+    合并的调用可能比发起请求活得更久（发起者被取消或先返回时 get_db 会关闭其会话），
+    因此使用独立会话，不借用任何调用者的会话
+    """
+    from database import SessionLocal
+    from exchange_connector import create_connector
+
+    db = SessionLocal()
     try:
+        db_account = get_account(db, account_id)
+        if not db_account or not db_account.is_active:
+            return None
+
         # 创建交易所连接器
         connector = create_connector(
             exchange_type=db_account.exchange_type,
@@ -91,51 +130,60 @@ async def update_account_balance(db: Session, account_id: int) -> Optional[model
             api_secret=db_account.api_secret,
             passphrase=db_account.passphrase
         )
-        
+
         # 获取实时余额
         async with connector:
             account_info = await connector.get_account_balance()
-            
-        if account_info:
-            # 更新数据库中的余额信息
-            db_account.real_time_balance = {
-                'total_equity': account_info.total_equity,
-                'balances': [
-                    {
-                        'asset': b.asset,
-                        'free': b.free,
-                        'locked': b.locked,
-                        'total': b.total
-                    } for b in account_info.balances
-                ],
-                'timestamp': account_info.timestamp
-            }
-            db_account.balance = account_info.total_equity
-            db_account.last_balance_update = func.now()
-            
-            db.commit()
-            db.refresh(db_account)
-            
-        return db_account
-        
+
+        if not account_info:
+            return False
+
+        # 更新数据库中的余额信息
+        db_account.real_time_balance = {
+            'total_equity': account_info.total_equity,
+            'balances': [
+                {
+                    'asset': b.asset,
+                    'free': b.free,
+                    'locked': b.locked,
+                    'total': b.total
+                } for b in account_info.balances
+            ],
+            'timestamp': account_info.timestamp
+        }
+        db_account.balance = account_info.total_equity
+        db_account.last_balance_update = func.now()
+        db.commit()
+        return True
+
     except Exception as e:
         logger.error(f"更新账户 {account_id} 余额失败: {e}")
         return None
+    finally:
+        db.close()
 
 async def get_accounts_with_real_time_balance(db: Session, skip: int = 0, limit: int = 100) -> List[models.Account]:
-    """获取账户列表并更新实时余额"""
-    accounts = get_accounts(db, skip, limit)
-    
-    # 异步更新所有账户的余额
-    update_tasks = []
-    for account in accounts:
-        if account.is_active:
-            update_tasks.append(update_account_balance(db, account.id))
-    
-    if update_tasks:
-        await asyncio.gather(*update_tasks, return_exceptions=True)
-    
-    return get_accounts(db, skip, limit)
+    """获取账户列表并更新实时余额，并发的相同请求共享一次刷新"""
+    await accounts_balance_flight.do((skip, limit), lambda: _refresh_accounts_balance(skip, limit))
+    # 刷新在独立会话中提交，用一次查询覆盖调用者会话中已加载的旧对象
+    return _active_accounts(db, skip, limit).populate_existing().all()
+
+async def _refresh_accounts_balance(skip: int, limit: int):
+    """异步更新一页账户的余额，每个账户在自己的会话中刷新"""
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        account_ids = [account.id for account in get_accounts(db, skip, limit)]
+    finally:
+        db.close()
+
+    if account_ids:
+        await asyncio.gather(
+            *[account_balance_flight.do(account_id, lambda account_id=account_id: _refresh_account_balance(account_id))
+              for account_id in account_ids],
+            return_exceptions=True
+        )
 
 def update_account(db: Session, account_id: int, account: schemas.AccountUpdate) -> Optional[models.Account]:
     db_account = get_account(db, account_id)
@@ -169,6 +217,321 @@ def create_trade(db: Session, trade: schemas.TradeCreate) -> models.Trade:
     db.refresh(db_trade)
     return db_trade
 
+# Fill ingestion operations
+def save_fills(db: Session, fills: List[dict], cursors: Optional[dict] = None) -> List[str]:
+    """在一个事务中写入成交、去重记录和拉取游标，返回本次新写入的去重键
+
+    已写入过的去重键直接跳过；游标只会前进。并发写入同一去重键时提交抛出 IntegrityError，
+    调用方回滚后重试即可
+    """
+    from sqlalchemy.dialects.sqlite import insert
+
+    existing = set()
+    if fills:
+        keys = [fill["fill_key"] for fill in fills]
+        existing = {key for (key,) in db.query(models.TradeFill.fill_key).filter(models.TradeFill.fill_key.in_(keys))}
+    new = [fill for fill in fills if fill["fill_key"] not in existing]
+
+    if new:
+        accounts = {
+            account.exchange_type.lower(): account.id
+            for account in db.query(models.Account).filter(models.Account.is_active == True)
+        }
+        trade_ids = db.scalars(
+            insert(models.Trade).returning(models.Trade.id, sort_by_parameter_order=True),
+            [{
+                "strategy_id": int(fill["strategy_key"]) if (fill["strategy_key"] or "").isdigit() else None,
+                "account_id": accounts.get(fill["exchange"], 0),  # 0 表示未找到对应交易所的账户
+                "symbol": fill["symbol"],
+                "side": fill["side"],
+                "price": fill["price"],
+                "amount": fill["amount"],
+                "fee": fill["fee"],
+                "order_id": fill["order_id"],
+                "status": "filled",
+                "created_at": fill["created_at"],
+            } for fill in new]
+        ).all()
+        db.execute(insert(models.TradeFill), [
+            {"fill_key": fill["fill_key"], "trade_id": trade_id, "strategy_key": fill["strategy_key"], "source": fill["source"]}
+            for fill, trade_id in zip(new, trade_ids)
+        ])
+
+    if cursors:
+        stmt = insert(models.IngestCursor)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["source"],
+            set_={"cursor": func.max(stmt.excluded.cursor, models.IngestCursor.cursor), "updated_at": func.now()}
+        )
+        db.execute(stmt, [{"source": source, "cursor": cursor} for source, cursor in cursors.items()])
+
+    db.commit()
+    return [fill["fill_key"] for fill in new]
+
+def get_ingest_cursor(db: Session, source: str) -> int:
+    cursor = db.query(models.IngestCursor).filter(models.IngestCursor.source == source).first()
+    return cursor.cursor if cursor else 0
+
+# Trade rollup operations
+def rollup_trades(db: Session, day: date) -> List[models.TradeRollup]:
+    """按策略汇总指定日期的成交记录，已存在的汇总记录会被覆盖"""
+    day_start = datetime.combine(day, time.min)
+    day_end = day_start + timedelta(days=1)
+
+    rows = db.query(
+        models.Trade.strategy_id,
+        func.count(models.Trade.id),
+        func.sum(case((models.Trade.side == "buy", models.Trade.amount), else_=0.0)),
+        func.sum(case((models.Trade.side == "sell", models.Trade.amount), else_=0.0)),
+        func.sum(models.Trade.price * models.Trade.amount),
+        func.sum(models.Trade.fee),
+    ).filter(
+        models.Trade.created_at >= day_start,
+        models.Trade.created_at < day_end,
+    ).group_by(models.Trade.strategy_id).all()
+
+    existing = {
+        rollup.strategy_id: rollup
+        for rollup in db.query(models.TradeRollup).filter(models.TradeRollup.day == day).all()
+    }
+
+    rollups = []
+    for strategy_id, trade_count, buy_amount, sell_amount, notional, fee in rows:
+        rollup = existing.get(strategy_id)
+        if rollup is None:
+            rollup = models.TradeRollup(day=day, strategy_id=strategy_id)
+            db.add(rollup)
+        rollup.trade_count = trade_count
+        rollup.buy_amount = buy_amount or 0.0
+        rollup.sell_amount = sell_amount or 0.0
+        rollup.notional = notional or 0.0
+        rollup.fee = fee or 0.0
+        rollups.append(rollup)
+
+    db.commit()
+    return rollups
+
+def get_trade_rollups(db: Session, day: Optional[date] = None) -> List[models.TradeRollup]:
+    query = db.query(models.TradeRollup)
+    if day:
+        query = query.filter(models.TradeRollup.day == day)
+    return query.order_by(desc(models.TradeRollup.day)).all()
+
+# Kline operations
+def save_klines(db: Session, rows: List[dict]) -> int:
+    """批量写入 K 线，同一根 K 线重复写入时覆盖
+
+    partial 的 K 线只包含部分成交（引擎启动后的第一根、关闭时未收盘的一根），
+    与已保存的同一根合并：保留已保存的开盘价，最高/最低价取两者的极值，成交量和笔数相加
+    """
+    from sqlalchemy import func
+    from sqlalchemy.dialects.sqlite import insert
+
+    if not rows:
+        return 0
+    complete = [{k: v for k, v in row.items() if k != "partial"} for row in rows if not row.get("partial")]
+    partial = [{k: v for k, v in row.items() if k != "partial"} for row in rows if row.get("partial")]
+    index_elements = ["exchange", "symbol", "interval", "open_time"]
+    if complete:
+        stmt = insert(models.Kline)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=index_elements,
+            set_={column: stmt.excluded[column] for column in ("open", "high", "low", "close", "volume", "trade_count")}
+        )
+        db.execute(stmt, complete)
+    if partial:
+        stmt = insert(models.Kline)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=index_elements,
+            set_={
+                "high": func.max(models.Kline.high, stmt.excluded.high),
+                "low": func.min(models.Kline.low, stmt.excluded.low),
+                "close": stmt.excluded.close,
+                "volume": models.Kline.volume + stmt.excluded.volume,
+                "trade_count": models.Kline.trade_count + stmt.excluded.trade_count,
+            }
+        )
+        db.execute(stmt, partial)
+    db.commit()
+    return len(rows)
+
+def get_klines(db: Session, exchange: str, symbol: str, interval: str, start: Optional[int] = None,
+               end: Optional[int] = None, limit: int = 500, latest: bool = True) -> List[models.Kline]:
+    """按时间范围查询 K 线，latest 为 True 时取范围内最新的 limit 根，结果按时间升序"""
+    query = db.query(models.Kline).filter(
+        models.Kline.exchange == exchange,
+        models.Kline.symbol == symbol,
+        models.Kline.interval == interval,
+    )
+    if start is not None:
+        query = query.filter(models.Kline.open_time >= start)
+    if end is not None:
+        query = query.filter(models.Kline.open_time <= end)
+    if latest:
+        return list(reversed(query.order_by(desc(models.Kline.open_time)).limit(limit).all()))
+    return query.order_by(models.Kline.open_time).limit(limit).all()
+
+# Strategy execution registry operations
+def get_strategy_executions(db: Session, strategy_ids: Optional[List[str]] = None,
+                            status: Optional[str] = None) -> List[models.StrategyExecution]:
+    """按策略 ID 和/或状态查询执行记录，两个条件同时给出时取并集"""
+    query = db.query(models.StrategyExecution)
+    conditions = []
+    if strategy_ids is not None:
+        conditions.append(models.StrategyExecution.strategy_id.in_(strategy_ids))
+    if status is not None:
+        conditions.append(models.StrategyExecution.status == status)
+    if conditions:
+        query = query.filter(or_(*conditions))
+    return query.all()
+
+def save_strategy_executions(db: Session, rows: List[dict]) -> List[models.StrategyExecution]:
+    """批量写入策略执行状态并返回写入后的记录
+
+    同一策略重复写入时覆盖状态，未给出的类型、参数和所在实例沿用已有记录；版本号保证严格递增，
+    不依赖各进程的时钟先后。数字 ID 的策略在同一事务中同步 strategies 表的 status
+    """
+    from sqlalchemy.dialects.sqlite import insert
+
+    if not rows:
+        return []
+    table = models.StrategyExecution
+    stmt = insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["strategy_id"],
+        set_={
+            "type": func.coalesce(stmt.excluded.type, table.type),
+            "params": func.coalesce(stmt.excluded.params, table.params),
+            "instance": func.coalesce(stmt.excluded.instance, table.instance),
+            "status": stmt.excluded.status,
+            "error": stmt.excluded.error,
+            "version": func.max(stmt.excluded.version, table.version + 1),
+        }
+    )
+    db.execute(stmt, rows)
+
+    by_status = {}
+    for row in rows:
+        if row["strategy_id"].isdigit():
+            by_status.setdefault(row["status"], []).append(int(row["strategy_id"]))
+    for status, ids in by_status.items():
+        db.query(models.Strategy).filter(models.Strategy.id.in_(ids)).update(
+            {"status": status}, synchronize_session=False
+        )
+    db.commit()
+    return get_strategy_executions(db, [row["strategy_id"] for row in rows])
+
+# Hummingbot instance pool operations
+def get_hummingbot_instances(db: Session) -> List[models.HummingbotInstance]:
+    return db.query(models.HummingbotInstance).all()
+
+def save_hummingbot_instance(db: Session, url: str, failed_over: Optional[bool] = None):
+    """记录实例（已存在时保留），给出 failed_over 时同时更新故障转移标记"""
+    from sqlalchemy.dialects.sqlite import insert
+
+    stmt = insert(models.HummingbotInstance).values(url=url, failed_over=bool(failed_over))
+    if failed_over is None:
+        stmt = stmt.on_conflict_do_nothing()
+    else:
+        stmt = stmt.on_conflict_do_update(index_elements=["url"], set_={"failed_over": failed_over})
+    db.execute(stmt)
+    db.commit()
+
+# Strategy job operations
+def create_strategy_job(db: Session, job: dict) -> tuple:
+    """创建策略命令任务，返回 (任务, 是否新建)；幂等键已存在时返回原任务"""
+    from sqlalchemy.dialects.sqlite import insert
+
+    key = job.get("idempotency_key")
+    # 幂等键冲突时不插入，由唯一约束保证多个 worker 并发提交同一幂等键时只有一个任务
+    result = db.execute(insert(models.StrategyJob).values(**job, status="queued").on_conflict_do_nothing())
+    db.commit()
+    if key is not None and result.rowcount == 0:
+        return db.query(models.StrategyJob).filter(models.StrategyJob.idempotency_key == key).first(), False
+    return db.query(models.StrategyJob).filter(models.StrategyJob.id == job["id"]).first(), True
+
+def update_strategy_jobs(db: Session, job_ids: List[str], **fields) -> int:
+    updated = db.query(models.StrategyJob).filter(models.StrategyJob.id.in_(job_ids)).update(fields, synchronize_session=False)
+    db.commit()
+    return updated
+
+def get_queued_strategy_jobs(db: Session, strategy_id: Optional[str] = None) -> List[models.StrategyJob]:
+    """排队中的任务，按提交顺序"""
+    query = db.query(models.StrategyJob).filter(models.StrategyJob.status == "queued")
+    if strategy_id is not None:
+        query = query.filter(models.StrategyJob.strategy_id == strategy_id)
+    return query.order_by(models.StrategyJob.created_at, models.StrategyJob.id).all()
+
+def count_queued_strategy_jobs(db: Session) -> int:
+    return db.query(models.StrategyJob).filter(models.StrategyJob.status == "queued").count()
+
+def claim_strategy_job(db: Session, strategy_id: str, owner: str, now: float, ttl: float,
+                       orphan_error: str) -> tuple:
+    """获取策略的任务租约并领取最早排队的任务，返回 (任务, 标记为失败的中断任务)
+
+    租约由其他未过期的持有者持有时返回 (None, [])；没有排队任务时释放租约。
+    获取租约时仍为 running 的任务属于已中断的持有者，标记为失败
+    """
+    from sqlalchemy.dialects.sqlite import insert
+
+    lease = models.StrategyJobLease
+    stmt = insert(lease).values(strategy_id=strategy_id, owner=owner, expires_at=now + ttl)
+    stmt = stmt.on_conflict_do_update(index_elements=["strategy_id"], set_={"owner": owner, "expires_at": now + ttl},
+                                      where=or_(lease.expires_at < now, lease.owner == owner))
+    if db.execute(stmt).rowcount == 0:
+        db.rollback()
+        return None, []
+
+    jobs = db.query(models.StrategyJob).filter(
+        models.StrategyJob.strategy_id == strategy_id, models.StrategyJob.status.in_(("queued", "running"))
+    ).order_by(models.StrategyJob.created_at, models.StrategyJob.id).all()
+    claimed_at = datetime.now(timezone.utc)
+    orphaned = [job for job in jobs if job.status == "running"]
+    for job in orphaned:
+        job.status, job.error, job.finished_at = "failed", orphan_error, claimed_at
+    job = next((job for job in jobs if job.status == "queued"), None)
+    if job is None:
+        db.query(lease).filter(lease.strategy_id == strategy_id).delete(synchronize_session=False)
+    else:
+        job.status, job.started_at = "running", claimed_at
+    db.commit()
+    return job, orphaned
+
+def renew_strategy_job_lease(db: Session, strategy_id: str, owner: str, expires_at: float) -> bool:
+    """续期租约，租约已被其他持有者接管时返回 False"""
+    lease = models.StrategyJobLease
+    updated = db.query(lease).filter(lease.strategy_id == strategy_id, lease.owner == owner).update(
+        {"expires_at": expires_at}, synchronize_session=False)
+    db.commit()
+    return bool(updated)
+
+def release_strategy_job_leases(db: Session, owner: str) -> int:
+    lease = models.StrategyJobLease
+    released = db.query(lease).filter(lease.owner == owner).delete(synchronize_session=False)
+    db.commit()
+    return released
+
+def get_orphaned_strategy_job_ids(db: Session, now: float) -> List[str]:
+    """有排队或执行中的任务、但没有有效租约的策略：提交它的进程已退出或崩溃"""
+    lease = models.StrategyJobLease
+    live = db.query(lease.strategy_id).filter(lease.expires_at >= now)
+    rows = db.query(models.StrategyJob.strategy_id).filter(
+        models.StrategyJob.status.in_(("queued", "running")), models.StrategyJob.strategy_id.not_in(live)
+    ).distinct().all()
+    return [row[0] for row in rows]
+
+def get_strategy_job(db: Session, job_id: str) -> Optional[models.StrategyJob]:
+    return db.query(models.StrategyJob).filter(models.StrategyJob.id == job_id).first()
+
+def get_strategy_jobs(db: Session, strategy_id: Optional[str] = None, status: Optional[str] = None,
+                      limit: int = 100) -> List[models.StrategyJob]:
+    query = db.query(models.StrategyJob)
+    if strategy_id is not None:
+        query = query.filter(models.StrategyJob.strategy_id == strategy_id)
+    if status is not None:
+        query = query.filter(models.StrategyJob.status == status)
+    return query.order_by(desc(models.StrategyJob.created_at)).limit(limit).all()
+
 # Log CRUD operations
 def get_logs(db: Session, strategy_id: Optional[int] = None, skip: int = 0, limit: int = 100) -> List[models.Log]:
     query = db.query(models.Log)
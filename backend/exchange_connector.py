@@ -14,9 +14,17 @@ from dataclasses import dataclass
 from enum import Enum
 import logging
 import base64
+import os
 
 logger = logging.getLogger(__name__)
 
+# 交易所接口地址（可通过环境变量指向测试网或本地模拟服务）
+BINANCE_API_URL = os.getenv('BINANCE_API_URL', 'https://api.binance.com')
+BINANCE_WS_URL = os.getenv('BINANCE_WS_URL', 'wss://stream.binance.com:9443/ws')
+BINANCE_FUTURES_API_URL = os.getenv('BINANCE_FUTURES_API_URL', 'https://fapi.binance.com')
+OKX_API_URL = os.getenv('OKX_API_URL', 'https://www.okx.com')
+OKX_WS_URL = os.getenv('OKX_WS_URL', 'wss://ws.okx.com:8443/ws/v5/public')
+
 class ExchangeType(Enum):
     BINANCE = "binance"
     OKX = "okx"
@@ -68,7 +76,7 @@ class BinanceConnector(ExchangeConnector):
     
     def __init__(self, api_key: str, api_secret: str):
         super().__init__(api_key, api_secret, ExchangeType.BINANCE)
-        self.base_url = "https://api.binance.com"
+        self.base_url = BINANCE_API_URL
     
     def _sign_request(self, params: Dict[str, Any]) -> str:
         """生成币安 API 签名"""
@@ -141,7 +149,7 @@ class OKXConnector(ExchangeConnector):
     def __init__(self, api_key: str, api_secret: str, passphrase: str = ""):
         super().__init__(api_key, api_secret, ExchangeType.OKX)
         self.passphrase = passphrase
-        self.base_url = "https://www.okx.com"
+        self.base_url = OKX_API_URL
     
     def _sign_request(self, timestamp: str, method: str, request_path: str, body: str = "") -> str:
         """生成 OKX API 签名"""
@@ -250,6 +258,33 @@ class ExchangeManager:
             logger.error(f"获取账户 {account_id} 余额失败: {e}")
             return None
 
+# 无分隔符写法（如 BTCUSDT）拆分时识别的计价币种，按长度优先匹配
+QUOTE_ASSETS = ("FDUSD", "USDT", "USDC", "BUSD", "TUSD", "BTC", "ETH", "BNB", "EUR", "TRY")
+
+def normalize_symbol(symbol: str) -> str:
+    """将 BTC-USDT / btc_usdt / BTCUSDT / BTC/USDT 等写法统一为 BTC/USDT"""
+    symbol = symbol.strip().upper()
+    for separator in ("-", "_"):
+        symbol = symbol.replace(separator, "/")
+    if "/" not in symbol:
+        for quote in QUOTE_ASSETS:
+            if symbol.endswith(quote) and len(symbol) > len(quote):
+                return f"{symbol[:-len(quote)]}/{quote}"
+    return symbol
+
+def to_exchange_symbol(exchange_type: str, symbol: str) -> str:
+    """将统一格式的交易对转换为交易所原生格式"""
+    base, _, quote = normalize_symbol(symbol).partition("/")
+    exchange_type = exchange_type.lower()
+    if exchange_type in (ExchangeType.BINANCE.value, ExchangeType.BYBIT.value):
+        return f"{base}{quote}"
+    elif exchange_type == ExchangeType.OKX.value:
+        return f"{base}-{quote}"
+    elif exchange_type == ExchangeType.GATE_IO.value:
+        return f"{base}_{quote}"
+    else:
+        raise ValueError(f"不支持的交易所类型: {exchange_type}")
+
 # 全局交易所管理器实例
 exchange_manager = ExchangeManager()
 
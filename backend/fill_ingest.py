@@ -0,0 +1,296 @@
+"""
+Hummingbot 成交与订单事件接入
+- 推送：Webhook（POST /api/hummingbot/events）或 WebSocket 流（/ws/hummingbot/events）提交事件
+- 拉取：调度器定期按游标从各 Hummingbot 实例拉取 GET /fills?after=<游标>，作为推送丢失时的补偿
+成交按 交易所:订单号[:成交号] 去重，经有界队列攒批后在一个事务中写入 trades、去重记录和拉取游标：
+推送方在事务提交后才收到确认，失败重发的成交会被去重跳过；拉取的游标与成交同一事务提交，
+进程崩溃后从上次提交的游标继续，因此每笔成交恰好写入一次。拉取到格式无效的事件时记录日志并计数后跳过，
+游标照常前进，不会卡在同一条事件上。订单事件不落库，只通过 pubsub 推送
+"""
+
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from metrics import registry
+from pubsub import broadcaster
+
+logger = logging.getLogger(__name__)
+
+FILL_BATCH_SIZE = int(os.getenv('FILL_BATCH_SIZE', '1000'))  # 单个事务最多写入的成交数
+FILL_FLUSH_INTERVAL = float(os.getenv('FILL_FLUSH_INTERVAL', '0.02'))  # 攒批等待时间（秒）
+FILL_QUEUE_BATCHES = int(os.getenv('FILL_QUEUE_BATCHES', '20'))  # 队列中最多积压的批次，满时提交方等待
+FILL_SUBMIT_TIMEOUT = float(os.getenv('FILL_SUBMIT_TIMEOUT', '10'))  # 提交方等待入队和落库的最长时间（秒）
+FILL_PULL_LIMIT = int(os.getenv('FILL_PULL_LIMIT', '1000'))  # 每次拉取的事件数
+FILL_PULL_MAX_PAGES = int(os.getenv('FILL_PULL_MAX_PAGES', '100'))  # 单次拉取任务最多拉取的页数
+FILL_WEBHOOK_TOKEN = os.getenv('FILL_WEBHOOK_TOKEN')  # 设置后推送请求需携带 X-Webhook-Token
+
+FILLS_TOPIC = "fills"
+ORDERS_TOPIC = "orders"
+FILL_SIDES = ("buy", "sell")
+
+fills_ingested = registry.counter("fills_ingested_total", "写入 trades 的成交数")
+fills_duplicated = registry.counter("fills_duplicated_total", "去重跳过的成交数")
+fills_rejected = registry.counter("fills_rejected_total", "拉取时因格式无效跳过的事件数")
+fill_batches = registry.counter("fill_batches_total", "成交写入事务数")
+order_events = registry.counter("order_events_total", "收到的订单事件数")
+
+
+def _fill_key(event) -> str:
+    key = f"{event.exchange.lower()}:{event.order_id}"
+    return f"{key}:{event.trade_id}" if event.trade_id else key
+
+
+def _normalize_fill(event, source: str) -> Dict:
+    """转为写库格式，缺少必要字段时抛出 ValueError"""
+    from exchange_connector import normalize_symbol
+
+    side = (event.side or "").lower()
+    if side not in FILL_SIDES:
+        raise ValueError(f"成交 {event.order_id} 的方向无效: {event.side}")
+    if not event.price or not event.amount or event.price <= 0 or event.amount <= 0:
+        raise ValueError(f"成交 {event.order_id} 的价格或数量无效")
+    timestamp = event.timestamp / 1000 if event.timestamp else time.time()
+    return {
+        "fill_key": _fill_key(event),
+        "strategy_key": event.strategy_id,
+        "exchange": event.exchange.lower(),
+        "symbol": normalize_symbol(event.symbol),
+        "side": side,
+        "price": event.price,
+        "amount": event.amount,
+        "fee": event.fee,
+        "order_id": event.order_id,
+        "created_at": datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None),
+        "source": source,
+    }
+
+
+def _seq(item) -> int:
+    """原始事件的序号，无法解析时为 0"""
+    try:
+        return int(item.get("seq") or 0)
+    except (AttributeError, TypeError, ValueError):
+        return 0
+
+
+@dataclass
+class _Chunk:
+    """一次提交中的成交，写入后通过 future 通知提交方"""
+    fills: List[Dict]
+    cursors: Dict[str, int]
+    future: asyncio.Future
+    result: Dict[str, int] = field(default_factory=lambda: {"accepted": 0, "duplicates": 0})
+
+
+class FillIngestor:
+    """成交接入：有界队列 + 单写入协程攒批落库"""
+
+    def __init__(self, batch_size: int = FILL_BATCH_SIZE, flush_interval: float = FILL_FLUSH_INTERVAL,
+                 queue_batches: int = FILL_QUEUE_BATCHES, session_factory=None):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.session_factory = session_factory  # 为空时使用 database.SessionLocal
+        # 每个队列元素最多 batch_size 笔成交，积压的成交不超过 queue_batches * batch_size
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_batches)
+        self._task: Optional[asyncio.Task] = None
+
+    async def submit(self, events, source: str = "webhook", cursor: Optional[int] = None) -> Dict[str, int]:
+        """提交事件并等待成交落库，返回写入数和重复数；队列积压时等待，超时抛出 asyncio.TimeoutError
+
+        cursor 为拉取来源的游标，与这批成交在同一事务中提交
+        """
+        fills, orders = [], 0
+        for event in events:
+            if event.type == "fill":
+                fills.append(_normalize_fill(event, source))
+            else:
+                orders += 1
+                self._publish_order(event)
+        if orders:
+            order_events.inc(orders, source=source)
+
+        cursors = {source: cursor} if cursor is not None else {}
+        if not fills and not cursors:
+            return {"accepted": 0, "duplicates": 0, "orders": orders}
+
+        self.start()
+        loop = asyncio.get_running_loop()
+        chunks = [
+            _Chunk(fills[i:i + self.batch_size], {}, loop.create_future())
+            for i in range(0, len(fills), self.batch_size)
+        ] or [_Chunk([], {}, loop.create_future())]
+        # 游标随最后一块提交，保证游标前的成交都已写入
+        chunks[-1].cursors = cursors
+
+        async def enqueue_and_wait():
+            for chunk in chunks:
+                await self.queue.put(chunk)
+            return await asyncio.gather(*[chunk.future for chunk in chunks])
+
+        results = await asyncio.wait_for(enqueue_and_wait(), FILL_SUBMIT_TIMEOUT)
+        return {
+            "accepted": sum(r["accepted"] for r in results),
+            "duplicates": sum(r["duplicates"] for r in results),
+            "orders": orders,
+        }
+
+    def start(self):
+        """启动写入协程，已启动时忽略"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            chunks = [await self.queue.get()]
+            if self.flush_interval > 0:
+                await asyncio.sleep(self.flush_interval)
+            count = len(chunks[0].fills)
+            while count < self.batch_size and not self.queue.empty():
+                chunk = self.queue.get_nowait()
+                chunks.append(chunk)
+                count += len(chunk.fills)
+            await self._flush(chunks)
+
+    async def _flush(self, chunks: List[_Chunk]):
+        # 批内去重：同一去重键只保留第一次出现
+        seen, fills, cursors = set(), [], {}
+        for chunk in chunks:
+            for fill in chunk.fills:
+                if fill["fill_key"] not in seen:
+                    seen.add(fill["fill_key"])
+                    fills.append(fill)
+            for source, cursor in chunk.cursors.items():
+                cursors[source] = max(cursor, cursors.get(source, cursor))
+        try:
+            inserted = set(await asyncio.to_thread(self._write, fills, cursors))
+        except Exception as e:
+            logger.error(f"成交写入失败（{len(fills)} 笔），等待重发: {e}")
+            for chunk in chunks:
+                if not chunk.future.done():
+                    chunk.future.set_exception(e)
+            return
+
+        fill_batches.inc()
+        written = []
+        for chunk in chunks:
+            for fill in chunk.fills:
+                if fill["fill_key"] in inserted:
+                    inserted.discard(fill["fill_key"])  # 同一去重键只计入第一次出现
+                    chunk.result["accepted"] += 1
+                    written.append(fill)
+                else:
+                    chunk.result["duplicates"] += 1
+            if not chunk.future.done():
+                chunk.future.set_result(chunk.result)
+        duplicates = sum(len(chunk.fills) for chunk in chunks) - len(written)
+        if written:
+            fills_ingested.inc(len(written))
+            self._publish_fills(written)
+        if duplicates:
+            fills_duplicated.inc(duplicates)
+
+    def _session(self):
+        if self.session_factory is not None:
+            return self.session_factory()
+        from database import SessionLocal
+
+        return SessionLocal()
+
+    def _write(self, fills: List[Dict], cursors: Dict[str, int]) -> List[str]:
+        import crud
+        from sqlalchemy.exc import IntegrityError
+
+        db = self._session()
+        try:
+            try:
+                return crud.save_fills(db, fills, cursors)
+            except IntegrityError:
+                # 其他 worker 同时写入了相同的成交：回滚后重试，已写入的会被跳过
+                db.rollback()
+                return crud.save_fills(db, fills, cursors)
+        finally:
+            db.close()
+
+    @staticmethod
+    def _publish_fills(fills: List[Dict]):
+        if broadcaster.has_subscribers(FILLS_TOPIC):
+            broadcaster.publish(FILLS_TOPIC, {
+                "type": FILLS_TOPIC,
+                "timestamp": time.time(),
+                "data": [{**fill, "created_at": fill["created_at"].isoformat()} for fill in fills],
+            })
+
+    @staticmethod
+    def _publish_order(event):
+        if broadcaster.has_subscribers(ORDERS_TOPIC):
+            broadcaster.publish(ORDERS_TOPIC, {"type": ORDERS_TOPIC, "timestamp": time.time(), "data": event.model_dump()})
+
+    async def pull(self, source: str, client, limit: int = FILL_PULL_LIMIT, max_pages: int = FILL_PULL_MAX_PAGES) -> int:
+        """从一个 Hummingbot 实例按游标拉取事件直到追上，返回写入的成交数"""
+        from pydantic import TypeAdapter
+
+        import schemas
+
+        adapter = TypeAdapter(schemas.HummingbotEvent)
+        cursor = await asyncio.to_thread(self._load_cursor, source)
+        accepted = 0
+        for _ in range(max_pages):
+            result = await client.get_fills(after=cursor, limit=limit)
+            items = result.get("data") or []
+            if not items:
+                break
+            events = []
+            for item in items:
+                try:
+                    event = adapter.validate_python(item)
+                    if event.type == "fill":
+                        _normalize_fill(event, source)
+                except (ValueError, OverflowError, OSError) as e:  # 时间戳超出范围时为 OverflowError/OSError
+                    fills_rejected.inc(source=source)
+                    logger.warning(f"跳过 {source} 的无效事件 {item!r:.500}: {e}")
+                    continue
+                events.append(event)
+            next_cursor = int(result.get("next") or max(_seq(item) for item in items))
+            accepted += (await self.submit(events, source=source, cursor=next_cursor))["accepted"]
+            cursor = next_cursor
+            if len(items) < limit:
+                break
+        return accepted
+
+    def _load_cursor(self, source: str) -> int:
+        import crud
+
+        db = self._session()
+        try:
+            return crud.get_ingest_cursor(db, source)
+        finally:
+            db.close()
+
+    async def pull_all(self) -> Dict[str, int]:
+        """从所有健康的 Hummingbot 实例拉取，单个实例失败不影响其他实例"""
+        from hummingbot_integration import strategy_executor
+
+        instances = strategy_executor.api_client.healthy_instances()
+        results = await asyncio.gather(*[self.pull(i.url, i.client) for i in instances], return_exceptions=True)
+        pulled = {}
+        for instance, result in zip(instances, results):
+            if isinstance(result, Exception):
+                logger.error(f"从 {instance.url} 拉取成交失败: {result}")
+            else:
+                pulled[instance.url] = result
+        return pulled
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+# 全局成交接入实例
+fill_ingestor = FillIngestor()
@@ -0,0 +1,385 @@
+"""
+永续合约资金费率监控
+定期批量拉取各永续交易所所有 U 本位合约的当前/预测资金费率、下次结算时间以及标记价格和指数价格：
+币安 /fapi/v1/premiumIndex 一次返回全部合约，结算周期来自 /fapi/v1/fundingInfo（只列出非 8 小时的合约，
+每 FUNDING_INFO_REFRESH_INTERVAL 重新拉取一次）；OKX 标记价格和指数价格各一次批量请求，
+资金费率按合约有限并发请求。数据保存在 交易对 × 交易所 的 numpy 矩阵中，
+一次向量化计算基差、年化资金费率和跨交易所资金费率价差；
+运行中的现货永续套利策略的资金费率超过或回落到 funding_rate_threshold 时推送给策略和前端
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+import numpy as np
+
+from exchange_connector import BINANCE_FUTURES_API_URL, OKX_API_URL, normalize_symbol
+from metrics import registry
+from pubsub import broadcaster
+
+logger = logging.getLogger(__name__)
+
+FUNDING_REFRESH_INTERVAL = float(os.getenv('FUNDING_REFRESH_INTERVAL', '30'))
+FUNDING_REQUEST_TIMEOUT = float(os.getenv('FUNDING_REQUEST_TIMEOUT', '10'))
+OKX_FUNDING_CONCURRENCY = int(os.getenv('OKX_FUNDING_CONCURRENCY', '5'))
+FUNDING_INFO_REFRESH_INTERVAL = float(os.getenv('FUNDING_INFO_REFRESH_INTERVAL', '3600'))  # 币安结算周期的刷新间隔（秒）
+DEFAULT_FUNDING_INTERVAL_HOURS = 8
+FUNDING_TOPIC = "funding"
+SPOT_PERPETUAL_STRATEGY = "spot_perpetual_arbitrage"
+
+funding_refreshes = registry.counter("funding_refreshes_total", "资金费率刷新次数")
+funding_alerts = registry.counter("funding_alerts_total", "策略资金费率阈值穿越次数")
+
+
+# 币安各合约的结算周期（小时）及拉取时间，未列出的合约为 8 小时
+_binance_intervals: Dict[str, float] = {}
+_binance_intervals_at: Optional[float] = None
+
+
+async def fetch_binance_funding_intervals(session: aiohttp.ClientSession) -> Dict[str, float]:
+    async with session.get(f"{BINANCE_FUTURES_API_URL}/fapi/v1/fundingInfo") as response:
+        response.raise_for_status()
+        data = await response.json()
+    return {normalize_symbol(item["symbol"]): float(item["fundingIntervalHours"])
+            for item in data if item.get("fundingIntervalHours")}
+
+
+async def _binance_funding_intervals(session: aiohttp.ClientSession) -> Dict[str, float]:
+    """缓存的结算周期，过期时重新拉取；拉取失败时继续使用上一次的结果（没有时全部按 8 小时），下次刷新再试"""
+    global _binance_intervals, _binance_intervals_at
+    if _binance_intervals_at is None or time.monotonic() - _binance_intervals_at > FUNDING_INFO_REFRESH_INTERVAL:
+        try:
+            _binance_intervals = await fetch_binance_funding_intervals(session)
+            _binance_intervals_at = time.monotonic()
+        except Exception as e:
+            logger.warning(f"获取币安资金费率结算周期失败，使用{'上一次的结果' if _binance_intervals else '默认 8 小时'}: {e}")
+    return _binance_intervals
+
+
+async def fetch_binance_funding(session: aiohttp.ClientSession) -> List[Dict]:
+    async with session.get(f"{BINANCE_FUTURES_API_URL}/fapi/v1/premiumIndex") as response:
+        response.raise_for_status()
+        data = await response.json()
+    intervals = await _binance_funding_intervals(session)
+
+    rates = []
+    for item in data:
+        # 交割合约带有到期日后缀（BTCUSDT_250627），只保留永续合约
+        if "_" in item["symbol"] or not item.get("lastFundingRate"):
+            continue
+        symbol = normalize_symbol(item["symbol"])
+        rates.append({
+            "symbol": symbol,
+            "funding_rate": float(item["lastFundingRate"]),
+            # 币安的 lastFundingRate 即本期预估费率，不提供下一期预测
+            "predicted_rate": None,
+            "next_funding_time": int(item["nextFundingTime"]),
+            "interval_hours": intervals.get(symbol, DEFAULT_FUNDING_INTERVAL_HOURS),
+            "mark_price": float(item["markPrice"]),
+            "index_price": float(item["indexPrice"]),
+        })
+    return rates
+
+
+async def fetch_okx_funding(session: aiohttp.ClientSession) -> List[Dict]:
+    async def get(path: str, **params) -> List[Dict]:
+        async with session.get(f"{OKX_API_URL}{path}", params=params) as response:
+            response.raise_for_status()
+            return (await response.json())["data"]
+
+    marks, indexes = await asyncio.gather(
+        get("/api/v5/public/mark-price", instType="SWAP"),
+        get("/api/v5/market/index-tickers", quoteCcy="USDT"),
+    )
+    mark_prices = {item["instId"]: float(item["markPx"]) for item in marks if item["instId"].endswith("-USDT-SWAP")}
+    index_prices = {item["instId"]: float(item["idxPx"]) for item in indexes if item.get("idxPx")}
+
+    # 资金费率接口只能逐个合约查询，以有限并发批量拉取
+    semaphore = asyncio.Semaphore(OKX_FUNDING_CONCURRENCY)
+
+    async def fetch(inst_id: str) -> Optional[Dict]:
+        async with semaphore:
+            try:
+                items = await get("/api/v5/public/funding-rate", instId=inst_id)
+            except Exception as e:
+                logger.warning(f"获取 OKX {inst_id} 资金费率失败: {e}")
+                return None
+        if not items or not items[0].get("fundingRate"):
+            return None
+        item = items[0]
+        funding_time, next_funding_time = int(item["fundingTime"]), int(item["nextFundingTime"] or 0)
+        index_id = inst_id[:-len("-SWAP")]
+        return {
+            "symbol": normalize_symbol(index_id),
+            "funding_rate": float(item["fundingRate"]),
+            "predicted_rate": float(item["nextFundingRate"]) if item.get("nextFundingRate") else None,
+            "next_funding_time": funding_time,
+            "interval_hours": (next_funding_time - funding_time) / 3600000 if next_funding_time > funding_time
+            else DEFAULT_FUNDING_INTERVAL_HOURS,
+            "mark_price": mark_prices[inst_id],
+            "index_price": index_prices.get(index_id, np.nan),
+        }
+
+    results = await asyncio.gather(*[fetch(inst_id) for inst_id in mark_prices])
+    return [rate for rate in results if rate is not None]
+
+
+FUNDING_FETCHERS = {
+    "binance_perpetual": fetch_binance_funding,
+    "okx_perpetual": fetch_okx_funding,
+}
+
+
+class FundingMonitor:
+    """资金费率监控：交易对 × 永续交易所矩阵，向量化计算基差和资金费率价差"""
+
+    FIELDS = ("funding_rate", "predicted_rate", "next_funding_time", "interval_hours", "mark_price", "index_price")
+
+    def __init__(self, capacity: int = 256, refresh_interval: float = FUNDING_REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self.venues: List[str] = list(FUNDING_FETCHERS)
+        self.venue_index = {venue: i for i, venue in enumerate(self.venues)}
+        self.symbols: List[str] = []
+        self.symbol_index: Dict[str, int] = {}
+        self.capacity = 0
+        self.data: Dict[str, np.ndarray] = {field: np.empty((0, len(self.venues))) for field in self.FIELDS}
+        self._grow(capacity)
+
+        self.derived: Dict[str, np.ndarray] = {}
+        # 策略阈值状态：策略 ID -> (交易对行, 交易所列, 阈值 %, 当前是否超过阈值)
+        self.strategy_states: Dict[str, Tuple[int, int, float, bool]] = {}
+        self.updated_at: Optional[float] = None
+        self.ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def _grow(self, capacity: int):
+        extra = capacity - self.capacity
+        for field, matrix in self.data.items():
+            self.data[field] = np.vstack([matrix, np.full((extra, len(self.venues)), np.nan)])
+        self.capacity = capacity
+
+    def _row(self, symbol: str) -> int:
+        row = self.symbol_index.get(symbol)
+        if row is None:
+            row = len(self.symbols)
+            if row >= self.capacity:
+                self._grow(self.capacity * 2)
+            self.symbols.append(symbol)
+            self.symbol_index[symbol] = row
+        return row
+
+    def update(self, venue: str, rates: List[Dict]):
+        """写入一个交易所的全部资金费率；本次未返回的合约清空，不再参与计算"""
+        col = self.venue_index[venue]
+        for matrix in self.data.values():
+            matrix[:, col] = np.nan
+        for rate in rates:
+            row = self._row(rate["symbol"])
+            for field in self.FIELDS:
+                value = rate[field]
+                self.data[field][row, col] = np.nan if value is None else value
+
+    def compute(self):
+        """一次向量化计算所有交易对、所有交易所的基差、年化资金费率和跨交易所资金费率价差"""
+        m = len(self.symbols)
+        data = {field: matrix[:m] for field, matrix in self.data.items()}
+        periods_per_year = 365 * 24 / data["interval_hours"]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            basis = data["mark_price"] / data["index_price"] - 1.0
+            annualized_funding = data["funding_rate"] * periods_per_year
+
+            # 资金费率价差：在费率最低的交易所做多、费率最高的交易所做空，按年化计
+            has_pair = np.sum(~np.isnan(annualized_funding), axis=1) >= 2
+            filled_low = np.where(np.isnan(annualized_funding), np.inf, annualized_funding)
+            filled_high = np.where(np.isnan(annualized_funding), -np.inf, annualized_funding)
+            long_venue = np.argmin(filled_low, axis=1)
+            short_venue = np.argmax(filled_high, axis=1)
+            rows = np.arange(m)
+            carry = np.where(has_pair, filled_high[rows, short_venue] - filled_low[rows, long_venue], np.nan)
+
+        self.derived = {
+            "basis": basis,
+            "annualized_funding": annualized_funding,
+            "carry": carry,
+            "long_venue": long_venue,
+            "short_venue": short_venue,
+        }
+
+    def sync_strategies(self, strategies: Dict[str, Dict]):
+        """从运行中的策略同步现货永续套利的资金费率阈值（%），保留已有策略的穿越状态"""
+        states = {}
+        for strategy_id, strategy in strategies.items():
+            if strategy.get("type") != SPOT_PERPETUAL_STRATEGY or strategy.get("status") != "running":
+                continue
+            params = strategy.get("params", {})
+            venue = str(params.get("perpetual_connector", "")).lower()
+            if venue not in self.venue_index or not params.get("market"):
+                continue
+            row = self._row(normalize_symbol(params["market"]))
+            threshold = float(params.get("funding_rate_threshold", 0.001))
+            previous = self.strategy_states.get(strategy_id)
+            above = previous[3] if previous is not None and previous[:3] == (row, self.venue_index[venue], threshold) else False
+            states[strategy_id] = (row, self.venue_index[venue], threshold, above)
+        self.strategy_states = states
+
+    def check_strategies(self) -> List[Dict]:
+        """向量化比较各策略的资金费率与阈值，返回状态发生变化的策略提醒
+
+        阈值为正时资金费率高于阈值视为超过，阈值为负时低于阈值视为超过
+        """
+        if not self.strategy_states:
+            return []
+        ids = list(self.strategy_states)
+        rows, cols, thresholds, previous = (np.array(values) for values in zip(*self.strategy_states.values()))
+        rates = self.data["funding_rate"][rows, cols] * 100
+        with np.errstate(invalid="ignore"):
+            above = np.where(thresholds >= 0, rates >= thresholds, rates <= thresholds)
+        # 暂时没有费率的策略保持原状态
+        above = np.where(np.isnan(rates), previous.astype(bool), above)
+
+        alerts = []
+        for k in np.flatnonzero(above != previous.astype(bool)):
+            strategy_id = ids[k]
+            row, col, threshold, _ = self.strategy_states[strategy_id]
+            self.strategy_states[strategy_id] = (row, col, threshold, bool(above[k]))
+            alerts.append({
+                "strategy_id": strategy_id,
+                "symbol": self.symbols[row],
+                "venue": self.venues[col],
+                "funding_rate": float(rates[k]),
+                "threshold": float(threshold),
+                "crossed": "above" if above[k] else "below",
+                "next_funding_time": int(self.data["next_funding_time"][row, col]),
+            })
+        return alerts
+
+    async def refresh(self):
+        """拉取所有交易所的资金费率并重新计算，单个交易所失败时保留其上一次的数据"""
+        timeout = aiohttp.ClientTimeout(total=FUNDING_REQUEST_TIMEOUT)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            results = await asyncio.gather(*[fetch(session) for fetch in FUNDING_FETCHERS.values()],
+                                           return_exceptions=True)
+        for venue, result in zip(FUNDING_FETCHERS, results):
+            if isinstance(result, Exception):
+                logger.error(f"获取 {venue} 资金费率失败: {result}")
+                continue
+            self.update(venue, result)
+            funding_refreshes.inc(venue=venue)
+
+        from hummingbot_integration import strategy_executor
+
+        self.sync_strategies(await strategy_executor.running_strategies())
+        self.compute()
+        self.updated_at = time.time()
+        self.ready.set()
+        self._publish(self.check_strategies())
+
+    def _publish(self, alerts: List[Dict]):
+        for alert in alerts:
+            funding_alerts.inc(venue=alert["venue"], crossed=alert["crossed"])
+            logger.info(f"策略 {alert['strategy_id']} 资金费率 {alert['funding_rate']:.4f}% "
+                        f"{'超过' if alert['crossed'] == 'above' else '回落到'}阈值 {alert['threshold']}%")
+            message = {"type": "funding_alert", "timestamp": self.updated_at, "data": alert}
+            broadcaster.publish(f"{FUNDING_TOPIC}:{alert['strategy_id']}", message)
+            broadcaster.publish(FUNDING_TOPIC, message)
+        if broadcaster.has_subscribers(FUNDING_TOPIC):
+            broadcaster.publish(FUNDING_TOPIC, self.snapshot_message())
+
+    def get_rates(self, symbol: Optional[str] = None, venue: Optional[str] = None) -> List[Dict]:
+        """各交易所的资金费率，费率和基差单位为 %"""
+        if venue is not None and venue not in self.venue_index:
+            raise ValueError(f"不支持的永续合约交易所: {venue}")
+        if not self.derived:
+            return []
+        if symbol:
+            row = self.symbol_index.get(normalize_symbol(symbol))
+            rows = [row] if row is not None else []
+        else:
+            rows = range(len(self.symbols))
+        cols = [self.venue_index[venue]] if venue else range(len(self.venues))
+        data, derived = self.data, self.derived
+
+        def number(value, scale=1.0):
+            return float(value) * scale if not np.isnan(value) else None
+
+        result = []
+        for row in rows:
+            if row >= len(derived["carry"]):
+                continue
+            for col in cols:
+                if np.isnan(data["funding_rate"][row, col]):
+                    continue
+                result.append({
+                    "symbol": self.symbols[row],
+                    "venue": self.venues[col],
+                    "funding_rate": number(data["funding_rate"][row, col], 100),
+                    "predicted_rate": number(data["predicted_rate"][row, col], 100),
+                    "next_funding_time": int(data["next_funding_time"][row, col]),
+                    "interval_hours": float(data["interval_hours"][row, col]),
+                    "mark_price": number(data["mark_price"][row, col]),
+                    "index_price": number(data["index_price"][row, col]),
+                    "basis": number(derived["basis"][row, col], 100),
+                    "annualized_funding": number(derived["annualized_funding"][row, col], 100),
+                })
+        return result
+
+    def get_carry(self, min_carry: Optional[float] = None) -> List[Dict]:
+        """跨交易所资金费率价差（年化 %），按价差降序"""
+        if not self.derived:
+            return []
+        carry = self.derived["carry"] * 100
+        with np.errstate(invalid="ignore"):
+            mask = ~np.isnan(carry) if min_carry is None else carry >= min_carry
+        rows = np.flatnonzero(mask)
+        rows = rows[np.argsort(-carry[rows])]
+        return [{
+            "symbol": self.symbols[row],
+            "long_venue": self.venues[self.derived["long_venue"][row]],
+            "short_venue": self.venues[self.derived["short_venue"][row]],
+            "annualized_carry": float(carry[row]),
+        } for row in rows]
+
+    def snapshot_message(self) -> Dict:
+        return {
+            "type": FUNDING_TOPIC,
+            "timestamp": self.updated_at,
+            "data": {"carry": self.get_carry()},
+        }
+
+    def start(self):
+        """启动后台定期刷新，已启动时忽略"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"资金费率刷新失败: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+    async def wait_ready(self, timeout: float = FUNDING_REQUEST_TIMEOUT) -> bool:
+        """启动刷新并等待首批数据，超时返回 False"""
+        self.start()
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+# 全局资金费率监控实例
+funding_monitor = FundingMonitor()
@@ -4,20 +4,39 @@ Hummingbot 集成模块
 支持容器化部署
 """
 import asyncio
+import copy
+import hashlib
 import json
 import logging
+import math
 import os
-import requests
+import random
 from decimal import Decimal
-from typing import Dict, List, Any, Optional, Union
+from typing import Callable, Dict, List, Any, Optional, Union
 from dataclasses import dataclass, asdict
 from enum import Enum
 import sys
 
+from hummingbot_pool import HummingbotPool
+from strategy_registry import strategy_registry
+
 # 获取环境变量
 HUMMINGBOT_HOST = os.getenv('HUMMINGBOT_HOST', 'localhost')
 HUMMINGBOT_PORT = os.getenv('HUMMINGBOT_PORT', '15888')
 HUMMINGBOT_API_URL = f"http://{HUMMINGBOT_HOST}:{HUMMINGBOT_PORT}"
+# 多实例部署时逗号分隔的 Hummingbot API 地址，策略按负载分布在各实例上
+HUMMINGBOT_API_URLS = [url.strip() for url in os.getenv('HUMMINGBOT_API_URLS', HUMMINGBOT_API_URL).split(',') if url.strip()]
+# 批量操作的最大并发数
+HUMMINGBOT_BULK_CONCURRENCY = int(os.getenv('HUMMINGBOT_BULK_CONCURRENCY', '20'))
+# 单次请求的总超时和连接超时（秒）
+HUMMINGBOT_REQUEST_TIMEOUT = float(os.getenv('HUMMINGBOT_REQUEST_TIMEOUT', '10'))
+HUMMINGBOT_CONNECT_TIMEOUT = float(os.getenv('HUMMINGBOT_CONNECT_TIMEOUT', '3'))
+# 幂等请求的最大重试次数和首次重试的退避时间（秒）
+HUMMINGBOT_MAX_RETRIES = int(os.getenv('HUMMINGBOT_MAX_RETRIES', '2'))
+HUMMINGBOT_RETRY_BACKOFF = float(os.getenv('HUMMINGBOT_RETRY_BACKOFF', '0.2'))
+RETRYABLE_STATUSES = (502, 503, 504)
+# 布尔参数以字符串传入时视为 True 的取值
+TRUE_STRINGS = frozenset(['true', '1', 'yes', 'on'])
 
 logger = logging.getLogger(__name__)
 
@@ -436,19 +455,22 @@ class StrategySchema:
     
     @staticmethod
     def get_strategy_schema(strategy_type: str) -> Dict[str, StrategyParameter]:
-        """根据策略类型获取参数模式"""
-        schema_map = {
-            StrategyType.PURE_MARKET_MAKING.value: StrategySchema.get_pure_market_making_schema,
-            StrategyType.AVELLANEDA_MARKET_MAKING.value: StrategySchema.get_avellaneda_market_making_schema,
-            StrategyType.CROSS_EXCHANGE_MARKET_MAKING.value: StrategySchema.get_cross_exchange_arbitrage_schema,
-            StrategyType.AMM_ARB.value: StrategySchema.get_amm_arbitrage_schema,
-            StrategyType.SPOT_PERPETUAL_ARBITRAGE.value: StrategySchema.get_spot_perpetual_arbitrage_schema,
-        }
-        
-        if strategy_type in schema_map:
-            return schema_map[strategy_type]()
-        else:
-            raise ValueError(f"Unsupported strategy type: {strategy_type}")
+        """根据策略类型获取参数模式（来自预编译的注册表）"""
+        return dict(schema_registry.get(strategy_type).parameters)
+
+
+# 策略类型到参数模式构建函数的映射
+StrategySchema.SCHEMA_FACTORIES = {
+    StrategyType.PURE_MARKET_MAKING.value: StrategySchema.get_pure_market_making_schema,
+    StrategyType.AVELLANEDA_MARKET_MAKING.value: StrategySchema.get_avellaneda_market_making_schema,
+    StrategyType.CROSS_EXCHANGE_MARKET_MAKING.value: StrategySchema.get_cross_exchange_arbitrage_schema,
+    StrategyType.AMM_ARB.value: StrategySchema.get_amm_arbitrage_schema,
+    StrategyType.SPOT_PERPETUAL_ARBITRAGE.value: StrategySchema.get_spot_perpetual_arbitrage_schema,
+}
+
+
+# 策略参数中表示现货交易所的字段
+EXCHANGE_PARAM_KEYS = ("exchange", "exchange_1", "exchange_2", "exchange_connector", "spot_connector")
 
 
 class ParameterValidator:
@@ -456,112 +478,321 @@ class ParameterValidator:
     
     @staticmethod
     def validate_parameters(params: Dict[str, Any], schema: Dict[str, StrategyParameter]) -> Dict[str, Any]:
-        """验证策略参数"""
-        validated_params = {}
+        """验证策略参数（临时编译给定的模式；内置策略请使用 schema_registry 中预编译的验证器）"""
+        return compile_validator(schema)(params)
+    
+    @staticmethod
+    def validate_instrument_rules(params: Dict[str, Any]) -> List[str]:
+        """按交易所的交易规则（最小下单量、数量精度、最小名义金额）检查 order_amount
+
+        只查内存中的交易对元数据和行情缓存，不发起网络请求；元数据尚未加载的交易所跳过检查，
+        没有该交易对的行情快照时跳过最小名义金额检查
+        """
+        amount, market = params.get("order_amount"), params.get("market")
+        if amount is None or not market:
+            return []
+        
+        from instruments import instrument_cache
+        from tickers import ticker_cache
+        
         errors = []
+        for key in EXCHANGE_PARAM_KEYS:
+            exchange = params.get(key)
+            if exchange and instrument_cache.is_loaded(exchange):
+                price = ticker_cache.last_price(exchange, market)
+                errors.extend(
+                    f"Parameter 'order_amount': {error}"
+                    for error in instrument_cache.check_order(exchange, market, amount, price)
+                )
+        return errors
+
+
+def _compile_parameter(param_def: StrategyParameter) -> Callable[[Any, List[str]], Any]:
+    """把单个参数定义编译为专用的检查函数：check(value, errors) -> 转换后的值"""
+    name = param_def.name
+    
+    if param_def.type == "number":
+        min_value, max_value = param_def.min_value, param_def.max_value
+        min_error = f"Parameter '{name}' must be >= {min_value}"
+        max_error = f"Parameter '{name}' must be <= {max_value}"
+        finite_error = f"Parameter '{name}' must be a finite number"
         
-        for param_name, param_def in schema.items():
-            value = params.get(param_name, param_def.default)
-            
-            # 检查必需参数
-            if param_def.required and value is None:
-                errors.append(f"Parameter '{param_name}' is required")
+        def check(value, errors):
+            value = float(value)
+            if not math.isfinite(value):
+                errors.append(finite_error)
+            if min_value is not None and value < min_value:
+                errors.append(min_error)
+            if max_value is not None and value > max_value:
+                errors.append(max_error)
+            return value
+    elif param_def.type == "boolean":
+        def check(value, errors):
+            if isinstance(value, str):
+                return value.lower() in TRUE_STRINGS
+            return bool(value)
+    elif param_def.type == "select" and param_def.options:
+        options = param_def.options
+        option_set = frozenset(options)
+        options_error = f"Parameter '{name}' must be one of {options}"
+        
+        def check(value, errors):
+            try:
+                valid = value in option_set
+            except TypeError:
+                valid = value in options
+            if not valid:
+                errors.append(options_error)
+            return value
+    else:
+        def check(value, errors):
+            return value
+    return check
+
+
+def compile_validator(schema: Dict[str, StrategyParameter]) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+    """把参数模式编译为验证函数：每个参数的类型、范围和可选值检查预先生成，验证时不再解释模式"""
+    fields = [
+        (name, param_def.default, param_def.required, f"Parameter '{name}' is required", _compile_parameter(param_def))
+        for name, param_def in schema.items()
+    ]
+    
+    def validate(params: Dict[str, Any]) -> Dict[str, Any]:
+        validated_params = {}
+        errors = []
+        get = params.get
+        for name, default, required, required_error, check in fields:
+            value = get(name, default)
+            if value is None:
+                if required:
+                    errors.append(required_error)
                 continue
-            
-            # 类型验证
-            if value is not None:
-                try:
-                    if param_def.type == "number":
-                        value = float(value)
-                        if param_def.min_value is not None and value < param_def.min_value:
-                            errors.append(f"Parameter '{param_name}' must be >= {param_def.min_value}")
-                        if param_def.max_value is not None and value > param_def.max_value:
-                            errors.append(f"Parameter '{param_name}' must be <= {param_def.max_value}")
-                    elif param_def.type == "boolean":
-                        if isinstance(value, str):
-                            value = value.lower() in ['true', '1', 'yes', 'on']
-                        else:
-                            value = bool(value)
-                    elif param_def.type == "select":
-                        if param_def.options and value not in param_def.options:
-                            errors.append(f"Parameter '{param_name}' must be one of {param_def.options}")
-                    
-                    validated_params[param_name] = value
-                except (ValueError, TypeError) as e:
-                    errors.append(f"Invalid value for parameter '{param_name}': {e}")
+            try:
+                validated_params[name] = check(value, errors)
+            except (ValueError, TypeError) as e:
+                errors.append(f"Invalid value for parameter '{name}': {e}")
+        
+        if not errors:
+            errors.extend(ParameterValidator.validate_instrument_rules(validated_params))
         
         if errors:
             raise ValueError(f"Parameter validation failed: {'; '.join(errors)}")
         
         return validated_params
+    
+    return validate
+
+
+@dataclass
+class CompiledSchema:
+    """预编译的策略参数模式"""
+    strategy_type: str
+    parameters: Dict[str, StrategyParameter]
+    validate: Callable[[Dict[str, Any]], Dict[str, Any]]
+    frontend: Dict[str, Any]  # 前端友好的格式
+    body: bytes  # 接口响应 {"code": 0, "data": frontend} 的 JSON
+    etag: str
+
+
+class SchemaRegistry:
+    """策略参数模式注册表：启动时为每种策略构建一次模式、验证函数和前端 JSON"""
+    
+    def __init__(self):
+        self.schemas: Dict[str, CompiledSchema] = {}
+        for strategy_type, factory in StrategySchema.SCHEMA_FACTORIES.items():
+            parameters = factory()
+            frontend = {
+                name: {
+                    "name": param.name,
+                    "type": param.type,
+                    "description": param.description,
+                    "required": param.required,
+                    "default": param.default,
+                    "min_value": param.min_value,
+                    "max_value": param.max_value,
+                    "options": param.options,
+                    "unit": param.unit
+                }
+                for name, param in parameters.items()
+            }
+            body = json.dumps({"code": 0, "data": frontend}, ensure_ascii=False, separators=(",", ":")).encode()
+            self.schemas[strategy_type] = CompiledSchema(
+                strategy_type=strategy_type,
+                parameters=parameters,
+                validate=compile_validator(parameters),
+                frontend=frontend,
+                body=body,
+                etag=f'"{hashlib.sha256(body).hexdigest()[:16]}"',
+            )
+        # 所有模式的整体版本号，任一模式变化时改变
+        self.version = hashlib.sha256(b"".join(s.body for s in self.schemas.values())).hexdigest()[:16]
+    
+    def get(self, strategy_type: str) -> CompiledSchema:
+        compiled = self.schemas.get(strategy_type)
+        if compiled is None:
+            raise ValueError(f"Unsupported strategy type: {strategy_type}")
+        return compiled
+    
+    def validate(self, strategy_type: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        return self.get(strategy_type).validate(params)
+
+
+class BulkValidationError(ValueError):
+    """批量操作中存在无效配置"""
+    
+    def __init__(self, errors: Dict[str, str]):
+        super().__init__(f"Parameter validation failed for {len(errors)} strategies")
+        self.errors = errors
 
 
 class HummingbotAPIClient:
-    """Hummingbot API 客户端"""
+    """Hummingbot API 异步客户端
+
+    基于 aiohttp 连接池，每次调用有总超时和连接超时；幂等请求（GET）在连接错误、超时和
+    502/503/504 时按指数退避重试。调用方被取消时请求随之取消，连接归还连接池
+    """
     
-    def __init__(self, base_url: str = HUMMINGBOT_API_URL):
+    def __init__(self, base_url: str = HUMMINGBOT_API_URL, timeout: float = HUMMINGBOT_REQUEST_TIMEOUT,
+                 max_retries: int = HUMMINGBOT_MAX_RETRIES):
         self.base_url = base_url
-        self.session = requests.Session()
-        self.session.headers.update({
-            'Content-Type': 'application/json',
-            'Accept': 'application/json'
-        })
-    
-    def _make_request(self, method: str, endpoint: str, data: Dict = None) -> Dict:
-        """发送 API 请求"""
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self._session = None
+        self._loop = None
+    
+    def session(self):
+        """首次请求时才创建会话，避免在导入期加载 aiohttp；会话绑定创建时的事件循环"""
+        import aiohttp
+
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            self._discard_session()
+            connector = aiohttp.TCPConnector(
+                # 连接池大小与批量并发数一致，避免并发调用时反复建连
+                limit=HUMMINGBOT_BULK_CONCURRENCY,
+                keepalive_timeout=30,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers={'Content-Type': 'application/json', 'Accept': 'application/json'},
+            )
+            self._loop = loop
+        return self._session
+    
+    def _discard_session(self):
+        """丢弃绑定在其他事件循环上的旧会话：原事件循环仍在运行时交给它关闭，
+        未运行时直接关闭连接池中的连接，已关闭时只能分离连接器"""
+        session, loop = self._session, self._loop
+        self._session = None
+        if session is None or session.closed:
+            return
+        if loop is not None and loop.is_running():
+            asyncio.run_coroutine_threadsafe(session.close(), loop)
+            return
+        connector = session.connector
+        session.detach()
+        if connector is not None and loop is not None and not loop.is_closed():
+            connector.close()
+    
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+    
+    async def _make_request(self, method: str, endpoint: str, data: Dict = None, timeout: Optional[float] = None,
+                            params: Optional[Dict[str, str]] = None, retry: bool = True) -> Dict:
+        """发送 API 请求，非 2xx 响应抛出 aiohttp.ClientResponseError"""
+        import aiohttp
+        
         url = f"{self.base_url}{endpoint}"
-        try:
-            if method.upper() == 'GET':
-                response = self.session.get(url)
-            elif method.upper() == 'POST':
-                response = self.session.post(url, json=data)
-            elif method.upper() == 'PUT':
-                response = self.session.put(url, json=data)
-            elif method.upper() == 'DELETE':
-                response = self.session.delete(url)
-            else:
-                raise ValueError(f"Unsupported HTTP method: {method}")
-            
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            logger.error(f"API request failed: {e}")
-            raise
+        method = method.upper()
+        if method not in ('GET', 'POST', 'PUT', 'DELETE'):
+            raise ValueError(f"Unsupported HTTP method: {method}")
+        client_timeout = aiohttp.ClientTimeout(total=timeout or self.timeout, connect=HUMMINGBOT_CONNECT_TIMEOUT)
+        retries = self.max_retries if method == 'GET' and retry else 0
+        
+        for attempt in range(retries + 1):
+            try:
+                async with self.session().request(method, url, json=data, params=params,
+                                                  timeout=client_timeout) as response:
+                    if response.status in RETRYABLE_STATUSES and attempt < retries:
+                        raise aiohttp.ClientResponseError(
+                            response.request_info, response.history, status=response.status, message=response.reason
+                        )
+                    response.raise_for_status()
+                    return await response.json()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                retryable = not isinstance(e, aiohttp.ClientResponseError) or e.status in RETRYABLE_STATUSES
+                if attempt >= retries or not retryable:
+                    logger.error(f"API request failed: {method} {endpoint}: {type(e).__name__} {e}")
+                    raise
+                delay = HUMMINGBOT_RETRY_BACKOFF * (2 ** attempt) * (0.5 + random.random())
+                logger.warning(f"API request failed, retrying in {delay:.2f}s: {method} {endpoint}: {type(e).__name__} {e}")
+                await asyncio.sleep(delay)
     
-    def get_strategies(self) -> List[Dict]:
+    async def get_strategies(self) -> List[Dict]:
         """获取可用策略列表"""
-        return self._make_request('GET', '/strategies')
+        return await self._make_request('GET', '/strategies')
     
-    def start_strategy(self, strategy_id: str, strategy_config: Dict) -> Dict:
+    async def start_strategy(self, strategy_id: str, strategy_config: Dict) -> Dict:
         """启动策略"""
-        return self._make_request('POST', f'/strategies/{strategy_id}/start', strategy_config)
+        return await self._make_request('POST', f'/strategies/{strategy_id}/start', strategy_config)
     
-    def stop_strategy(self, strategy_id: str) -> Dict:
+    async def stop_strategy(self, strategy_id: str) -> Dict:
         """停止策略"""
-        return self._make_request('POST', f'/strategies/{strategy_id}/stop')
+        return await self._make_request('POST', f'/strategies/{strategy_id}/stop')
     
-    def get_strategy_status(self, strategy_id: str) -> Dict:
+    async def get_strategy_status(self, strategy_id: str) -> Dict:
         """获取策略状态"""
-        return self._make_request('GET', f'/strategies/{strategy_id}/status')
+        return await self._make_request('GET', f'/strategies/{strategy_id}/status')
+    
+    async def get_strategies_status(self, strategy_ids: Optional[List[str]] = None) -> Dict:
+        """批量获取策略状态，未指定 ID 时返回所有运行中的策略"""
+        params = {'ids': ','.join(strategy_ids)} if strategy_ids is not None else None
+        return await self._make_request('GET', '/strategies/status', params=params)
+    
+    async def health(self, timeout: Optional[float] = None) -> Dict:
+        """健康检查（不重试，失败由调用方计数）"""
+        return await self._make_request('GET', '/health', timeout=timeout, retry=False)
+
+    async def get_fills(self, after: int = 0, limit: int = 1000) -> Dict:
+        """按序号拉取 after 之后的成交和订单事件，返回 {"data": [...], "next": 最后一条的序号}"""
+        return await self._make_request('GET', '/fills', params={'after': str(after), 'limit': str(limit)})
 
 
 class HummingbotStrategyExecutor:
     """Hummingbot 策略执行器"""
     
     def __init__(self):
-        self.active_strategies: Dict[str, Any] = {}
-        self.api_client = HummingbotAPIClient()
+        self.registry = strategy_registry  # 执行状态保存在数据库（可选 Redis），所有 worker 共享
+        # 策略按负载分布在 HUMMINGBOT_API_URLS 的各实例上，单实例时池中只有一个实例
+        self.api_client = HummingbotPool(HUMMINGBOT_API_URLS, HummingbotAPIClient)
         self.logger = logging.getLogger(__name__)
     
+    async def running_strategies(self) -> Dict[str, Dict[str, Any]]:
+        """所有运行中的策略（来自执行注册表）"""
+        return await self.registry.running()
+    
+    def validate_config(self, strategy_type: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """验证策略配置，返回验证后的参数"""
+        return schema_registry.validate(strategy_type, params)
+    
     async def start_strategy(self, strategy_id: str, strategy_type: str, params: Dict[str, Any]) -> bool:
         """启动策略"""
         try:
-            # 获取策略参数模式
-            schema = StrategySchema.get_strategy_schema(strategy_type)
-            
-            # 验证参数
-            validated_params = ParameterValidator.validate_parameters(params, schema)
-            
+            validated_params = self.validate_config(strategy_type, params)
+        except Exception as e:
+            self.logger.error(f"Error starting strategy {strategy_id}: {e}")
+            return False
+        
+        result = await self._start_validated(strategy_id, strategy_type, validated_params)
+        if result["success"]:
+            await self._record_started([(strategy_id, strategy_type, validated_params, result["instance"])])
+        return result["success"]
+    
+    async def _start_validated(self, strategy_id: str, strategy_type: str, validated_params: Dict[str, Any]) -> Dict[str, Any]:
+        """以已验证的参数启动策略，返回单个策略的执行结果"""
+        try:
             # 创建策略配置
             strategy_config = {
                 "type": strategy_type,
@@ -569,65 +800,149 @@ class HummingbotStrategyExecutor:
             }
             
             # 通过 API 启动策略
-            result = self.api_client.start_strategy(strategy_id, strategy_config)
+            result = await self.api_client.start_strategy(strategy_id, strategy_config)
             
             if result.get("success", False):
-                self.active_strategies[strategy_id] = {
-                    "type": strategy_type,
-                    "params": validated_params,
-                    "status": "running"
-                }
-                
+                self._invalidate_status()
                 self.logger.info(f"Strategy {strategy_id} started successfully")
-                return True
+                return {"id": strategy_id, "success": True, "instance": result.get("instance")}
             else:
-                self.logger.error(f"Failed to start strategy {strategy_id}: {result.get('error', 'Unknown error')}")
-                return False
+                error = result.get('error', 'Unknown error')
+                self.logger.error(f"Failed to start strategy {strategy_id}: {error}")
+                return {"id": strategy_id, "success": False, "error": error}
                 
         except Exception as e:
             self.logger.error(f"Error starting strategy {strategy_id}: {e}")
-            return False
+            return {"id": strategy_id, "success": False, "error": str(e)}
     
     async def stop_strategy(self, strategy_id: str) -> bool:
         """停止策略"""
+        result = await self._stop(strategy_id)
+        if result["success"]:
+            await self._record_stopped([strategy_id])
+        return result["success"]
+    
+    async def _stop(self, strategy_id: str) -> Dict[str, Any]:
+        """停止策略，返回单个策略的执行结果"""
         try:
-            result = self.api_client.stop_strategy(strategy_id)
+            result = await self.api_client.stop_strategy(strategy_id)
             
             if result.get("success", False):
-                if strategy_id in self.active_strategies:
-                    del self.active_strategies[strategy_id]
-                
+                self._invalidate_status()
                 self.logger.info(f"Strategy {strategy_id} stopped successfully")
-                return True
+                return {"id": strategy_id, "success": True}
             else:
                 self.logger.warning(f"Strategy {strategy_id} not found or already stopped")
-                return False
+                return {"id": strategy_id, "success": False, "error": result.get("error", "Strategy not found")}
                 
         except Exception as e:
             self.logger.error(f"Error stopping strategy {strategy_id}: {e}")
-            return False
+            return {"id": strategy_id, "success": False, "error": str(e)}
     
     async def get_strategy_status(self, strategy_id: str) -> Optional[Dict[str, Any]]:
-        """获取策略状态"""
+        """获取策略状态（从状态聚合缓存读取）"""
+        from strategy_status import strategy_status_aggregator
+        
+        return await strategy_status_aggregator.get(strategy_id)
+    
+    async def _fetch_strategy_status(self, strategy_id: str) -> Optional[Dict[str, Any]]:
+        """向 Hummingbot 查询单个策略的状态，策略不存在（404）时返回 None
+
+        其他错误（连接失败、超时、5xx）直接抛出，避免把 Hummingbot 不可达误判为策略已停止
+        """
+        import aiohttp
+
         try:
-            result = self.api_client.get_strategy_status(strategy_id)
-            
-            if result.get("success", False):
-                return {
-                    "id": strategy_id,
-                    "status": result.get("data", {}).get("status", "unknown"),
-                    "type": result.get("data", {}).get("type"),
-                    "params": result.get("data", {}).get("params", {})
-                }
-            else:
+            result = await self.api_client.get_strategy_status(strategy_id)
+        except aiohttp.ClientResponseError as e:
+            if e.status == 404:
                 return None
-                
-        except Exception as e:
-            self.logger.error(f"Error getting strategy status {strategy_id}: {e}")
+            raise
+
+        if result.get("success", False):
+            return {
+                "id": strategy_id,
+                "status": result.get("data", {}).get("status", "unknown"),
+                "type": result.get("data", {}).get("type"),
+                "params": result.get("data", {}).get("params", {}),
+                "instance": result.get("data", {}).get("instance")
+            }
+        else:
             return None
+    
+    async def start_strategies(self, configs: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """批量启动策略
+        
+        先验证全部配置，任一配置无效时抛出 BulkValidationError 且不启动任何策略；
+        验证通过后以有限并发分发，返回按策略 ID 索引的结果
+        """
+        errors = {}
+        prepared = []
+        for config in configs:
+            try:
+                validated_params = self.validate_config(config["type"], config.get("params", {}))
+                prepared.append((config["id"], config["type"], validated_params))
+            except (ValueError, KeyError) as e:
+                errors[config.get("id", "")] = str(e)
+        
+        if errors:
+            raise BulkValidationError(errors)
+        
+        results = await self._run_bounded(self._start_validated, prepared)
+        await self._record_started([(*item, result["instance"]) for item, result in zip(prepared, results) if result["success"]])
+        return {result["id"]: result for result in results}
+    
+    async def stop_strategies(self, strategy_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """批量停止策略，返回按策略 ID 索引的结果"""
+        results = await self._run_bounded(self._stop, [(strategy_id,) for strategy_id in strategy_ids])
+        await self._record_stopped([result["id"] for result in results if result["success"]])
+        return {result["id"]: result for result in results}
+    
+    async def get_strategies_status(self, strategy_ids: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """批量获取策略状态（从状态聚合缓存读取），未找到的策略对应 None"""
+        from strategy_status import strategy_status_aggregator
+        
+        return await strategy_status_aggregator.get_many(strategy_ids)
+    
+    async def fetch_strategies_status(self, strategy_ids: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """逐个向 Hummingbot 查询策略状态（Hummingbot 不支持批量接口时使用），任一查询失败时抛出异常"""
+        statuses = await self._run_bounded(self._fetch_strategy_status, [(strategy_id,) for strategy_id in strategy_ids])
+        return dict(zip(strategy_ids, statuses))
+    
+    async def _record_started(self, started: List[tuple]):
+        """把启动成功的策略写入执行注册表（批量时一个事务）；写入失败只记录日志，由对账补齐"""
+        try:
+            await self.registry.mark_running(started)
+        except Exception as e:
+            self.logger.error(f"Error recording started strategies {[item[0] for item in started]}: {e}")
+    
+    async def _record_stopped(self, strategy_ids: List[str]):
+        """把已停止的策略写入执行注册表；写入失败只记录日志，由对账修正"""
+        try:
+            await self.registry.mark_stopped(strategy_ids)
+        except Exception as e:
+            self.logger.error(f"Error recording stopped strategies {strategy_ids}: {e}")
+    
+    @staticmethod
+    def _invalidate_status():
+        """策略启停后使状态缓存失效"""
+        from strategy_status import strategy_status_aggregator
+        
+        strategy_status_aggregator.invalidate()
+    
+    async def _run_bounded(self, func, args_list: List[tuple]) -> List[Any]:
+        """以 HUMMINGBOT_BULK_CONCURRENCY 为上限并发执行 func(*args)"""
+        semaphore = asyncio.Semaphore(HUMMINGBOT_BULK_CONCURRENCY)
+        
+        async def run(args):
+            async with semaphore:
+                return await func(*args)
+        
+        return await asyncio.gather(*[run(args) for args in args_list])
 
 
-# 全局策略执行器实例
+# 全局策略参数模式注册表和策略执行器实例
+schema_registry = SchemaRegistry()
 strategy_executor = HummingbotStrategyExecutor()
 
 
@@ -668,22 +983,11 @@ def get_available_strategies() -> List[Dict[str, Any]]:
 
 
 def get_strategy_schema(strategy_type: str) -> Dict[str, Any]:
-    """获取策略参数模式（转换为前端友好的格式）"""
+    """获取策略参数模式（前端友好的格式，来自预编译的注册表）
+
+    返回副本：注册表中的模式与预先序列化的响应和 ETag 对应，调用方修改返回值不能影响它们
+    """
     try:
-        schema = StrategySchema.get_strategy_schema(strategy_type)
-        return {
-            name: {
-                "name": param.name,
-                "type": param.type,
-                "description": param.description,
-                "required": param.required,
-                "default": param.default,
-                "min_value": param.min_value,
-                "max_value": param.max_value,
-                "options": param.options,
-                "unit": param.unit
-            }
-            for name, param in schema.items()
-        }
+        return copy.deepcopy(schema_registry.get(strategy_type).frontend)
     except ValueError as e:
-        return {"error": str(e)} 
\ No newline at end of file
+        return {"error": str(e)}
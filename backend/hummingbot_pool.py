@@ -0,0 +1,390 @@
+"""
+多 Hummingbot 实例编排
+管理一组 Hummingbot API 实例（HUMMINGBOT_API_URLS），对外提供与 HummingbotAPIClient 相同的接口：
+- 放置：新策略放到健康实例中运行策略最少的一个；策略所在实例记录在执行注册表中，
+  之后的停止、查询和重新启动都路由到同一实例（粘性放置）
+- 实例列表：运行时加入的实例记录在数据库中，每个 worker 在健康检查时加载，重启后不会丢失
+- 健康检查：每个 worker 定期请求各实例的 /health，同时得到运行中的策略数作为负载，只用于放置
+- 再平衡：新增实例后，从负载最高的实例把策略迁移到负载最低的实例，直到负载差不超过 1
+- 故障转移：实例连续 HUMMINGBOT_FAILOVER_AFTER 次健康检查失败后，把其上的策略在其他实例重新启动；
+  实例恢复后停止其上已迁走的策略，避免同一策略在两个实例上同时运行。
+  由调度器只在 leader 上执行，故障转移标记记录在数据库中，leader 切换后仍能清理
+"""
+
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from metrics import registry as metrics_registry
+
+logger = logging.getLogger(__name__)
+
+HUMMINGBOT_HEALTH_INTERVAL = float(os.getenv('HUMMINGBOT_HEALTH_INTERVAL', '5'))
+HUMMINGBOT_HEALTH_TIMEOUT = float(os.getenv('HUMMINGBOT_HEALTH_TIMEOUT', '2'))
+HUMMINGBOT_FAILOVER_AFTER = int(os.getenv('HUMMINGBOT_FAILOVER_AFTER', '3'))
+
+strategy_placements = metrics_registry.counter("hummingbot_strategy_placements_total", "策略放置次数")
+strategy_migrations = metrics_registry.counter("hummingbot_strategy_migrations_total", "策略在实例间迁移的次数")
+instance_failovers = metrics_registry.counter("hummingbot_instance_failovers_total", "实例故障转移次数")
+
+
+class NoHealthyInstanceError(RuntimeError):
+    """没有可用的 Hummingbot 实例"""
+
+
+@dataclass
+class HummingbotInstance:
+    """单个 Hummingbot 实例及其最近一次检查的状态"""
+    url: str
+    client: Any
+    healthy: bool = True  # 首次检查前视为健康
+    running: int = 0  # 运行中的策略数（负载）
+    failures: int = 0  # 连续失败的健康检查次数
+    failed_over: bool = False  # 已把策略转移到其他实例，恢复后需要清理
+    last_check: Optional[float] = None
+    last_error: Optional[str] = None
+    statuses: Dict[str, Dict] = field(default_factory=dict)  # 最近一次成功的批量状态，实例不可达时沿用
+
+    def to_dict(self) -> Dict:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "running": self.running,
+            "failures": self.failures,
+            "failed_over": self.failed_over,
+            "last_check": self.last_check,
+            "last_error": self.last_error,
+        }
+
+
+class HummingbotPool:
+    """Hummingbot 实例池，接口与 HummingbotAPIClient 一致，可直接作为执行器的 api_client"""
+
+    def __init__(self, urls: List[str], client_factory: Callable[[str], Any], registry=None,
+                 health_interval: float = HUMMINGBOT_HEALTH_INTERVAL, health_timeout: float = HUMMINGBOT_HEALTH_TIMEOUT,
+                 failover_after: int = HUMMINGBOT_FAILOVER_AFTER, session_factory=None):
+        self.client_factory = client_factory
+        self.registry = registry  # 为空时使用全局策略执行注册表
+        self.session_factory = session_factory  # 为空时使用 database.SessionLocal
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self.failover_after = failover_after
+        self.instances: Dict[str, HummingbotInstance] = {}
+        for url in urls:
+            self.add_instance(url)
+        self._task: Optional[asyncio.Task] = None
+
+    def _registry(self):
+        if self.registry is not None:
+            return self.registry
+        from strategy_registry import strategy_registry
+
+        return strategy_registry
+
+    def _session(self):
+        if self.session_factory is not None:
+            return self.session_factory()
+        from database import SessionLocal
+
+        return SessionLocal()
+
+    async def load_instances(self):
+        """从数据库加载运行时加入的实例及其故障转移标记"""
+        for url, failed_over in await asyncio.to_thread(self._load_instances):
+            self.add_instance(url).failed_over = failed_over
+
+    def _load_instances(self) -> List[tuple]:
+        import crud
+
+        db = self._session()
+        try:
+            return [(row.url, row.failed_over) for row in crud.get_hummingbot_instances(db)]
+        finally:
+            db.close()
+
+    async def save_instance(self, url: str, failed_over: Optional[bool] = None):
+        """记录实例，所有 worker 下次健康检查时加载；给出 failed_over 时同时更新故障转移标记"""
+        await asyncio.to_thread(self._save_instance, url.rstrip("/"), failed_over)
+
+    def _save_instance(self, url: str, failed_over: Optional[bool]):
+        import crud
+
+        db = self._session()
+        try:
+            crud.save_hummingbot_instance(db, url, failed_over)
+        finally:
+            db.close()
+
+    def add_instance(self, url: str) -> HummingbotInstance:
+        """加入实例（已存在时直接返回），新实例上的负载通过 rebalance() 迁入"""
+        url = url.rstrip("/")
+        if url not in self.instances:
+            self.instances[url] = HummingbotInstance(url, self.client_factory(url))
+            logger.info(f"加入 Hummingbot 实例 {url}")
+        return self.instances[url]
+
+    async def remove_instance(self, url: str):
+        """移出实例并关闭其连接池，不迁移其上的策略（用于移出从未投入使用的实例）"""
+        instance = self.instances.pop(url.rstrip("/"), None)
+        if instance is not None:
+            await instance.client.close()
+
+    def healthy_instances(self) -> List[HummingbotInstance]:
+        return [instance for instance in self.instances.values() if instance.healthy]
+
+    def _least_loaded(self, exclude: Optional[str] = None) -> HummingbotInstance:
+        candidates = [instance for instance in self.healthy_instances() if instance.url != exclude]
+        if not candidates:
+            raise NoHealthyInstanceError("没有可用的 Hummingbot 实例")
+        return min(candidates, key=lambda instance: (instance.running, instance.url))
+
+    async def _placed(self, strategy_id: str) -> Optional[HummingbotInstance]:
+        """注册表中记录的策略所在实例（不论是否健康），未记录时返回 None
+
+        其他 worker 运行时加入的实例在这里首次遇到时加入本进程的实例池
+        """
+        entry = await self._registry().get(strategy_id)
+        if entry is None or not entry.get("instance"):
+            return None
+        return self.add_instance(entry["instance"])
+
+    async def place(self, strategy_id: str) -> HummingbotInstance:
+        """选择策略的运行实例：优先沿用上次所在的健康实例，否则选负载最低的健康实例"""
+        instance = await self._placed(strategy_id)
+        if instance is None or not instance.healthy:
+            instance = self._least_loaded()
+        strategy_placements.inc(instance=instance.url)
+        return instance
+
+    # 与 HummingbotAPIClient 一致的接口
+    async def get_strategies(self) -> Dict:
+        """获取可用策略列表（各实例相同，取第一个健康实例）"""
+        return await self._least_loaded().client.get_strategies()
+
+    async def start_strategy(self, strategy_id: str, strategy_config: Dict) -> Dict:
+        instance = await self.place(strategy_id)
+        # 放置后立即计入负载，并发启动的策略不会都选中同一个实例
+        instance.running += 1
+        try:
+            result = await instance.client.start_strategy(strategy_id, strategy_config)
+        except Exception:
+            instance.running -= 1
+            raise
+        if not result.get("success", False):
+            instance.running -= 1
+        return {**result, "instance": instance.url}
+
+    async def stop_strategy(self, strategy_id: str) -> Dict:
+        instance = await self._placed(strategy_id)
+        if instance is not None:
+            result = await instance.client.stop_strategy(strategy_id)
+            if result.get("success", False):
+                instance.running = max(0, instance.running - 1)
+            return result
+        return await self._first_success(lambda client: client.stop_strategy(strategy_id))
+
+    async def get_strategy_status(self, strategy_id: str) -> Dict:
+        instance = await self._placed(strategy_id)
+        if instance is not None:
+            result = await instance.client.get_strategy_status(strategy_id)
+            return self._with_instance(result, instance)
+        return await self._first_success(lambda client: client.get_strategy_status(strategy_id))
+
+    async def get_strategies_status(self, strategy_ids: Optional[List[str]] = None) -> Dict:
+        """向所有实例批量查询并合并，每条状态带上所在实例；
+        单个实例查询失败时沿用它上一次的状态，全部失败时抛出第一个异常
+        """
+        instances = list(self.instances.values())
+        results = await asyncio.gather(*[i.client.get_strategies_status(strategy_ids) for i in instances],
+                                       return_exceptions=True)
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if len(errors) == len(instances):
+            raise errors[0]
+
+        merged: Dict[str, Optional[Dict]] = {strategy_id: None for strategy_id in strategy_ids or []}
+        for instance, result in zip(instances, results):
+            if isinstance(result, BaseException):
+                data = instance.statuses
+            elif not result.get("success", False):
+                raise RuntimeError(result.get("error", "Unknown error"))
+            else:
+                data = {i: {**d, "instance": instance.url} for i, d in (result.get("data") or {}).items() if d}
+                if strategy_ids is None:
+                    instance.statuses = data
+                    instance.running = sum(1 for d in data.values() if d.get("status") == "running")
+            for strategy_id, status in data.items():
+                if strategy_ids is None or strategy_id in merged:
+                    merged[strategy_id] = status
+        return {"success": True, "data": merged}
+
+    async def _first_success(self, call) -> Dict:
+        """策略所在实例未知时依次尝试各健康实例，返回第一个成功的结果；全部抛出异常时抛出最后一个"""
+        result, error = None, None
+        for instance in self.healthy_instances():
+            try:
+                result = await call(instance.client)
+            except Exception as e:
+                error = e
+                continue
+            if result.get("success", False):
+                return self._with_instance(result, instance)
+        if result is None and error is not None:
+            raise error
+        return result or {"success": False, "error": "Strategy not found"}
+
+    @staticmethod
+    def _with_instance(result: Dict, instance: HummingbotInstance) -> Dict:
+        if isinstance(result.get("data"), dict):
+            return {**result, "data": {**result["data"], "instance": instance.url}}
+        return result
+
+    # 健康检查、再平衡与故障转移
+    async def check_health(self):
+        """加载数据库中的实例并检查所有实例的健康与负载；每个 worker 各自检查，结果只用于放置"""
+        try:
+            await self.load_instances()
+        except Exception as e:
+            logger.error(f"加载 Hummingbot 实例列表失败: {e}")
+        await asyncio.gather(*[self._check(instance) for instance in list(self.instances.values())])
+
+    async def handle_failures(self):
+        """对连续健康检查失败的实例执行故障转移、对恢复的实例清理已迁走的策略
+
+        由调度器只在 leader 上执行，避免多个 worker 重复转移同一实例上的策略；依据本进程健康检查的结果
+        """
+        for instance in list(self.instances.values()):
+            if not instance.healthy and instance.failures >= self.failover_after and not instance.failed_over:
+                await self.failover(instance.url)
+            elif instance.healthy and instance.failed_over:
+                await self._fence(instance)
+
+    async def _check(self, instance: HummingbotInstance):
+        try:
+            result = await instance.client.health(timeout=self.health_timeout)
+            if result.get("running_strategies") is not None:
+                instance.running = int(result["running_strategies"])
+            if not instance.healthy:
+                logger.info(f"Hummingbot 实例 {instance.url} 已恢复")
+            instance.healthy = True
+            instance.failures = 0
+            instance.last_error = None
+        except Exception as e:
+            instance.failures += 1
+            instance.last_error = f"{type(e).__name__} {e}"
+            if instance.healthy:
+                logger.warning(f"Hummingbot 实例 {instance.url} 健康检查失败: {instance.last_error}")
+            instance.healthy = False
+        instance.last_check = time.time()
+
+    async def _move(self, strategy_id: str, source: HummingbotInstance, target: HummingbotInstance,
+                    entry: Dict, stop_source: bool = True) -> bool:
+        """把策略迁移到目标实例：先在源实例停止，再在目标实例启动，失败时尽量恢复到源实例"""
+        config = {"type": entry.get("type"), "params": entry.get("params") or {}}
+        if stop_source:
+            result = await source.client.stop_strategy(strategy_id)
+            if not result.get("success", False):
+                logger.warning(f"迁移策略 {strategy_id} 时无法在 {source.url} 停止: {result.get('error')}")
+                return False
+            source.running = max(0, source.running - 1)
+            source.statuses.pop(strategy_id, None)
+        try:
+            result = await target.client.start_strategy(strategy_id, config)
+            if not result.get("success", False):
+                raise RuntimeError(result.get("error", "Unknown error"))
+        except Exception as e:
+            logger.error(f"策略 {strategy_id} 在 {target.url} 启动失败: {e}")
+            if stop_source:
+                await source.client.start_strategy(strategy_id, config)
+                source.running += 1
+            return False
+        target.running += 1
+        await self._registry().mark_running([(strategy_id, config["type"], config["params"], target.url)])
+        strategy_migrations.inc(source=source.url, target=target.url)
+        logger.info(f"策略 {strategy_id} 已从 {source.url} 迁移到 {target.url}")
+        return True
+
+    async def rebalance(self) -> List[Dict]:
+        """从负载最高的健康实例向负载最低的健康实例迁移策略，直到负载差不超过 1，返回迁移记录"""
+        await self.get_strategies_status()
+        running = await self._registry().running()
+        moves = []
+        while len(self.healthy_instances()) > 1:
+            busiest = max(self.healthy_instances(), key=lambda instance: (instance.running, instance.url))
+            idlest = self._least_loaded()
+            if busiest.running - idlest.running <= 1:
+                break
+            movable = [strategy_id for strategy_id in busiest.statuses if strategy_id in running]
+            moved = False
+            for strategy_id in movable:
+                if await self._move(strategy_id, busiest, idlest, running[strategy_id]):
+                    moves.append({"id": strategy_id, "from": busiest.url, "to": idlest.url})
+                    moved = True
+                    break
+            if not moved:
+                break
+        return moves
+
+    async def failover(self, url: str) -> List[Dict]:
+        """把实例上记录为运行中的策略在其他健康实例重新启动（不可达的实例无法先停止）"""
+        source = self.instances[url]
+        running = await self._registry().running()
+        placed = [strategy_id for strategy_id, entry in running.items() if entry.get("instance") == url]
+        instance_failovers.inc(instance=url)
+        logger.warning(f"Hummingbot 实例 {url} 不可用，故障转移 {len(placed)} 个策略")
+        moves = []
+        for strategy_id in placed:
+            try:
+                target = self._least_loaded(exclude=url)
+            except NoHealthyInstanceError:
+                logger.error(f"没有可用的 Hummingbot 实例，策略 {strategy_id} 无法转移")
+                break
+            if await self._move(strategy_id, source, target, running[strategy_id], stop_source=False):
+                moves.append({"id": strategy_id, "from": url, "to": target.url})
+        source.failed_over = True
+        source.statuses = {}
+        source.running = 0
+        await self.save_instance(url, failed_over=True)
+        return moves
+
+    async def _fence(self, instance: HummingbotInstance):
+        """实例恢复后停止其上仍在运行、但已转移到其他实例的策略"""
+        try:
+            result = await instance.client.get_strategies_status()
+        except Exception as e:
+            logger.warning(f"检查恢复的实例 {instance.url} 失败: {e}")
+            return
+        registry = self._registry()
+        for strategy_id in (result.get("data") or {}):
+            entry = await registry.get(strategy_id)
+            if entry is not None and entry.get("instance") not in (None, instance.url):
+                await instance.client.stop_strategy(strategy_id)
+                logger.info(f"已停止恢复实例 {instance.url} 上转移走的策略 {strategy_id}")
+        instance.failed_over = False
+        await self.save_instance(instance.url, failed_over=False)
+
+    def status(self) -> List[Dict]:
+        return [instance.to_dict() for instance in self.instances.values()]
+
+    def start(self):
+        """启动后台健康检查（每个 worker 各自运行），已启动时忽略"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await self.check_health()
+            except Exception as e:
+                logger.error(f"Hummingbot 实例健康检查失败: {e}")
+            await asyncio.sleep(self.health_interval)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for instance in self.instances.values():
+            await instance.client.close()
@@ -0,0 +1,305 @@
+"""
+交易所交易对元数据缓存
+从币安 exchangeInfo、OKX instruments 加载价格精度、数量精度、最小下单量和最小名义金额，
+按 (交易所, 统一交易对) 建立索引，参数校验、下单取整和交易对列表都只做内存查找；
+刷新时按交易对增量合并，并持久化到 JSON 文件供下次启动预热；
+文件的修改时间变化时（其他进程刷新后）重新读取，因此所有 worker 都能看到最新的元数据
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from dataclasses import asdict, dataclass
+from decimal import ROUND_CEILING, ROUND_FLOOR, ROUND_HALF_EVEN, Decimal
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+
+from exchange_connector import BINANCE_API_URL, OKX_API_URL, ExchangeType, normalize_symbol
+from metrics import registry
+from singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+INSTRUMENT_CACHE_FILE = os.getenv('INSTRUMENT_CACHE_FILE', './data/instruments.json')
+INSTRUMENT_REFRESH_INTERVAL = float(os.getenv('INSTRUMENT_REFRESH_INTERVAL', '3600'))
+INSTRUMENT_REQUEST_TIMEOUT = float(os.getenv('INSTRUMENT_REQUEST_TIMEOUT', '10'))
+INSTRUMENT_FILE_CHECK_INTERVAL = float(os.getenv('INSTRUMENT_FILE_CHECK_INTERVAL', '1'))  # 检查缓存文件是否更新的间隔（秒）
+
+instrument_refreshes = registry.counter("instrument_refreshes_total", "交易对元数据刷新次数")
+instrument_changes = registry.counter("instrument_changes_total", "刷新时新增、变更或下线的交易对数量")
+
+
+@dataclass
+class Instrument:
+    """交易对的交易规则"""
+    exchange: str
+    symbol: str  # 统一格式 BTC/USDT
+    exchange_symbol: str
+    base: str
+    quote: str
+    tick_size: float
+    lot_size: float
+    min_qty: float
+    max_qty: Optional[float] = None
+    min_notional: Optional[float] = None
+    status: str = "trading"
+
+
+def _decimal(value: float) -> Decimal:
+    return Decimal(str(value))
+
+
+def _round_to_step(value: float, step: float, rounding) -> float:
+    if not step:
+        return value
+    step = _decimal(step)
+    return float((_decimal(value) / step).to_integral_value(rounding=rounding) * step)
+
+
+async def fetch_binance_instruments(session: aiohttp.ClientSession) -> List[Instrument]:
+    async with session.get(f"{BINANCE_API_URL}/api/v3/exchangeInfo") as response:
+        response.raise_for_status()
+        data = await response.json()
+
+    instruments = []
+    for item in data["symbols"]:
+        filters = {f["filterType"]: f for f in item.get("filters", [])}
+        price_filter = filters.get("PRICE_FILTER", {})
+        lot_filter = filters.get("LOT_SIZE", {})
+        notional = filters.get("NOTIONAL") or filters.get("MIN_NOTIONAL") or {}
+        instruments.append(Instrument(
+            exchange=ExchangeType.BINANCE.value,
+            symbol=f"{item['baseAsset']}/{item['quoteAsset']}",
+            exchange_symbol=item["symbol"],
+            base=item["baseAsset"],
+            quote=item["quoteAsset"],
+            tick_size=float(price_filter.get("tickSize", 0)),
+            lot_size=float(lot_filter.get("stepSize", 0)),
+            min_qty=float(lot_filter.get("minQty", 0)),
+            max_qty=float(lot_filter["maxQty"]) if lot_filter.get("maxQty") else None,
+            min_notional=float(notional["minNotional"]) if notional.get("minNotional") else None,
+            status="trading" if item.get("status") == "TRADING" else item.get("status", "").lower(),
+        ))
+    return instruments
+
+
+async def fetch_okx_instruments(session: aiohttp.ClientSession) -> List[Instrument]:
+    async with session.get(f"{OKX_API_URL}/api/v5/public/instruments", params={"instType": "SPOT"}) as response:
+        response.raise_for_status()
+        data = await response.json()
+
+    instruments = []
+    for item in data["data"]:
+        instruments.append(Instrument(
+            exchange=ExchangeType.OKX.value,
+            symbol=f"{item['baseCcy']}/{item['quoteCcy']}",
+            exchange_symbol=item["instId"],
+            base=item["baseCcy"],
+            quote=item["quoteCcy"],
+            tick_size=float(item["tickSz"]),
+            lot_size=float(item["lotSz"]),
+            min_qty=float(item["minSz"]),
+            max_qty=float(item["maxLmtSz"]) if item.get("maxLmtSz") else None,
+            status="trading" if item.get("state") == "live" else item.get("state", ""),
+        ))
+    return instruments
+
+
+INSTRUMENT_FETCHERS = {
+    ExchangeType.BINANCE.value: fetch_binance_instruments,
+    ExchangeType.OKX.value: fetch_okx_instruments,
+}
+
+
+class InstrumentCache:
+    """交易对元数据缓存"""
+
+    def __init__(self, path: str = INSTRUMENT_CACHE_FILE, refresh_interval: float = INSTRUMENT_REFRESH_INTERVAL,
+                 file_check_interval: float = INSTRUMENT_FILE_CHECK_INTERVAL):
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self.file_check_interval = file_check_interval
+        self.instruments: Dict[Tuple[str, str], Instrument] = {}
+        self.by_exchange: Dict[str, Dict[str, Instrument]] = {}
+        self.loaded_at: Dict[str, float] = {}
+        self._file_version: Optional[Tuple[int, int, int]] = None  # 上次读取的文件 (修改时间, inode, 大小)，未读取时为空
+        self._file_checked_at: Optional[float] = None
+        self._flight = SingleFlight("instrument_refresh")
+
+    def _load_file(self, force: bool = False):
+        """从持久化文件预热，文件修改时间变化时重新读取以获得其他进程的刷新结果
+
+        每 file_check_interval 秒最多检查一次文件状态，force 时立即检查
+        """
+        now = time.monotonic()
+        if not force and self._file_checked_at is not None and now - self._file_checked_at < self.file_check_interval:
+            return
+        self._file_checked_at = now
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return
+        # 写入时先写临时文件再替换，inode 随之变化，修改时间精度不足时也能发现更新
+        version = (stat.st_mtime_ns, stat.st_ino, stat.st_size)
+        if version == self._file_version:
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取交易对元数据缓存失败: {e}")
+            return
+        self._file_version = version
+        for exchange, entry in data.items():
+            if entry["loaded_at"] <= self.loaded_at.get(exchange, 0):
+                continue
+            self._apply(exchange, [Instrument(**item) for item in entry["instruments"]])
+            self.loaded_at[exchange] = entry["loaded_at"]
+            logger.info(f"从 {self.path} 加载了 {exchange} 的 {len(entry['instruments'])} 个交易对")
+
+    def _snapshot(self) -> Dict:
+        return {
+            exchange: {
+                "loaded_at": self.loaded_at[exchange],
+                "instruments": [asdict(item) for item in instruments.values()],
+            }
+            for exchange, instruments in self.by_exchange.items()
+            if exchange in self.loaded_at
+        }
+
+    def _save_file(self, data: Dict):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def _apply(self, exchange: str, instruments: List[Instrument]) -> int:
+        """把新的元数据增量合并进索引：只替换有变化的交易对，移除已下线的交易对，返回变化数量"""
+        current = self.by_exchange.setdefault(exchange, {})
+        fresh = {item.symbol: item for item in instruments}
+        changed = 0
+        for symbol in list(current):
+            if symbol not in fresh:
+                del current[symbol]
+                self.instruments.pop((exchange, symbol), None)
+                changed += 1
+        for symbol, item in fresh.items():
+            if current.get(symbol) != item:
+                current[symbol] = item
+                self.instruments[(exchange, symbol)] = item
+                changed += 1
+        return changed
+
+    def is_loaded(self, exchange: str) -> bool:
+        self._load_file()
+        return exchange in self.loaded_at
+
+    def is_stale(self, exchange: str) -> bool:
+        self._load_file()
+        loaded_at = self.loaded_at.get(exchange)
+        return loaded_at is None or time.time() - loaded_at > self.refresh_interval
+
+    async def refresh(self, exchange: str) -> int:
+        """从交易所拉取元数据并增量合并；并发刷新同一交易所时只发一次请求"""
+        exchange = exchange.lower()
+        if exchange not in INSTRUMENT_FETCHERS:
+            raise ValueError(f"不支持的交易所类型: {exchange}")
+        return await self._flight.do(exchange, lambda: self._refresh(exchange))
+
+    async def _refresh(self, exchange: str) -> int:
+        self._load_file()
+        timeout = aiohttp.ClientTimeout(total=INSTRUMENT_REQUEST_TIMEOUT)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            instruments = await INSTRUMENT_FETCHERS[exchange](session)
+        changed = self._apply(exchange, instruments)
+        self.loaded_at[exchange] = time.time()
+        instrument_refreshes.inc(exchange=exchange)
+        instrument_changes.inc(changed, exchange=exchange)
+        await asyncio.to_thread(self._save_file, self._snapshot())
+        logger.info(f"{exchange} 交易对元数据已刷新：{len(instruments)} 个交易对，{changed} 个有变化")
+        return changed
+
+    async def ensure_fresh(self, exchange: str):
+        """元数据缺失或过期时刷新；已有旧数据时刷新失败只记录日志，继续使用旧数据"""
+        if not self.is_stale(exchange):
+            return
+        # 其他 worker 可能已经刷新并写入了文件
+        self._load_file(force=True)
+        if not self.is_stale(exchange):
+            return
+        try:
+            await self.refresh(exchange)
+        except Exception as e:
+            if not self.is_loaded(exchange):
+                raise
+            logger.warning(f"{exchange} 交易对元数据刷新失败，继续使用缓存: {e}")
+
+    async def refresh_stale(self):
+        """刷新所有元数据过期的交易所，供后台调度器定期调用"""
+        for exchange in INSTRUMENT_FETCHERS:
+            try:
+                await self.ensure_fresh(exchange)
+            except Exception as e:
+                logger.error(f"{exchange} 交易对元数据刷新失败: {e}")
+
+    def get(self, exchange: str, symbol: str) -> Optional[Instrument]:
+        self._load_file()
+        return self.instruments.get((exchange.lower(), normalize_symbol(symbol)))
+
+    def symbols(self, exchange: Optional[str] = None, quote: Optional[str] = None) -> List[Instrument]:
+        """可交易的交易对，按交易对排序"""
+        self._load_file()
+        if exchange:
+            items = self.by_exchange.get(exchange.lower(), {}).values()
+        else:
+            items = self.instruments.values()
+        if quote:
+            quote = quote.upper()
+            items = [item for item in items if item.quote == quote]
+        return sorted((item for item in items if item.status == "trading"), key=lambda item: (item.symbol, item.exchange))
+
+    def round_price(self, exchange: str, symbol: str, price: float, side: Optional[str] = None) -> float:
+        """按价格精度取整：买单向下、卖单向上取整，避免越过原价；未指定方向时就近取整"""
+        instrument = self.get(exchange, symbol)
+        if instrument is None:
+            raise ValueError(f"未知交易对: {exchange} {symbol}")
+        if side == "buy":
+            return _round_to_step(price, instrument.tick_size, ROUND_FLOOR)
+        if side == "sell":
+            return _round_to_step(price, instrument.tick_size, ROUND_CEILING)
+        return _round_to_step(price, instrument.tick_size, ROUND_HALF_EVEN)
+
+    def round_quantity(self, exchange: str, symbol: str, quantity: float) -> float:
+        """按数量精度向下取整"""
+        instrument = self.get(exchange, symbol)
+        if instrument is None:
+            raise ValueError(f"未知交易对: {exchange} {symbol}")
+        return _round_to_step(quantity, instrument.lot_size, ROUND_FLOOR)
+
+    def check_order(self, exchange: str, symbol: str, quantity: float, price: Optional[float] = None) -> List[str]:
+        """按交易所规则检查下单数量，返回错误列表；提供价格时同时检查最小名义金额"""
+        instrument = self.get(exchange, symbol)
+        if instrument is None:
+            return [f"Unknown symbol {symbol} on {exchange}"]
+        errors = []
+        if instrument.status != "trading":
+            errors.append(f"{symbol} on {exchange} is not trading ({instrument.status})")
+        if quantity < instrument.min_qty:
+            errors.append(f"order amount must be >= {instrument.min_qty} on {exchange}")
+        if instrument.max_qty is not None and quantity > instrument.max_qty:
+            errors.append(f"order amount must be <= {instrument.max_qty} on {exchange}")
+        if instrument.lot_size and _round_to_step(quantity, instrument.lot_size, ROUND_FLOOR) != quantity:
+            errors.append(f"order amount must be a multiple of {instrument.lot_size} on {exchange}")
+        if price is not None and instrument.min_notional is not None and quantity * price < instrument.min_notional:
+            errors.append(f"order value must be >= {instrument.min_notional} {instrument.quote} on {exchange}")
+        return errors
+
+
+# 全局交易对元数据缓存实例
+instrument_cache = InstrumentCache()
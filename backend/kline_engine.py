@@ -0,0 +1,304 @@
+"""
+增量多周期 K 线引擎
+由逐笔成交一次性更新所有周期（1s 到 1d）的 OHLCV，最近的 K 线保存在环形缓冲区中，
+已收盘的 K 线定期批量写入数据库。每个序列的第一根 K 线（track() 或重启之后）只包含部分成交，
+标记为 partial，落库时与已保存的同一根 K 线合并而不是覆盖
+"""
+
+import asyncio
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
+
+from metrics import registry
+from trade_stream import MarketTrade, trade_stream_service
+
+logger = logging.getLogger(__name__)
+
+# K 线周期（毫秒）
+KLINE_INTERVALS: Dict[str, int] = {
+    "1s": 1000,
+    "1m": 60 * 1000,
+    "3m": 3 * 60 * 1000,
+    "5m": 5 * 60 * 1000,
+    "15m": 15 * 60 * 1000,
+    "30m": 30 * 60 * 1000,
+    "1h": 60 * 60 * 1000,
+    "2h": 2 * 60 * 60 * 1000,
+    "4h": 4 * 60 * 60 * 1000,
+    "6h": 6 * 60 * 60 * 1000,
+    "12h": 12 * 60 * 60 * 1000,
+    "1d": 24 * 60 * 60 * 1000,
+}
+
+KLINE_BUFFER_SIZE = int(os.getenv('KLINE_BUFFER_SIZE', '5000'))  # 每个周期在内存中保留的 K 线数
+KLINE_FLUSH_INTERVAL = float(os.getenv('KLINE_FLUSH_INTERVAL', '5'))  # 批量落库间隔（秒）
+KLINE_MAX_PENDING = int(os.getenv('KLINE_MAX_PENDING', '100000'))  # 待落库 K 线上限
+
+klines_closed = registry.counter("klines_closed_total", "收盘的 K 线数量")
+klines_late_trades = registry.counter("klines_late_trades_total", "晚于当前 K 线到达而被忽略的成交")
+
+
+class Bar:
+    """一根 K 线"""
+    __slots__ = ("open_time", "open", "high", "low", "close", "volume", "trade_count", "partial")
+
+    def __init__(self, open_time: int, price: float, amount: float, partial: bool = False):
+        self.open_time = open_time
+        self.open = self.high = self.low = self.close = price
+        self.volume = amount
+        self.trade_count = 1
+        self.partial = partial  # 不是从周期开始就在统计（序列的第一根），缺少更早的成交
+
+    def add(self, price: float, amount: float):
+        if price > self.high:
+            self.high = price
+        elif price < self.low:
+            self.low = price
+        self.close = price
+        self.volume += amount
+        self.trade_count += 1
+
+    def to_dict(self) -> Dict:
+        return {
+            "time": self.open_time,
+            "open": self.open,
+            "high": self.high,
+            "low": self.low,
+            "close": self.close,
+            "volume": self.volume,
+        }
+
+
+class RingBuffer:
+    """定长环形缓冲区，写满后覆盖最旧的元素；元素按 open_time 递增，支持二分查找"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._items: List[Optional[Bar]] = [None] * capacity
+        self._start = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __getitem__(self, index: int) -> Bar:
+        return self._items[(self._start + index) % self.capacity]
+
+    def append(self, bar: Bar):
+        if self._size < self.capacity:
+            self._items[(self._start + self._size) % self.capacity] = bar
+            self._size += 1
+        else:
+            self._items[self._start] = bar
+            self._start = (self._start + 1) % self.capacity
+
+    def bisect_left(self, open_time: int) -> int:
+        """第一个 open_time >= 给定时间的位置"""
+        lo, hi = 0, self._size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self[mid].open_time < open_time:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def slice(self, start: int, stop: int) -> List[Bar]:
+        return [self[i] for i in range(max(start, 0), min(stop, self._size))]
+
+
+class KlineSeries:
+    """单个周期的 K 线序列：当前未收盘的 K 线 + 已收盘 K 线的环形缓冲区"""
+
+    def __init__(self, interval: str, capacity: int):
+        self.interval = interval
+        self.interval_ms = KLINE_INTERVALS[interval]
+        self.closed = RingBuffer(capacity)
+        self.current: Optional[Bar] = None
+
+    def add(self, timestamp: int, price: float, amount: float) -> Optional[Bar]:
+        """加入一笔成交，若因此收盘了上一根 K 线则返回它"""
+        open_time = timestamp - timestamp % self.interval_ms
+        current = self.current
+        if current is not None and open_time == current.open_time:
+            current.add(price, amount)
+            return None
+        if current is not None and open_time < current.open_time:
+            klines_late_trades.inc(interval=self.interval)
+            return None
+
+        # 序列的第一根 K 线从中途开始统计
+        self.current = Bar(open_time, price, amount, partial=current is None)
+        if current is not None:
+            self.closed.append(current)
+        return current
+
+    def query(self, start: Optional[int], end: Optional[int]) -> List[Bar]:
+        """返回时间范围内的 K 线（含未收盘的当前 K 线），按时间升序"""
+        lo = 0 if start is None else self.closed.bisect_left(start)
+        hi = len(self.closed) if end is None else self.closed.bisect_left(end + 1)
+        bars = self.closed.slice(lo, hi)
+        current = self.current
+        if current is not None and (start is None or current.open_time >= start) \
+                and (end is None or current.open_time <= end):
+            bars.append(current)
+        return bars
+
+    def earliest(self) -> Optional[int]:
+        if len(self.closed):
+            return self.closed[0].open_time
+        return self.current.open_time if self.current else None
+
+
+class KlineEngine:
+    """多周期 K 线引擎"""
+
+    def __init__(self, capacity: int = KLINE_BUFFER_SIZE, flush_interval: float = KLINE_FLUSH_INTERVAL,
+                 session_factory=None):
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.session_factory = session_factory  # 为空时使用 database.SessionLocal
+        self.series: Dict[Tuple[str, str], List[KlineSeries]] = {}
+        self.pending: List[Dict] = []
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def _series_for(self, exchange: str, symbol: str) -> List[KlineSeries]:
+        key = (exchange, symbol)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = [KlineSeries(interval, self.capacity) for interval in KLINE_INTERVALS]
+        return series
+
+    def on_trade(self, trade: MarketTrade):
+        """一笔成交在一次遍历中更新所有周期"""
+        for series in self._series_for(trade.exchange, trade.symbol):
+            closed = series.add(trade.timestamp, trade.price, trade.amount)
+            if closed is not None:
+                klines_closed.inc(interval=series.interval)
+                self.pending.append(self._row(trade.exchange, trade.symbol, series.interval, closed))
+
+        if len(self.pending) > KLINE_MAX_PENDING:
+            # 一次丢弃到上限的 90%，避免之后每条记录都触发整段移动
+            dropped = len(self.pending) - KLINE_MAX_PENDING * 9 // 10
+            del self.pending[:dropped]
+            logger.warning(f"待落库 K 线过多，丢弃最旧的 {dropped} 根")
+
+    @staticmethod
+    def _row(exchange: str, symbol: str, interval: str, bar: Bar) -> Dict:
+        return {
+            "exchange": exchange,
+            "symbol": symbol,
+            "interval": interval,
+            "open_time": bar.open_time,
+            "open": bar.open,
+            "high": bar.high,
+            "low": bar.low,
+            "close": bar.close,
+            "volume": bar.volume,
+            "trade_count": bar.trade_count,
+            "partial": bar.partial,
+        }
+
+    def get_series(self, exchange: str, symbol: str, interval: str) -> Optional[KlineSeries]:
+        series = self.series.get((exchange, symbol))
+        if series is None:
+            return None
+        return series[list(KLINE_INTERVALS).index(interval)]
+
+    async def get_klines(self, db, exchange: str, symbol: str, interval: str, start: Optional[int] = None,
+                         end: Optional[int] = None, limit: int = 500) -> List[Dict]:
+        """查询 K 线：优先读内存，内存不覆盖的更早部分从数据库补齐
+
+        指定 start 时返回从 start 开始的 limit 根，否则返回 end 之前最新的 limit 根；
+        内存部分在事件循环中读取，数据库查询放到线程中执行
+        """
+        import crud
+
+        series = self.get_series(exchange, symbol, interval)
+        bars = [bar.to_dict() for bar in series.query(start, end)] if series else []
+        earliest = bars[0]["time"] if bars else None
+
+        need_history = (start is None and len(bars) < limit) or \
+                       (start is not None and (earliest is None or earliest > start))
+        if need_history:
+            history_end = earliest - 1 if earliest is not None else end
+            if end is not None and history_end is not None:
+                history_end = min(history_end, end)
+            history = await asyncio.to_thread(crud.get_klines, db, exchange, symbol, interval, start, history_end,
+                                              limit=limit, latest=start is None)
+            bars = [{
+                "time": k.open_time, "open": k.open, "high": k.high,
+                "low": k.low, "close": k.close, "volume": k.volume,
+            } for k in history] + bars
+
+        return bars[:limit] if start is not None else bars[-limit:]
+
+    def track(self, exchange: str, symbol: str):
+        """开始为交易对生成 K 线：订阅成交推送并启动落库任务"""
+        trade_stream_service.add_listener(self.on_trade)
+        trade_stream_service.subscribe(exchange, symbol)
+        self.start()
+
+    def start(self):
+        """启动定期落库任务"""
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"K 线落库失败: {e}")
+
+    async def flush(self) -> int:
+        """把已收盘的 K 线批量写入数据库"""
+        if not self.pending:
+            return 0
+        rows, self.pending = self.pending, []
+        try:
+            return await asyncio.to_thread(self._write, rows)
+        except Exception:
+            # 写入失败时放回队首，下次重试
+            self.pending = rows + self.pending
+            raise
+
+    def _session(self):
+        if self.session_factory is not None:
+            return self.session_factory()
+        from database import SessionLocal
+
+        return SessionLocal()
+
+    def _write(self, rows: List[Dict]) -> int:
+        import crud
+
+        db = self._session()
+        try:
+            return crud.save_klines(db, rows)
+        finally:
+            db.close()
+
+    async def close(self):
+        """停止落库任务，未收盘的当前 K 线按 partial 一并写入，重启后的第一根 K 线再与之合并"""
+        if self._flush_task:
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            self._flush_task = None
+        for (exchange, symbol), series_list in self.series.items():
+            for series in series_list:
+                if series.current is not None:
+                    series.current.partial = True
+                    self.pending.append(self._row(exchange, symbol, series.interval, series.current))
+        # 之后再收到的成交从新的序列开始，不会把已写入的部分重复合并
+        self.series.clear()
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"关闭时 K 线落库失败: {e}")
+
+
+# 全局 K 线引擎实例
+kline_engine = KlineEngine()
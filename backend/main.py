@@ -1,18 +1,72 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional, Dict, Any
 from fastapi.middleware.cors import CORSMiddleware
-from datetime import datetime
+from contextlib import asynccontextmanager
+import asyncio
+import sys
+from datetime import datetime, date
 
 import crud, models, schemas
-from database import get_db
+from metrics import registry as metrics_registry
+from database import get_db, engine
 from hummingbot_integration import (
     get_available_strategies, 
-    get_strategy_schema, 
-    strategy_executor
+    schema_registry,
+    strategy_executor,
+    BulkValidationError
 )
+from scheduler import SCHEDULER_ENABLED, create_default_scheduler
+from rate_limiter import RATE_LIMIT_ENABLED, RateLimitMiddleware
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：确保表结构存在并启动后台调度器"""
+    models.Base.metadata.create_all(bind=engine)
+
+    scheduler = create_default_scheduler() if SCHEDULER_ENABLED else None
+    app.state.scheduler = scheduler
+    if scheduler:
+        await scheduler.start()
+    # 在后台与 Hummingbot 对账一次策略执行注册表，不阻塞启动；定期检查各 Hummingbot 实例的健康与负载
+    # （故障转移由调度器只在 leader 上执行）
+    strategy_executor.registry.start_reconcile()
+    strategy_executor.api_client.start()
+    try:
+        yield
+    finally:
+        if scheduler:
+            await scheduler.stop()
+        await _close_market_services()
+        await strategy_executor.registry.close()
+        await strategy_executor.api_client.close()
+
+# 行情等后台服务按需导入，关闭时只处理已经加载的模块
+MARKET_SERVICES = [
+    ("orderbook", "order_book_service"),
+    ("trade_stream", "trade_stream_service"),
+    ("kline_engine", "kline_engine"),
+    ("tick_store", "tick_store"),
+    ("book_ticker", "book_ticker_service"),
+    ("funding", "funding_monitor"),
+    ("strategy_status", "strategy_status_aggregator"),
+    ("fill_ingest", "fill_ingestor"),
+    ("arbitrage_scanner", "arbitrage_scanner"),
+    ("strategy_jobs", "strategy_command_queue"),
+]
+
+async def _close_market_services():
+    for module_name, attr in MARKET_SERVICES:
+        module = sys.modules.get(module_name)
+        if module is not None:
+            await getattr(module, attr).close()
+
+app = FastAPI(lifespan=lifespan)
+
+# API 限流（在 CORS 之内，保证 429 响应也带有跨域头）
+if RATE_LIMIT_ENABLED:
+    app.add_middleware(RateLimitMiddleware)
 
 # 允许前端跨域访问
 app.add_middleware(
@@ -23,6 +77,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 健康检查：不访问数据库和外部服务，供容器健康检查和负载均衡使用
+@app.get('/health')
+def health_check():
+    return {"status": "healthy"}
+
 # 策略相关接口
 @app.get('/api/strategies', response_model=List[schemas.Strategy])
 def get_strategies(db: Session = Depends(get_db)):
@@ -32,6 +91,34 @@ def get_strategies(db: Session = Depends(get_db)):
 def create_strategy(strategy: schemas.StrategyCreate, db: Session = Depends(get_db)):
     return crud.create_strategy(db=db, strategy=strategy)
 
+@app.post('/api/strategies/grid')
+def create_strategy_grid(request: schemas.StrategyGridCreate, db: Session = Depends(get_db)):
+    """按基础配置和参数网格批量创建策略：一次验证全部候选，再在一个事务中创建"""
+    from strategy_grid import STRATEGY_GRID_PREVIEW, axis_values, validate_grid
+
+    try:
+        grid = {name: axis_values(**axis.model_dump()) for name, axis in request.grid.items()}
+        validation = validate_grid(request.type, request.params, grid)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    invalid = validation.total - validation.valid_count
+    summary = {"total": validation.total, "valid": validation.valid_count, "invalid": invalid, "errors": validation.errors}
+    if request.dry_run:
+        preview = [{"index": index, "params": params} for index, params in validation.candidates(STRATEGY_GRID_PREVIEW)]
+        return {"code": 0, "data": {**summary, "preview": preview}}
+    if invalid and not request.skip_invalid:
+        raise HTTPException(status_code=400, detail={
+            "msg": f"Parameter validation failed for {invalid} of {validation.total} candidates",
+            "errors": validation.errors,
+        })
+
+    ids = crud.create_strategies(db, [
+        {"name": f"{request.name} #{index + 1}", "type": request.type, "params": params}
+        for index, params in validation.candidates()
+    ])
+    return {"code": 0, "data": {**summary, "created": len(ids), "ids": ids}}
+
 @app.put('/api/strategies/{strategy_id}', response_model=schemas.Strategy)
 def update_strategy(strategy_id: int, strategy: schemas.StrategyUpdate, db: Session = Depends(get_db)):
     db_strategy = crud.update_strategy(db=db, strategy_id=strategy_id, strategy=strategy)
@@ -39,19 +126,76 @@ def update_strategy(strategy_id: int, strategy: schemas.StrategyUpdate, db: Sess
         raise HTTPException(status_code=404, detail="Strategy not found")
     return db_strategy
 
-@app.post('/api/strategies/{strategy_id}/start')
-def start_strategy(strategy_id: int, db: Session = Depends(get_db)):
-    db_strategy = crud.update_strategy_status(db=db, strategy_id=strategy_id, status="running")
+async def _submit_strategy_job(strategy_id: str, action: str, strategy_type: Optional[str] = None,
+                               params: Optional[Dict[str, Any]] = None,
+                               idempotency_key: Optional[str] = None) -> JSONResponse:
+    """提交策略命令任务，返回 202 和任务；任务状态通过 GET /api/strategy-jobs/{job_id} 或 /ws/strategy-jobs 获取"""
+    from strategy_jobs import CommandQueueFull, IdempotencyKeyConflict, strategy_command_queue
+
+    try:
+        job, _ = await strategy_command_queue.submit(strategy_id, action, strategy_type, params, idempotency_key)
+    except IdempotencyKeyConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except CommandQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return JSONResponse(status_code=202, content={"code": 0, "data": job},
+                        headers={"Location": f"/api/strategy-jobs/{job['id']}"})
+
+@app.post('/api/strategies/{strategy_id}/start', status_code=202)
+async def start_strategy(strategy_id: int, db: Session = Depends(get_db),
+                         idempotency_key: Optional[str] = Header(None)):
+    """提交启动任务：参数在提交时验证，之后由命令队列调用 Hummingbot 启动"""
+    db_strategy = crud.get_strategy(db, strategy_id)
     if db_strategy is None:
         raise HTTPException(status_code=404, detail="Strategy not found")
-    return {"code": 0, "msg": "success"}
+    return await _submit_strategy_job(str(strategy_id), "start", db_strategy.type, db_strategy.params or {},
+                                      idempotency_key)
+
+@app.post('/api/strategies/{strategy_id}/stop', status_code=202)
+async def stop_strategy(strategy_id: int, db: Session = Depends(get_db),
+                        idempotency_key: Optional[str] = Header(None)):
+    """提交停止任务；Hummingbot 上本就没有运行时通过对账修正记录的状态"""
+    if crud.get_strategy(db, strategy_id) is None:
+        raise HTTPException(status_code=404, detail="Strategy not found")
+    return await _submit_strategy_job(str(strategy_id), "stop", idempotency_key=idempotency_key)
 
-@app.post('/api/strategies/{strategy_id}/stop')
-def stop_strategy(strategy_id: int, db: Session = Depends(get_db)):
-    db_strategy = crud.update_strategy_status(db=db, strategy_id=strategy_id, status="stopped")
+@app.post('/api/strategies/{strategy_id}/restart', status_code=202)
+async def restart_strategy(strategy_id: int, db: Session = Depends(get_db),
+                           idempotency_key: Optional[str] = Header(None)):
+    """提交重启任务：先停止再以当前参数启动"""
+    db_strategy = crud.get_strategy(db, strategy_id)
     if db_strategy is None:
         raise HTTPException(status_code=404, detail="Strategy not found")
-    return {"code": 0, "msg": "success"}
+    return await _submit_strategy_job(str(strategy_id), "restart", db_strategy.type, db_strategy.params or {},
+                                      idempotency_key)
+
+@app.get('/api/strategy-jobs')
+async def get_strategy_jobs(strategy_id: Optional[str] = None, status: Optional[str] = None,
+                            limit: int = Query(100, ge=1, le=1000)):
+    """最近的策略命令任务，可按策略和状态过滤"""
+    from strategy_jobs import strategy_command_queue
+
+    return {"code": 0, "data": await strategy_command_queue.list(strategy_id, status, limit)}
+
+@app.get('/api/strategy-jobs/{job_id}')
+async def get_strategy_job(job_id: str):
+    """策略命令任务状态：queued, running, succeeded, failed"""
+    from strategy_jobs import strategy_command_queue
+
+    job = await strategy_command_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"code": 0, "data": job}
+
+@app.websocket('/ws/strategy-jobs')
+async def stream_strategy_jobs(websocket: WebSocket, strategy_id: Optional[str] = None):
+    """推送策略命令任务的状态变化，带 strategy_id 时只推送该策略的任务"""
+    from strategy_jobs import STRATEGY_JOBS_TOPIC
+
+    await websocket.accept()
+    await _stream_topic(websocket, f"{STRATEGY_JOBS_TOPIC}:{strategy_id}" if strategy_id else STRATEGY_JOBS_TOPIC)
 
 @app.delete('/api/strategies/{strategy_id}')
 def delete_strategy(strategy_id: int, db: Session = Depends(get_db)):
@@ -71,49 +215,163 @@ def get_hummingbot_strategies():
         raise HTTPException(status_code=500, detail=f"Failed to get strategies: {str(e)}")
 
 @app.get('/api/hummingbot/strategies/{strategy_type}/schema')
-def get_strategy_parameter_schema(strategy_type: str):
-    """获取策略参数模式"""
+async def get_strategy_parameter_schema(strategy_type: str, request: Request):
+    """获取策略参数模式：返回预先序列化的 JSON，带 ETag，客户端缓存未过期时返回 304"""
     try:
-        schema = get_strategy_schema(strategy_type)
-        if "error" in schema:
-            raise HTTPException(status_code=400, detail=schema["error"])
-        return {"code": 0, "data": schema}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to get schema: {str(e)}")
+        compiled = schema_registry.get(strategy_type)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    headers = {"ETag": compiled.etag, "Cache-Control": "no-cache", "X-Schema-Version": schema_registry.version}
+    if compiled.etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(content=compiled.body, media_type="application/json", headers=headers)
 
-@app.post('/api/hummingbot/strategies/{strategy_id}/start')
-async def start_hummingbot_strategy(strategy_id: str, strategy_data: Dict[str, Any]):
-    """启动 Hummingbot 策略"""
-    try:
-        strategy_type = strategy_data.get("type")
-        params = strategy_data.get("params", {})
-        
-        if not strategy_type:
-            raise HTTPException(status_code=400, detail="Strategy type is required")
-        
-        success = await strategy_executor.start_strategy(strategy_id, strategy_type, params)
-        
-        if success:
-            return {"code": 0, "msg": "Strategy started successfully"}
-        else:
-            raise HTTPException(status_code=500, detail="Failed to start strategy")
-            
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to start strategy: {str(e)}")
+def _unique_ids(ids) -> List[str]:
+    """去重并保持顺序"""
+    return list(dict.fromkeys(i for i in ids if i))
+
+async def _submit_strategy_jobs(commands: List[tuple], idempotency_key: Optional[str] = None) -> JSONResponse:
+    """批量提交策略命令任务，commands 为 (策略 ID, 命令, 策略类型, 参数)
+
+    先验证全部配置，任一无效时返回 400 且不提交任何任务；之后每个策略提交一个任务，
+    和单个策略的命令一样经由命令队列按策略串行执行，返回 202 和按策略 ID 索引的任务或提交失败原因。
+    带幂等键时每个策略使用“幂等键:策略 ID”
+    """
+    from strategy_jobs import strategy_command_queue
+
+    errors = {}
+    for strategy_id, action, strategy_type, params in commands:
+        if action == "stop":
+            continue
+        try:
+            strategy_command_queue.executor.validate_config(strategy_type, params)
+        except (ValueError, KeyError) as e:
+            errors[strategy_id] = str(e)
+    if errors:
+        e = BulkValidationError(errors)
+        raise HTTPException(status_code=400, detail={"msg": str(e), "errors": e.errors})
+
+    async def submit(strategy_id, action, strategy_type, params):
+        key = f"{idempotency_key}:{strategy_id}" if idempotency_key else None
+        try:
+            job, _ = await strategy_command_queue.submit(strategy_id, action, strategy_type, params, key)
+            return {"success": True, "job": job}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
+    outcomes = await asyncio.gather(*[submit(*command) for command in commands])
+    results = {command[0]: outcome for command, outcome in zip(commands, outcomes)}
+    submitted = len([r for r in results.values() if r["success"]])
+    return JSONResponse(status_code=202, content={"code": 0, "data": {
+        "total": len(results), "submitted": submitted, "results": results,
+    }})
+
+@app.post('/api/hummingbot/strategies/bulk/start', status_code=202)
+async def bulk_start_hummingbot_strategies(request: schemas.BulkStrategyStart,
+                                          idempotency_key: Optional[str] = Header(None)):
+    """批量提交 Hummingbot 策略启动任务（先验证全部配置，再每个策略提交一个任务）"""
+    configs = {item.id: item for item in request.strategies}
+    return await _submit_strategy_jobs([(item.id, "start", item.type, item.params or {}) for item in configs.values()],
+                                       idempotency_key)
+
+@app.post('/api/hummingbot/strategies/bulk/stop', status_code=202)
+async def bulk_stop_hummingbot_strategies(request: schemas.BulkStrategyStop,
+                                         idempotency_key: Optional[str] = Header(None)):
+    """批量提交 Hummingbot 策略停止任务"""
+    return await _submit_strategy_jobs([(strategy_id, "stop", None, None) for strategy_id in _unique_ids(request.ids)],
+                                       idempotency_key)
 
-@app.post('/api/hummingbot/strategies/{strategy_id}/stop')
-async def stop_hummingbot_strategy(strategy_id: str):
-    """停止 Hummingbot 策略"""
+@app.get('/api/hummingbot/strategies/status')
+async def bulk_get_hummingbot_strategy_status(ids: str = Query(..., description="逗号分隔的策略 ID")):
+    """批量获取 Hummingbot 策略状态"""
+    strategy_ids = _unique_ids(i.strip() for i in ids.split(","))
+    statuses = await strategy_executor.get_strategies_status(strategy_ids)
+    return {"code": 0, "data": statuses}
+
+@app.websocket('/ws/hummingbot/strategies/status')
+async def stream_hummingbot_strategy_status(websocket: WebSocket):
+    """推送策略状态：连接后先发送所有运行中策略的状态，之后只推送有变化的策略（已停止的策略为 null）"""
+    from strategy_status import STRATEGY_STATUS_TOPIC, strategy_status_aggregator
+
+    await websocket.accept()
+    await strategy_status_aggregator.ensure_fresh()
+    strategy_status_aggregator.start()
+    await _stream_topic(websocket, STRATEGY_STATUS_TOPIC, strategy_status_aggregator.snapshot_message())
+
+@app.get('/api/hummingbot/instances')
+async def get_hummingbot_instances():
+    """Hummingbot 实例池状态：健康、负载（运行中的策略数）和最近一次检查"""
+    return {"code": 0, "data": strategy_executor.api_client.status()}
+
+@app.post('/api/hummingbot/instances')
+async def add_hummingbot_instance(request: schemas.HummingbotInstanceCreate):
+    """加入 Hummingbot 实例，检查其健康后记录到数据库（其他 worker 随后加载），再把其他实例上的策略再平衡过去"""
+    pool = strategy_executor.api_client
+    existed = request.url.rstrip("/") in pool.instances
+    instance = pool.add_instance(request.url)
+    await pool.check_health()
+    if not instance.healthy:
+        if not existed:
+            await pool.remove_instance(instance.url)
+        raise HTTPException(status_code=502, detail=f"Hummingbot instance unreachable: {instance.last_error}")
+    await pool.save_instance(instance.url)
+    moves = await pool.rebalance()
+    return {"code": 0, "data": {"instances": pool.status(), "moves": moves}}
+
+@app.post('/api/hummingbot/events')
+async def ingest_hummingbot_events(request: schemas.HummingbotEventBatch,
+                                   x_webhook_token: Optional[str] = Header(None)):
+    """接收 Hummingbot 推送的成交和订单事件，成交写入 trades 后返回；重复推送的成交会被跳过"""
+    from fill_ingest import FILL_WEBHOOK_TOKEN, fill_ingestor
+
+    if FILL_WEBHOOK_TOKEN and x_webhook_token != FILL_WEBHOOK_TOKEN:
+        raise HTTPException(status_code=401, detail="Invalid webhook token")
     try:
-        success = await strategy_executor.stop_strategy(strategy_id)
-        
-        if success:
-            return {"code": 0, "msg": "Strategy stopped successfully"}
-        else:
-            raise HTTPException(status_code=404, detail="Strategy not found")
-            
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to stop strategy: {str(e)}")
+        result = await fill_ingestor.submit(request.events, source="webhook")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="Fill ingestion backlog is full, retry later")
+    return {"code": 0, "data": result}
+
+@app.websocket('/ws/hummingbot/events')
+async def stream_hummingbot_events(websocket: WebSocket, token: Optional[str] = None):
+    """事件流：客户端发送 {"id": ..., "events": [...]}，成交写入后回复 {"id": ..., "code": 0, "data": {...}}
+    未收到确认的消息可原样重发，已写入的成交会被跳过
+    """
+    from fill_ingest import FILL_WEBHOOK_TOKEN, fill_ingestor
+
+    if FILL_WEBHOOK_TOKEN and token != FILL_WEBHOOK_TOKEN:
+        await websocket.close(code=1008, reason="Invalid webhook token")
+        return
+    await websocket.accept()
+    while True:
+        try:
+            text = await websocket.receive_text()
+        except WebSocketDisconnect:
+            return
+        reply = {"id": None}
+        try:
+            batch = schemas.HummingbotEventStreamMessage.model_validate_json(text)
+            reply["id"] = batch.id
+            reply.update(code=0, data=await fill_ingestor.submit(batch.events, source="stream"))
+        except ValueError as e:  # 包括 JSON 解析和 pydantic 校验错误
+            reply.update(code=400, msg=str(e))
+        except asyncio.TimeoutError:
+            reply.update(code=503, msg="Fill ingestion backlog is full, retry later")
+        await websocket.send_json(reply)
+
+@app.post('/api/hummingbot/strategies/{strategy_id}/start', status_code=202)
+async def start_hummingbot_strategy(strategy_id: str, strategy_data: Dict[str, Any],
+                                    idempotency_key: Optional[str] = Header(None)):
+    """提交 Hummingbot 策略启动任务"""
+    return await _submit_strategy_job(strategy_id, "start", strategy_data.get("type"),
+                                      strategy_data.get("params", {}), idempotency_key)
+
+@app.post('/api/hummingbot/strategies/{strategy_id}/stop', status_code=202)
+async def stop_hummingbot_strategy(strategy_id: str, idempotency_key: Optional[str] = Header(None)):
+    """提交 Hummingbot 策略停止任务"""
+    return await _submit_strategy_job(strategy_id, "stop", idempotency_key=idempotency_key)
 
 @app.get('/api/hummingbot/strategies/{strategy_id}/status')
 async def get_hummingbot_strategy_status(strategy_id: str):
@@ -161,22 +419,266 @@ def delete_account(account_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Account not found")
     return {"code": 0, "msg": "success"}
 
-# 行情相关接口（保持 mock 数据，因为需要外部 API）
+# 行情相关接口
 @app.get('/api/markets/symbols')
-def get_symbols():
-    return ["BTC/USDT", "ETH/USDT", "BNB/USDT"]
+async def get_symbols(exchange: Optional[str] = None, quote: Optional[str] = None, details: bool = False):
+    """交易对列表，来自交易对元数据缓存；details=true 时返回价格精度、数量精度、最小下单量等规则"""
+    from dataclasses import asdict
+    from instruments import INSTRUMENT_FETCHERS, instrument_cache
+
+    exchanges = [exchange.lower()] if exchange else list(INSTRUMENT_FETCHERS)
+    for name in exchanges:
+        if name not in INSTRUMENT_FETCHERS:
+            raise HTTPException(status_code=400, detail=f"Unsupported exchange: {name}")
+        try:
+            await instrument_cache.ensure_fresh(name)
+        except Exception:
+            pass
+    if not any(instrument_cache.is_loaded(name) for name in exchanges):
+        raise HTTPException(status_code=503, detail="Instrument metadata unavailable")
+
+    instruments = instrument_cache.symbols(exchange, quote)
+    if details:
+        return [asdict(instrument) for instrument in instruments]
+    return sorted({instrument.symbol for instrument in instruments})
+
+@app.get('/api/markets/tickers')
+async def get_tickers(symbols: Optional[str] = Query(None, description="逗号分隔的交易对，为空时返回全部"),
+                      exchange: str = "binance"):
+    """批量获取行情；同一交易所的全部交易对共享一次上游请求的快照
+
+    行情只含基本类型，直接序列化返回，跳过逐字段的 jsonable_encoder 转换
+    """
+    from tickers import ticker_cache
+
+    symbol_list = [s for s in symbols.split(",") if s.strip()] if symbols else None
+    try:
+        tickers = await ticker_cache.get_tickers(exchange, symbol_list)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception:
+        raise HTTPException(status_code=503, detail="Tickers unavailable")
+    return JSONResponse(tickers)
 
 @app.get('/api/markets/kline')
-def get_kline(symbol: str):
-    return [
-        {"time": 1622476800000, "open": 35000, "high": 35500, "low": 34500, "close": 35200},
-        {"time": 1622480400000, "open": 35200, "high": 36000, "low": 35000, "close": 35800},
-        {"time": 1622484000000, "open": 35800, "high": 36200, "low": 35500, "close": 36000},
-    ]
+async def get_kline(symbol: str, exchange: str = "binance", interval: str = "1m",
+              start: Optional[int] = None, end: Optional[int] = None,
+              limit: int = Query(500, ge=1, le=5000), db: Session = Depends(get_db)):
+    """获取 K 线（start/end 为毫秒时间戳）；首次请求某交易对时开始订阅成交并生成 K 线"""
+    from exchange_connector import normalize_symbol
+    from kline_engine import KLINE_INTERVALS, kline_engine
+
+    if interval not in KLINE_INTERVALS:
+        raise HTTPException(status_code=400, detail=f"Unsupported interval: {interval}")
+    exchange, symbol = exchange.lower(), normalize_symbol(symbol)
+    try:
+        kline_engine.track(exchange, symbol)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return await kline_engine.get_klines(db, exchange, symbol, interval, start, end, limit)
 
 @app.get('/api/markets/orderbook')
-def get_orderbook(symbol: str):
-    return {"bids": [[35200, 1.2], [35150, 0.8]], "asks": [[35300, 1.0], [35400, 0.5]]}
+async def get_orderbook(symbol: str, exchange: str = "binance", depth: int = Query(20, ge=1, le=500),
+                        consolidated: bool = False):
+    """获取实时订单簿前 depth 档（首次请求某交易对时会建立订阅）
+
+    consolidated=true 时返回跨交易所合并订单簿，每档附带各交易所的数量
+    """
+    from orderbook import order_book_service
+
+    try:
+        if consolidated:
+            book = await order_book_service.get_consolidated_snapshot(symbol, depth)
+        else:
+            book = await order_book_service.get_snapshot(exchange, symbol, depth)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if book is None:
+        raise HTTPException(status_code=503, detail="Order book not ready")
+    return book
+
+@app.get('/api/markets/slippage')
+async def get_slippage(symbol: str, amounts: str = Query(..., description="逗号分隔的下单数量（基础币种）"),
+                       side: str = "buy", exchanges: str = "binance"):
+    """按订单簿深度计算各交易所、各下单数量的成交均价、最差成交价和滑点（bp）"""
+    from exchange_connector import normalize_symbol
+    from orderbook import order_book_service
+    from slippage import slippage_calculator
+
+    symbol = normalize_symbol(symbol)
+    try:
+        amount_list = [float(a) for a in amounts.split(",") if a.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid amounts")
+    if not amount_list or min(amount_list) <= 0:
+        raise HTTPException(status_code=400, detail="Amounts must be positive")
+    if side not in ("buy", "sell"):
+        raise HTTPException(status_code=400, detail=f"Unsupported side: {side}")
+
+    exchange_list = list(dict.fromkeys(e.strip().lower() for e in exchanges.split(",") if e.strip()))
+    try:
+        await asyncio.gather(*[order_book_service.get_snapshot(exchange, symbol, 1) for exchange in exchange_list])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    data = []
+    results = slippage_calculator.estimate_many([(e, symbol, side) for e in exchange_list], amount_list)
+    for exchange, result in zip(exchange_list, results):
+        if result is not None:
+            data.extend(slippage_calculator.to_rows(exchange, symbol, side, result))
+    if not data:
+        raise HTTPException(status_code=503, detail="Order book not ready")
+    return {"code": 0, "data": data}
+
+@app.get('/api/markets/ticks')
+async def get_ticks(symbol: str, exchange: str = "binance", kind: str = "trade",
+                    start: Optional[int] = None, end: Optional[int] = None,
+                    limit: int = Query(10000, ge=1, le=1000000), format: str = "json"):
+    """查询逐笔成交（kind=trade）或盘口最优价（kind=quote），start/end 为毫秒时间戳
+
+    首次请求某交易对时开始记录；format=binary 时直接返回定长二进制记录，
+    客户端可按 X-Tick-Dtype 描述的格式零解析读取
+    """
+    from exchange_connector import normalize_symbol
+    from tick_store import TICK_DTYPES, tick_store
+
+    if kind not in TICK_DTYPES:
+        raise HTTPException(status_code=400, detail=f"Unsupported tick kind: {kind}")
+    exchange, symbol = exchange.lower(), normalize_symbol(symbol)
+    try:
+        tick_store.track(kind, exchange, symbol)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    ticks = tick_store.query(kind, exchange, symbol, start, end, limit)
+    if format == "binary":
+        dtype = TICK_DTYPES[kind]
+        return Response(content=ticks.tobytes(), media_type="application/octet-stream", headers={
+            "X-Tick-Dtype": ",".join(f"{name}:{dtype.fields[name][0].str}:{dtype.fields[name][1]}" for name in dtype.names),
+            "X-Tick-Itemsize": str(dtype.itemsize),
+            "X-Tick-Count": str(len(ticks)),
+        })
+    return {
+        "exchange": exchange,
+        "symbol": symbol,
+        "kind": kind,
+        "count": len(ticks),
+        "data": {name: ticks[name].tolist() for name in ticks.dtype.names},
+    }
+
+# 套利机会
+@app.get('/api/opportunities')
+async def get_opportunities(symbol: Optional[str] = None, min_profitability: Optional[float] = None,
+                      strategy_id: Optional[int] = None, amount: Optional[float] = Query(None, gt=0)):
+    """当前的跨交易所套利机会（已扣除吃单手续费），min_profitability 单位为 %
+
+    指定 amount 时按订单簿深度返回该数量的成交均价、滑点和净收益
+    """
+    from arbitrage_scanner import arbitrage_scanner
+
+    await arbitrage_scanner.wait_ready()
+    return {
+        "code": 0,
+        "data": arbitrage_scanner.get_opportunities(symbol, min_profitability, strategy_id, amount),
+        "scanned_at": arbitrage_scanner.scanned_at,
+    }
+
+@app.websocket('/ws/opportunities')
+async def stream_opportunities(websocket: WebSocket):
+    """推送套利机会：连接后先发送当前列表，之后每当机会变化时推送"""
+    from arbitrage_scanner import OPPORTUNITIES_TOPIC, arbitrage_scanner
+
+    await websocket.accept()
+    await arbitrage_scanner.wait_ready()
+    await _stream_topic(websocket, OPPORTUNITIES_TOPIC, {
+        "type": OPPORTUNITIES_TOPIC,
+        "timestamp": arbitrage_scanner.scanned_at,
+        "data": arbitrage_scanner.get_opportunities(),
+    })
+
+@app.get('/api/opportunities/triangular')
+async def get_triangular_opportunities(exchange: str = "binance", min_profitability: Optional[float] = None):
+    """单一交易所内的三角套利机会（已扣除吃单手续费），首次请求时订阅该交易所的全市场行情"""
+    from triangular_arbitrage import triangular_detector
+
+    exchange = exchange.lower()
+    try:
+        triangular_detector.track(exchange)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "code": 0,
+        "data": triangular_detector.get_opportunities(exchange, min_profitability),
+        "updated_at": triangular_detector.updated_at,
+    }
+
+@app.websocket('/ws/opportunities/triangular')
+async def stream_triangular_opportunities(websocket: WebSocket, exchange: str = "binance"):
+    """推送指定交易所的三角套利机会：该交易所的机会集合变化时推送其全部当前机会"""
+    from triangular_arbitrage import TRIANGULAR_TOPIC, triangular_detector
+
+    await websocket.accept()
+    exchange = exchange.lower()
+    try:
+        triangular_detector.track(exchange)
+    except ValueError as e:
+        await websocket.close(code=1003, reason=str(e))
+        return
+    await _stream_topic(websocket, f"{TRIANGULAR_TOPIC}:{exchange}", {
+        "type": TRIANGULAR_TOPIC,
+        "timestamp": triangular_detector.updated_at,
+        "data": triangular_detector.get_opportunities(exchange),
+    })
+
+@app.get('/api/funding')
+async def get_funding(symbol: Optional[str] = None, venue: Optional[str] = None,
+                      min_carry: Optional[float] = None):
+    """永续合约资金费率（%）、基差和跨交易所年化资金费率价差；首次请求时开始定期刷新"""
+    from funding import funding_monitor
+
+    if not await funding_monitor.wait_ready():
+        raise HTTPException(status_code=503, detail="Funding rates not ready")
+    try:
+        rates = funding_monitor.get_rates(symbol, venue.lower() if venue else None)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "code": 0,
+        "data": {"rates": rates, "carry": funding_monitor.get_carry(min_carry)},
+        "updated_at": funding_monitor.updated_at,
+    }
+
+@app.websocket('/ws/funding')
+async def stream_funding(websocket: WebSocket, strategy_id: Optional[str] = None):
+    """推送资金费率：不带 strategy_id 时推送价差快照和所有策略的阈值提醒，带 strategy_id 时只推送该策略的提醒"""
+    from funding import FUNDING_TOPIC, funding_monitor
+
+    await websocket.accept()
+    funding_monitor.start()
+    if strategy_id:
+        await _stream_topic(websocket, f"{FUNDING_TOPIC}:{strategy_id}")
+    else:
+        await _stream_topic(websocket, FUNDING_TOPIC,
+                            funding_monitor.snapshot_message() if funding_monitor.updated_at else None)
+
+async def _stream_topic(websocket: WebSocket, topic: str, initial: Optional[Dict] = None):
+    """把 pubsub 主题的消息转发给 WebSocket 客户端，直到客户端断开"""
+    from pubsub import broadcaster
+
+    async def forward(queue):
+        if initial is not None:
+            await websocket.send_json(initial)
+        while True:
+            await websocket.send_json(await queue.get())
+
+    with broadcaster.subscribe(topic) as queue:
+        sender = asyncio.create_task(forward(queue))
+        try:
+            while (await websocket.receive())["type"] != "websocket.disconnect":
+                pass
+        finally:
+            sender.cancel()
+            await asyncio.gather(sender, return_exceptions=True)
 
 # 日志与交易记录接口
 @app.get('/api/logs', response_model=List[schemas.Log])
@@ -187,6 +689,23 @@ def get_logs(strategy_id: Optional[int] = None, db: Session = Depends(get_db)):
 def get_trades(strategy_id: Optional[int] = None, db: Session = Depends(get_db)):
     return crud.get_trades(db=db, strategy_id=strategy_id)
 
+@app.get('/api/trades/rollups', response_model=List[schemas.TradeRollup])
+def get_trade_rollups(day: Optional[date] = None, db: Session = Depends(get_db)):
+    return crud.get_trade_rollups(db=db, day=day)
+
+# 监控指标（Prometheus 文本格式）
+@app.get('/metrics', response_class=PlainTextResponse)
+def get_metrics():
+    return metrics_registry.render()
+
+# 后台调度器状态
+@app.get('/api/scheduler/status')
+def get_scheduler_status():
+    scheduler = getattr(app.state, "scheduler", None)
+    if scheduler is None:
+        return {"code": 0, "data": {"enabled": False}}
+    return {"code": 0, "data": {"enabled": True, **scheduler.get_status()}}
+
 # 总览统计接口
 @app.get('/api/overview')
 def get_overview(db: Session = Depends(get_db)):
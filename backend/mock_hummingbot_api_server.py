@@ -1,35 +1,137 @@
 #!/usr/bin/env python3
 """
 模拟 Hummingbot API 服务器
+默认只返回静态数据；开启模拟模式后运行中的策略按配置的速率产生成交、PnL 更新和日志，
+并可注入延迟分布、错误率和崩溃重启，作为集成层性能测试的本地替身：
+
+    python mock_hummingbot_api_server.py --strategies 100 --fill-rate 2 --pnl-interval 1 --log-rate 1 \
+        --latency 0.05 --latency-dist lognormal --latency-jitter 0.5 --error-rate 0.01 --crash-interval 300
 """
 
+import argparse
 import asyncio
 import json
 import logging
-from typing import Dict, Any
-from aiohttp import web, ClientSession
+import math
+import os
+import random
+import time
+from collections import deque
+from dataclasses import asdict, dataclass
+from typing import Dict, Any, List, Optional
+from aiohttp import web, ClientSession, ClientTimeout
 from datetime import datetime
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "exponential", "lognormal")
+# 模拟行情的初始中间价（按交易对的基础币种），其他币种为 1.0
+BASE_PRICES = {"BTC": 60000.0, "ETH": 3000.0, "SOL": 150.0, "BNB": 500.0}
+LOG_TEMPLATES = (
+    "Created {side} order {order_id} for {amount} {symbol} at {price}",
+    "Cancelled order {order_id}",
+    "Refreshing orders on {exchange} {symbol}, mid price {mid}",
+    "Filled {side} order {order_id}: {amount} {symbol} at {price}",
+)
+
+
+@dataclass
+class SimulationConfig:
+    """模拟模式配置：成交和日志速率为每个运行中策略每秒的期望条数（泊松分布）"""
+    fill_rate: float = 0.0
+    pnl_interval: float = 0.0  # PnL 更新间隔（秒），0 表示不更新
+    log_rate: float = 0.0
+    tick: float = 0.1  # 模拟步长（秒）
+    latency_dist: str = "fixed"  # 响应延迟分布：fixed, uniform, exponential, lognormal
+    latency_jitter: float = 0.0  # uniform 为半宽（秒），lognormal 为对数标准差
+    error_rate: float = 0.0  # 返回 503 的请求比例（不含 /health）
+    crash_interval: float = 0.0  # 平均崩溃间隔（秒，指数分布），0 表示不崩溃
+    crash_downtime: float = 5.0  # 崩溃后重启前不可用的时间（秒）
+    keep_strategies: bool = False  # 重启后是否保留运行中的策略
+    webhook_url: Optional[str] = None  # 设置后把成交推送到后端 POST /api/hummingbot/events
+    webhook_token: Optional[str] = None
+    log_retention: int = 200  # 每个策略保留的日志条数
+    seed: Optional[int] = None
+
+
 class MockHummingbotAPIServer:
-    def __init__(self, host: str = "0.0.0.0", port: int = 15888):
+    def __init__(self, host: str = "0.0.0.0", port: int = 15888, latency: float = 0.0,
+                 simulation: Optional[SimulationConfig] = None):
         self.host = host
         self.port = port
-        self.app = web.Application()
+        # 注入的响应延迟（秒），用于测试慢 Hummingbot 对后端的影响；按 simulation.latency_dist 分布时为均值或中位数
+        self.latency = latency
+        self.simulation = simulation or SimulationConfig()
+        if self.simulation.latency_dist not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"latency_dist must be one of {LATENCY_DISTRIBUTIONS}")
+        self.random = random.Random(self.simulation.seed)
+        self.request_count = 0
+        self.crashed = False
+        self.stats = {"errors": 0, "fills": 0, "pnl_updates": 0, "logs": 0, "crashes": 0,
+                      "webhook_batches": 0, "webhook_failures": 0, "webhook_dropped": 0}
+        self.app = web.Application(middlewares=[self.latency_middleware])
+        self.app.on_startup.append(self._start_simulation)
+        self.app.on_cleanup.append(self._stop_simulation)
+        self.runner: Optional[web.AppRunner] = None
+        self.site: Optional[web.TCPSite] = None
+        self._tasks: List[asyncio.Task] = []
+        self._push_tasks = set()
+        self._session: Optional[ClientSession] = None
         self.running_strategies = {}
+        self.logs: Dict[str, deque] = {}
+        self.prices: Dict[str, float] = {}
+        self.trade_retention = 100  # 每个策略状态中保留的最近成交条数
+        # 成交和订单事件日志，按序号递增，供 GET /fills 按游标拉取
+        self.fills = []
+        self.fill_seq = 0
+        self.fill_retention = int(os.getenv('MOCK_FILL_RETENTION', '100000'))
         self.setup_routes()
         
+    @web.middleware
+    async def latency_middleware(self, request, handler):
+        """统计请求次数，按配置延迟响应并注入错误；崩溃期间直接断开连接"""
+        self.request_count += 1
+        if self.crashed:
+            if request.transport is not None:
+                request.transport.close()
+            raise web.HTTPServiceUnavailable()
+        delay = self.sample_latency()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self.simulation.error_rate > 0 and request.path != '/health' and self.random.random() < self.simulation.error_rate:
+            self.stats["errors"] += 1
+            return web.json_response({"success": False, "error": "Simulated error"}, status=503)
+        return await handler(request)
+
+    def sample_latency(self) -> float:
+        """按配置的分布抽取一次响应延迟（秒）"""
+        if self.latency <= 0:
+            return 0.0
+        dist, jitter = self.simulation.latency_dist, self.simulation.latency_jitter
+        if dist == "uniform":
+            return max(0.0, self.random.uniform(self.latency - jitter, self.latency + jitter))
+        if dist == "exponential":
+            return self.random.expovariate(1 / self.latency)
+        if dist == "lognormal":
+            return self.random.lognormvariate(math.log(self.latency), jitter)
+        return self.latency
+        
     def setup_routes(self):
         """设置 API 路由"""
         self.app.router.add_get('/strategies', self.get_strategies)
+        # 批量状态路由需在 /strategies/{strategy_id} 之前注册
+        self.app.router.add_get('/strategies/status', self.get_strategies_status)
         self.app.router.add_get('/strategies/{strategy_id}', self.get_strategy)
         self.app.router.add_post('/strategies/{strategy_id}/start', self.start_strategy)
         self.app.router.add_post('/strategies/{strategy_id}/stop', self.stop_strategy)
         self.app.router.add_get('/strategies/{strategy_id}/status', self.get_strategy_status)
+        self.app.router.add_get('/strategies/{strategy_id}/logs', self.get_strategy_logs)
+        self.app.router.add_get('/fills', self.get_fills)
         self.app.router.add_get('/health', self.health_check)
+        self.app.router.add_get('/simulation', self.get_simulation)
+        self.app.router.add_post('/simulation/crash', self.trigger_crash)
         
     async def get_strategies(self, request):
         """获取策略列表"""
@@ -72,6 +174,20 @@ class MockHummingbotAPIServer:
         ]
         return web.json_response({"success": True, "data": strategies})
         
+    def new_strategy(self, strategy_id: str, strategy_type: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """运行中策略的状态；position 和 cash 用于模拟模式计算 PnL"""
+        return {
+            "id": strategy_id,
+            "type": strategy_type,
+            "params": params,
+            "status": "running",
+            "started_at": datetime.now().isoformat(),
+            "trades": [],
+            "pnl": 0.0,
+            "position": 0.0,
+            "cash": 0.0,
+        }
+
     async def get_strategy(self, request):
         """获取策略详情"""
         strategy_id = request.match_info['strategy_id']
@@ -93,15 +209,7 @@ class MockHummingbotAPIServer:
             params = data.get('params', {})
             
             # 模拟策略启动
-            self.running_strategies[strategy_id] = {
-                "id": strategy_id,
-                "type": strategy_type,
-                "params": params,
-                "status": "running",
-                "started_at": datetime.now().isoformat(),
-                "trades": [],
-                "pnl": 0.0
-            }
+            self.running_strategies[strategy_id] = self.new_strategy(strategy_id, strategy_type, params)
             
             logger.info(f"Strategy {strategy_id} started successfully")
             return web.json_response({
@@ -152,6 +260,224 @@ class MockHummingbotAPIServer:
                 "error": f"Strategy {strategy_id} not found"
             }, status=404)
             
+    async def get_strategies_status(self, request):
+        """批量获取策略状态：ids 为逗号分隔的策略 ID，未指定时返回所有运行中的策略，未找到的策略为 null"""
+        ids = request.query.get('ids')
+        if ids is None:
+            data = dict(self.running_strategies)
+        else:
+            data = {i: self.running_strategies.get(i) for i in ids.split(',') if i}
+        return web.json_response({"success": True, "data": data})
+            
+    def add_fill(self, strategy_id: str, side: str, price: float, amount: float, fee: float = 0.0,
+                 exchange: str = "binance", symbol: str = "BTC-USDT", order_id: str = None,
+                 event_type: str = "fill") -> Dict[str, Any]:
+        """记录一条成交（或订单事件），返回带序号的事件"""
+        self.fill_seq += 1
+        event = {
+            "seq": self.fill_seq,
+            "type": event_type,
+            "strategy_id": strategy_id,
+            "exchange": exchange,
+            "symbol": symbol,
+            "order_id": order_id or f"mock-{self.port}-{self.fill_seq}",
+            "side": side,
+            "price": price,
+            "amount": amount,
+            "fee": fee,
+            "timestamp": datetime.now().timestamp() * 1000,
+        }
+        self.fills.append(event)
+        if len(self.fills) > self.fill_retention:
+            del self.fills[:len(self.fills) - self.fill_retention]
+        strategy = self.running_strategies.get(strategy_id)
+        if strategy is not None and event_type == "fill":
+            strategy["trades"].append(event)
+            if len(strategy["trades"]) > self.trade_retention:
+                del strategy["trades"][:len(strategy["trades"]) - self.trade_retention]
+        return event
+
+    async def get_fills(self, request):
+        """按序号拉取成交和订单事件：after 为上次拉取到的序号，limit 为最多返回条数"""
+        after = int(request.query.get('after', 0))
+        limit = int(request.query.get('limit', 1000))
+        # 序号连续递增，可直接定位起始位置
+        start = max(0, len(self.fills) - (self.fill_seq - after)) if self.fills else 0
+        data = self.fills[start:start + limit]
+        return web.json_response({"success": True, "data": data, "next": data[-1]["seq"] if data else after})
+
+    async def get_strategy_logs(self, request):
+        """获取策略最近的日志"""
+        strategy_id = request.match_info['strategy_id']
+        limit = int(request.query.get('limit', 100))
+        logs = list(self.logs.get(strategy_id, ()))[-limit:]
+        return web.json_response({"success": True, "data": logs})
+
+    async def get_simulation(self, request):
+        """模拟模式配置和统计"""
+        return web.json_response({
+            "success": True,
+            "data": {
+                "config": asdict(self.simulation),
+                "latency": self.latency,
+                "stats": {**self.stats, "requests": self.request_count,
+                          "running_strategies": len(self.running_strategies), "fill_seq": self.fill_seq},
+            }
+        })
+
+    async def trigger_crash(self, request):
+        """触发一次崩溃：响应后停止服务 downtime 秒再重启"""
+        downtime = float(request.query.get('downtime', self.simulation.crash_downtime))
+        self._tasks.append(asyncio.create_task(self.crash(downtime, delay=0.05)))
+        return web.json_response({"success": True, "downtime": downtime}, status=202)
+
+    async def _start_simulation(self, app):
+        sim = self.simulation
+        if sim.fill_rate > 0 or sim.pnl_interval > 0 or sim.log_rate > 0:
+            self._tasks.append(asyncio.create_task(self._simulate()))
+        if sim.crash_interval > 0:
+            self._tasks.append(asyncio.create_task(self._crash_loop()))
+        if sim.webhook_url:
+            self._session = ClientSession(timeout=ClientTimeout(total=10))
+
+    async def _stop_simulation(self, app):
+        tasks = self._tasks + list(self._push_tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _simulate(self):
+        """按步长推进所有运行中的策略：产生成交和日志，定期按最新价格更新 PnL"""
+        sim = self.simulation
+        last_pnl = time.monotonic()
+        while True:
+            await asyncio.sleep(sim.tick)
+            if self.crashed:
+                continue
+            fills = []
+            for strategy in list(self.running_strategies.values()):
+                for _ in range(self._poisson(sim.fill_rate * sim.tick)):
+                    fills.append(self._simulate_fill(strategy))
+                for _ in range(self._poisson(sim.log_rate * sim.tick)):
+                    self._simulate_log(strategy)
+            now = time.monotonic()
+            if sim.pnl_interval > 0 and now - last_pnl >= sim.pnl_interval:
+                last_pnl = now
+                for strategy in self.running_strategies.values():
+                    self._update_pnl(strategy)
+            if fills and sim.webhook_url:
+                self._push(fills)
+
+    def _poisson(self, lam: float) -> int:
+        """泊松分布抽样（期望较大时用正态近似）"""
+        if lam <= 0:
+            return 0
+        if lam > 30:
+            return max(0, round(self.random.gauss(lam, math.sqrt(lam))))
+        limit, count, product = math.exp(-lam), 0, self.random.random()
+        while product > limit:
+            count += 1
+            product *= self.random.random()
+        return count
+
+    @staticmethod
+    def _market(strategy: Dict[str, Any]):
+        params = strategy.get("params") or {}
+        exchange = params.get("exchange") or params.get("exchange_1") or "binance"
+        return exchange, params.get("market") or "BTC-USDT"
+
+    def _mid(self, exchange: str, symbol: str) -> float:
+        """模拟行情：每次取价时按几何随机游走前进一步"""
+        key = f"{exchange}:{symbol}"
+        mid = self.prices.get(key)
+        if mid is None:
+            mid = BASE_PRICES.get(symbol.replace("/", "-").split("-")[0].upper(), 1.0)
+        mid *= math.exp(self.random.gauss(0, 0.0005))
+        self.prices[key] = mid
+        return mid
+
+    def _simulate_fill(self, strategy: Dict[str, Any]) -> Dict[str, Any]:
+        params = strategy.get("params") or {}
+        exchange, symbol = self._market(strategy)
+        mid = self._mid(exchange, symbol)
+        side = self.random.choice(("buy", "sell"))
+        spread = float(params.get("bid_spread" if side == "buy" else "ask_spread", 0.1)) / 100
+        price = round(mid * (1 - spread if side == "buy" else 1 + spread), 8)
+        amount = float(params.get("order_amount", 0.01))
+        fee = round(price * amount * 0.001, 8)
+        direction = 1 if side == "buy" else -1
+        strategy["position"] = strategy.get("position", 0.0) + direction * amount
+        strategy["cash"] = strategy.get("cash", 0.0) - direction * price * amount - fee
+        self.stats["fills"] += 1
+        return self.add_fill(strategy["id"], side, price, amount, fee=fee, exchange=exchange, symbol=symbol)
+
+    def _update_pnl(self, strategy: Dict[str, Any]):
+        exchange, symbol = self._market(strategy)
+        strategy["pnl"] = round(strategy.get("cash", 0.0) + strategy.get("position", 0.0) * self._mid(exchange, symbol), 8)
+        strategy["pnl_updated_at"] = datetime.now().isoformat()
+        self.stats["pnl_updates"] += 1
+
+    def _simulate_log(self, strategy: Dict[str, Any]):
+        exchange, symbol = self._market(strategy)
+        mid = self.prices.get(f"{exchange}:{symbol}") or self._mid(exchange, symbol)
+        message = self.random.choice(LOG_TEMPLATES).format(
+            side=self.random.choice(("BUY", "SELL")), order_id=f"mock-{self.port}-{self.fill_seq}",
+            amount=(strategy.get("params") or {}).get("order_amount", 0.01), symbol=symbol, exchange=exchange,
+            price=round(mid, 8), mid=round(mid, 8),
+        )
+        logs = self.logs.setdefault(strategy["id"], deque(maxlen=self.simulation.log_retention))
+        logs.append({"timestamp": datetime.now().isoformat(), "level": "INFO", "message": message})
+        self.stats["logs"] += 1
+        logger.debug(f"[{strategy['id']}] {message}")
+
+    def _push(self, fills: List[Dict[str, Any]]):
+        """把成交推送到后端 Webhook；积压过多时丢弃，由后端按游标拉取补齐"""
+        if len(self._push_tasks) >= 4:
+            self.stats["webhook_dropped"] += len(fills)
+            return
+        task = asyncio.create_task(self._post_fills(fills))
+        self._push_tasks.add(task)
+        task.add_done_callback(self._push_tasks.discard)
+
+    async def _post_fills(self, fills: List[Dict[str, Any]]):
+        headers = {"X-Webhook-Token": self.simulation.webhook_token} if self.simulation.webhook_token else {}
+        try:
+            async with self._session.post(self.simulation.webhook_url, json={"events": fills}, headers=headers) as response:
+                response.raise_for_status()
+            self.stats["webhook_batches"] += 1
+        except Exception as e:
+            self.stats["webhook_failures"] += 1
+            logger.warning(f"Failed to push {len(fills)} fills: {e}")
+
+    async def _crash_loop(self):
+        while True:
+            await asyncio.sleep(self.random.expovariate(1 / self.simulation.crash_interval))
+            await self.crash(self.simulation.crash_downtime)
+
+    async def crash(self, downtime: float, delay: float = 0.0):
+        """模拟进程崩溃：停止监听并断开请求，downtime 秒后重启；未配置保留时丢失运行中的策略"""
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self.crashed:
+            return
+        self.crashed = True
+        self.stats["crashes"] += 1
+        logger.warning(f"Simulated crash, restarting in {downtime}s")
+        if self.site is not None:
+            await self.site.stop()
+        if not self.simulation.keep_strategies:
+            self.running_strategies.clear()
+        await asyncio.sleep(downtime)
+        if self.site is not None:
+            self.site = web.TCPSite(self.runner, self.host, self.port)
+            await self.site.start()
+        self.crashed = False
+        logger.info("Simulated restart complete")
+
     async def health_check(self, request):
         """健康检查"""
         return web.json_response({
@@ -163,10 +489,10 @@ class MockHummingbotAPIServer:
         
     async def start(self):
         """启动服务器"""
-        runner = web.AppRunner(self.app)
-        await runner.setup()
-        site = web.TCPSite(runner, self.host, self.port)
-        await site.start()
+        self.runner = web.AppRunner(self.app)
+        await self.runner.setup()
+        self.site = web.TCPSite(self.runner, self.host, self.port)
+        await self.site.start()
         
         logger.info(f"Mock Hummingbot API Server started on {self.host}:{self.port}")
         
@@ -175,12 +501,47 @@ class MockHummingbotAPIServer:
         except KeyboardInterrupt:
             logger.info("Shutting down server...")
         finally:
-            await runner.cleanup()
+            await self.runner.cleanup()
 
-async def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="模拟 Hummingbot API 服务器")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=15888)
+    parser.add_argument("--latency", type=float, default=float(os.getenv('MOCK_LATENCY', '0')),
+                        help="响应延迟（秒），按分布时为均值或中位数")
+    parser.add_argument("--latency-dist", choices=LATENCY_DISTRIBUTIONS, default="fixed", help="响应延迟分布")
+    parser.add_argument("--latency-jitter", type=float, default=0.0,
+                        help="uniform 分布的半宽（秒）或 lognormal 分布的对数标准差")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 503 的请求比例")
+    parser.add_argument("--strategies", type=int, default=0, help="启动时预先运行的模拟策略数")
+    parser.add_argument("--fill-rate", type=float, default=0.0, help="每个策略每秒的成交数")
+    parser.add_argument("--pnl-interval", type=float, default=0.0, help="PnL 更新间隔（秒）")
+    parser.add_argument("--log-rate", type=float, default=0.0, help="每个策略每秒的日志条数")
+    parser.add_argument("--tick", type=float, default=0.1, help="模拟步长（秒）")
+    parser.add_argument("--crash-interval", type=float, default=0.0, help="平均崩溃间隔（秒），0 表示不崩溃")
+    parser.add_argument("--crash-downtime", type=float, default=5.0, help="崩溃后重启前的不可用时间（秒）")
+    parser.add_argument("--keep-strategies", action="store_true", help="重启后保留运行中的策略")
+    parser.add_argument("--webhook-url", help="把成交推送到该地址，如 http://localhost:8000/api/hummingbot/events")
+    parser.add_argument("--webhook-token", default=os.getenv('FILL_WEBHOOK_TOKEN'))
+    parser.add_argument("--seed", type=int, help="随机种子，便于复现")
+    return parser.parse_args(argv)
+
+async def main(argv=None):
     """主函数"""
-    server = MockHummingbotAPIServer()
+    args = parse_args(argv)
+    simulation = SimulationConfig(
+        fill_rate=args.fill_rate, pnl_interval=args.pnl_interval, log_rate=args.log_rate, tick=args.tick,
+        latency_dist=args.latency_dist, latency_jitter=args.latency_jitter, error_rate=args.error_rate,
+        crash_interval=args.crash_interval, crash_downtime=args.crash_downtime,
+        keep_strategies=args.keep_strategies, webhook_url=args.webhook_url, webhook_token=args.webhook_token,
+        seed=args.seed,
+    )
+    server = MockHummingbotAPIServer(host=args.host, port=args.port, latency=args.latency, simulation=simulation)
+    for i in range(args.strategies):
+        server.running_strategies[f"sim-{i}"] = server.new_strategy(f"sim-{i}", "pure_market_making", {
+            "exchange": "binance", "market": "BTC-USDT", "bid_spread": 0.1, "ask_spread": 0.1, "order_amount": 0.01,
+        })
     await server.start()
 
 if __name__ == "__main__":
-    asyncio.run(main()) 
\ No newline at end of file
+    asyncio.run(main())
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Text, JSON, Boolean
+from sqlalchemy import Column, Integer, BigInteger, String, Float, DateTime, Date, Text, JSON, Boolean, UniqueConstraint
 from sqlalchemy.sql import func
 from database import Base
 
@@ -52,4 +52,90 @@ class Log(Base):
     strategy_id = Column(Integer, nullable=True)  # 关联策略ID
     level = Column(String(10), nullable=False)  # INFO, WARN, ERROR
     message = Column(Text, nullable=False)  # 日志消息
-    created_at = Column(DateTime(timezone=True), server_default=func.now()) 
\ No newline at end of file
+    created_at = Column(DateTime(timezone=True), server_default=func.now()) 
+
+class TradeRollup(Base):
+    __tablename__ = "trade_rollups"
+    __table_args__ = (UniqueConstraint("day", "strategy_id", name="uq_trade_rollups_day_strategy"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    day = Column(Date, nullable=False, index=True)  # 汇总日期
+    strategy_id = Column(Integer, nullable=True)  # 关联策略ID（为空表示手工成交）
+    trade_count = Column(Integer, default=0)  # 成交笔数
+    buy_amount = Column(Float, default=0.0)  # 买入数量
+    sell_amount = Column(Float, default=0.0)  # 卖出数量
+    notional = Column(Float, default=0.0)  # 成交额
+    fee = Column(Float, default=0.0)  # 手续费合计
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class Kline(Base):
+    __tablename__ = "klines"
+    __table_args__ = (UniqueConstraint("exchange", "symbol", "interval", "open_time", name="uq_klines_bar"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    exchange = Column(String(20), nullable=False)  # 交易所
+    symbol = Column(String(20), nullable=False)  # 交易对（统一格式，如 BTC/USDT）
+    interval = Column(String(5), nullable=False)  # K 线周期：1s, 1m, 1h, 1d 等
+    open_time = Column(BigInteger, nullable=False)  # 开盘时间（毫秒）
+    open = Column(Float, nullable=False)
+    high = Column(Float, nullable=False)
+    low = Column(Float, nullable=False)
+    close = Column(Float, nullable=False)
+    volume = Column(Float, default=0.0)  # 成交量
+    trade_count = Column(Integer, default=0)  # 成交笔数
+
+class StrategyExecution(Base):
+    __tablename__ = "strategy_executions"
+
+    strategy_id = Column(String(64), primary_key=True)  # Hummingbot 策略 ID（数据库中的策略为其数字 ID）
+    type = Column(String(50), nullable=True)  # 策略类型
+    params = Column(JSON(none_as_null=True))  # 启动时经过验证的参数
+    status = Column(String(20), nullable=False, index=True)  # running, stopped, error
+    instance = Column(String(255), nullable=True)  # 所在的 Hummingbot 实例地址，停止后保留用于粘性放置
+    error = Column(Text, nullable=True)  # 最近一次失败或对账修正的原因
+    version = Column(BigInteger, nullable=False)  # 单调递增的写入版本（微秒），Redis 缓存据此丢弃过期写入
+
+class HummingbotInstance(Base):
+    __tablename__ = "hummingbot_instances"
+
+    url = Column(String(255), primary_key=True)  # 运行时加入的 Hummingbot API 地址，所有 worker 从这里加载
+    failed_over = Column(Boolean, nullable=False, default=False)  # 已故障转移，恢复后需要清理其上迁走的策略
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class TradeFill(Base):
+    __tablename__ = "trade_fills"
+
+    fill_key = Column(String(255), primary_key=True)  # 去重键：交易所:订单号[:成交号]
+    trade_id = Column(Integer, nullable=False, index=True)  # 写入的 trades 记录
+    strategy_key = Column(String(64), nullable=True, index=True)  # Hummingbot 策略 ID
+    source = Column(String(255), nullable=True)  # 来源：webhook、stream 或 Hummingbot 实例地址
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class IngestCursor(Base):
+    __tablename__ = "ingest_cursors"
+
+    source = Column(String(255), primary_key=True)  # 拉取来源（Hummingbot 实例地址）
+    cursor = Column(BigInteger, nullable=False, default=0)  # 已写入的最大事件序号
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class StrategyJob(Base):
+    __tablename__ = "strategy_jobs"
+
+    id = Column(String(32), primary_key=True)  # 任务 ID（uuid4 hex）
+    idempotency_key = Column(String(128), nullable=True, unique=True)  # 客户端提供的幂等键，重复提交返回同一任务
+    strategy_id = Column(String(64), nullable=False, index=True)  # Hummingbot 策略 ID
+    action = Column(String(20), nullable=False)  # start, stop, restart
+    type = Column(String(50), nullable=True)  # 启动时的策略类型
+    params = Column(JSON(none_as_null=True))  # 启动时经过验证的参数
+    status = Column(String(20), nullable=False, index=True)  # queued, running, succeeded, failed
+    error = Column(Text, nullable=True)  # 失败原因
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+class StrategyJobLease(Base):
+    __tablename__ = "strategy_job_leases"
+
+    strategy_id = Column(String(64), primary_key=True)  # 同一策略的任务只由持有租约的 worker 按提交顺序执行
+    owner = Column(String(64), nullable=False)  # 持有租约的命令队列（进程号:随机串）
+    expires_at = Column(Float, nullable=False)  # 租约到期时间（Unix 秒），执行任务期间定期续期
@@ -0,0 +1,505 @@
+"""
+L2 订单簿行情服务
+按交易所和交易对维护实时订单簿：先获取快照，再应用 WebSocket 增量推送，
+检测序列号缺口并自动重新同步
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from bisect import bisect_left, insort
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import aiohttp
+
+from exchange_connector import (
+    BINANCE_API_URL,
+    BINANCE_WS_URL,
+    OKX_WS_URL,
+    ExchangeType,
+    normalize_symbol,
+    to_exchange_symbol,
+)
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# 订单簿服务配置
+MAX_ORDERBOOK_SUBSCRIPTIONS = int(os.getenv('MAX_ORDERBOOK_SUBSCRIPTIONS', '200'))
+ORDERBOOK_SNAPSHOT_DEPTH = int(os.getenv('ORDERBOOK_SNAPSHOT_DEPTH', '1000'))
+ORDERBOOK_RECONNECT_DELAY = float(os.getenv('ORDERBOOK_RECONNECT_DELAY', '1'))
+
+orderbook_resyncs = registry.counter(
+    "orderbook_resyncs_total", "订单簿因序列号缺口或断线而重新同步的次数"
+)
+orderbook_updates = registry.counter(
+    "orderbook_updates_total", "应用到订单簿的增量更新次数"
+)
+
+Level = Tuple[float, float]
+
+
+class SequenceGapError(Exception):
+    """增量推送的序列号不连续，需要重新同步"""
+
+
+class BookSide:
+    """订单簿单边：有序价格数组 + 价格到数量的映射
+
+    更新时二分查找定位价格，读取前 k 档只需切片，复杂度 O(k)
+    """
+
+    def __init__(self, descending: bool):
+        self.descending = descending
+        self._prices: List[float] = []  # 始终升序存放
+        self._sizes: Dict[float, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._prices)
+
+    def update(self, price: float, size: float):
+        """设置价格档位的数量，数量为 0 表示删除该档位"""
+        if size <= 0:
+            if self._sizes.pop(price, None) is not None:
+                del self._prices[bisect_left(self._prices, price)]
+            return
+
+        if price not in self._sizes:
+            insort(self._prices, price)
+        self._sizes[price] = size
+
+    def clear(self):
+        self._prices.clear()
+        self._sizes.clear()
+
+    def get(self, price: float) -> float:
+        return self._sizes.get(price, 0.0)
+
+    def items(self) -> List[Level]:
+        return list(self._sizes.items())
+
+    def best(self) -> Optional[Level]:
+        if not self._prices:
+            return None
+        price = self._prices[-1] if self.descending else self._prices[0]
+        return price, self._sizes[price]
+
+    def top(self, n: int) -> List[List[float]]:
+        """按价格优先顺序返回前 n 档 [price, size]"""
+        if self.descending:
+            prices = self._prices[:-n - 1:-1] if n < len(self._prices) else self._prices[::-1]
+        else:
+            prices = self._prices[:n]
+        sizes = self._sizes
+        return [[price, sizes[price]] for price in prices]
+
+
+class L2OrderBook:
+    """单个交易所、单个交易对的 L2 订单簿"""
+
+    def __init__(self, exchange: str, symbol: str):
+        self.exchange = exchange
+        self.symbol = symbol
+        self.bids = BookSide(descending=True)
+        self.asks = BookSide(descending=False)
+        self.sequence: Optional[int] = None
+        self.timestamp: Optional[float] = None
+        self.synced = False
+        self.ready = asyncio.Event()
+        self.listeners: List[Callable] = []
+
+    def add_listener(self, listener: Callable):
+        """注册订单簿变化回调：listener(book, kind, bids, asks)
+
+        kind 为 snapshot / update / invalidate；update 时 bids、asks 为本次变化的档位（数量为 0 表示删除）
+        """
+        self.listeners.append(listener)
+
+    def _notify(self, kind: str, bids=(), asks=()):
+        for listener in self.listeners:
+            try:
+                listener(self, kind, bids, asks)
+            except Exception as e:
+                logger.error(f"订单簿回调执行失败: {e}")
+
+    def apply_snapshot(self, bids: Iterable[Level], asks: Iterable[Level], sequence: Optional[int]):
+        """用全量快照替换订单簿"""
+        self.bids.clear()
+        self.asks.clear()
+        for price, size in bids:
+            self.bids.update(price, size)
+        for price, size in asks:
+            self.asks.update(price, size)
+        self.sequence = sequence
+        self.timestamp = time.time()
+        self.synced = True
+        self.ready.set()
+        self._notify("snapshot")
+
+    def apply_update(self, bids: List[Level], asks: List[Level], sequence: Optional[int]):
+        """应用增量更新"""
+        for price, size in bids:
+            self.bids.update(price, size)
+        for price, size in asks:
+            self.asks.update(price, size)
+        self.sequence = sequence
+        self.timestamp = time.time()
+        orderbook_updates.inc(exchange=self.exchange)
+        if self.listeners:
+            self._notify("update", bids, asks)
+
+    def invalidate(self):
+        """标记订单簿失效，等待重新同步"""
+        self.synced = False
+        self.ready.clear()
+        self._notify("invalidate")
+
+    def snapshot(self, depth: int = 20) -> Dict:
+        """返回前 depth 档的订单簿"""
+        return {
+            "exchange": self.exchange,
+            "symbol": self.symbol,
+            "bids": self.bids.top(depth),
+            "asks": self.asks.top(depth),
+            "sequence": self.sequence,
+            "timestamp": int(self.timestamp * 1000) if self.timestamp else None,
+        }
+
+
+def _parse_levels(levels) -> List[Level]:
+    return [(float(level[0]), float(level[1])) for level in levels]
+
+
+class DepthFeed:
+    """订单簿增量推送基类：负责断线重连和重新同步"""
+
+    def __init__(self, book: L2OrderBook):
+        self.book = book
+        self.exchange_symbol = to_exchange_symbol(book.exchange, book.symbol)
+
+    async def run(self):
+        while True:
+            try:
+                async with aiohttp.ClientSession() as session:
+                    await self._stream(session)
+            except asyncio.CancelledError:
+                raise
+            except SequenceGapError as e:
+                logger.warning(f"{self.book.exchange} {self.book.symbol} 订单簿序列号缺口，重新同步: {e}")
+            except Exception as e:
+                logger.error(f"{self.book.exchange} {self.book.symbol} 订单簿推送中断: {e}")
+            self.book.invalidate()
+            orderbook_resyncs.inc(exchange=self.book.exchange)
+            await asyncio.sleep(ORDERBOOK_RECONNECT_DELAY)
+
+    async def _stream(self, session: aiohttp.ClientSession):
+        raise NotImplementedError
+
+
+class BinanceDepthFeed(DepthFeed):
+    """币安 depth@100ms 增量推送
+
+    同步流程：先订阅并缓存推送，再拉取 REST 快照；丢弃 u <= lastUpdateId 的事件，
+    之后每个事件必须满足 U <= 上一个 u + 1，否则视为缺口
+    """
+
+    async def _stream(self, session: aiohttp.ClientSession):
+        url = f"{BINANCE_WS_URL}/{self.exchange_symbol.lower()}@depth@100ms"
+        async with session.ws_connect(url, heartbeat=30) as ws:
+            snapshot_task = asyncio.create_task(self._fetch_snapshot(session))
+            buffered = []
+            try:
+                async for message in ws:
+                    if message.type != aiohttp.WSMsgType.TEXT:
+                        break
+                    event = json.loads(message.data)
+
+                    if not self.book.synced:
+                        buffered.append(event)
+                        if not snapshot_task.done():
+                            continue
+                        bids, asks, last_update_id = snapshot_task.result()
+                        self.book.apply_snapshot(bids, asks, last_update_id)
+                        for buffered_event in buffered:
+                            self._apply(buffered_event)
+                        buffered.clear()
+                        continue
+
+                    self._apply(event)
+            finally:
+                snapshot_task.cancel()
+
+    async def _fetch_snapshot(self, session: aiohttp.ClientSession):
+        params = {"symbol": self.exchange_symbol, "limit": min(ORDERBOOK_SNAPSHOT_DEPTH, 5000)}
+        async with session.get(f"{BINANCE_API_URL}/api/v3/depth", params=params) as response:
+            response.raise_for_status()
+            data = await response.json()
+        return _parse_levels(data["bids"]), _parse_levels(data["asks"]), data["lastUpdateId"]
+
+    def _apply(self, event: Dict):
+        first_id, last_id = event["U"], event["u"]
+        if last_id <= self.book.sequence:
+            return
+        if first_id > self.book.sequence + 1:
+            raise SequenceGapError(f"期望 {self.book.sequence + 1}，收到 {first_id}")
+        self.book.apply_update(_parse_levels(event["b"]), _parse_levels(event["a"]), last_id)
+
+
+class OKXBooksFeed(DepthFeed):
+    """OKX books 频道推送
+
+    首条消息为全量快照，之后每条增量的 prevSeqId 必须等于上一条的 seqId
+    """
+
+    async def _stream(self, session: aiohttp.ClientSession):
+        async with session.ws_connect(OKX_WS_URL) as ws:
+            await ws.send_json({
+                "op": "subscribe",
+                "args": [{"channel": "books", "instId": self.exchange_symbol}]
+            })
+            keepalive = asyncio.create_task(self._keepalive(ws))
+            try:
+                async for message in ws:
+                    if message.type != aiohttp.WSMsgType.TEXT:
+                        break
+                    if message.data == "pong":
+                        continue
+                    payload = json.loads(message.data)
+                    if payload.get("event") == "error":
+                        raise RuntimeError(payload.get("msg"))
+                    if "data" in payload:
+                        self._apply(payload["action"], payload["data"][0])
+            finally:
+                keepalive.cancel()
+
+    @staticmethod
+    async def _keepalive(ws):
+        # OKX 要求 30 秒内有数据交互，空闲时发送文本 ping
+        while True:
+            await asyncio.sleep(20)
+            await ws.send_str("ping")
+
+    def _apply(self, action: str, data: Dict):
+        bids, asks = _parse_levels(data["bids"]), _parse_levels(data["asks"])
+        sequence = data.get("seqId")
+        if action == "snapshot":
+            self.book.apply_snapshot(bids, asks, sequence)
+            return
+        if not self.book.synced:
+            return
+        if data.get("prevSeqId") != self.book.sequence:
+            raise SequenceGapError(f"期望 prevSeqId={self.book.sequence}，收到 {data.get('prevSeqId')}")
+        self.book.apply_update(bids, asks, sequence)
+
+
+class ConsolidatedSide:
+    """合并订单簿单边：每个价格档位记录各交易所的数量"""
+
+    def __init__(self, descending: bool):
+        self.descending = descending
+        self._prices: List[float] = []
+        self._levels: Dict[float, Dict[str, float]] = {}
+        self._totals: Dict[float, float] = {}
+        self._venue_prices: Dict[str, set] = {}
+
+    def __len__(self) -> int:
+        return len(self._prices)
+
+    def update(self, venue: str, price: float, size: float):
+        """设置某交易所在某价格的数量，数量为 0 表示移除"""
+        venues = self._levels.get(price)
+        if size <= 0:
+            if venues is None or venue not in venues:
+                return
+            del venues[venue]
+            self._venue_prices[venue].discard(price)
+            if not venues:
+                del self._levels[price]
+                del self._totals[price]
+                del self._prices[bisect_left(self._prices, price)]
+            else:
+                self._totals[price] = sum(venues.values())
+            return
+
+        if venues is None:
+            venues = self._levels[price] = {}
+            insort(self._prices, price)
+        venues[venue] = size
+        # 每档只有少数几个交易所，直接求和避免浮点累加误差
+        self._totals[price] = sum(venues.values())
+        self._venue_prices.setdefault(venue, set()).add(price)
+
+    def remove_venue(self, venue: str):
+        """移除某交易所的全部档位"""
+        for price in list(self._venue_prices.get(venue, ())):
+            self.update(venue, price, 0)
+
+    def best(self) -> Optional[Level]:
+        if not self._prices:
+            return None
+        price = self._prices[-1] if self.descending else self._prices[0]
+        return price, self._totals[price]
+
+    def top(self, n: int) -> List[List]:
+        """按价格优先顺序返回前 n 档 [price, total_size, {venue: size}]"""
+        if self.descending:
+            prices = self._prices[:-n - 1:-1] if n < len(self._prices) else self._prices[::-1]
+        else:
+            prices = self._prices[:n]
+        return [[price, self._totals[price], dict(self._levels[price])] for price in prices]
+
+
+class ConsolidatedOrderBook:
+    """跨交易所合并订单簿
+
+    作为各交易所订单簿的监听者，只按变化的档位增量合并，不重建整本订单簿
+    """
+
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+        self.bids = ConsolidatedSide(descending=True)
+        self.asks = ConsolidatedSide(descending=False)
+        self.venues: Dict[str, L2OrderBook] = {}
+        self.timestamp: Optional[float] = None
+
+    def attach(self, book: L2OrderBook):
+        """接入一个交易所订单簿，已同步的订单簿立即合并其当前档位"""
+        if book.exchange in self.venues:
+            return
+        self.venues[book.exchange] = book
+        book.add_listener(self.on_book_event)
+        if book.synced:
+            self.on_book_event(book, "snapshot", (), ())
+
+    def on_book_event(self, book: L2OrderBook, kind: str, bids, asks):
+        venue = book.exchange
+        if kind == "update":
+            for price, size in bids:
+                self.bids.update(venue, price, size)
+            for price, size in asks:
+                self.asks.update(venue, price, size)
+        else:
+            # 快照或失效：先移除该交易所的全部档位，快照时再整体合并
+            self.bids.remove_venue(venue)
+            self.asks.remove_venue(venue)
+            if kind == "snapshot":
+                for price, size in book.bids.items():
+                    self.bids.update(venue, price, size)
+                for price, size in book.asks.items():
+                    self.asks.update(venue, price, size)
+        self.timestamp = time.time()
+
+    def snapshot(self, depth: int = 20) -> Dict:
+        return {
+            "symbol": self.symbol,
+            "consolidated": True,
+            "venues": sorted(v for v, book in self.venues.items() if book.synced),
+            "bids": self.bids.top(depth),
+            "asks": self.asks.top(depth),
+            "timestamp": int(self.timestamp * 1000) if self.timestamp else None,
+        }
+
+
+FEEDS = {
+    ExchangeType.BINANCE.value: BinanceDepthFeed,
+    ExchangeType.OKX.value: OKXBooksFeed,
+}
+
+
+class OrderBookService:
+    """订单簿服务：按需订阅并在内存中维护各交易所各交易对的订单簿"""
+
+    def __init__(self, max_subscriptions: int = MAX_ORDERBOOK_SUBSCRIPTIONS):
+        self.max_subscriptions = max_subscriptions
+        self.books: Dict[Tuple[str, str], L2OrderBook] = {}
+        self.consolidated: Dict[str, ConsolidatedOrderBook] = {}
+        self._tasks: Dict[Tuple[str, str], asyncio.Task] = {}
+        self.book_listeners: List[Callable] = []
+
+    def add_book_listener(self, listener: Callable):
+        """为所有已订阅和之后订阅的订单簿注册变化回调，参数同 L2OrderBook.add_listener"""
+        if listener in self.book_listeners:
+            return
+        self.book_listeners.append(listener)
+        for book in self.books.values():
+            book.add_listener(listener)
+
+    def get_book(self, exchange: str, symbol: str) -> Optional[L2OrderBook]:
+        return self.books.get((exchange.lower(), normalize_symbol(symbol)))
+
+    def subscribe(self, exchange: str, symbol: str) -> L2OrderBook:
+        """订阅订单簿，已订阅时直接返回"""
+        exchange, symbol = exchange.lower(), normalize_symbol(symbol)
+        key = (exchange, symbol)
+        book = self.books.get(key)
+        if book is not None:
+            return book
+
+        if exchange not in FEEDS:
+            raise ValueError(f"不支持的交易所类型: {exchange}")
+        if len(self.books) >= self.max_subscriptions:
+            raise ValueError(f"订单簿订阅数量已达上限 {self.max_subscriptions}")
+
+        book = L2OrderBook(exchange, symbol)
+        for listener in self.book_listeners:
+            book.add_listener(listener)
+        self.books[key] = book
+        if symbol in self.consolidated:
+            self.consolidated[symbol].attach(book)
+        self._tasks[key] = asyncio.create_task(FEEDS[exchange](book).run())
+        logger.info(f"订阅订单簿 {exchange} {symbol}")
+        return book
+
+    async def unsubscribe(self, exchange: str, symbol: str):
+        key = (exchange.lower(), normalize_symbol(symbol))
+        task = self._tasks.pop(key, None)
+        self.books.pop(key, None)
+        if task:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def get_snapshot(self, exchange: str, symbol: str, depth: int = 20, timeout: float = 5.0) -> Optional[Dict]:
+        """获取订单簿前 depth 档；首次请求会订阅并等待快照，超时返回 None"""
+        book = self.get_book(exchange, symbol)
+        if book is None or not book.synced:
+            book = self.subscribe(exchange, symbol)
+            try:
+                await asyncio.wait_for(book.ready.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                return None
+        return book.snapshot(depth)
+
+    async def get_consolidated_snapshot(self, symbol: str, depth: int = 20, timeout: float = 5.0) -> Optional[Dict]:
+        """获取跨交易所合并订单簿；首次请求会订阅所有支持的交易所，任一交易所就绪即返回"""
+        symbol = normalize_symbol(symbol)
+        consolidated = self.consolidated.get(symbol)
+        if consolidated is None:
+            consolidated = self.consolidated[symbol] = ConsolidatedOrderBook(symbol)
+            for exchange in FEEDS:
+                consolidated.attach(self.subscribe(exchange, symbol))
+
+        books = list(consolidated.venues.values())
+        if not any(book.synced for book in books):
+            waiters = [asyncio.create_task(book.ready.wait()) for book in books]
+            done, pending = await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for waiter in pending:
+                waiter.cancel()
+            if not done:
+                return None
+        return consolidated.snapshot(depth)
+
+    async def close(self):
+        """取消所有订阅"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+        self.books.clear()
+        self.consolidated.clear()
+
+
+# 全局订单簿服务实例
+order_book_service = OrderBookService()
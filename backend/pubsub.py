@@ -0,0 +1,69 @@
+"""
+进程内发布/订阅
+按主题把消息广播给所有订阅者（WebSocket 推送等），每个订阅者一个有界队列，
+慢消费者的队列写满时丢弃最旧的消息，不会阻塞发布方
+"""
+
+import asyncio
+import logging
+import os
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Set
+
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+PUBSUB_QUEUE_SIZE = int(os.getenv('PUBSUB_QUEUE_SIZE', '100'))
+
+pubsub_published = registry.counter("pubsub_messages_published_total", "发布的消息数")
+pubsub_dropped = registry.counter("pubsub_messages_dropped_total", "因订阅者队列已满而丢弃的消息数")
+pubsub_subscribers = registry.gauge("pubsub_subscribers", "当前订阅者数量")
+
+
+class Broadcaster:
+    """按主题广播消息"""
+
+    def __init__(self, queue_size: int = PUBSUB_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.topics: Dict[str, Set[asyncio.Queue]] = {}
+
+    def has_subscribers(self, topic: str) -> bool:
+        return bool(self.topics.get(topic))
+
+    def publish(self, topic: str, message: Any) -> int:
+        """发布消息，返回收到消息的订阅者数量"""
+        queues = self.topics.get(topic)
+        if not queues:
+            return 0
+        pubsub_published.inc(topic=topic)
+        for queue in queues:
+            if queue.full():
+                queue.get_nowait()
+                pubsub_dropped.inc(topic=topic)
+            queue.put_nowait(message)
+        return len(queues)
+
+    @contextmanager
+    def subscribe(self, topic: str) -> Iterator[asyncio.Queue]:
+        """订阅主题，退出上下文时自动取消订阅
+
+        with broadcaster.subscribe("opportunities") as queue:
+            message = await queue.get()
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self.topics.setdefault(topic, set()).add(queue)
+        pubsub_subscribers.inc(topic=topic)
+        try:
+            yield queue
+        finally:
+            queues = self.topics.get(topic)
+            if queues is not None:
+                queues.discard(queue)
+                if not queues:
+                    del self.topics[topic]
+            pubsub_subscribers.dec(topic=topic)
+
+
+# 全局广播实例
+broadcaster = Broadcaster()
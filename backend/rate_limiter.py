@@ -0,0 +1,302 @@
+"""
+API 限流中间件
+基于 GCRA（Generic Cell Rate Algorithm）实现按客户端、按路由的限流：
+- 每个客户端共享一个总预算（API_RATE_LIMIT 次/分钟）
+- 需要访问交易所的路由按更高的成本计费，并可单独设置路由预算
+- 默认使用进程内存储；配置 REDIS_URL 后使用 Redis，多个 worker 共享计数
+- 只有来自 TRUSTED_PROXIES 的请求才按 X-Real-IP / X-Forwarded-For 识别客户端，其他请求按连接地址识别
+"""
+
+import ipaddress
+import json
+import logging
+import math
+import os
+import re
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Pattern, Tuple, Union
+
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# 限流配置
+API_RATE_LIMIT = int(os.getenv('API_RATE_LIMIT', '100'))  # 每个客户端每分钟的请求预算
+API_RATE_PERIOD = float(os.getenv('API_RATE_PERIOD', '60'))  # 预算周期（秒）
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() in ['true', '1', 'yes', 'on']
+REDIS_URL = os.getenv('REDIS_URL')
+# 受信任的反向代理（逗号分隔的 IP 或网段），只有来自这些地址的请求才信任转发头
+TRUSTED_PROXIES = os.getenv('TRUSTED_PROXIES', '127.0.0.1,::1')
+
+rate_limited_requests = registry.counter(
+    "rate_limited_requests_total", "被限流拒绝的请求数"
+)
+
+
+@dataclass
+class RateLimitResult:
+    """限流判定结果"""
+    allowed: bool
+    limit: int
+    remaining: int
+    retry_after: float  # 被拒绝时需要等待的秒数
+    reset_after: float  # 预算完全恢复所需的秒数
+
+
+def gcra(tat: Optional[float], now: float, limit: int, period: float, cost: float) -> Tuple[RateLimitResult, float]:
+    """GCRA 判定，返回结果和新的理论到达时间（TAT）"""
+    emission_interval = period / limit
+    tat = max(tat or now, now)
+    new_tat = tat + emission_interval * cost
+    allow_at = new_tat - period
+
+    if now < allow_at:
+        remaining = max(0, int((period - (tat - now)) / emission_interval))
+        return RateLimitResult(False, limit, remaining, allow_at - now, tat - now), tat
+
+    remaining = max(0, int((period - (new_tat - now)) / emission_interval))
+    return RateLimitResult(True, limit, remaining, 0.0, new_tat - now), new_tat
+
+
+class MemoryRateLimitStore:
+    """进程内 GCRA 存储，仅对当前 worker 准确"""
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._tat: Dict[str, float] = {}
+
+    async def hit(self, key: str, limit: int, period: float, cost: float) -> RateLimitResult:
+        return await self.hit_all([(key, limit, cost)], period)
+
+    async def hit_all(self, hits: List[Tuple[str, int, float]], period: float) -> RateLimitResult:
+        """同时检查多个预算 (key, limit, cost)：全部允许时才一起计费，否则返回第一个拒绝的结果"""
+        now = time.monotonic()
+        results = []
+        for key, limit, cost in hits:
+            result, new_tat = gcra(self._tat.get(key), now, limit, period, cost)
+            if not result.allowed:
+                return result
+            results.append((key, result, new_tat))
+        for key, _, new_tat in results:
+            self._tat[key] = new_tat
+        if len(self._tat) > self.max_keys:
+            self._prune(now)
+        return results[-1][1]
+
+    def _prune(self, now: float):
+        """清理预算已完全恢复的 key"""
+        self._tat = {k: v for k, v in self._tat.items() if v > now}
+
+
+class RedisRateLimitStore:
+    """基于 Redis 的 GCRA 存储，用 Lua 脚本保证原子性，多 worker 共享预算"""
+
+    # KEYS 为各预算的 key，ARGV 为 now、period 以及每个预算的 emission_interval 和 cost；
+    # 全部允许时才一起写入，返回 {1, 各 key 的新 TAT...}，否则返回 {0, 拒绝的序号, 其 TAT}
+    _GCRA_SCRIPT = """
+    local now = tonumber(ARGV[1])
+    local period = tonumber(ARGV[2])
+    local new_tats = {}
+    for i, key in ipairs(KEYS) do
+        local emission_interval = tonumber(ARGV[1 + 2 * i])
+        local cost = tonumber(ARGV[2 + 2 * i])
+        local tat = tonumber(redis.call('get', key) or now)
+        if tat < now then tat = now end
+        local new_tat = tat + emission_interval * cost
+        if now < new_tat - period then
+            return {0, i, tostring(tat)}
+        end
+        new_tats[i] = new_tat
+    end
+    local reply = {1}
+    for i, key in ipairs(KEYS) do
+        redis.call('set', key, tostring(new_tats[i]), 'PX', math.ceil((new_tats[i] - now) * 1000))
+        reply[i + 1] = tostring(new_tats[i])
+    end
+    return reply
+    """
+
+    def __init__(self, redis_client, prefix: str = "arbitrage:ratelimit:"):
+        self.redis = redis_client
+        self.prefix = prefix
+        self.fallback = MemoryRateLimitStore()
+
+    async def hit(self, key: str, limit: int, period: float, cost: float) -> RateLimitResult:
+        return await self.hit_all([(key, limit, cost)], period)
+
+    async def hit_all(self, hits: List[Tuple[str, int, float]], period: float) -> RateLimitResult:
+        """同时检查多个预算 (key, limit, cost)：全部允许时才一起计费，否则返回第一个拒绝的结果"""
+        # 使用 Redis 服务器时间，避免各 worker 时钟不一致
+        try:
+            seconds, micros = await self.redis.time()
+            now = seconds + micros / 1e6
+            args = [now, period]
+            for _, limit, cost in hits:
+                args.extend([period / limit, cost])
+            reply = await self.redis.eval(
+                self._GCRA_SCRIPT, len(hits), *[self.prefix + key for key, _, _ in hits], *args
+            )
+        except Exception as e:
+            logger.warning(f"Redis 限流存储不可用，回退到进程内存储: {e}")
+            return await self.fallback.hit_all(hits, period)
+
+        if int(reply[0]):
+            _, limit, _ = hits[-1]
+            tat = float(reply[-1])
+            remaining = max(0, int((period - (tat - now)) / (period / limit)))
+            return RateLimitResult(True, limit, remaining, 0.0, tat - now)
+        _, limit, cost = hits[int(reply[1]) - 1]
+        tat = float(reply[2])
+        emission_interval = period / limit
+        remaining = max(0, int((period - (tat - now)) / emission_interval))
+        return RateLimitResult(False, limit, remaining, tat + emission_interval * cost - period - now, tat - now)
+
+
+def create_rate_limit_store():
+    """根据配置创建限流存储"""
+    if REDIS_URL:
+        try:
+            import redis.asyncio as aioredis
+            return RedisRateLimitStore(aioredis.from_url(REDIS_URL))
+        except ImportError:
+            logger.warning("未安装 redis 客户端，限流使用进程内存储")
+    return MemoryRateLimitStore()
+
+
+@dataclass
+class RouteRule:
+    """路由限流规则"""
+    name: str
+    method: str
+    pattern: Pattern
+    cost: float = 1.0  # 在客户端总预算中的计费
+    limit: Optional[int] = None  # 路由单独预算（每周期），为空表示只受总预算约束
+
+
+def parse_networks(value: str) -> List[Union[ipaddress.IPv4Network, ipaddress.IPv6Network]]:
+    """解析逗号分隔的 IP 或网段，忽略无效项"""
+    networks = []
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        try:
+            networks.append(ipaddress.ip_network(item, strict=False))
+        except ValueError:
+            logger.warning(f"忽略无效的受信任代理地址: {item}")
+    return networks
+
+
+def route_rule(name: str, method: str, path: str, cost: float = 1.0, limit: Optional[int] = None) -> RouteRule:
+    return RouteRule(name=name, method=method, pattern=re.compile(f"^{path}$"), cost=cost, limit=limit)
+
+
+# 需要访问交易所的路由计费更高，并限制单独预算
+DEFAULT_ROUTE_RULES: List[RouteRule] = [
+    route_rule("accounts_list", "GET", r"/api/accounts", cost=5, limit=20),
+    route_rule("account_create", "POST", r"/api/accounts", cost=5, limit=10),
+    route_rule("account_update_balance", "POST", r"/api/accounts/\d+/update-balance", cost=5, limit=20),
+    route_rule("strategy_grid", "POST", r"/api/strategies/grid", cost=10, limit=10),
+    route_rule("hummingbot_bulk_start", "POST", r"/api/hummingbot/strategies/bulk/start", cost=10, limit=10),
+    route_rule("hummingbot_bulk_stop", "POST", r"/api/hummingbot/strategies/bulk/stop", cost=10, limit=10),
+    route_rule("hummingbot_bulk_status", "GET", r"/api/hummingbot/strategies/status", cost=5),
+    route_rule("hummingbot_start", "POST", r"/api/hummingbot/strategies/[^/]+/start", cost=2),
+    route_rule("hummingbot_stop", "POST", r"/api/hummingbot/strategies/[^/]+/stop", cost=2),
+]
+
+# 不限流的路径
+EXEMPT_PATHS = ("/health", "/metrics", "/docs", "/redoc", "/openapi.json")
+
+
+class RateLimitMiddleware:
+    """ASGI 限流中间件"""
+
+    def __init__(self, app, store=None, limit: int = API_RATE_LIMIT, period: float = API_RATE_PERIOD,
+                 rules: Optional[List[RouteRule]] = None, trusted_proxies: str = TRUSTED_PROXIES):
+        self.app = app
+        self.store = store or create_rate_limit_store()
+        self.limit = limit
+        self.period = period
+        self.rules = DEFAULT_ROUTE_RULES if rules is None else rules
+        self.trusted_proxies = parse_networks(trusted_proxies)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "OPTIONS" or scope["path"].startswith(EXEMPT_PATHS):
+            await self.app(scope, receive, send)
+            return
+
+        client = self._client_id(scope)
+        rule = self._match(scope["method"], scope["path"])
+        cost = rule.cost if rule else 1.0
+
+        # 路由预算和客户端总预算同时检查，任一拒绝时两者都不计费
+        hits = [(f"client:{client}", self.limit, cost)]
+        if rule and rule.limit:
+            hits.insert(0, (f"route:{rule.name}:{client}", rule.limit, 1))
+        result = await self.store.hit_all(hits, self.period)
+
+        if not result.allowed:
+            rate_limited_requests.inc(route=rule.name if rule else "default")
+            await self._reject(send, result)
+            return
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.extend(self._headers(result))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+    def _match(self, method: str, path: str) -> Optional[RouteRule]:
+        for rule in self.rules:
+            if rule.method == method and rule.pattern.match(path):
+                return rule
+        return None
+
+    def _trusted(self, address: str) -> bool:
+        try:
+            ip = ipaddress.ip_address(address)
+        except ValueError:
+            return False
+        return any(ip in network for network in self.trusted_proxies)
+
+    def _client_id(self, scope) -> str:
+        """识别客户端：连接来自受信任的代理时使用其传入的真实 IP，否则使用连接地址
+
+        X-Forwarded-For 从右向左跳过受信任的代理，取第一个不受信任的地址；最左侧的值由客户端任意填写，不可信
+        """
+        client = scope.get("client")
+        peer = client[0] if client else "unknown"
+        if not self._trusted(peer):
+            return peer
+        headers = dict(scope.get("headers") or [])
+        real_ip = headers.get(b"x-real-ip")
+        if real_ip:
+            return real_ip.decode().strip()
+        forwarded = headers.get(b"x-forwarded-for")
+        if forwarded:
+            for address in reversed([a.strip() for a in forwarded.decode().split(",") if a.strip()]):
+                if not self._trusted(address):
+                    return address
+        return peer
+
+    @staticmethod
+    def _headers(result: RateLimitResult) -> List[Tuple[bytes, bytes]]:
+        return [
+            (b"x-ratelimit-limit", str(result.limit).encode()),
+            (b"x-ratelimit-remaining", str(result.remaining).encode()),
+            (b"x-ratelimit-reset", str(math.ceil(result.reset_after)).encode()),
+        ]
+
+    async def _reject(self, send, result: RateLimitResult):
+        body = json.dumps({"detail": "Too Many Requests"}).encode()
+        headers = [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(result.retry_after))).encode()),
+        ] + self._headers(result)
+        await send({"type": "http.response.start", "status": 429, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
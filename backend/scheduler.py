@@ -0,0 +1,379 @@
+"""
+后台任务调度器
+由 FastAPI lifespan 启动，周期性执行余额刷新、策略状态对账和成交汇总等任务
+多个 uvicorn worker 之间通过 Redis 或文件锁选举唯一的 leader，只有 leader 执行任务
+"""
+
+import asyncio
+import fcntl
+import logging
+import os
+import random
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import date
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 调度器配置
+SCHEDULER_ENABLED = os.getenv('SCHEDULER_ENABLED', 'true').lower() in ['true', '1', 'yes', 'on']
+SCHEDULER_LOCK_FILE = os.getenv('SCHEDULER_LOCK_FILE', './data/scheduler.lock')
+SCHEDULER_LEADER_TTL = float(os.getenv('SCHEDULER_LEADER_TTL', '30'))
+REDIS_URL = os.getenv('REDIS_URL')
+
+BALANCE_REFRESH_INTERVAL = float(os.getenv('BALANCE_REFRESH_INTERVAL', '60'))
+BALANCE_REFRESH_CONCURRENCY = int(os.getenv('BALANCE_REFRESH_CONCURRENCY', '5'))  # 同时刷新的账户数
+STRATEGY_RECONCILE_INTERVAL = float(os.getenv('STRATEGY_RECONCILE_INTERVAL', '30'))
+TRADE_ROLLUP_INTERVAL = float(os.getenv('TRADE_ROLLUP_INTERVAL', '300'))
+INSTRUMENT_REFRESH_INTERVAL = float(os.getenv('INSTRUMENT_REFRESH_INTERVAL', '3600'))
+FILL_PULL_INTERVAL = float(os.getenv('FILL_PULL_INTERVAL', '5'))
+HUMMINGBOT_HEALTH_INTERVAL = float(os.getenv('HUMMINGBOT_HEALTH_INTERVAL', '5'))
+STRATEGY_COMMAND_RECOVER_INTERVAL = float(os.getenv('STRATEGY_COMMAND_RECOVER_INTERVAL', '10'))
+
+
+class LeaderLock:
+    """leader 锁基类"""
+
+    async def acquire(self) -> bool:
+        """尝试获取（或续期）leader 身份，返回当前是否为 leader"""
+        raise NotImplementedError
+
+    async def release(self):
+        """释放 leader 身份"""
+        raise NotImplementedError
+
+
+class FileLeaderLock(LeaderLock):
+    """基于 flock 的文件锁，适用于同一主机上的多个 worker
+
+    锁随文件描述符存在，进程退出时由内核自动释放，不会残留死锁
+    """
+
+    def __init__(self, path: str = SCHEDULER_LOCK_FILE):
+        self.path = path
+        self._fd: Optional[int] = None
+
+    async def acquire(self) -> bool:
+        if self._fd is not None:
+            return True
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._fd = fd
+        return True
+
+    async def release(self):
+        if self._fd is not None:
+            try:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            finally:
+                os.close(self._fd)
+                self._fd = None
+
+
+class RedisLeaderLock(LeaderLock):
+    """基于 Redis SET NX PX 的租约锁，适用于跨主机部署
+
+    leader 需要在 TTL 内续期，进程崩溃后租约过期，其他 worker 接管
+    """
+
+    _RENEW_SCRIPT = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('pexpire', KEYS[1], ARGV[2])
+    end
+    return 0
+    """
+
+    _RELEASE_SCRIPT = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('del', KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(self, redis_client, key: str = "arbitrage:scheduler:leader", ttl: float = SCHEDULER_LEADER_TTL):
+        self.redis = redis_client
+        self.key = key
+        self.ttl_ms = int(ttl * 1000)
+        self.token = f"{os.getpid()}:{uuid.uuid4().hex}"
+        self._held = False
+
+    async def acquire(self) -> bool:
+        try:
+            if self._held:
+                renewed = await self.redis.eval(self._RENEW_SCRIPT, 1, self.key, self.token, self.ttl_ms)
+                self._held = bool(renewed)
+            else:
+                self._held = bool(await self.redis.set(self.key, self.token, nx=True, px=self.ttl_ms))
+        except Exception as e:
+            logger.error(f"Redis leader 锁操作失败: {e}")
+            self._held = False
+        return self._held
+
+    async def release(self):
+        if self._held:
+            try:
+                await self.redis.eval(self._RELEASE_SCRIPT, 1, self.key, self.token)
+            except Exception as e:
+                logger.warning(f"释放 Redis leader 锁失败: {e}")
+            self._held = False
+
+
+def create_leader_lock() -> LeaderLock:
+    """根据配置创建 leader 锁：配置了 REDIS_URL 且安装了 redis 时使用 Redis，否则使用文件锁"""
+    if REDIS_URL:
+        try:
+            import redis.asyncio as aioredis
+            return RedisLeaderLock(aioredis.from_url(REDIS_URL))
+        except ImportError:
+            logger.warning("未安装 redis 客户端，调度器回退到文件锁")
+    return FileLeaderLock()
+
+
+@dataclass
+class PeriodicJob:
+    """周期任务定义"""
+    name: str
+    func: Callable[[], Awaitable[None]]
+    interval: float  # 执行间隔（秒）
+    jitter: float = 0.1  # 随机抖动比例，避免多个任务同时触发
+    timeout: Optional[float] = None  # 单次执行超时（秒）
+    running: bool = False
+    last_run: Optional[float] = None
+    last_duration: Optional[float] = None
+    last_error: Optional[str] = None
+    run_count: int = 0
+    skipped_count: int = 0
+
+    def next_delay(self) -> float:
+        """计算下一次执行前的等待时间"""
+        spread = self.interval * self.jitter
+        return max(0.0, self.interval + random.uniform(-spread, spread))
+
+
+class BackgroundScheduler:
+    """后台任务调度器"""
+
+    def __init__(self, leader_lock: Optional[LeaderLock] = None, leader_check_interval: Optional[float] = None):
+        self.leader_lock = leader_lock or create_leader_lock()
+        self.leader_check_interval = leader_check_interval or max(1.0, SCHEDULER_LEADER_TTL / 3)
+        self.jobs: Dict[str, PeriodicJob] = {}
+        self.is_leader = False
+        self._tasks: List[asyncio.Task] = []
+        self._job_tasks: Dict[str, asyncio.Task] = {}
+        self._stopping = False
+
+    def add_job(self, name: str, func: Callable[[], Awaitable[None]], interval: float,
+                jitter: float = 0.1, timeout: Optional[float] = None) -> PeriodicJob:
+        """注册周期任务"""
+        job = PeriodicJob(name=name, func=func, interval=interval, jitter=jitter, timeout=timeout)
+        self.jobs[name] = job
+        return job
+
+    async def start(self):
+        """启动 leader 选举循环和所有任务循环"""
+        self._stopping = False
+        await self._elect()
+        self._tasks.append(asyncio.create_task(self._leader_loop()))
+        for job in self.jobs.values():
+            self._tasks.append(asyncio.create_task(self._job_loop(job)))
+        logger.info(f"后台调度器已启动，注册任务 {len(self.jobs)} 个，leader={self.is_leader}")
+
+    async def stop(self):
+        """停止调度器，等待正在执行的任务结束并释放 leader 锁"""
+        self._stopping = True
+        for task in self._tasks:
+            task.cancel()
+        running = list(self._job_tasks.values())
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*self._tasks, *running, return_exceptions=True)
+        self._tasks.clear()
+        self._job_tasks.clear()
+        await self.leader_lock.release()
+        self.is_leader = False
+        logger.info("后台调度器已停止")
+
+    async def _elect(self):
+        was_leader = self.is_leader
+        self.is_leader = await self.leader_lock.acquire()
+        if self.is_leader != was_leader:
+            logger.info(f"进程 {os.getpid()} {'成为' if self.is_leader else '失去'}调度器 leader")
+
+    async def _leader_loop(self):
+        while not self._stopping:
+            await asyncio.sleep(self.leader_check_interval)
+            try:
+                await self._elect()
+            except Exception as e:
+                logger.error(f"leader 选举失败: {e}")
+                self.is_leader = False
+
+    async def _job_loop(self, job: PeriodicJob):
+        # 首次执行也加入随机延迟，避免所有 worker 启动时同时打到交易所
+        await asyncio.sleep(random.uniform(0, job.interval * job.jitter))
+        while not self._stopping:
+            if self.is_leader:
+                self.trigger(job.name)
+            await asyncio.sleep(job.next_delay())
+
+    def trigger(self, name: str) -> bool:
+        """立即触发一次任务；上一次执行尚未结束时跳过，返回是否真正触发"""
+        job = self.jobs[name]
+        if job.running:
+            job.skipped_count += 1
+            logger.warning(f"任务 {name} 上一次执行尚未结束，跳过本次调度")
+            return False
+        job.running = True
+        self._job_tasks[name] = asyncio.create_task(self._run_job(job))
+        return True
+
+    async def _run_job(self, job: PeriodicJob):
+        started = time.monotonic()
+        try:
+            if job.timeout:
+                await asyncio.wait_for(job.func(), timeout=job.timeout)
+            else:
+                await job.func()
+            job.last_error = None
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            job.last_error = str(e)
+            logger.error(f"任务 {job.name} 执行失败: {e}")
+        finally:
+            job.running = False
+            job.run_count += 1
+            job.last_run = time.time()
+            job.last_duration = time.monotonic() - started
+            self._job_tasks.pop(job.name, None)
+
+    def get_status(self) -> Dict:
+        """获取调度器状态"""
+        return {
+            "pid": os.getpid(),
+            "is_leader": self.is_leader,
+            "jobs": {
+                name: {
+                    "interval": job.interval,
+                    "running": job.running,
+                    "last_run": job.last_run,
+                    "last_duration": job.last_duration,
+                    "last_error": job.last_error,
+                    "run_count": job.run_count,
+                    "skipped_count": job.skipped_count,
+                }
+                for name, job in self.jobs.items()
+            }
+        }
+
+
+# 周期任务实现
+async def refresh_account_balances():
+    """刷新所有激活账户的实时余额；每个账户使用独立会话，并发数受 BALANCE_REFRESH_CONCURRENCY 限制"""
+    import crud
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        account_ids = [account.id for account in crud.get_accounts(db, limit=10000)]
+    finally:
+        db.close()
+
+    semaphore = asyncio.Semaphore(BALANCE_REFRESH_CONCURRENCY)
+
+    async def refresh(account_id: int):
+        async with semaphore:
+            account_db = SessionLocal()
+            try:
+                return await crud.update_account_balance(account_db, account_id)
+            finally:
+                account_db.close()
+
+    results = await asyncio.gather(*[refresh(account_id) for account_id in account_ids], return_exceptions=True)
+    updated = len([r for r in results if r is not None and not isinstance(r, Exception)])
+    logger.info(f"更新了 {updated}/{len(account_ids)} 个账户的余额")
+
+
+async def reconcile_strategy_status():
+    """将 Hummingbot 上的实际策略状态同步回执行注册表和数据库（一次批量查询）"""
+    from strategy_registry import strategy_registry
+
+    await strategy_registry.reconcile()
+
+
+async def handle_hummingbot_failures():
+    """对连续健康检查失败的 Hummingbot 实例执行故障转移，对恢复的实例清理已迁走的策略"""
+    from hummingbot_integration import strategy_executor
+
+    await strategy_executor.api_client.handle_failures()
+
+
+async def recover_strategy_jobs():
+    """继续执行已退出或崩溃的 worker 遗留的策略命令任务，中断的任务标记为失败"""
+    from strategy_jobs import strategy_command_queue
+
+    await strategy_command_queue.recover()
+
+
+async def rollup_trades():
+    """汇总当日成交记录"""
+    import crud
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        rows = crud.rollup_trades(db, date.today())
+        logger.info(f"成交汇总完成，共 {len(rows)} 条汇总记录")
+    finally:
+        db.close()
+
+
+async def pull_fills():
+    """按游标从各 Hummingbot 实例拉取成交，补齐推送丢失的部分"""
+    from fill_ingest import fill_ingestor
+
+    pulled = await fill_ingestor.pull_all()
+    if any(pulled.values()):
+        logger.info(f"拉取成交完成: {pulled}")
+
+
+async def refresh_instruments():
+    """刷新过期的交易对元数据并写入缓存文件；启动时若缓存文件仍新鲜则不访问交易所"""
+    from instruments import instrument_cache
+
+    await instrument_cache.refresh_stale()
+
+
+def create_default_scheduler() -> BackgroundScheduler:
+    """创建注册了默认任务的调度器"""
+    scheduler = BackgroundScheduler()
+    scheduler.add_job("balance_refresh", refresh_account_balances, BALANCE_REFRESH_INTERVAL,
+                      timeout=BALANCE_REFRESH_INTERVAL * 2)
+    scheduler.add_job("strategy_reconcile", reconcile_strategy_status, STRATEGY_RECONCILE_INTERVAL,
+                      timeout=STRATEGY_RECONCILE_INTERVAL * 2)
+    scheduler.add_job("hummingbot_failover", handle_hummingbot_failures, HUMMINGBOT_HEALTH_INTERVAL,
+                      timeout=HUMMINGBOT_HEALTH_INTERVAL * 12)
+    scheduler.add_job("strategy_job_recovery", recover_strategy_jobs, STRATEGY_COMMAND_RECOVER_INTERVAL,
+                      timeout=STRATEGY_COMMAND_RECOVER_INTERVAL * 2)
+    scheduler.add_job("trade_rollup", rollup_trades, TRADE_ROLLUP_INTERVAL,
+                      timeout=TRADE_ROLLUP_INTERVAL)
+    scheduler.add_job("fill_pull", pull_fills, FILL_PULL_INTERVAL,
+                      timeout=FILL_PULL_INTERVAL * 6)
+    # 以刷新周期的 1/4 检查是否过期，过期后最多延迟 1/4 周期刷新
+    scheduler.add_job("instrument_refresh", refresh_instruments, INSTRUMENT_REFRESH_INTERVAL / 4,
+                      timeout=120)
+    return scheduler
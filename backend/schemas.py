@@ -1,6 +1,6 @@
 from pydantic import BaseModel
-from typing import Optional, Dict, Any
-from datetime import datetime
+from typing import Optional, Dict, Any, List
+from datetime import datetime, date
 
 # Strategy schemas
 class StrategyBase(BaseModel):
@@ -11,6 +11,20 @@ class StrategyBase(BaseModel):
 class StrategyCreate(StrategyBase):
     pass
 
+class StrategyGridAxis(BaseModel):
+    values: Optional[List[Any]] = None  # 显式取值
+    start: Optional[float] = None  # 或按 [start, stop] 闭区间和步长展开
+    stop: Optional[float] = None
+    step: Optional[float] = None
+
+class StrategyGridCreate(BaseModel):
+    name: str  # 生成的策略命名为 "{name} #{网格序号}"
+    type: str
+    params: Dict[str, Any]  # 基础配置
+    grid: Dict[str, StrategyGridAxis]  # 参数名 -> 取值范围
+    skip_invalid: bool = False  # 为 True 时只创建有效的候选，否则有任一无效候选即不创建
+    dry_run: bool = False  # 只验证，返回候选预览
+
 class StrategyUpdate(BaseModel):
     name: Optional[str] = None
     type: Optional[str] = None
@@ -25,6 +39,56 @@ class Strategy(StrategyBase):
     class Config:
         from_attributes = True
 
+# Hummingbot bulk control schemas
+class BulkStrategyStartItem(BaseModel):
+    id: str
+    type: str
+    params: Dict[str, Any] = {}
+
+class BulkStrategyStart(BaseModel):
+    strategies: List[BulkStrategyStartItem]
+
+class BulkStrategyStop(BaseModel):
+    ids: List[str]
+
+class StrategyJob(BaseModel):
+    id: str
+    strategy_id: str
+    action: str  # start, stop, restart
+    type: Optional[str] = None
+    params: Optional[Dict[str, Any]] = None
+    status: str  # queued, running, succeeded, failed
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class HummingbotEvent(BaseModel):
+    type: str = "fill"  # fill, order_created, order_cancelled, order_failed, order_completed
+    strategy_id: Optional[str] = None  # Hummingbot 策略 ID
+    exchange: str
+    symbol: str
+    order_id: str  # 交易所订单号
+    trade_id: Optional[str] = None  # 成交号，区分同一订单的多笔部分成交
+    side: Optional[str] = None  # buy, sell
+    price: Optional[float] = None
+    amount: Optional[float] = None
+    fee: float = 0.0
+    timestamp: Optional[float] = None  # 事件时间（毫秒）
+    seq: Optional[int] = None  # 拉取接口中的事件序号
+
+class HummingbotEventBatch(BaseModel):
+    events: List[HummingbotEvent]
+
+class HummingbotEventStreamMessage(HummingbotEventBatch):
+    id: Optional[Any] = None  # 客户端消息 ID，原样带回确认中
+
+class HummingbotInstanceCreate(BaseModel):
+    url: str  # Hummingbot API 地址，如 http://hummingbot-2:15888
+
 # Account schemas
 class AccountBase(BaseModel):
     name: str
@@ -79,6 +143,20 @@ class Trade(TradeBase):
     class Config:
         from_attributes = True
 
+# Trade rollup schemas
+class TradeRollup(BaseModel):
+    day: date
+    strategy_id: Optional[int] = None
+    trade_count: int
+    buy_amount: float
+    sell_amount: float
+    notional: float
+    fee: float
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
 # Log schemas
 class LogBase(BaseModel):
     level: str
@@ -0,0 +1,61 @@
+"""
+Single-flight 请求合并
+相同 key 的并发调用共享同一个进行中的 Future，只有第一个调用者真正执行，
+其余调用者等待并获得同一结果（或同一异常）
+"""
+
+import asyncio
+import functools
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+singleflight_calls = registry.counter(
+    "singleflight_calls_total", "进入 single-flight 的调用次数"
+)
+singleflight_coalesced = registry.counter(
+    "singleflight_coalesced_total", "被合并到已有进行中调用的调用次数"
+)
+singleflight_inflight = registry.gauge(
+    "singleflight_inflight", "当前进行中的 single-flight 调用数"
+)
+
+
+class SingleFlight:
+    """按 key 合并并发调用"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """执行 func，若相同 key 已有调用在进行中则直接等待其结果"""
+        singleflight_calls.inc(flight=self.name)
+
+        future = self._inflight.get(key)
+        if future is not None:
+            singleflight_coalesced.inc(flight=self.name)
+            # shield：单个等待者被取消时不影响共享的调用
+            return await asyncio.shield(future)
+
+        future = asyncio.ensure_future(func())
+        self._inflight[key] = future
+        singleflight_inflight.inc(flight=self.name)
+        future.add_done_callback(functools.partial(self._on_done, key))
+        return await asyncio.shield(future)
+
+    def _on_done(self, key: Hashable, future: asyncio.Future):
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        singleflight_inflight.dec(flight=self.name)
+        # 所有等待者都已取消时也要取走异常，避免 "exception was never retrieved"
+        if not future.cancelled() and future.exception() is not None:
+            logger.debug(f"single-flight {self.name}[{key}] 执行失败: {future.exception()}")
+
+    def inflight(self, key: Hashable) -> Optional[asyncio.Future]:
+        """获取指定 key 进行中的调用"""
+        return self._inflight.get(key)
+
@@ -0,0 +1,134 @@
+"""
+基于订单簿深度的可成交价格与滑点计算
+对订单簿一侧的前 N 档计算累计数量和累计成交额（cumsum），给定下单数量时用 searchsorted
+定位成交落在第几档，一次向量化得到所有数量的成交均价（VWAP）、最差成交价和相对最优价的滑点（bp）；
+同一档位快照在订单簿变化前会被缓存复用
+"""
+
+import logging
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from exchange_connector import normalize_symbol
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+SLIPPAGE_MAX_LEVELS = int(os.getenv('SLIPPAGE_MAX_LEVELS', '500'))
+
+slippage_profile_builds = registry.counter("slippage_profile_builds_total", "重新生成订单簿累计深度的次数")
+
+
+class DepthProfile:
+    """订单簿一侧按价格优先顺序排列的档位及其累计数量、累计成交额"""
+
+    def __init__(self, prices: np.ndarray, sizes: np.ndarray, side: str):
+        self.side = side  # buy：吃卖盘；sell：吃买盘
+        self.prices = prices
+        self.cum_qty = np.cumsum(sizes)
+        self.cum_notional = np.cumsum(prices * sizes)
+
+    @classmethod
+    def from_levels(cls, levels: Sequence[Sequence[float]], side: str) -> "DepthProfile":
+        levels = np.asarray(levels, dtype=float).reshape(-1, 2)
+        return cls(levels[:, 0], levels[:, 1], side)
+
+    def estimate(self, amounts) -> Dict[str, np.ndarray]:
+        """计算各下单数量（基础币种）的成交情况，返回与 amounts 等长的数组
+
+        数量超过可见深度时 filled 为全部深度、fully_filled 为 False
+        """
+        amounts = np.atleast_1d(np.asarray(amounts, dtype=float))
+        n = len(self.prices)
+        if n == 0:
+            nan = np.full(len(amounts), np.nan)
+            return {"amount": amounts, "filled": np.zeros(len(amounts)), "fully_filled": np.zeros(len(amounts), dtype=bool),
+                    "vwap": nan, "worst_price": nan, "slippage_bps": nan, "levels": np.zeros(len(amounts), dtype=np.int64)}
+
+        # idx：成交完成时所在档位（该档之前的档位全部吃完）
+        idx = np.searchsorted(self.cum_qty, amounts, side="left")
+        fully_filled = idx < n
+        last = np.minimum(idx, n - 1)
+        prev = last - 1
+        prev_qty = np.where(prev >= 0, self.cum_qty[prev], 0.0)
+        prev_notional = np.where(prev >= 0, self.cum_notional[prev], 0.0)
+
+        filled = np.where(fully_filled, amounts, self.cum_qty[-1])
+        notional = np.where(fully_filled, prev_notional + (amounts - prev_qty) * self.prices[last], self.cum_notional[-1])
+        with np.errstate(invalid="ignore", divide="ignore"):
+            vwap = notional / filled
+        best = self.prices[0]
+        # 买入时均价高于卖一为正滑点，卖出时均价低于买一为正滑点
+        sign = 1.0 if self.side == "buy" else -1.0
+        return {
+            "amount": amounts,
+            "filled": filled,
+            "fully_filled": fully_filled,
+            "vwap": vwap,
+            "worst_price": self.prices[last],
+            "slippage_bps": sign * (vwap / best - 1.0) * 1e4,
+            "levels": last + 1,
+        }
+
+
+class SlippageCalculator:
+    """按交易所、交易对、方向缓存订单簿累计深度，订单簿变化后首次查询时重新生成"""
+
+    def __init__(self, max_levels: int = SLIPPAGE_MAX_LEVELS):
+        self.max_levels = max_levels
+        self._profiles: Dict[Tuple[str, str, str], Tuple[Tuple, DepthProfile]] = {}
+
+    def profile(self, exchange: str, symbol: str, side: str) -> Optional[DepthProfile]:
+        """订单簿一侧的累计深度；订单簿未订阅或未同步时返回 None"""
+        if side not in ("buy", "sell"):
+            raise ValueError(f"不支持的方向: {side}")
+        from orderbook import order_book_service
+
+        exchange, symbol = exchange.lower(), normalize_symbol(symbol)
+        book = order_book_service.get_book(exchange, symbol)
+        if book is None or not book.synced:
+            return None
+        key = (exchange, symbol, side)
+        version = (book.sequence, book.timestamp)
+        cached = self._profiles.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        levels = (book.asks if side == "buy" else book.bids).top(self.max_levels)
+        profile = DepthProfile.from_levels(levels, side)
+        self._profiles[key] = (version, profile)
+        slippage_profile_builds.inc(exchange=exchange)
+        return profile
+
+    def estimate(self, exchange: str, symbol: str, side: str, amounts) -> Optional[Dict[str, np.ndarray]]:
+        profile = self.profile(exchange, symbol, side)
+        return profile.estimate(amounts) if profile is not None else None
+
+    def estimate_many(self, queries: Sequence[Tuple[str, str, str]], amounts) -> List[Optional[Dict[str, np.ndarray]]]:
+        """批量计算：每个 (交易所, 交易对, 方向) 对同一组数量一次向量化计算"""
+        return [self.estimate(exchange, symbol, side, amounts) for exchange, symbol, side in queries]
+
+    @staticmethod
+    def to_rows(exchange: str, symbol: str, side: str, result: Dict[str, np.ndarray]) -> List[Dict]:
+        """把计算结果转为接口返回的逐条记录"""
+        def number(value):
+            value = float(value)
+            return value if np.isfinite(value) else None
+
+        return [{
+            "exchange": exchange,
+            "symbol": symbol,
+            "side": side,
+            "amount": float(result["amount"][k]),
+            "filled": float(result["filled"][k]),
+            "fully_filled": bool(result["fully_filled"][k]),
+            "vwap": number(result["vwap"][k]),
+            "worst_price": number(result["worst_price"][k]),
+            "slippage_bps": number(result["slippage_bps"][k]),
+            "levels": int(result["levels"][k]),
+        } for k in range(len(result["amount"]))]
+
+
+# 全局滑点计算器实例
+slippage_calculator = SlippageCalculator()
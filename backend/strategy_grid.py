@@ -0,0 +1,186 @@
+"""
+策略参数网格
+以基础配置加若干参数的取值范围展开笛卡尔积，批量生成只在价差、数量、风险系数等参数上不同的策略。
+模式中的约束都是单参数约束（范围、可选值），因此每个参数只需对自己的取值检查一次，
+得到的有效掩码按网格维度广播相与即为全部候选的验证结果；交易规则检查（order_amount 与交易所、交易对）
+只对相关参数取值的组合各做一次。验证不逐个构造候选配置，10 万个候选在毫秒级完成
+"""
+
+import itertools
+import logging
+import numbers
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from hummingbot_integration import EXCHANGE_PARAM_KEYS, ParameterValidator, _compile_parameter, schema_registry
+
+logger = logging.getLogger(__name__)
+
+STRATEGY_GRID_MAX_CANDIDATES = int(os.getenv('STRATEGY_GRID_MAX_CANDIDATES', '100000'))  # 单次展开的候选上限
+STRATEGY_GRID_MAX_ERRORS = 50  # 返回的错误信息条数上限
+STRATEGY_GRID_PREVIEW = 20  # 只验证时返回的候选预览条数
+
+# 参与交易规则检查的参数
+INSTRUMENT_PARAM_KEYS = (*EXCHANGE_PARAM_KEYS, "market", "order_amount")
+
+
+def expand_range(start: float, stop: float, step: float) -> List[float]:
+    """展开 [start, stop] 闭区间的等差取值，消除浮点累加误差"""
+    if step <= 0:
+        raise ValueError("step must be > 0")
+    if stop < start:
+        raise ValueError("stop must be >= start")
+    count = int(np.floor((stop - start) / step + 1e-9)) + 1
+    return np.round(start + step * np.arange(count), 10).tolist()
+
+
+def axis_values(values: Optional[List[Any]] = None, start: Optional[float] = None, stop: Optional[float] = None,
+                step: Optional[float] = None) -> List[Any]:
+    """网格参数的取值：显式取值，或按起止和步长展开"""
+    if values is not None:
+        return list(values)
+    if start is None or stop is None or step is None:
+        raise ValueError("grid axis requires either values or start, stop and step")
+    return expand_range(start, stop, step)
+
+
+@dataclass
+class GridValidation:
+    """网格验证结果：valid 为按网格维度排列的有效掩码，候选按 C 顺序编号"""
+    base: Dict[str, Any]  # 不在网格中的参数（已验证和转换）
+    axes: List[Tuple[str, List[Any]]]  # 网格参数及其取值（已转换）
+    valid: np.ndarray
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def total(self) -> int:
+        return int(self.valid.size)
+
+    @property
+    def valid_count(self) -> int:
+        return int(np.count_nonzero(self.valid))
+
+    def candidates(self, limit: Optional[int] = None) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """有效候选的 (网格序号, 参数)"""
+        indices = np.flatnonzero(self.valid)
+        if limit is not None:
+            indices = indices[:limit]
+        positions = np.unravel_index(indices, self.valid.shape)
+        columns = [(name, [values[i] for i in position.tolist()]) for (name, values), position in zip(self.axes, positions)]
+        for row, index in enumerate(indices.tolist()):
+            params = dict(self.base)
+            for name, values in columns:
+                if values[row] is not None:  # 与单个配置验证一致，取值为空的可选参数不出现在参数中
+                    params[name] = values[row]
+            yield index, params
+
+
+def _check_axis(param_def, values: List[Any]) -> Tuple[List[Any], np.ndarray, List[str]]:
+    """检查一个参数的全部取值，返回转换后的取值、有效掩码和错误信息
+
+    取值全是数字的数字参数向量化检查；其他情况（含空值、字符串）逐个使用与单个配置验证相同的检查函数，
+    保证每个候选的结果与单独验证一致
+    """
+    if param_def.type == "number" and all(isinstance(value, numbers.Real) for value in values):
+        array = np.asarray(values, dtype=float)
+        mask = np.isfinite(array)
+        if param_def.min_value is not None:
+            mask &= array >= param_def.min_value
+        if param_def.max_value is not None:
+            mask &= array <= param_def.max_value
+        errors = [
+            f"Parameter '{param_def.name}' = {value} is out of range [{param_def.min_value}, {param_def.max_value}]"
+            for value in array[~mask][:STRATEGY_GRID_MAX_ERRORS].tolist()
+        ]
+        return array.tolist(), mask, errors
+
+    check = _compile_parameter(param_def)
+    converted, mask, errors = [], np.ones(len(values), dtype=bool), []
+    for i, value in enumerate(values):
+        if value is None:
+            converted.append(None)
+            if param_def.required:
+                mask[i] = False
+                errors.append(f"Parameter '{param_def.name}' is required")
+            continue
+        value_errors = []
+        try:
+            converted.append(check(value, value_errors))
+        except (ValueError, TypeError) as e:
+            converted.append(value)
+            value_errors.append(f"Invalid value for parameter '{param_def.name}': {e}")
+        if value_errors:
+            mask[i] = False
+            errors.extend(value_errors)
+    return converted, mask, errors
+
+
+def validate_grid(strategy_type: str, base_params: Dict[str, Any], grid: Dict[str, List[Any]],
+                  max_candidates: int = STRATEGY_GRID_MAX_CANDIDATES) -> GridValidation:
+    """验证基础配置与参数网格的全部组合
+
+    网格参数不在模式中、取值为空或候选数超过上限时抛出 ValueError；
+    候选违反约束（包括无法转换的取值）不抛出异常，通过结果中的掩码和错误信息体现，与逐个候选单独验证的结果一致
+    """
+    parameters = schema_registry.get(strategy_type).parameters
+    unknown = [name for name in grid if name not in parameters]
+    if unknown:
+        raise ValueError(f"Unknown grid parameters for {strategy_type}: {unknown}")
+    empty = [name for name, values in grid.items() if not values]
+    if empty:
+        raise ValueError(f"Grid parameters without values: {empty}")
+    total = int(np.prod([len(values) for values in grid.values()], dtype=np.int64)) if grid else 1
+    if total > max_candidates:
+        raise ValueError(f"Grid expands to {total} candidates, exceeding the limit of {max_candidates}")
+
+    # 不在网格中的参数是所有候选共有的，按单个配置验证一次
+    axis_names = [name for name in parameters if name in grid]
+    base_schema = {name: param for name, param in parameters.items() if name not in grid}
+    base_input = {name: value for name, value in base_params.items() if name not in grid}
+    base, errors = {}, []
+    base_valid = True
+    for name, param_def in base_schema.items():
+        value = base_input.get(name, param_def.default)
+        if value is None:
+            if param_def.required:
+                base_valid = False
+                errors.append(f"Parameter '{name}' is required")
+            continue
+        converted, mask, axis_errors = _check_axis(param_def, [value])
+        base[name] = converted[0]
+        base_valid &= bool(mask[0])
+        errors.extend(axis_errors)
+
+    axes, shape = [], tuple(len(grid[name]) for name in axis_names)
+    valid = np.full(shape, base_valid, dtype=bool)
+    for dim, name in enumerate(axis_names):
+        converted, mask, axis_errors = _check_axis(parameters[name], list(grid[name]))
+        axes.append((name, converted))
+        errors.extend(axis_errors)
+        valid &= mask.reshape([-1 if d == dim else 1 for d in range(len(shape))])
+
+    if base_valid:
+        valid &= _instrument_mask(base, axes, shape, errors)
+    return GridValidation(base=base, axes=axes, valid=valid,
+                          errors=list(dict.fromkeys(errors))[:STRATEGY_GRID_MAX_ERRORS])
+
+
+def _instrument_mask(base: Dict[str, Any], axes: List[Tuple[str, List[Any]]], shape: Tuple[int, ...],
+                     errors: List[str]) -> np.ndarray:
+    """交易规则检查：只对交易所、交易对和下单数量的取值组合逐个检查，再广播到整个网格"""
+    dims = [dim for dim, (name, _) in enumerate(axes) if name in INSTRUMENT_PARAM_KEYS]
+    sub_shape = tuple(shape[dim] for dim in dims)
+    mask = np.ones(sub_shape, dtype=bool)
+    for position in itertools.product(*[range(size) for size in sub_shape]):
+        params = {key: base[key] for key in INSTRUMENT_PARAM_KEYS if key in base}
+        for dim, i in zip(dims, position):
+            name, values = axes[dim]
+            params[name] = values[i]
+        rule_errors = ParameterValidator.validate_instrument_rules(params)
+        if rule_errors:
+            mask[position] = False
+            errors.extend(rule_errors)
+    return mask.reshape([shape[dim] if dim in dims else 1 for dim in range(len(shape))])
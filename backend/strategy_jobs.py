@@ -0,0 +1,358 @@
+"""
+策略命令队列
+启动、停止、重启策略作为任务提交，接口立即返回 202 和任务 ID，由后台 worker 调用 Hummingbot 执行，
+请求延迟不再取决于 Hummingbot 的响应速度。任务记录保存在数据库中，所有 worker 共享：
+客户端通过 Idempotency-Key 重复提交时返回同一任务，没有幂等键时与同一策略排队中的相同命令合并；
+同一策略的任务按提交顺序逐个执行，不同策略的任务并发执行。任务状态变化通过 pubsub 推送（WebSocket /ws/strategy-jobs）。
+任务由接收请求的进程领取执行：领取前获取该策略在数据库中的租约，持有租约的 worker 按提交顺序执行该策略所有
+排队的任务（包括其他 worker 提交的），执行期间定期续期，因此多个 worker 不会并发执行同一策略的命令。
+进程关闭时释放租约，中断的任务标记为失败；进程崩溃后租约过期，调度器 leader 定期领取没有有效租约的策略，
+把中断的任务标记为失败并继续执行排队的任务，策略实际状态以注册表对账为准
+"""
+
+import asyncio
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from metrics import registry
+from pubsub import broadcaster
+
+logger = logging.getLogger(__name__)
+
+STRATEGY_COMMAND_WORKERS = int(os.getenv('STRATEGY_COMMAND_WORKERS', '8'))  # 并发执行任务的 worker 数
+STRATEGY_COMMAND_MAX_PENDING = int(os.getenv('STRATEGY_COMMAND_MAX_PENDING', '10000'))  # 所有 worker 排队任务总数上限
+STRATEGY_COMMAND_LEASE_TTL = float(os.getenv('STRATEGY_COMMAND_LEASE_TTL', '30'))  # 策略任务租约有效期（秒）
+
+STRATEGY_JOBS_TOPIC = "strategy_jobs"
+JOB_ACTIONS = ("start", "stop", "restart")
+ORPHANED_ERROR = "执行任务的进程中断，策略状态以对账结果为准"
+
+jobs_submitted = registry.counter("strategy_jobs_submitted_total", "提交的策略命令任务数")
+jobs_deduplicated = registry.counter("strategy_jobs_deduplicated_total", "重复提交而返回已有任务的次数")
+jobs_finished = registry.counter("strategy_jobs_finished_total", "执行完成的策略命令任务数")
+
+
+class CommandQueueFull(RuntimeError):
+    """排队任务已达上限"""
+
+
+class IdempotencyKeyConflict(Exception):
+    """幂等键已用于其他策略或命令"""
+
+
+def _to_dict(job) -> Dict[str, Any]:
+    import schemas
+
+    return schemas.StrategyJob.model_validate(job).model_dump(mode="json")
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class StrategyCommandQueue:
+    """策略命令队列：任务保存在数据库中，每个策略的任务由持有该策略租约的 worker 按提交顺序执行，
+    有任务的策略轮流交给 worker 执行"""
+
+    def __init__(self, workers: int = STRATEGY_COMMAND_WORKERS, max_pending: int = STRATEGY_COMMAND_MAX_PENDING,
+                 executor=None, session_factory=None, lease_ttl: float = STRATEGY_COMMAND_LEASE_TTL):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.lease_ttl = lease_ttl
+        self.owner = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"  # 租约持有者标识
+        self._executor = executor  # 为空时使用 hummingbot_integration.strategy_executor
+        self.session_factory = session_factory  # 为空时使用 database.SessionLocal
+        self._ready: asyncio.Queue = asyncio.Queue()  # 待领取任务的策略
+        self._scheduled: Set[str] = set()  # 在就绪队列中或正在执行任务的策略，同一策略在本进程只由一个 worker 处理
+        self._running: Dict[str, Dict[str, Any]] = {}  # 策略 ID -> 本进程正在执行的任务
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            from hummingbot_integration import strategy_executor
+
+            self._executor = strategy_executor
+        return self._executor
+
+    async def submit(self, strategy_id: str, action: str, strategy_type: Optional[str] = None,
+                     params: Optional[Dict[str, Any]] = None,
+                     idempotency_key: Optional[str] = None) -> Tuple[Dict[str, Any], bool]:
+        """提交任务，返回 (任务, 是否新建)
+
+        参数在提交时验证，无效时抛出 ValueError；幂等键已用于其他策略或命令时抛出 IdempotencyKeyConflict；
+        所有 worker 排队的任务已达上限时抛出 CommandQueueFull
+        """
+        if action not in JOB_ACTIONS:
+            raise ValueError(f"不支持的命令: {action}")
+        if action == "stop":
+            strategy_type, params = None, None
+        else:
+            if not strategy_type:
+                raise ValueError("Strategy type is required")
+            params = self.executor.validate_config(strategy_type, params or {})
+
+        job = {
+            "id": uuid.uuid4().hex,
+            "idempotency_key": idempotency_key,
+            "strategy_id": strategy_id,
+            "action": action,
+            "type": strategy_type,
+            "params": params,
+            "created_at": _now(),
+        }
+        entry, created = await asyncio.to_thread(self._create, job)
+        if not created:
+            if entry["strategy_id"] != strategy_id or entry["action"] != action:
+                raise IdempotencyKeyConflict(f"幂等键 {idempotency_key} 已用于任务 {entry['id']}")
+            jobs_deduplicated.inc(action=action)
+            return entry, False
+
+        jobs_submitted.inc(action=action)
+        self._publish(entry)
+        self._schedule(strategy_id)
+        return entry, True
+
+    def _schedule(self, strategy_id: str):
+        """把策略加入就绪队列，由 worker 获取租约后领取它排队的任务"""
+        if strategy_id not in self._scheduled:
+            self._scheduled.add(strategy_id)
+            self._ready.put_nowait(strategy_id)
+        self.start()
+
+    async def recover(self) -> int:
+        """领取没有有效租约的策略（提交任务的进程已退出或崩溃），返回策略数
+
+        领取时中断的任务标记为失败，排队的任务按提交顺序继续执行；由调度器 leader 定期调用
+        """
+        strategy_ids = await asyncio.to_thread(self._load_orphaned)
+        for strategy_id in strategy_ids:
+            self._schedule(strategy_id)
+        if strategy_ids:
+            logger.info(f"领取 {len(strategy_ids)} 个策略遗留的命令任务")
+        return len(strategy_ids)
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self._load, job_id)
+
+    async def list(self, strategy_id: Optional[str] = None, status: Optional[str] = None,
+                   limit: int = 100) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self._load_many, strategy_id, status, limit)
+
+    def start(self):
+        """启动 worker，已启动时忽略"""
+        self._tasks = [task for task in self._tasks if not task.done()]
+        for _ in range(self.workers - len(self._tasks)):
+            self._tasks.append(asyncio.create_task(self._work()))
+
+    async def _work(self):
+        while True:
+            strategy_id = await self._ready.get()
+            job = None
+            try:
+                job = await self._claim(strategy_id)
+                if job is not None:
+                    await self._execute(job)
+            except Exception as e:
+                logger.error(f"领取策略 {strategy_id} 的命令任务失败: {e}")
+            finally:
+                if job is not None:
+                    # 继续领取该策略的下一个任务；排到就绪队列末尾，任务多的策略不会饿死其他策略
+                    self._ready.put_nowait(strategy_id)
+                else:
+                    # 没有排队的任务（租约已释放），或租约由其他 worker 持有、由它执行
+                    self._scheduled.discard(strategy_id)
+
+    async def _claim(self, strategy_id: str) -> Optional[Dict[str, Any]]:
+        """获取策略的租约并领取最早排队的任务，租约由其他 worker 持有或没有排队的任务时返回 None"""
+        job, orphaned = await asyncio.to_thread(self._claim_next, strategy_id)
+        for entry in orphaned:
+            logger.warning(f"策略命令任务 {entry['id']} 的执行进程已中断，标记为失败")
+            jobs_finished.inc(action=entry["action"], status="failed")
+            self._publish(entry)
+        if job is not None:
+            self._publish(job)
+        return job
+
+    async def _execute(self, job: Dict[str, Any]):
+        strategy_id = job["strategy_id"]
+        self._running[strategy_id] = job
+        heartbeat = asyncio.create_task(self._keep_lease(strategy_id))
+        try:
+            try:
+                error = await self._run(job)
+            except Exception as e:
+                logger.error(f"执行策略命令 {job['action']} {strategy_id} 失败: {e}")
+                error = str(e)
+            status = "failed" if error else "succeeded"
+            jobs_finished.inc(action=job["action"], status=status)
+            await self._update(job, status=status, error=error, finished_at=_now())
+        finally:
+            heartbeat.cancel()
+            self._running.pop(strategy_id, None)
+
+    async def _keep_lease(self, strategy_id: str):
+        """执行任务期间定期续期租约"""
+        while True:
+            await asyncio.sleep(self.lease_ttl / 3)
+            try:
+                if not await asyncio.to_thread(self._renew, strategy_id):
+                    logger.warning(f"策略 {strategy_id} 的任务租约已过期并被其他 worker 接管")
+                    return
+            except Exception as e:
+                logger.error(f"续期策略 {strategy_id} 的任务租约失败: {e}")
+
+    async def _run(self, job: Dict[str, Any]) -> Optional[str]:
+        """执行命令，成功返回 None，失败返回原因"""
+        if job["action"] in ("stop", "restart"):
+            error = await self._stop(job["strategy_id"])
+            if error or job["action"] == "stop":
+                return error
+        results = await self.executor.start_strategies(
+            [{"id": job["strategy_id"], "type": job["type"], "params": job["params"] or {}}]
+        )
+        result = results[job["strategy_id"]]
+        return None if result["success"] else result.get("error") or "Failed to start strategy"
+
+    async def _stop(self, strategy_id: str) -> Optional[str]:
+        """停止策略；Hummingbot 上本就没有运行时通过对账修正记录的状态，视为成功"""
+        result = (await self.executor.stop_strategies([strategy_id]))[strategy_id]
+        if result["success"]:
+            return None
+        await self.executor.registry.reconcile()
+        if await self.executor.registry.is_running(strategy_id):
+            return result.get("error") or "Failed to stop strategy"
+        return None
+
+    async def _update(self, job: Dict[str, Any], **fields):
+        job.update({k: v.isoformat() if isinstance(v, datetime) else v for k, v in fields.items()})
+        try:
+            await asyncio.to_thread(self._save, [job["id"]], fields)
+        except Exception as e:
+            logger.error(f"更新策略命令任务 {job['id']} 失败: {e}")
+        self._publish(job)
+
+    @staticmethod
+    def _publish(job: Dict[str, Any]):
+        message = {"type": STRATEGY_JOBS_TOPIC, "timestamp": time.time(), "data": dict(job)}
+        broadcaster.publish(STRATEGY_JOBS_TOPIC, message)
+        broadcaster.publish(f"{STRATEGY_JOBS_TOPIC}:{job['strategy_id']}", message)
+
+    async def close(self):
+        """停止 worker，中断的任务标记为失败并释放租约；排队的任务由其他 worker 或重启后的 leader 继续执行"""
+        started = bool(self._tasks)
+        running = [job["id"] for job in self._running.values()]
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._ready = asyncio.Queue()
+        self._scheduled.clear()
+        self._running.clear()
+        if not started:
+            return
+        try:
+            if running:
+                await asyncio.to_thread(self._save, running, {
+                    "status": "failed", "error": "服务关闭时中断，策略状态以对账结果为准", "finished_at": _now()})
+            await asyncio.to_thread(self._release)
+        except Exception as e:
+            logger.error(f"标记未完成的策略命令任务失败: {e}")
+
+    def _session(self):
+        if self.session_factory is not None:
+            return self.session_factory()
+        from database import SessionLocal
+
+        return SessionLocal()
+
+    def _create(self, job: Dict[str, Any]) -> Tuple[Dict[str, Any], bool]:
+        import crud
+
+        db = self._session()
+        try:
+            if job["idempotency_key"] is None:
+                # 没有幂等键时，与同一策略尚未开始执行的相同命令合并，避免重复点击产生重复命令
+                for queued in crud.get_queued_strategy_jobs(db, job["strategy_id"]):
+                    if (queued.action, queued.type, queued.params) == (job["action"], job["type"], job["params"]):
+                        return _to_dict(queued), False
+            if crud.count_queued_strategy_jobs(db) >= self.max_pending:
+                raise CommandQueueFull(f"排队的策略命令已达上限 {self.max_pending}")
+            entry, created = crud.create_strategy_job(db, job)
+            return _to_dict(entry), created
+        finally:
+            db.close()
+
+    def _claim_next(self, strategy_id: str) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]]]:
+        import crud
+
+        db = self._session()
+        try:
+            job, orphaned = crud.claim_strategy_job(db, strategy_id, self.owner, time.time(), self.lease_ttl,
+                                                    ORPHANED_ERROR)
+            return (_to_dict(job) if job else None), [_to_dict(entry) for entry in orphaned]
+        finally:
+            db.close()
+
+    def _renew(self, strategy_id: str) -> bool:
+        import crud
+
+        db = self._session()
+        try:
+            return crud.renew_strategy_job_lease(db, strategy_id, self.owner, time.time() + self.lease_ttl)
+        finally:
+            db.close()
+
+    def _release(self):
+        import crud
+
+        db = self._session()
+        try:
+            crud.release_strategy_job_leases(db, self.owner)
+        finally:
+            db.close()
+
+    def _load_orphaned(self) -> List[str]:
+        import crud
+
+        db = self._session()
+        try:
+            return crud.get_orphaned_strategy_job_ids(db, time.time())
+        finally:
+            db.close()
+
+    def _save(self, job_ids: List[str], fields: Dict[str, Any]):
+        import crud
+
+        db = self._session()
+        try:
+            crud.update_strategy_jobs(db, job_ids, **fields)
+        finally:
+            db.close()
+
+    def _load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        import crud
+
+        db = self._session()
+        try:
+            job = crud.get_strategy_job(db, job_id)
+            return _to_dict(job) if job else None
+        finally:
+            db.close()
+
+    def _load_many(self, strategy_id: Optional[str], status: Optional[str], limit: int) -> List[Dict[str, Any]]:
+        import crud
+
+        db = self._session()
+        try:
+            return [_to_dict(job) for job in crud.get_strategy_jobs(db, strategy_id, status, limit)]
+        finally:
+            db.close()
+
+
+# 全局策略命令队列实例
+strategy_command_queue = StrategyCommandQueue()
@@ -0,0 +1,243 @@
+"""
+策略执行注册表
+记录每个策略在 Hummingbot 上的执行状态（类型、参数、running/stopped/error），持久化在数据库中，
+所有 worker 共享同一份状态，进程重启后不会丢失。配置 REDIS_URL 后同时写入 Redis 哈希，
+按策略 ID 的读取只需一次 HGET；Redis 未命中或不可用时回退到数据库主键查询。
+启动时和调度器周期任务中用一次批量状态查询与 Hummingbot 实际运行的策略对账
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from metrics import registry as metrics_registry
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv('REDIS_URL')
+STRATEGY_REGISTRY_KEY = os.getenv('STRATEGY_REGISTRY_KEY', 'arbitrage:strategy_executions')
+
+registry_reconciles = metrics_registry.counter("strategy_registry_reconciles_total", "策略执行注册表对账次数")
+registry_corrections = metrics_registry.counter("strategy_registry_corrections_total", "对账时修正的策略数")
+
+
+def _to_entry(execution) -> Dict:
+    """数据库记录转为注册表条目"""
+    return {
+        "id": execution.strategy_id,
+        "type": execution.type,
+        "params": execution.params or {},
+        "status": execution.status,
+        "instance": execution.instance,
+        "error": execution.error,
+        "version": execution.version,
+    }
+
+
+class StrategyRegistry:
+    """策略执行注册表：数据库为准，Redis 为可选的读缓存"""
+
+    # 只在版本更新时覆盖缓存，避免多个 worker 并发写入时旧状态覆盖新状态
+    _SET_SCRIPT = """
+    local current = redis.call('hget', KEYS[1], ARGV[1])
+    if current then
+        local ok, entry = pcall(cjson.decode, current)
+        if ok and tonumber(entry['version']) and tonumber(entry['version']) >= tonumber(ARGV[2]) then
+            return 0
+        end
+    end
+    redis.call('hset', KEYS[1], ARGV[1], ARGV[3])
+    return 1
+    """
+
+    def __init__(self, redis_client=None, key: str = STRATEGY_REGISTRY_KEY, session_factory=None):
+        self.redis = redis_client
+        self.key = key
+        self.session_factory = session_factory  # 为空时使用 database.SessionLocal
+        self._reconcile_task: Optional[asyncio.Task] = None
+
+    async def get(self, strategy_id: str) -> Optional[Dict]:
+        """按策略 ID 读取执行状态，从未启动过的策略返回 None"""
+        if self.redis is not None:
+            try:
+                cached = await self.redis.hget(self.key, strategy_id)
+                if cached is not None:
+                    return json.loads(cached)
+            except Exception as e:
+                logger.warning(f"读取 Redis 策略注册表失败，回退到数据库: {e}")
+        entries = await asyncio.to_thread(self._load, [strategy_id])
+        if not entries:
+            return None
+        await self._cache(entries)
+        return entries[0]
+
+    async def is_running(self, strategy_id: str) -> bool:
+        entry = await self.get(strategy_id)
+        return entry is not None and entry["status"] == "running"
+
+    async def running(self) -> Dict[str, Dict]:
+        """所有运行中的策略（按 status 索引查询数据库，Redis 缓存可能不完整因此不用于枚举）"""
+        entries = await asyncio.to_thread(self._load, None, "running")
+        return {entry["id"]: entry for entry in entries}
+
+    async def mark_running(self, strategies: List[Tuple[str, str, Dict, Optional[str]]]) -> List[Dict]:
+        """记录启动成功的策略，strategies 为 (策略 ID, 类型, 参数, 所在实例) 列表，一个事务内写入"""
+        return await self.save([
+            {"strategy_id": strategy_id, "type": strategy_type, "params": params, "status": "running",
+             "instance": instance, "error": None}
+            for strategy_id, strategy_type, params, instance in strategies
+        ])
+
+    async def mark_stopped(self, strategy_ids: List[str], error: Optional[str] = None) -> List[Dict]:
+        """记录已停止的策略，保留其类型和参数"""
+        return await self.save([
+            {"strategy_id": strategy_id, "type": None, "params": None, "status": "stopped", "instance": None,
+             "error": error}
+            for strategy_id in strategy_ids
+        ])
+
+    async def save(self, rows: List[Dict]) -> List[Dict]:
+        """先写数据库再更新 Redis 缓存，返回写入后的条目"""
+        if not rows:
+            return []
+        version = time.time_ns() // 1000
+        entries = await asyncio.to_thread(self._save, [{**row, "version": version} for row in rows])
+        await self._cache(entries)
+        return entries
+
+    async def _cache(self, entries: List[Dict]):
+        if self.redis is None or not entries:
+            return
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for entry in entries:
+                pipe.eval(self._SET_SCRIPT, 1, self.key, entry["id"], entry["version"], json.dumps(entry))
+            await pipe.execute()
+        except Exception as e:
+            # 缓存写入失败时删除对应条目，读取会回退到数据库，不会读到旧状态
+            logger.warning(f"写入 Redis 策略注册表失败: {e}")
+            try:
+                await self.redis.hdel(self.key, *[entry["id"] for entry in entries])
+            except Exception as e:
+                logger.error(f"清理 Redis 策略注册表失败，缓存可能过期: {e}")
+
+    async def reconcile(self) -> Dict[str, int]:
+        """与 Hummingbot 对账：一次批量状态查询，修正记录为运行但实际未运行的策略，
+        并补录在 Hummingbot 上运行但未记录的策略。Hummingbot 不可达时抛出异常，不修改任何记录
+        """
+        from strategy_status import strategy_status_aggregator
+
+        # 不支持批量接口时逐个查询，旧版本只标记在 strategies 表中的策略也要一并查询
+        legacy = await asyncio.to_thread(self._load_legacy_ids)
+        await strategy_status_aggregator.refresh(legacy)
+        actual = dict(strategy_status_aggregator.statuses)
+        recorded = await asyncio.to_thread(self._load_for_reconcile, list(actual))
+
+        rows = []
+        for strategy_id, status in actual.items():
+            entry = recorded.get(strategy_id)
+            moved = status.get("instance") is not None and entry is not None and entry.get("instance") != status["instance"]
+            if entry is None or entry.get("legacy") or moved or entry["status"] != status["status"]:
+                rows.append({"strategy_id": strategy_id, "type": status.get("type"), "params": status.get("params"),
+                             "status": status["status"], "instance": status.get("instance"), "error": None})
+        for strategy_id, entry in recorded.items():
+            if entry["status"] == "running" and strategy_id not in actual:
+                rows.append({"strategy_id": strategy_id, "type": None, "params": None, "status": "stopped",
+                             "instance": None, "error": "对账时 Hummingbot 上未运行该策略"})
+
+        await self.save(rows)
+        registry_reconciles.inc()
+        if rows:
+            registry_corrections.inc(len(rows))
+            logger.info(f"策略执行注册表对账完成，修正 {len(rows)} 个策略")
+        return {"running": sum(1 for s in actual.values() if s["status"] == "running"), "corrected": len(rows)}
+
+    def start_reconcile(self):
+        """在后台执行一次对账（启动时使用），不阻塞应用启动"""
+        if self._reconcile_task is None or self._reconcile_task.done():
+            self._reconcile_task = asyncio.create_task(self._reconcile_logged())
+
+    async def _reconcile_logged(self):
+        try:
+            await self.reconcile()
+        except Exception as e:
+            logger.error(f"启动时策略对账失败，沿用已记录的状态: {e}")
+
+    async def close(self):
+        if self._reconcile_task is not None:
+            self._reconcile_task.cancel()
+            await asyncio.gather(self._reconcile_task, return_exceptions=True)
+            self._reconcile_task = None
+
+    def _session(self):
+        if self.session_factory is not None:
+            return self.session_factory()
+        from database import SessionLocal
+
+        return SessionLocal()
+
+    def _load(self, strategy_ids: Optional[List[str]], status: Optional[str] = None) -> List[Dict]:
+        import crud
+
+        db = self._session()
+        try:
+            return [_to_entry(e) for e in crud.get_strategy_executions(db, strategy_ids, status)]
+        finally:
+            db.close()
+
+    def _load_for_reconcile(self, strategy_ids: List[str]) -> Dict[str, Dict]:
+        """对账需要的已记录状态：Hummingbot 返回的策略、记录为运行中的策略，
+        以及 strategies 表中标记为运行但没有执行记录的策略（旧版本只改数据库状态造成的漂移）
+        """
+        import crud
+
+        db = self._session()
+        try:
+            recorded = {e.strategy_id: _to_entry(e) for e in crud.get_strategy_executions(db, strategy_ids, "running")}
+            for strategy_id in self._legacy_ids(db):
+                recorded.setdefault(strategy_id, {"id": strategy_id, "status": "running", "legacy": True})
+            return recorded
+        finally:
+            db.close()
+
+    def _load_legacy_ids(self) -> List[str]:
+        db = self._session()
+        try:
+            return self._legacy_ids(db)
+        finally:
+            db.close()
+
+    @staticmethod
+    def _legacy_ids(db) -> List[str]:
+        """strategies 表中标记为运行的策略 ID"""
+        import models
+
+        return [str(strategy_id) for (strategy_id,) in
+                db.query(models.Strategy.id).filter(models.Strategy.status == "running").all()]
+
+    def _save(self, rows: List[Dict]) -> List[Dict]:
+        import crud
+
+        db = self._session()
+        try:
+            return [_to_entry(e) for e in crud.save_strategy_executions(db, rows)]
+        finally:
+            db.close()
+
+
+def create_strategy_registry() -> StrategyRegistry:
+    """根据配置创建注册表：配置了 REDIS_URL 且安装了 redis 时启用 Redis 缓存"""
+    if REDIS_URL:
+        try:
+            import redis.asyncio as aioredis
+            return StrategyRegistry(aioredis.from_url(REDIS_URL))
+        except ImportError:
+            logger.warning("未安装 redis 客户端，策略注册表只使用数据库")
+    return StrategyRegistry()
+
+
+# 全局策略执行注册表实例
+strategy_registry = create_strategy_registry()
@@ -0,0 +1,168 @@
+"""
+Hummingbot 策略状态聚合
+一次批量请求（GET /strategies/status）拉取所有运行中策略的状态并缓存 STRATEGY_STATUS_TTL 秒，
+单个和批量的状态查询都从内存读取；并发刷新通过 single-flight 合并。
+Hummingbot 不支持批量接口时退回按策略有限并发查询。状态变化时通过 pubsub 推送
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List, Optional
+
+from metrics import registry
+from pubsub import broadcaster
+from singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+STRATEGY_STATUS_TTL = float(os.getenv('STRATEGY_STATUS_TTL', '2'))
+STRATEGY_STATUS_TOPIC = "strategy_status"
+
+status_refreshes = registry.counter("strategy_status_refreshes_total", "策略状态刷新次数")
+status_changes = registry.counter("strategy_status_changes_total", "检测到的策略状态变化次数")
+
+
+def _normalize(strategy_id: str, data: Optional[Dict]) -> Optional[Dict]:
+    """转换为与单个状态接口一致的格式"""
+    if not data:
+        return None
+    return {
+        "id": strategy_id,
+        "status": data.get("status", "unknown"),
+        "type": data.get("type"),
+        "params": data.get("params", {}),
+        "instance": data.get("instance"),  # 多实例部署时策略所在的 Hummingbot 实例
+    }
+
+
+class StrategyStatusAggregator:
+    """策略状态聚合缓存"""
+
+    def __init__(self, ttl: float = STRATEGY_STATUS_TTL):
+        self.ttl = ttl
+        self.statuses: Dict[str, Dict] = {}  # 只保存运行中（Hummingbot 能查到）的策略
+        self.fetched_at: Optional[float] = None
+        self.updated_at: Optional[float] = None
+        self.bulk_supported = True
+        self._flight = SingleFlight("strategy_status")
+        self._task: Optional[asyncio.Task] = None
+
+    def is_fresh(self) -> bool:
+        return self.fetched_at is not None and time.monotonic() - self.fetched_at < self.ttl
+
+    def invalidate(self):
+        """策略启停后调用，下次读取时重新拉取"""
+        self.fetched_at = None
+
+    async def refresh(self, strategy_ids: Optional[List[str]] = None):
+        """刷新状态；并发调用共享同一次请求
+
+        批量接口返回所有策略，并发调用共用一个 key；逐个查询时结果取决于传入的策略 ID，
+        按 ID 集合合并，避免后来的调用者拿到不包含其策略的结果
+        """
+        strategy_ids = list(strategy_ids or [])
+        key = "all" if self.bulk_supported else tuple(sorted(set(strategy_ids)))
+        await self._flight.do(key, lambda: self._refresh(strategy_ids))
+
+    async def _refresh(self, strategy_ids: List[str]):
+        from hummingbot_integration import strategy_executor
+
+        statuses = None
+        if self.bulk_supported:
+            statuses = await self._fetch_bulk(strategy_executor.api_client)
+        if statuses is None:
+            # 不支持批量接口：逐个查询已知的策略
+            running = await strategy_executor.running_strategies()
+            known = list(dict.fromkeys([*self.statuses, *running, *strategy_ids]))
+            results = await strategy_executor.fetch_strategies_status(known)
+            # 逐个查询只对查询过的策略有效，其他并发刷新写入的策略保持不变
+            statuses = {strategy_id: status for strategy_id, status in self.statuses.items() if strategy_id not in results}
+            statuses.update((strategy_id, status) for strategy_id, status in results.items() if status is not None)
+
+        self.fetched_at = time.monotonic()
+        status_refreshes.inc(mode="bulk" if self.bulk_supported else "per_id")
+        self._apply(statuses)
+
+    async def _fetch_bulk(self, client) -> Optional[Dict[str, Dict]]:
+        import aiohttp
+
+        try:
+            result = await client.get_strategies_status()
+        except aiohttp.ClientResponseError as e:
+            if e.status in (404, 405):
+                logger.warning("Hummingbot 不支持批量状态接口，改为逐个查询")
+                self.bulk_supported = False
+                return None
+            raise
+        if not result.get("success", False):
+            raise RuntimeError(result.get("error", "Unknown error"))
+        data = result.get("data") or {}
+        return {
+            strategy_id: status
+            for strategy_id, status in ((i, _normalize(i, d)) for i, d in data.items())
+            if status is not None
+        }
+
+    def _apply(self, statuses: Dict[str, Dict]):
+        """替换缓存并推送有变化的策略（已停止的策略推送 None）"""
+        changed = {
+            strategy_id: status for strategy_id, status in statuses.items()
+            if self.statuses.get(strategy_id) != status
+        }
+        changed.update({strategy_id: None for strategy_id in self.statuses if strategy_id not in statuses})
+        self.statuses = statuses
+        if not changed:
+            return
+        self.updated_at = time.time()
+        status_changes.inc(len(changed))
+        if broadcaster.has_subscribers(STRATEGY_STATUS_TOPIC):
+            broadcaster.publish(STRATEGY_STATUS_TOPIC, {
+                "type": STRATEGY_STATUS_TOPIC,
+                "timestamp": self.updated_at,
+                "data": changed,
+            })
+
+    async def ensure_fresh(self, strategy_ids: Optional[List[str]] = None):
+        """缓存过期时刷新；已有缓存时刷新失败只记录日志，继续使用缓存"""
+        if self.is_fresh():
+            return
+        try:
+            await self.refresh(strategy_ids)
+        except Exception as e:
+            if self.fetched_at is None and not self.statuses:
+                logger.error(f"获取策略状态失败: {e}")
+            else:
+                logger.warning(f"刷新策略状态失败，继续使用缓存: {e}")
+
+    async def get(self, strategy_id: str) -> Optional[Dict]:
+        await self.ensure_fresh([strategy_id])
+        return self.statuses.get(strategy_id)
+
+    async def get_many(self, strategy_ids: List[str]) -> Dict[str, Optional[Dict]]:
+        await self.ensure_fresh(strategy_ids)
+        return {strategy_id: self.statuses.get(strategy_id) for strategy_id in strategy_ids}
+
+    def snapshot_message(self) -> Dict:
+        return {"type": STRATEGY_STATUS_TOPIC, "timestamp": self.updated_at, "data": dict(self.statuses)}
+
+    def start(self):
+        """启动后台定期刷新（有推送订阅时使用），已启动时忽略"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await self.ensure_fresh()
+            await asyncio.sleep(self.ttl)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+# 全局策略状态聚合实例
+strategy_status_aggregator = StrategyStatusAggregator()
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+账户余额刷新合并测试
+本地模拟交易所的 /api/v3/account 接口（带延迟和请求计数），验证并发刷新同一账户或同一页账户
+只打一次交易所，发起者被取消并关闭会话后其余调用者仍拿到结果；刷新后的账户列表只用一次查询读取，
+交易所未返回余额时返回未更新的账户
+"""
+import asyncio
+import os
+import socket
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(__file__))
+
+import crud
+import database
+import exchange_connector
+import models
+
+CALLERS = 20
+ACCOUNTS = 3
+EXCHANGE_LATENCY = 0.2
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class MockExchange:
+    """只实现账户余额接口的模拟币安，status 不为 200 时返回错误"""
+
+    def __init__(self, status: int = 200):
+        self.calls = 0
+        self.status = status
+
+    async def account(self, request):
+        from aiohttp import web
+
+        self.calls += 1
+        await asyncio.sleep(EXCHANGE_LATENCY)
+        if self.status != 200:
+            return web.json_response({"code": -1000, "msg": "unavailable"}, status=self.status)
+        return web.json_response({"accountType": "SPOT", "balances": [
+            {"asset": "USDT", "free": "1000", "locked": "0"},
+            {"asset": "BTC", "free": "0.5", "locked": "0.1"},
+        ]})
+
+    async def __aenter__(self):
+        from aiohttp import web
+
+        app = web.Application()
+        app.router.add_get("/api/v3/account", self.account)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        port = _free_port()
+        await web.TCPSite(self.runner, "127.0.0.1", port).start()
+        self._base_url = exchange_connector.BINANCE_API_URL
+        exchange_connector.BINANCE_API_URL = f"http://127.0.0.1:{port}"
+        return self
+
+    async def __aexit__(self, *exc):
+        exchange_connector.BINANCE_API_URL = self._base_url
+        await self.runner.cleanup()
+
+
+class TempDatabase:
+    """临时数据库，替换 database.SessionLocal 供余额刷新打开独立会话"""
+
+    def __enter__(self):
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+
+        self.tmpdir = tempfile.TemporaryDirectory()
+        engine = create_engine(f"sqlite:///{self.tmpdir.name}/accounts.db", connect_args={"check_same_thread": False})
+        models.Base.metadata.create_all(bind=engine)
+        self._session_local = database.SessionLocal
+        database.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        db = database.SessionLocal()
+        try:
+            accounts = [models.Account(name=f"acc{i}", exchange_type="binance", api_key="k", api_secret="s")
+                        for i in range(ACCOUNTS)]
+            db.add_all(accounts)
+            db.commit()
+            self.account_ids = [account.id for account in accounts]
+        finally:
+            db.close()
+        return self
+
+    def __exit__(self, *exc):
+        database.SessionLocal = self._session_local
+        self.tmpdir.cleanup()
+
+
+async def _update(account_id: int):
+    db = database.SessionLocal()
+    try:
+        account = await crud.update_account_balance(db, account_id)
+        return account.balance if account else None
+    finally:
+        db.close()
+
+
+async def _check_single_account():
+    with TempDatabase() as temp:
+        async with MockExchange() as exchange:
+            account_id = temp.account_ids[0]
+            balances = await asyncio.gather(*[_update(account_id) for _ in range(CALLERS)])
+            return exchange.calls, balances
+
+
+def test_concurrent_refresh_single_call():
+    """测试同一账户的并发刷新只请求一次交易所"""
+    print("=== 测试并发刷新同一账户 ===")
+    calls, balances = asyncio.run(_check_single_account())
+    print(f"✅ {CALLERS} 个并发调用，交易所请求 {calls} 次，余额 {balances[0]}")
+    assert calls == 1
+    assert balances == [1000.6] * CALLERS
+
+
+async def _check_initiator_cancelled():
+    with TempDatabase() as temp:
+        async with MockExchange() as exchange:
+            account_id = temp.account_ids[0]
+            # 发起者的会话在被取消时关闭（等同于请求断开后 get_db 的清理）
+            initiator = asyncio.create_task(_update(account_id))
+            await asyncio.sleep(EXCHANGE_LATENCY / 4)
+            followers = [asyncio.create_task(_update(account_id)) for _ in range(CALLERS - 1)]
+            await asyncio.sleep(0)
+            initiator.cancel()
+            balances = await asyncio.gather(*followers)
+            return exchange.calls, balances
+
+
+def test_initiator_cancelled():
+    """测试发起者被取消后合并的调用者仍拿到结果"""
+    print("\n=== 测试发起者被取消 ===")
+    calls, balances = asyncio.run(_check_initiator_cancelled())
+    print(f"✅ 发起者取消后 {len(balances)} 个调用者拿到余额，交易所请求 {calls} 次")
+    assert calls == 1
+    assert balances == [1000.6] * (CALLERS - 1)
+
+
+async def _list_accounts():
+    db = database.SessionLocal()
+    try:
+        return [account.balance for account in await crud.get_accounts_with_real_time_balance(db)]
+    finally:
+        db.close()
+
+
+async def _check_account_list():
+    with TempDatabase():
+        async with MockExchange() as exchange:
+            results = await asyncio.gather(*[_list_accounts() for _ in range(CALLERS)])
+            return exchange.calls, results
+
+
+def test_concurrent_account_list():
+    """测试并发获取账户列表时每个账户只请求一次交易所"""
+    print("\n=== 测试并发获取账户列表 ===")
+    calls, results = asyncio.run(_check_account_list())
+    print(f"✅ {CALLERS} 个并发调用，{ACCOUNTS} 个账户共请求交易所 {calls} 次")
+    assert calls == ACCOUNTS
+    assert all(result == [1000.6] * ACCOUNTS for result in results)
+
+
+async def _check_list_queries():
+    from sqlalchemy import event
+
+    with TempDatabase():
+        async with MockExchange():
+            db = database.SessionLocal()
+            try:
+                stale = crud.get_accounts(db)  # 调用者会话中已加载刷新前的账户
+                statements = []
+                event.listen(db.connection(), "before_cursor_execute",
+                             lambda conn, cursor, statement, *args: statements.append(statement))
+                accounts = await crud.get_accounts_with_real_time_balance(db)
+                return [account.balance for account in stale], [account.balance for account in accounts], statements
+            finally:
+                db.close()
+
+
+def test_account_list_single_query():
+    """测试刷新后的账户列表只用一次查询读取，并覆盖会话中已加载的旧余额"""
+    print("\n=== 测试账户列表查询次数 ===")
+    stale, balances, statements = asyncio.run(_check_list_queries())
+    print(f"✅ 调用者会话执行 {len(statements)} 条语句，余额 {balances}")
+    assert len(statements) == 1
+    assert balances == [1000.6] * ACCOUNTS and stale == balances
+
+
+async def _check_no_balance_info():
+    with TempDatabase() as temp:
+        async with MockExchange(status=500) as exchange:
+            db = database.SessionLocal()
+            try:
+                account = await crud.update_account_balance(db, temp.account_ids[0])
+                missing = await crud.update_account_balance(db, max(temp.account_ids) + 1)
+                return exchange.calls, account, missing
+            finally:
+                db.close()
+
+
+def test_no_balance_info_returns_account():
+    """测试交易所未返回余额时返回未更新的账户，账户不存在时返回 None"""
+    print("\n=== 测试交易所未返回余额 ===")
+    calls, account, missing = asyncio.run(_check_no_balance_info())
+    print(f"✅ 交易所请求 {calls} 次，返回账户 {account.id if account else None}，不存在的账户返回 {missing}")
+    assert calls == 1
+    assert account is not None and account.last_balance_update is None
+    assert missing is None
+
+
+def main():
+    tests = [
+        test_concurrent_refresh_single_call,
+        test_initiator_cancelled,
+        test_concurrent_account_list,
+        test_account_list_single_query,
+        test_no_balance_info_returns_account,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+    print("=" * 50)
+    print(f"测试完成: {len(tests) - failed}/{len(tests)} 通过")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+套利检测测试
+跨交易所扫描：向量化扫描结果与逐对计算一致，策略阈值低于全局阈值时也会报告，行情失效后移除，
+只同步运行中的策略且策略未变化时不重置阈值；
+三角套利：已知价格下的收益率、价格回落后机会消失，按交易所推送，以及随机币种图上增量检测与穷举所有三角环一致
+"""
+import asyncio
+import itertools
+import math
+import os
+import random
+import sys
+
+sys.path.append(os.path.dirname(__file__))
+
+from arbitrage_scanner import ArbitrageScanner
+from book_ticker import BookTicker
+from orderbook import order_book_service
+from pubsub import broadcaster
+from triangular_arbitrage import TRIANGULAR_TOPIC, CurrencyGraph, TriangularArbitrageDetector
+
+FEES = {"binance": 0.001, "okx": 0.0008, "bybit": 0.001, "gate_io": 0.002}
+MIN_PROFITABILITY = 0.1  # %
+
+
+def _expected_opportunities(quotes, threshold):
+    """逐对计算：在 i 吃单买入、在 j 吃单卖出扣除手续费后的净收益率"""
+    expected = {}
+    for (symbol, buy), (bid_b, _, ask_b, _) in quotes.items():
+        for (other, sell), (bid_s, _, _, _) in quotes.items():
+            if other != symbol or sell == buy:
+                continue
+            edge = bid_s * (1 - FEES[sell]) / (ask_b * (1 + FEES[buy])) - 1
+            if edge > threshold:
+                expected[(symbol, buy, sell)] = edge * 100
+    return expected
+
+
+def test_scanner_matches_pairwise():
+    """测试向量化扫描与逐对计算一致"""
+    print("=== 测试跨交易所扫描 ===")
+    rng = random.Random(7)
+    scanner = ArbitrageScanner(fees=FEES, capacity=4, min_profitability=MIN_PROFITABILITY)
+    quotes = {}
+    for s in range(30):  # 超过初始容量，覆盖扩容
+        symbol = f"C{s}/USDT"
+        mid = rng.uniform(1, 1000)
+        for venue in FEES:
+            price = mid * (1 + rng.uniform(-0.004, 0.004))
+            quotes[(symbol, venue)] = (price * 0.9999, rng.uniform(1, 5), price * 1.0001, rng.uniform(1, 5))
+            scanner.update_quote(venue, symbol, *quotes[(symbol, venue)])
+    expected = _expected_opportunities(quotes, MIN_PROFITABILITY / 100)
+    found = {(o["symbol"], o["buy_exchange"], o["sell_exchange"]): o for o in scanner.get_opportunities()}
+    print(f"✅ 期望 {len(expected)} 个机会，扫描得到 {len(found)} 个")
+    assert expected and set(found) == set(expected)
+    assert all(abs(found[key]["profitability"] - edge) < 1e-9 for key, edge in expected.items())
+    profits = [o["profitability"] for o in scanner.get_opportunities()]
+    assert profits == sorted(profits, reverse=True)
+    key = next(iter(expected))
+    assert found[key]["size"] == min(quotes[(key[0], key[1])][3], quotes[(key[0], key[2])][1])
+
+
+def test_strategy_threshold_and_invalidation():
+    """测试策略阈值低于全局阈值时报告并关联策略，行情失效后机会消失"""
+    print("\n=== 测试策略阈值与行情失效 ===")
+    scanner = ArbitrageScanner(fees={"binance": 0.001, "okx": 0.001}, min_profitability=MIN_PROFITABILITY)
+    # binance 买入成本 100.1*1.001，okx 卖出所得 100.4*0.999，净收益约 0.1%
+    scanner.update_quote("binance", "BTC/USDT", 100.0, 1, 100.1, 2)
+    scanner.update_quote("okx", "BTC/USDT", 100.4, 3, 100.5, 1)
+    edge = (100.4 * 0.999 / (100.1 * 1.001) - 1) * 100
+    before = scanner.get_opportunities()
+    scanner.set_strategies([{"id": 7, "market": "BTC-USDT", "exchange_1": "binance", "exchange_2": "okx",
+                             "min_profitability": 0.05}])
+    matched = scanner.get_opportunities()
+    scanner.clear_quote("okx", "BTC/USDT")
+    after = scanner.get_opportunities()
+    print(f"✅ 净收益 {edge:.4f}%：全局阈值下 {len(before)} 个，策略阈值下 {len(matched)} 个，失效后 {len(after)} 个")
+    assert 0.05 < edge < MIN_PROFITABILITY
+    assert before == []
+    assert len(matched) == 1 and matched[0]["strategy_ids"] == [7]
+    assert matched[0]["buy_exchange"] == "binance" and matched[0]["size"] == 2
+    assert after == []
+
+
+async def _check_sync_strategies():
+    scanner = ArbitrageScanner(fees={"binance": 0.001, "okx": 0.001}, min_profitability=MIN_PROFITABILITY)
+    scanner.update_quote("binance", "BTC/USDT", 100.0, 1, 100.1, 2)
+    scanner.update_quote("okx", "BTC/USDT", 100.4, 3, 100.5, 1)
+    params = {"market": "BTC-USDT", "exchange_1": "binance", "exchange_2": "okx", "min_profitability": 0.05}
+    strategies = {
+        "7": {"status": "running", "params": params},
+        "8": {"status": "stopped", "params": params},
+        "9": {"status": "running", "params": {"market": "ETH-USDT"}},  # 不是跨交易所套利
+    }
+    # 订阅数量已满时只记录警告，阈值照常生效
+    max_subscriptions, order_book_service.max_subscriptions = order_book_service.max_subscriptions, 0
+    try:
+        scanner.sync_strategies(strategies)
+        matched = scanner.get_opportunities()
+        watches = scanner.watches
+        scanner.sync_strategies(dict(strategies))
+        unchanged = scanner.watches is watches
+        scanner.sync_strategies({"7": {"status": "stopped", "params": params}})
+        stopped = scanner.get_opportunities()
+    finally:
+        order_book_service.max_subscriptions = max_subscriptions
+    return matched, unchanged, stopped
+
+
+def test_sync_running_strategies():
+    """测试只同步运行中的策略，策略未变化时不重置阈值"""
+    print("\n=== 测试同步运行中的策略 ===")
+    matched, unchanged, stopped = asyncio.run(_check_sync_strategies())
+    print(f"✅ 运行中策略关联 {len(matched)} 个机会，策略未变化时保留阈值: {unchanged}，停止后 {len(stopped)} 个")
+    assert len(matched) == 1 and matched[0]["strategy_ids"] == [7]
+    assert unchanged
+    assert stopped == []
+
+
+def _ticker(symbol, bid, ask, size=10.0, exchange="binance"):
+    return BookTicker(exchange, symbol, bid, size, ask, size, 0)
+
+
+def test_triangular_known_cycle():
+    """测试已知价格下三角环的收益率，价格回落后机会消失"""
+    print("\n=== 测试三角套利已知环 ===")
+    detector = TriangularArbitrageDetector(min_profitability=0.05)
+    detector.fees = {"binance": 0.001}
+    detector.on_tickers([
+        _ticker("BTC/USDT", 49990, 50000),
+        _ticker("ETH/BTC", 0.0499, 0.05),
+        _ticker("ETH/USDT", 2520, 2521),
+    ])
+    opportunities = detector.get_opportunities("binance")
+    expected = (2520 / 50000 / 0.05 * 0.999 ** 3 - 1) * 100
+    detector.on_tickers([_ticker("ETH/USDT", 2500, 2501)])
+    after = detector.get_opportunities()
+    print(f"✅ 路径 {opportunities[0]['path']}，收益率 {opportunities[0]['profitability']:.4f}%（期望 {expected:.4f}%）")
+    assert len(opportunities) == 1
+    cycle = opportunities[0]
+    path = cycle["path"]
+    assert path[0] == path[-1] and set(path) == {"USDT", "BTC", "ETH"}
+    rotation = path.index("USDT")
+    assert (path[:-1] * 2)[rotation:rotation + 3] == ["USDT", "BTC", "ETH"]
+    assert abs(cycle["profitability"] - expected) < 1e-9
+    assert after == []
+
+
+async def _check_publish_per_exchange():
+    detector = TriangularArbitrageDetector(min_profitability=0.05)
+    detector.fees = {"binance": 0.001, "okx": 0.001}
+    with broadcaster.subscribe(f"{TRIANGULAR_TOPIC}:okx") as okx, broadcaster.subscribe(TRIANGULAR_TOPIC) as everything:
+        for exchange in ("binance", "okx"):
+            detector.on_tickers([
+                _ticker("BTC/USDT", 49990, 50000, exchange=exchange),
+                _ticker("ETH/BTC", 0.0499, 0.05, exchange=exchange),
+                _ticker("ETH/USDT", 2520, 2521, exchange=exchange),
+            ])
+        okx_messages = [okx.get_nowait() for _ in range(okx.qsize())]
+        all_messages = [everything.get_nowait() for _ in range(everything.qsize())]
+    return okx_messages, all_messages
+
+
+def test_triangular_publish_per_exchange():
+    """测试三角套利按交易所主题推送，总主题推送所有交易所"""
+    print("\n=== 测试三角套利按交易所推送 ===")
+    okx_messages, all_messages = asyncio.run(_check_publish_per_exchange())
+    print(f"✅ okx 主题收到 {len(okx_messages)} 条，总主题收到 {len(all_messages)} 条")
+    assert len(okx_messages) == 1
+    assert [o["exchange"] for o in okx_messages[0]["data"]] == ["okx"]
+    assert len(all_messages) == 2
+    assert sorted(o["exchange"] for o in all_messages[-1]["data"]) == ["binance", "okx"]
+
+
+def _canonical(path):
+    cycle = path[:-1]
+    start = cycle.index(min(cycle))
+    return tuple(cycle[start:] + cycle[:start])
+
+
+def test_triangular_matches_brute_force():
+    """测试随机币种图上的增量检测与穷举所有三角环一致"""
+    print("\n=== 测试三角套利与穷举一致 ===")
+    rng = random.Random(11)
+    fee, threshold = 0.001, 0.05
+    currencies = [f"C{i}" for i in range(7)]
+    values = {c: rng.uniform(0.1, 100) for c in currencies}
+    graph = CurrencyGraph("binance", fee, threshold)
+    rates = {}
+    for round_ in range(3):  # 多轮行情，后几轮只更新部分交易对，覆盖增量检查
+        changed = []
+        for base, quote in itertools.combinations(currencies, 2):
+            if round_ and rng.random() < 0.5:
+                continue
+            mid = values[base] / values[quote] * (1 + rng.uniform(-0.006, 0.006))
+            bid, ask = mid * 0.9999, mid * 1.0001
+            changed.extend(graph.update(f"{base}/{quote}", bid, 1.0, ask, 1.0))
+            rates[(base, quote)] = bid * (1 - fee)
+            rates[(quote, base)] = (1 - fee) / ask
+        graph.check(changed)
+
+        expected = set()
+        for a, b, c in itertools.permutations(currencies, 3):
+            if rates[(a, b)] * rates[(b, c)] * rates[(c, a)] - 1 > threshold / 100:
+                expected.add(_canonical([a, b, c, a]))
+        found = {_canonical(o["path"]) for o in graph.describe_opportunities()}
+        assert found == expected, (found ^ expected)
+    total = math.perm(len(currencies), 3) // 3
+    print(f"✅ {graph.cycle_count} 个三角环（期望 {total}），最后一轮有利可图 {len(found)} 个，与穷举一致")
+    assert graph.cycle_count == total
+    assert found
+
+
+def main():
+    tests = [
+        test_scanner_matches_pairwise,
+        test_strategy_threshold_and_invalidation,
+        test_sync_running_strategies,
+        test_triangular_known_cycle,
+        test_triangular_publish_per_exchange,
+        test_triangular_matches_brute_force,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+    print("=" * 50)
+    print(f"测试完成: {len(tests) - failed}/{len(tests)} 通过")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
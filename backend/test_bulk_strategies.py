@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+批量启停策略测试
+对模拟 Hummingbot API 服务器验证批量接口：任一配置无效时返回 400 且不分发任何请求、
+执行器批量分发的并发不超过 HUMMINGBOT_BULK_CONCURRENCY，以及部分策略失败时按策略 ID 返回各自的结果
+"""
+import asyncio
+import json
+import os
+import socket
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(__file__))
+os.environ.setdefault("SCHEDULER_ENABLED", "false")
+
+import hummingbot_integration
+import models
+import schemas
+from hummingbot_integration import HummingbotAPIClient, HummingbotStrategyExecutor
+from hummingbot_pool import HummingbotPool
+from mock_hummingbot_api_server import MockHummingbotAPIServer, SimulationConfig
+from strategy_jobs import StrategyCommandQueue
+from strategy_registry import StrategyRegistry
+
+PARAMS = {
+    "exchange": "binance",
+    "market": "BTC-USDT",
+    "bid_spread": 0.1,
+    "ask_spread": 0.1,
+    "order_amount": 0.01,
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _configs(count: int, **overrides):
+    return [{"id": f"s{i}", "type": "pure_market_making", "params": {**PARAMS, **overrides.get(f"s{i}", {})}}
+            for i in range(count)]
+
+
+class Environment:
+    """模拟 Hummingbot + 临时数据库上的执行注册表、执行器和命令队列；命令队列替换为全局实例供接口使用"""
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0):
+        self.latency = latency
+        self.error_rate = error_rate
+
+    async def __aenter__(self):
+        import strategy_jobs
+        from aiohttp import web
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+
+        self.tmpdir = tempfile.TemporaryDirectory()
+        engine = create_engine(f"sqlite:///{self.tmpdir.name}/bulk.db", connect_args={"check_same_thread": False})
+        models.Base.metadata.create_all(bind=engine)
+        session_factory = sessionmaker(bind=engine)
+        self.mock = MockHummingbotAPIServer(host="127.0.0.1", port=_free_port(), latency=self.latency,
+                                            simulation=SimulationConfig(error_rate=self.error_rate, seed=7))
+        self.runner = web.AppRunner(self.mock.app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.mock.host, self.mock.port).start()
+
+        self.executor = HummingbotStrategyExecutor()
+        self.executor.registry = StrategyRegistry(session_factory=session_factory)
+        self.executor.api_client = HummingbotPool([f"http://{self.mock.host}:{self.mock.port}"], HummingbotAPIClient,
+                                                  registry=self.executor.registry, session_factory=session_factory)
+        self.queue = StrategyCommandQueue(executor=self.executor, session_factory=session_factory)
+        self._saved_queue, strategy_jobs.strategy_command_queue = strategy_jobs.strategy_command_queue, self.queue
+        return self
+
+    async def __aexit__(self, *exc):
+        import strategy_jobs
+
+        strategy_jobs.strategy_command_queue = self._saved_queue
+        await self.queue.close()
+        await self.executor.api_client.close()
+        await self.runner.cleanup()
+        self.tmpdir.cleanup()
+
+    async def wait_finished(self, job_ids, timeout: float = 10.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            jobs = [await self.queue.get(job_id) for job_id in job_ids]
+            if all(job["status"] in ("succeeded", "failed") for job in jobs):
+                return jobs
+            await asyncio.sleep(0.02)
+        raise AssertionError(f"任务未在 {timeout} 秒内完成")
+
+
+async def _check_validation_up_front():
+    import main
+    from fastapi import HTTPException
+
+    async with Environment() as env:
+        request = schemas.BulkStrategyStart(strategies=_configs(5, s3={"bid_spread": 150}))
+        try:
+            await main.bulk_start_hummingbot_strategies(request, idempotency_key=None)
+            route = None
+        except HTTPException as e:
+            route = (e.status_code, list(e.detail["errors"]))
+        try:
+            await env.executor.start_strategies(_configs(5, s3={"bid_spread": 150}))
+            direct = None
+        except hummingbot_integration.BulkValidationError as e:
+            direct = list(e.errors)
+        return route, direct, await env.queue.list(), env.mock.request_count, len(env.mock.running_strategies)
+
+
+def test_validation_up_front():
+    """测试任一配置无效时返回 400，不提交任务也不向 Hummingbot 发送请求"""
+    print("=== 测试批量启动的预先验证 ===")
+    route, direct, jobs, requests, running = asyncio.run(_check_validation_up_front())
+    print(f"✅ 接口返回 {route}，执行器拒绝 {direct}，提交任务 {len(jobs)} 个，Hummingbot 收到 {requests} 个请求")
+    assert route == (400, ["s3"]) and direct == ["s3"]
+    assert jobs == [] and requests == 0 and running == 0
+
+
+async def _check_concurrency(limit: int, count: int):
+    async with Environment(latency=0.05) as env:
+        pool = env.executor.api_client
+        start_strategy = pool.start_strategy
+        in_flight = peak = 0
+
+        async def counting_start(strategy_id, config):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            try:
+                return await start_strategy(strategy_id, config)
+            finally:
+                in_flight -= 1
+
+        pool.start_strategy = counting_start
+        saved, hummingbot_integration.HUMMINGBOT_BULK_CONCURRENCY = \
+            hummingbot_integration.HUMMINGBOT_BULK_CONCURRENCY, limit
+        try:
+            began = time.monotonic()
+            results = await env.executor.start_strategies(_configs(count))
+            elapsed = time.monotonic() - began
+        finally:
+            hummingbot_integration.HUMMINGBOT_BULK_CONCURRENCY = saved
+        return results, peak, elapsed, len(env.mock.running_strategies)
+
+
+def test_concurrency_bounded():
+    """测试批量分发的并发不超过 HUMMINGBOT_BULK_CONCURRENCY，且确实并发执行"""
+    print("\n=== 测试批量分发的并发上限 ===")
+    results, peak, elapsed, running = asyncio.run(_check_concurrency(limit=4, count=16))
+    print(f"✅ 16 个策略，并发上限 4，峰值并发 {peak}，耗时 {elapsed:.2f}s，运行中 {running}")
+    assert all(r["success"] for r in results.values()) and running == 16
+    assert peak == 4
+    assert elapsed < 16 * 0.05
+
+
+async def _check_partial_failures(count: int):
+    import main
+
+    async with Environment(error_rate=0.5) as env:
+        request = schemas.BulkStrategyStart(strategies=_configs(count))
+        response = await main.bulk_start_hummingbot_strategies(request, idempotency_key=None)
+        body = json.loads(response.body)["data"]
+        jobs = await env.wait_finished([r["job"]["id"] for r in body["results"].values()])
+
+        started = set(env.mock.running_strategies)
+        # 停止时不再注入错误：运行中的策略成功，不存在的策略失败
+        env.mock.simulation.error_rate = 0.0
+        direct = await env.executor.stop_strategies(["missing", *sorted(started)])
+        return response.status_code, body, {job["strategy_id"]: job for job in jobs}, started, direct, \
+            set(env.mock.running_strategies), env.mock.stats["errors"]
+
+
+def test_partial_failures():
+    """测试部分策略在 Hummingbot 上失败时，每个策略的结果各自返回"""
+    print("\n=== 测试部分失败 ===")
+    status, body, jobs, started, direct, remaining, errors = asyncio.run(_check_partial_failures(8))
+    failed = sorted(i for i, job in jobs.items() if job["status"] == "failed")
+    print(f"✅ 接口 {status} 提交 {body['submitted']} 个任务，失败 {failed}（注入错误 {errors} 次），"
+          f"批量停止结果 {[(i, r['success']) for i, r in direct.items()]}")
+    assert status == 202 and body["total"] == body["submitted"] == 8
+    assert sorted(jobs) == [f"s{i}" for i in range(8)]
+    assert 0 < len(failed) < 8
+    assert all(jobs[i]["error"] for i in failed)
+    assert started == {i for i, job in jobs.items() if job["status"] == "succeeded"}
+    assert list(direct) == ["missing", *sorted(started)]
+    assert not direct["missing"]["success"] and direct["missing"]["error"]
+    assert all(direct[i]["success"] for i in started) and remaining == set()
+
+
+def main():
+    tests = [
+        test_validation_up_front,
+        test_concurrency_bounded,
+        test_partial_failures,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+    print("=" * 50)
+    print(f"测试完成: {len(tests) - failed}/{len(tests)} 通过")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+成交接入测试
+在临时数据库上对模拟 Hummingbot 的 GET /fills 验证：同一成交重复推送只写入一次、批内重复只写入一次、
+写入失败时游标不前进（游标与成交同一事务提交）、重启后从已保存的游标继续拉取，
+以及格式无效的事件被跳过并计数、游标照常前进
+"""
+import asyncio
+import os
+import socket
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(__file__))
+
+import models
+import schemas
+from fill_ingest import FillIngestor, fills_rejected
+from hummingbot_integration import HummingbotAPIClient
+from mock_hummingbot_api_server import MockHummingbotAPIServer
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _event(order_id: str, trade_id: str = None, side: str = "buy") -> schemas.HummingbotEvent:
+    return schemas.HummingbotEvent(exchange="binance", symbol="BTC-USDT", order_id=order_id, trade_id=trade_id,
+                                   side=side, price=50000.0, amount=0.01, strategy_id="s1")
+
+
+class Environment:
+    """临时数据库 + 模拟 Hummingbot"""
+
+    async def __aenter__(self):
+        from aiohttp import web
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{self.tmpdir.name}/fills.db", connect_args={"check_same_thread": False})
+        models.Base.metadata.create_all(bind=self.engine)
+        self.session_factory = sessionmaker(bind=self.engine)
+        self.mock = MockHummingbotAPIServer(host="127.0.0.1", port=_free_port())
+        self.runner = web.AppRunner(self.mock.app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.mock.host, self.mock.port).start()
+        self.source = f"http://{self.mock.host}:{self.mock.port}"
+        self.client = HummingbotAPIClient(self.source, max_retries=0)
+        self.ingestors = []
+        return self
+
+    async def __aexit__(self, *exc):
+        for ingestor in self.ingestors:
+            await ingestor.close()
+        await self.client.close()
+        await self.runner.cleanup()
+        self.engine.dispose()
+        self.tmpdir.cleanup()
+
+    def ingestor(self) -> FillIngestor:
+        """新的接入实例，模拟进程重启"""
+        ingestor = FillIngestor(batch_size=3, flush_interval=0, session_factory=self.session_factory)
+        self.ingestors.append(ingestor)
+        return ingestor
+
+    def counts(self):
+        """trades 条数和已保存的游标"""
+        import crud
+
+        db = self.session_factory()
+        try:
+            return db.query(models.Trade).count(), crud.get_ingest_cursor(db, self.source)
+        finally:
+            db.close()
+
+
+async def _check_dedup():
+    async with Environment() as env:
+        ingestor = env.ingestor()
+        first = await ingestor.submit([_event("o1", "t1"), _event("o1", "t2")])
+        again = await ingestor.submit([_event("o1", "t1")])
+        # 批内重复：同一批中的重复成交，且跨越多个写入块
+        in_batch = await ingestor.submit([_event("o2"), _event("o3"), _event("o2"), _event("o4"), _event("o3")])
+        trades, _ = env.counts()
+        return first, again, in_batch, trades
+
+
+def test_duplicate_fills():
+    """测试重复推送和批内重复的成交只写入一次"""
+    print("=== 测试成交去重 ===")
+    first, again, in_batch, trades = asyncio.run(_check_dedup())
+    print(f"✅ 首次 {first}，重复推送 {again}，批内重复 {in_batch}，trades {trades} 条")
+    assert first["accepted"] == 2 and first["duplicates"] == 0
+    assert again["accepted"] == 0 and again["duplicates"] == 1
+    assert in_batch["accepted"] == 3 and in_batch["duplicates"] == 2
+    assert trades == 5
+
+
+async def _check_cursor_transaction():
+    from sqlalchemy import text
+
+    async with Environment() as env:
+        for i in range(5):
+            env.mock.add_fill("s1", "buy" if i % 2 else "sell", 50000.0 + i, 0.01)
+        ingestor = env.ingestor()
+        # 成交写入失败时整个事务回滚，游标不前进
+        with env.engine.begin() as conn:
+            conn.execute(text("ALTER TABLE trades RENAME TO trades_offline"))
+        try:
+            await ingestor.pull(env.source, env.client, limit=2)
+            failed = None
+        except Exception as e:
+            failed = e
+        with env.engine.begin() as conn:
+            conn.execute(text("ALTER TABLE trades_offline RENAME TO trades"))
+        after_failure = env.counts()
+        pulled = await ingestor.pull(env.source, env.client, limit=2)
+        after_pull = env.counts()
+
+        # 重启后从已保存的游标继续，只拉取新的事件
+        for i in range(3):
+            env.mock.add_fill("s1", "buy", 51000.0 + i, 0.02)
+        env.mock.request_count = 0
+        resumed = await env.ingestor().pull(env.source, env.client, limit=2)
+        return failed, after_failure, pulled, after_pull, resumed, env.counts(), env.mock.request_count
+
+
+def test_cursor_and_restart():
+    """测试游标与成交同一事务提交，重启后从已保存的游标继续"""
+    print("\n=== 测试拉取游标 ===")
+    failed, after_failure, pulled, after_pull, resumed, after_resume, requests = asyncio.run(_check_cursor_transaction())
+    print(f"✅ 写入失败后 (trades, 游标) = {after_failure}，拉取 {pulled} 笔后 {after_pull}，"
+          f"重启后拉取 {resumed} 笔（{requests} 次请求）后 {after_resume}")
+    assert failed is not None
+    assert after_failure == (0, 0)
+    assert pulled == 5 and after_pull == (5, 5)
+    assert resumed == 3 and after_resume == (8, 8)
+    assert requests == 2
+
+
+async def _check_invalid_events():
+    async with Environment() as env:
+        env.mock.add_fill("s1", "buy", 50000.0, 0.01)
+        env.mock.add_fill("s1", "hold", 50000.0, 0.01)  # 方向无效
+        env.mock.add_fill("s1", "sell", 0.0, 0.01)  # 价格无效
+        bad = env.mock.add_fill("s1", "sell", 50000.0, 0.01)
+        del bad["exchange"]  # 缺少必填字段
+        env.mock.add_fill("s1", "sell", 50100.0, 0.01)
+        rejected = fills_rejected.get(source=env.source)
+        pulled = await env.ingestor().pull(env.source, env.client)
+        again = await env.ingestor().pull(env.source, env.client)
+        return pulled, again, fills_rejected.get(source=env.source) - rejected, env.counts()
+
+
+def test_invalid_events_skipped():
+    """测试格式无效的事件被跳过并计数，游标照常前进"""
+    print("\n=== 测试无效事件 ===")
+    pulled, again, rejected, (trades, cursor) = asyncio.run(_check_invalid_events())
+    print(f"✅ 写入 {pulled} 笔，跳过 {rejected} 条无效事件，游标前进到 {cursor}，再次拉取写入 {again} 笔")
+    assert pulled == 2 and again == 0
+    assert rejected == 3
+    assert trades == 2 and cursor == 5
+
+
+def main():
+    tests = [
+        test_duplicate_fills,
+        test_cursor_and_restart,
+        test_invalid_events_skipped,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+    print("=" * 50)
+    print(f"测试完成: {len(tests) - failed}/{len(tests)} 通过")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+资金费率监控测试
+用本地服务器返回的固定响应验证币安和 OKX 资金费率的解析（币安结算周期来自 fundingInfo，只拉取一次，
+失败时按 8 小时并在下次重试），以及矩阵的写入、基差/年化费率/跨交易所价差的计算，
+和策略阈值的双向穿越提醒（暂时没有费率时保持原状态）
+"""
+import asyncio
+import math
+import os
+import socket
+import sys
+
+sys.path.append(os.path.dirname(__file__))
+os.environ.setdefault("SCHEDULER_ENABLED", "false")
+
+import funding
+from funding import FundingMonitor
+
+BINANCE_PREMIUM_INDEX = [
+    {"symbol": "BTCUSDT", "markPrice": "60060.0", "indexPrice": "60000.0", "lastFundingRate": "0.00010000",
+     "nextFundingTime": 1700028800000},
+    {"symbol": "ETHUSDT", "markPrice": "2990.0", "indexPrice": "3000.0", "lastFundingRate": "-0.00020000",
+     "nextFundingTime": 1700014400000},
+    {"symbol": "BTCUSDT_250627", "markPrice": "61000.0", "indexPrice": "60000.0", "lastFundingRate": "",
+     "nextFundingTime": 0},
+    {"symbol": "NEWUSDT", "markPrice": "1.0", "indexPrice": "1.0", "lastFundingRate": "",
+     "nextFundingTime": 0},
+]
+BINANCE_FUNDING_INFO = [
+    {"symbol": "ETHUSDT", "adjustedFundingRateCap": "0.02", "adjustedFundingRateFloor": "-0.02",
+     "fundingIntervalHours": 4, "disclaimer": False},
+]
+OKX_MARK_PRICES = {"code": "0", "data": [
+    {"instId": "BTC-USDT-SWAP", "instType": "SWAP", "markPx": "60030"},
+    {"instId": "ETH-USDT-SWAP", "instType": "SWAP", "markPx": "3003"},
+    {"instId": "BTC-USD-SWAP", "instType": "SWAP", "markPx": "60010"},
+]}
+OKX_INDEX_TICKERS = {"code": "0", "data": [
+    {"instId": "BTC-USDT", "idxPx": "60000"},
+]}
+OKX_FUNDING_RATES = {
+    "BTC-USDT-SWAP": {"instId": "BTC-USDT-SWAP", "fundingRate": "0.0003", "nextFundingRate": "0.0002",
+                      "fundingTime": "1700006400000", "nextFundingTime": "1700020800000"},
+    "ETH-USDT-SWAP": {"instId": "ETH-USDT-SWAP", "fundingRate": "0.0001", "nextFundingRate": "",
+                      "fundingTime": "1700006400000", "nextFundingTime": ""},
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class CannedExchange:
+    """返回固定响应的币安合约和 OKX 接口，统计每个路径的请求次数"""
+
+    def __init__(self):
+        self.calls = {}
+        self.funding_info_status = 200
+
+    async def __aenter__(self):
+        from aiohttp import web
+
+        self.app = web.Application()
+        routes = {
+            "/fapi/v1/premiumIndex": lambda request: BINANCE_PREMIUM_INDEX,
+            "/fapi/v1/fundingInfo": lambda request: BINANCE_FUNDING_INFO,
+            "/api/v5/public/mark-price": lambda request: OKX_MARK_PRICES,
+            "/api/v5/market/index-tickers": lambda request: OKX_INDEX_TICKERS,
+            "/api/v5/public/funding-rate":
+                lambda request: {"code": "0", "data": [OKX_FUNDING_RATES[request.query["instId"]]]},
+        }
+        for path, payload in routes.items():
+            self.app.router.add_get(path, self._handler(path, payload))
+        self.runner = web.AppRunner(self.app)
+        await self.runner.setup()
+        port = _free_port()
+        await web.TCPSite(self.runner, "127.0.0.1", port).start()
+        self.saved = funding.BINANCE_FUTURES_API_URL, funding.OKX_API_URL
+        funding.BINANCE_FUTURES_API_URL = funding.OKX_API_URL = f"http://127.0.0.1:{port}"
+        funding._binance_intervals, funding._binance_intervals_at = {}, None
+        return self
+
+    async def __aexit__(self, *exc):
+        funding.BINANCE_FUTURES_API_URL, funding.OKX_API_URL = self.saved
+        funding._binance_intervals, funding._binance_intervals_at = {}, None
+        await self.runner.cleanup()
+
+    def _handler(self, path, payload):
+        from aiohttp import web
+
+        async def handler(request):
+            self.calls[path] = self.calls.get(path, 0) + 1
+            if path == "/fapi/v1/fundingInfo" and self.funding_info_status != 200:
+                return web.json_response({"code": -1, "msg": "error"}, status=self.funding_info_status)
+            return web.json_response(payload(request))
+        return handler
+
+
+async def _fetch_binance():
+    from aiohttp import ClientSession
+
+    async with CannedExchange() as exchange, ClientSession() as session:
+        exchange.funding_info_status = 500
+        fallback = await funding.fetch_binance_funding(session)
+        exchange.funding_info_status = 200
+        first = await funding.fetch_binance_funding(session)
+        second = await funding.fetch_binance_funding(session)
+        return fallback, first, second, dict(exchange.calls)
+
+
+def test_binance_parser():
+    """测试币安资金费率解析：只保留永续合约，结算周期来自 fundingInfo 且只拉取一次，失败时按 8 小时"""
+    print("=== 测试币安资金费率解析 ===")
+    fallback, first, second, calls = asyncio.run(_fetch_binance())
+    intervals = {rate["symbol"]: rate["interval_hours"] for rate in first}
+    print(f"✅ 结算周期 {intervals}，fundingInfo 失败时 {[r['interval_hours'] for r in fallback]}，请求次数 {calls}")
+    assert [rate["symbol"] for rate in first] == ["BTC/USDT", "ETH/USDT"]
+    btc = first[0]
+    assert (btc["funding_rate"], btc["predicted_rate"], btc["next_funding_time"]) == (0.0001, None, 1700028800000)
+    assert (btc["mark_price"], btc["index_price"]) == (60060.0, 60000.0)
+    assert intervals == {"BTC/USDT": 8, "ETH/USDT": 4.0}
+    assert [rate["interval_hours"] for rate in fallback] == [8, 8]
+    assert second == first
+    # 失败的一次和成功的一次，之后使用缓存
+    assert calls["/fapi/v1/fundingInfo"] == 2 and calls["/fapi/v1/premiumIndex"] == 3
+
+
+async def _fetch_okx():
+    from aiohttp import ClientSession
+
+    async with CannedExchange() as exchange, ClientSession() as session:
+        return await funding.fetch_okx_funding(session), dict(exchange.calls)
+
+
+def test_okx_parser():
+    """测试 OKX 资金费率解析：只取 USDT 永续，结算周期由两次结算时间推算，缺少时按 8 小时"""
+    print("\n=== 测试 OKX 资金费率解析 ===")
+    rates, calls = asyncio.run(_fetch_okx())
+    rates = {rate["symbol"]: rate for rate in rates}
+    print(f"✅ {[(s, r['funding_rate'], r['interval_hours']) for s, r in rates.items()]}，请求次数 {calls}")
+    assert sorted(rates) == ["BTC/USDT", "ETH/USDT"]
+    btc, eth = rates["BTC/USDT"], rates["ETH/USDT"]
+    assert (btc["funding_rate"], btc["predicted_rate"], btc["interval_hours"]) == (0.0003, 0.0002, 4.0)
+    assert (btc["mark_price"], btc["index_price"], btc["next_funding_time"]) == (60030.0, 60000.0, 1700006400000)
+    assert eth["predicted_rate"] is None and eth["interval_hours"] == 8
+    assert math.isnan(eth["index_price"])
+    assert calls["/api/v5/public/funding-rate"] == 2
+
+
+def _rate(symbol, funding_rate, mark=100.0, index=100.0, interval=8):
+    return {"symbol": symbol, "funding_rate": funding_rate, "predicted_rate": None, "next_funding_time": 1,
+            "interval_hours": interval, "mark_price": mark, "index_price": index}
+
+
+def test_update_and_compute():
+    """测试矩阵写入（容量不足时扩容、未返回的合约清空）和向量化计算"""
+    print("\n=== 测试资金费率矩阵计算 ===")
+    monitor = FundingMonitor(capacity=1)
+    monitor.update("binance_perpetual", [_rate("BTC/USDT", 0.0001, mark=101.0), _rate("ETH/USDT", -0.0002, interval=4),
+                                         _rate("SOL/USDT", 0.0005)])
+    monitor.update("okx_perpetual", [_rate("BTC/USDT", 0.0003), _rate("ETH/USDT", 0.0001)])
+    monitor.compute()
+    rates = {(r["symbol"], r["venue"]): r for r in monitor.get_rates()}
+    carry = monitor.get_carry()
+    print(f"✅ 容量 {monitor.capacity}，价差 {[(c['symbol'], round(c['annualized_carry'], 2)) for c in carry]}")
+    assert monitor.capacity == 4 and monitor.symbols == ["BTC/USDT", "ETH/USDT", "SOL/USDT"]
+    assert math.isclose(rates[("BTC/USDT", "binance_perpetual")]["basis"], 1.0)
+    assert math.isclose(rates[("BTC/USDT", "binance_perpetual")]["annualized_funding"], 0.01 * 3 * 365)
+    assert math.isclose(rates[("ETH/USDT", "binance_perpetual")]["annualized_funding"], -0.02 * 6 * 365)
+    # SOL 只有一个交易所，没有价差；ETH 做多币安、做空 OKX
+    assert [c["symbol"] for c in carry] == ["ETH/USDT", "BTC/USDT"]
+    assert carry[0]["long_venue"] == "binance_perpetual" and carry[0]["short_venue"] == "okx_perpetual"
+    assert math.isclose(carry[0]["annualized_carry"], (0.01 * 3 + 0.02 * 6) * 365)
+
+    # 本次未返回的合约清空，不再参与计算
+    monitor.update("binance_perpetual", [_rate("BTC/USDT", 0.0001)])
+    monitor.compute()
+    assert ("SOL/USDT", "binance_perpetual") not in {(r["symbol"], r["venue"]) for r in monitor.get_rates()}
+    assert [c["symbol"] for c in monitor.get_carry()] == ["BTC/USDT"]
+
+
+def test_check_strategies():
+    """测试策略阈值双向穿越时各提醒一次，暂时没有费率时保持原状态"""
+    print("\n=== 测试资金费率阈值提醒 ===")
+    monitor = FundingMonitor(capacity=4)
+    strategies = {
+        "long": {"type": "spot_perpetual_arbitrage", "status": "running",
+                 "params": {"market": "BTC-USDT", "perpetual_connector": "binance_perpetual",
+                            "funding_rate_threshold": 0.01}},
+        "short": {"type": "spot_perpetual_arbitrage", "status": "running",
+                  "params": {"market": "ETH-USDT", "perpetual_connector": "okx_perpetual",
+                             "funding_rate_threshold": -0.01}},
+        "other": {"type": "pure_market_making", "status": "running", "params": {"market": "BTC-USDT"}},
+    }
+    steps = []
+
+    def step(binance_btc, okx_eth):
+        monitor.update("binance_perpetual", [_rate("BTC/USDT", binance_btc)] if binance_btc is not None else [])
+        monitor.update("okx_perpetual", [_rate("ETH/USDT", okx_eth)] if okx_eth is not None else [])
+        monitor.sync_strategies(strategies)
+        alerts = monitor.check_strategies()
+        steps.append(sorted((a["strategy_id"], a["crossed"]) for a in alerts))
+
+    step(0.00005, 0.0)  # 都未超过
+    step(0.0002, -0.0002)  # 都超过
+    step(0.0003, -0.0003)  # 仍超过，不重复提醒
+    step(None, None)  # 暂时没有费率：保持超过
+    step(0.0003, -0.0003)  # 恢复后仍超过，不提醒
+    step(0.00005, 0.0001)  # 都回落
+    print(f"✅ 每次刷新的提醒 {steps}")
+    assert sorted(monitor.strategy_states) == ["long", "short"]
+    assert steps == [
+        [],
+        [("long", "above"), ("short", "above")],
+        [],
+        [],
+        [],
+        [("long", "below"), ("short", "below")],
+    ]
+
+
+def main():
+    tests = [
+        test_binance_parser,
+        test_okx_parser,
+        test_update_and_compute,
+        test_check_strategies,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+    print("=" * 50)
+    print(f"测试完成: {len(tests) - failed}/{len(tests)} 通过")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Hummingbot API 客户端测试
+对注入了延迟的模拟 Hummingbot API 服务器验证：慢调用不会阻塞其他接口，
+超时、幂等请求重试和取消都按预期工作，事件循环变化时旧会话被关闭
+"""
+import asyncio
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.append(os.path.dirname(__file__))
+os.environ.setdefault("SCHEDULER_ENABLED", "false")
+
+from hummingbot_integration import HummingbotAPIClient, strategy_executor
+from mock_hummingbot_api_server import MockHummingbotAPIServer
+
+# 模拟 Hummingbot 的响应延迟（秒）和其他接口允许的最大响应时间（秒）；
+# 事件循环被阻塞时健康检查至少要等待整个 MOCK_LATENCY
+MOCK_LATENCY = 1.0
+RESPONSIVE_BUDGET = MOCK_LATENCY / 2
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _start_mock(latency: float):
+    from aiohttp import web
+
+    server = MockHummingbotAPIServer(host="127.0.0.1", port=_free_port(), latency=latency)
+    runner = web.AppRunner(server.app)
+    await runner.setup()
+    await web.TCPSite(runner, server.host, server.port).start()
+    return server, runner
+
+
+async def _start_backend():
+    import uvicorn
+    from main import app
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, lifespan="off", log_level="warning"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    return server, task, f"http://127.0.0.1:{port}"
+
+
+async def _check_other_routes_responsive():
+    import aiohttp
+
+    mock, runner = await _start_mock(MOCK_LATENCY)
+    strategy_executor.api_client = HummingbotAPIClient(f"http://{mock.host}:{mock.port}")
+    backend, task, base_url = await _start_backend()
+    try:
+        async with aiohttp.ClientSession() as session:
+            # 预热连接和按需导入的模块
+            async with session.get(f"{base_url}/health") as response:
+                assert response.status == 200
+            
+            async def slow_call():
+                async with session.get(f"{base_url}/api/hummingbot/strategies/slow/status") as response:
+                    return response.status
+
+            slow = asyncio.create_task(slow_call())
+            await asyncio.sleep(0.1)
+
+            # Hummingbot 调用进行中，其他接口必须照常快速响应
+            latencies = []
+            while not slow.done():
+                start = time.perf_counter()
+                async with session.get(f"{base_url}/health") as response:
+                    assert response.status == 200
+                latencies.append(time.perf_counter() - start)
+                await asyncio.sleep(0.05)
+            await slow
+            return latencies
+    finally:
+        backend.should_exit = True
+        await task
+        await strategy_executor.api_client.close()
+        await runner.cleanup()
+
+
+def test_other_routes_stay_responsive():
+    """测试慢 Hummingbot 调用期间其他接口不受阻塞"""
+    print("=== 测试慢调用不阻塞事件循环 ===")
+    latencies = asyncio.run(_check_other_routes_responsive())
+    assert len(latencies) >= 5, f"慢调用期间只完成了 {len(latencies)} 次健康检查"
+    worst = max(latencies)
+    print(f"✅ 慢调用期间完成 {len(latencies)} 次健康检查，最慢 {worst * 1000:.1f}ms")
+    assert worst < RESPONSIVE_BUDGET, f"健康检查耗时 {worst:.3f}s 超出 {RESPONSIVE_BUDGET}s"
+
+
+async def _check_timeout_and_retries():
+    mock, runner = await _start_mock(0.5)
+    client = HummingbotAPIClient(f"http://{mock.host}:{mock.port}", timeout=0.1, max_retries=2)
+    try:
+        # 幂等的 GET 超时后重试
+        start = time.perf_counter()
+        try:
+            await client.get_strategy_status("slow")
+            raise AssertionError("应该超时但返回了结果")
+        except asyncio.TimeoutError:
+            pass
+        elapsed = time.perf_counter() - start
+        get_attempts = mock.request_count
+
+        # 非幂等的 POST 不重试
+        mock.request_count = 0
+        try:
+            await client.stop_strategy("slow")
+            raise AssertionError("应该超时但返回了结果")
+        except asyncio.TimeoutError:
+            pass
+        return elapsed, get_attempts, mock.request_count
+    finally:
+        await client.close()
+        await runner.cleanup()
+
+
+def test_timeout_and_retries():
+    """测试超时以及只对幂等请求重试"""
+    print("\n=== 测试超时与重试 ===")
+    elapsed, get_attempts, post_attempts = asyncio.run(_check_timeout_and_retries())
+    print(f"✅ GET 请求 {get_attempts} 次后超时（耗时 {elapsed:.2f}s），POST 请求 {post_attempts} 次")
+    assert get_attempts == 3
+    assert post_attempts == 1
+    assert elapsed < 2.0
+
+
+async def _check_cancellation():
+    mock, runner = await _start_mock(MOCK_LATENCY)
+    client = HummingbotAPIClient(f"http://{mock.host}:{mock.port}")
+    try:
+        task = asyncio.create_task(client.get_strategies())
+        await asyncio.sleep(0.1)
+        start = time.perf_counter()
+        task.cancel()
+        try:
+            await task
+            raise AssertionError("应该被取消但返回了结果")
+        except asyncio.CancelledError:
+            pass
+        cancel_elapsed = time.perf_counter() - start
+
+        # 取消后连接池仍可继续使用
+        mock.latency = 0
+        result = await client.get_strategies()
+        return cancel_elapsed, result
+    finally:
+        await client.close()
+        await runner.cleanup()
+
+
+def test_cancellation():
+    """测试取消进行中的请求"""
+    print("\n=== 测试取消请求 ===")
+    cancel_elapsed, result = asyncio.run(_check_cancellation())
+    print(f"✅ 请求在 {cancel_elapsed * 1000:.1f}ms 内取消，之后的请求正常返回")
+    assert cancel_elapsed < 0.1
+    assert result["success"]
+
+
+def test_session_replaced_on_loop_change():
+    """测试在其他事件循环中调用时关闭旧会话：原事件循环仍在运行时交给它关闭，已关闭时分离"""
+    print("\n=== 测试事件循环变化时关闭旧会话 ===")
+    background = asyncio.new_event_loop()
+    thread = threading.Thread(target=background.run_forever, daemon=True)
+    thread.start()
+    mock, runner = asyncio.run_coroutine_threadsafe(_start_mock(0), background).result()
+    client = HummingbotAPIClient(f"http://{mock.host}:{mock.port}")
+    try:
+        asyncio.run_coroutine_threadsafe(client.get_strategies(), background).result()
+        running_loop_session = client._session
+        asyncio.run(client.get_strategies())
+        asyncio.run_coroutine_threadsafe(asyncio.sleep(0.05), background).result()
+        closed_loop_session = client._session
+        asyncio.run(client.get_strategies())
+        sessions = [running_loop_session.closed, closed_loop_session.closed]
+        asyncio.run_coroutine_threadsafe(client.close(), background).result()
+    finally:
+        asyncio.run_coroutine_threadsafe(runner.cleanup(), background).result()
+        background.call_soon_threadsafe(background.stop)
+        thread.join()
+        background.close()
+    print(f"✅ 原事件循环运行中的旧会话已关闭: {sessions[0]}，原事件循环已关闭的旧会话已分离: {sessions[1]}")
+    assert sessions == [True, True]
+
+
+def main():
+    tests = [
+        test_other_routes_stay_responsive,
+        test_timeout_and_retries,
+        test_cancellation,
+        test_session_replaced_on_loop_change,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+    print("=" * 50)
+    print(f"测试完成: {len(tests) - failed}/{len(tests)} 通过")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
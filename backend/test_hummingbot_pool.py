@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Hummingbot 多实例编排测试
+在不同端口启动多个模拟 Hummingbot API 服务器，验证按负载放置、粘性放置、
+新增实例后的再平衡（新实例记录在数据库中，其他 worker 加载），以及实例故障后的转移和恢复后的清理
+（健康检查不转移，只有 leader 的故障处理才转移，且 leader 切换后仍能清理）
+"""
+import asyncio
+import os
+import socket
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(__file__))
+os.environ.setdefault("SCHEDULER_ENABLED", "false")
+
+from hummingbot_integration import HummingbotAPIClient, HummingbotStrategyExecutor
+from hummingbot_pool import HummingbotPool
+from mock_hummingbot_api_server import MockHummingbotAPIServer
+from strategy_registry import StrategyRegistry
+
+STRATEGY_COUNT = 10
+PARAMS = {
+    "exchange": "binance",
+    "market": "BTC-USDT",
+    "bid_spread": 0.1,
+    "ask_spread": 0.1,
+    "order_amount": 0.01,
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _start_mock():
+    from aiohttp import web
+
+    server = MockHummingbotAPIServer(host="127.0.0.1", port=_free_port())
+    runner = web.AppRunner(server.app)
+    await runner.setup()
+    await web.TCPSite(runner, server.host, server.port).start()
+    return server, runner
+
+
+def _url(mock) -> str:
+    return f"http://{mock.host}:{mock.port}"
+
+
+class Cluster:
+    """若干模拟实例 + 临时数据库上的执行注册表 + 实例池和执行器"""
+
+    async def __aenter__(self):
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+        import models
+
+        self.tmpdir = tempfile.TemporaryDirectory()
+        engine = create_engine(f"sqlite:///{self.tmpdir.name}/registry.db", connect_args={"check_same_thread": False})
+        models.Base.metadata.create_all(bind=engine)
+        self.session_factory = sessionmaker(bind=engine)
+        self.registry = StrategyRegistry(session_factory=self.session_factory)
+        self.mocks = []
+        self.runners = []
+        for _ in range(3):
+            mock, runner = await _start_mock()
+            self.mocks.append(mock)
+            self.runners.append(runner)
+        self.pools = []
+        self.pool = self.new_pool()
+        self.executor = HummingbotStrategyExecutor()
+        self.executor.registry = self.registry
+        self.executor.api_client = self.pool
+        return self
+
+    def new_pool(self) -> HummingbotPool:
+        """同一配置的实例池，模拟另一个 worker"""
+        pool = HummingbotPool([_url(m) for m in self.mocks[:2]], HummingbotAPIClient, registry=self.registry,
+                              health_timeout=0.2, failover_after=2, session_factory=self.session_factory)
+        self.pools.append(pool)
+        return pool
+
+    async def __aexit__(self, *exc):
+        for pool in self.pools:
+            await pool.close()
+        for runner in self.runners:
+            await runner.cleanup()
+        self.tmpdir.cleanup()
+
+    async def start_all(self):
+        configs = [{"id": f"s{i}", "type": "pure_market_making", "params": PARAMS} for i in range(STRATEGY_COUNT)]
+        results = await self.executor.start_strategies(configs)
+        assert all(r["success"] for r in results.values()), results
+
+    def loads(self):
+        return [len(m.running_strategies) for m in self.mocks]
+
+    async def assert_consistent(self):
+        """注册表记录的实例与各模拟实例上实际运行的策略一致，且每个策略只在一个实例上运行"""
+        running = await self.registry.running()
+        actual = {}
+        for mock in self.mocks:
+            for strategy_id in mock.running_strategies:
+                assert strategy_id not in actual, f"策略 {strategy_id} 同时在多个实例上运行"
+                actual[strategy_id] = _url(mock)
+        assert {i: e["instance"] for i, e in running.items()} == actual, (running, actual)
+
+
+async def _check_placement_and_stickiness():
+    async with Cluster() as cluster:
+        await cluster.start_all()
+        loads = cluster.loads()
+        await cluster.assert_consistent()
+
+        # 停止后重新启动，即使另一个实例负载更低也回到原来的实例
+        running = await cluster.registry.running()
+        first = running["s0"]["instance"]
+        others = [i for i, e in running.items() if e["instance"] != first][:2]
+        results = await cluster.executor.stop_strategies(["s0", *others])
+        assert all(r["success"] for r in results.values()), results
+        assert (await cluster.registry.get("s0"))["status"] == "stopped"
+        assert await cluster.executor.start_strategy("s0", "pure_market_making", PARAMS)
+        sticky = (await cluster.registry.get("s0"))["instance"]
+        await cluster.assert_consistent()
+        return loads, first, sticky
+
+
+def test_placement_and_stickiness():
+    """测试按负载放置和粘性放置"""
+    print("=== 测试按负载放置与粘性放置 ===")
+    loads, first, sticky = asyncio.run(_check_placement_and_stickiness())
+    print(f"✅ {STRATEGY_COUNT} 个策略分布为 {loads[:2]}，重启后仍在 {sticky}")
+    assert loads[:2] == [STRATEGY_COUNT // 2, STRATEGY_COUNT // 2]
+    assert first == sticky
+
+
+async def _check_rebalance():
+    async with Cluster() as cluster:
+        await cluster.start_all()
+        other_worker = cluster.new_pool()
+        cluster.pool.add_instance(_url(cluster.mocks[2]))
+        await cluster.pool.check_health()
+        await cluster.pool.save_instance(_url(cluster.mocks[2]))
+        moves = await cluster.pool.rebalance()
+        await cluster.assert_consistent()
+        # 其他 worker 和重启后的进程在下一次健康检查时加载新实例
+        await other_worker.check_health()
+        restarted = cluster.new_pool()
+        await restarted.check_health()
+        return moves, cluster.loads(), sorted(other_worker.instances), sorted(restarted.instances)
+
+
+def test_rebalance_on_new_instance():
+    """测试新增实例后的再平衡，新实例在其他 worker 和重启后仍在实例池中"""
+    print("\n=== 测试新增实例后再平衡 ===")
+    moves, loads, other_worker, restarted = asyncio.run(_check_rebalance())
+    print(f"✅ 迁移 {len(moves)} 个策略，负载变为 {loads}，其他 worker 的实例数 {len(other_worker)}")
+    assert sum(loads) == STRATEGY_COUNT
+    assert max(loads) - min(loads) <= 1
+    assert len(moves) == 3
+    assert len(other_worker) == 3 and other_worker == restarted
+
+
+async def _check_failover():
+    async with Cluster() as cluster:
+        await cluster.start_all()
+        dead = cluster.mocks[0]
+        stranded = set(dead.running_strategies)
+
+        # 实例无响应（健康检查超时），但其上的策略仍在运行，模拟网络分区
+        dead.latency = 1.0
+        for _ in range(cluster.pool.failover_after):
+            await cluster.pool.check_health()
+        # 健康检查只更新放置用的状态，不转移策略
+        before = {i for i, e in (await cluster.registry.running()).items() if e["instance"] != _url(dead)}
+        await cluster.pool.handle_failures()
+        running = await cluster.registry.running()
+        moved = {i for i, e in running.items() if e["instance"] != _url(dead)}
+
+        # leader 切换：新 leader 从数据库得知该实例已故障转移，实例恢复后停止已转移走的策略
+        dead.latency = 0
+        new_leader = cluster.new_pool()
+        await new_leader.check_health()
+        await new_leader.handle_failures()
+        await cluster.assert_consistent()
+        return stranded, before, moved, cluster.loads()
+
+
+def test_failover_and_fencing():
+    """测试只有故障处理才转移策略，以及 leader 切换后恢复实例的清理"""
+    print("\n=== 测试故障转移与恢复清理 ===")
+    stranded, before, moved, loads = asyncio.run(_check_failover())
+    print(f"✅ 故障实例上的 {len(stranded)} 个策略已转移，恢复后负载为 {loads}")
+    assert stranded and not stranded & before
+    assert stranded <= moved
+    assert loads[0] == 0
+    assert loads[1] == STRATEGY_COUNT
+
+
+def main():
+    tests = [
+        test_placement_and_stickiness,
+        test_rebalance_on_new_instance,
+        test_failover_and_fencing,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+    print("=" * 50)
+    print(f"测试完成: {len(tests) - failed}/{len(tests)} 通过")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
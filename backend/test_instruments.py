@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+交易对元数据缓存测试
+用本地服务器返回的固定响应验证币安 exchangeInfo 和 OKX instruments 的解析、check_order 的各项规则、
+参数验证按行情缓存中的价格检查最小名义金额、从持久化文件预热，
+以及其他进程刷新并写入文件后本进程重新读取（文件缺失时不会停止检查）
+"""
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import textwrap
+
+sys.path.append(os.path.dirname(__file__))
+os.environ.setdefault("SCHEDULER_ENABLED", "false")
+
+import instruments
+from instruments import Instrument, InstrumentCache
+
+BINANCE_EXCHANGE_INFO = {"symbols": [
+    {"symbol": "BTCUSDT", "baseAsset": "BTC", "quoteAsset": "USDT", "status": "TRADING", "filters": [
+        {"filterType": "PRICE_FILTER", "tickSize": "0.01000000"},
+        {"filterType": "LOT_SIZE", "stepSize": "0.00001000", "minQty": "0.00001000", "maxQty": "9000.00000000"},
+        {"filterType": "NOTIONAL", "minNotional": "5.00000000"},
+    ]},
+    {"symbol": "LUNAUSDT", "baseAsset": "LUNA", "quoteAsset": "USDT", "status": "BREAK", "filters": [
+        {"filterType": "LOT_SIZE", "stepSize": "0.01", "minQty": "0.01", "maxQty": ""},
+        {"filterType": "MIN_NOTIONAL", "minNotional": "10"},
+    ]},
+]}
+OKX_INSTRUMENTS = {"code": "0", "data": [
+    {"instId": "ETH-USDT", "baseCcy": "ETH", "quoteCcy": "USDT", "tickSz": "0.01", "lotSz": "0.000001",
+     "minSz": "0.0001", "maxLmtSz": "10000", "state": "live"},
+    {"instId": "OLD-USDT", "baseCcy": "OLD", "quoteCcy": "USDT", "tickSz": "0.0001", "lotSz": "1",
+     "minSz": "1", "maxLmtSz": "", "state": "suspend"},
+]}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _btc(**overrides) -> Instrument:
+    fields = dict(exchange="binance", symbol="BTC/USDT", exchange_symbol="BTCUSDT", base="BTC", quote="USDT",
+                  tick_size=0.01, lot_size=0.00001, min_qty=0.0001, max_qty=100.0, min_notional=5.0)
+    fields.update(overrides)
+    return Instrument(**fields)
+
+
+async def _fetch_canned():
+    from aiohttp import ClientSession, web
+
+    def canned(payload):
+        async def handler(request):
+            return web.json_response(payload)
+        return handler
+
+    app = web.Application()
+    app.router.add_get("/api/v3/exchangeInfo", canned(BINANCE_EXCHANGE_INFO))
+    app.router.add_get("/api/v5/public/instruments", canned(OKX_INSTRUMENTS))
+    runner = web.AppRunner(app)
+    await runner.setup()
+    port = _free_port()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    saved = instruments.BINANCE_API_URL, instruments.OKX_API_URL
+    instruments.BINANCE_API_URL = instruments.OKX_API_URL = f"http://127.0.0.1:{port}"
+    try:
+        async with ClientSession() as session:
+            return await instruments.fetch_binance_instruments(session), await instruments.fetch_okx_instruments(session)
+    finally:
+        instruments.BINANCE_API_URL, instruments.OKX_API_URL = saved
+        await runner.cleanup()
+
+
+def test_parsers():
+    """测试币安和 OKX 交易规则的解析"""
+    print("=== 测试交易规则解析 ===")
+    binance, okx = asyncio.run(_fetch_canned())
+    print(f"✅ 币安 {[(i.symbol, i.status) for i in binance]}，OKX {[(i.symbol, i.status) for i in okx]}")
+    btc, luna = binance
+    assert (btc.symbol, btc.exchange_symbol, btc.tick_size, btc.lot_size) == ("BTC/USDT", "BTCUSDT", 0.01, 0.00001)
+    assert (btc.min_qty, btc.max_qty, btc.min_notional, btc.status) == (0.00001, 9000.0, 5.0, "trading")
+    assert (luna.tick_size, luna.max_qty, luna.min_notional, luna.status) == (0, None, 10.0, "break")
+    eth, old = okx
+    assert (eth.symbol, eth.exchange_symbol, eth.lot_size, eth.min_qty, eth.max_qty) == \
+        ("ETH/USDT", "ETH-USDT", 0.000001, 0.0001, 10000.0)
+    assert eth.min_notional is None and eth.status == "trading"
+    assert old.max_qty is None and old.status == "suspend"
+
+
+def test_check_order_and_rounding():
+    """测试下单数量的各项规则和价格、数量取整"""
+    print("\n=== 测试下单规则检查 ===")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cache = InstrumentCache(path=os.path.join(tmpdir, "instruments.json"))
+        cache._apply("binance", [_btc(), _btc(symbol="DOGE/USDT", exchange_symbol="DOGEUSDT", status="break")])
+        cache.loaded_at["binance"] = 1.0
+        cases = {
+            "ok": cache.check_order("binance", "BTCUSDT", 0.001, 60000.0),
+            "min_qty": cache.check_order("binance", "BTC/USDT", 0.00005),
+            "max_qty": cache.check_order("binance", "BTC/USDT", 200.0),
+            "lot": cache.check_order("binance", "BTC/USDT", 0.000123456),
+            "notional": cache.check_order("binance", "BTC/USDT", 0.0001, 40000.0),
+            "no_price": cache.check_order("binance", "BTC/USDT", 0.0001),
+            "halted": cache.check_order("binance", "DOGE/USDT", 1.0),
+            "unknown": cache.check_order("binance", "XYZ/USDT", 1.0),
+        }
+        rounded = (cache.round_price("binance", "BTC/USDT", 100.005, "buy"),
+                   cache.round_price("binance", "BTC/USDT", 100.001, "sell"),
+                   cache.round_quantity("binance", "BTC/USDT", 0.123456789))
+    for name, errors in cases.items():
+        print(f"  - {name}: {errors}")
+    print(f"✅ 取整结果 {rounded}")
+    assert cases["ok"] == [] and cases["no_price"] == []
+    assert len(cases["min_qty"]) == 1 and ">= 0.0001" in cases["min_qty"][0]
+    assert len(cases["max_qty"]) == 1 and "<= 100.0" in cases["max_qty"][0]
+    assert len(cases["lot"]) == 1 and "multiple of" in cases["lot"][0]
+    assert len(cases["notional"]) == 1 and "order value must be >= 5.0 USDT" in cases["notional"][0]
+    assert len(cases["halted"]) == 1 and "not trading" in cases["halted"][0]
+    assert cases["unknown"] == ["Unknown symbol XYZ/USDT on binance"]
+    assert rounded == (100.0, 100.01, 0.12345)
+
+
+def test_validation_uses_reference_price():
+    """测试参数验证用行情缓存中的价格检查最小名义金额，没有行情时跳过"""
+    from hummingbot_integration import ParameterValidator
+    from tickers import ticker_cache
+
+    print("\n=== 测试参数验证的最小名义金额 ===")
+    params = {"exchange": "binance", "market": "BTC-USDT", "order_amount": 0.0001}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cache = InstrumentCache(path=os.path.join(tmpdir, "instruments.json"))
+        cache._apply("binance", [_btc()])
+        cache.loaded_at["binance"] = 1.0
+        saved_cache, instruments.instrument_cache = instruments.instrument_cache, cache
+        saved_snapshots = ticker_cache.snapshots
+        try:
+            ticker_cache.snapshots = {}
+            without_ticker = ParameterValidator.validate_instrument_rules(params)
+            ticker_cache.snapshots = {"binance": {"BTC/USDT": {"symbol": "BTC/USDT", "last": 30000.0}}}
+            below = ParameterValidator.validate_instrument_rules(params)
+            ticker_cache.snapshots = {"binance": {"BTC/USDT": {"symbol": "BTC/USDT", "last": 60000.0}}}
+            above = ParameterValidator.validate_instrument_rules(params)
+        finally:
+            instruments.instrument_cache = saved_cache
+            ticker_cache.snapshots = saved_snapshots
+    print(f"✅ 无行情 {without_ticker}，价格 30000 {below}，价格 60000 {above}")
+    assert without_ticker == [] and above == []
+    assert len(below) == 1 and "order value must be >= 5.0" in below[0]
+
+
+WRITER = textwrap.dedent("""
+    import sys
+    sys.path.append({backend!r})
+    from instruments import Instrument, InstrumentCache
+
+    cache = InstrumentCache(path={path!r})
+    cache._apply("binance", [Instrument(exchange="binance", symbol="BTC/USDT", exchange_symbol="BTCUSDT",
+                                        base="BTC", quote="USDT", tick_size=0.01, lot_size=0.001,
+                                        min_qty={min_qty}, min_notional=5.0)])
+    cache.loaded_at["binance"] = {loaded_at}
+    cache._save_file(cache._snapshot())
+""")
+
+
+def _write_from_other_process(path: str, min_qty: float, loaded_at: float):
+    script = WRITER.format(backend=os.path.dirname(os.path.abspath(__file__)), path=path, min_qty=min_qty,
+                           loaded_at=loaded_at)
+    subprocess.run([sys.executable, "-c", script], check=True)
+
+
+def test_warm_start_and_cross_process_reload():
+    """测试从持久化文件预热，以及其他进程写入文件后重新读取"""
+    print("\n=== 测试预热和跨进程刷新 ===")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "instruments.json")
+        cache = InstrumentCache(path=path, file_check_interval=0)
+        # 文件尚不存在：未加载，但之后仍会检查文件
+        missing = cache.is_loaded("binance")
+        _write_from_other_process(path, min_qty=0.001, loaded_at=1000.0)
+        warm = cache.is_loaded("binance"), cache.check_order("binance", "BTC/USDT", 0.002)
+
+        # 另一个进程刷新后交易所提高了最小下单量
+        _write_from_other_process(path, min_qty=0.01, loaded_at=2000.0)
+        reloaded = cache.check_order("binance", "BTC/USDT", 0.002), cache.loaded_at["binance"]
+
+        # 新进程从文件预热
+        fresh = InstrumentCache(path=path)
+        restarted = fresh.get("binance", "BTCUSDT")
+    print(f"✅ 文件缺失时已加载 {missing}，预热后 {warm}，其他进程刷新后 {reloaded}，"
+          f"新进程最小下单量 {restarted.min_qty}")
+    assert missing is False
+    assert warm == (True, [])
+    assert len(reloaded[0]) == 1 and ">= 0.01" in reloaded[0][0] and reloaded[1] == 2000.0
+    assert restarted.min_qty == 0.01
+
+
+def main():
+    tests = [
+        test_parsers,
+        test_check_order_and_rounding,
+        test_validation_uses_reference_price,
+        test_warm_start_and_cross_process_reload,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+    print("=" * 50)
+    print(f"测试完成: {len(tests) - failed}/{len(tests)} 通过")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+K 线引擎测试
+验证逐笔成交更新 K 线和收盘、环形缓冲区写满后的覆盖与查询、内存与数据库 K 线的拼接，
+以及每个序列的第一根 K 线和关闭时未收盘的 K 线按 partial 落库，与已保存的同一根合并而不是覆盖
+"""
+import asyncio
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(__file__))
+os.environ.setdefault("SCHEDULER_ENABLED", "false")
+
+import crud
+import models
+from kline_engine import KlineEngine, KlineSeries, RingBuffer, Bar
+from trade_stream import MarketTrade
+
+MINUTE = 60 * 1000
+
+
+def _trade(timestamp: int, price: float, amount: float = 1.0) -> MarketTrade:
+    return MarketTrade(exchange="binance", symbol="BTC/USDT", timestamp=timestamp, price=price, amount=amount, side="buy")
+
+
+class Database:
+    """临时 SQLite 数据库"""
+
+    def __enter__(self):
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{self.tmpdir.name}/klines.db", connect_args={"check_same_thread": False})
+        models.Base.metadata.create_all(bind=self.engine)
+        self.session_factory = sessionmaker(bind=self.engine)
+        self.db = self.session_factory()
+        return self
+
+    def __exit__(self, *exc):
+        self.db.close()
+        self.engine.dispose()
+        self.tmpdir.cleanup()
+
+
+def test_series_add():
+    """测试成交更新当前 K 线、跨周期时收盘上一根、迟到的成交被忽略"""
+    print("=== 测试 K 线更新 ===")
+    series = KlineSeries("1m", capacity=10)
+    assert series.add(10_000, 100.0, 1.0) is None
+    assert series.add(20_000, 105.0, 2.0) is None
+    assert series.add(30_000, 95.0, 1.0) is None
+    assert series.add(50_000, 101.0, 0.5) is None
+    closed = series.add(MINUTE + 1_000, 102.0, 1.0)
+    late = series.add(59_000, 200.0, 1.0)
+    print(f"✅ 收盘 {closed.to_dict()}，partial={closed.partial}，当前 {series.current.to_dict()}")
+    assert closed.to_dict() == {"time": 0, "open": 100.0, "high": 105.0, "low": 95.0, "close": 101.0, "volume": 4.5}
+    assert closed.trade_count == 4 and closed.partial
+    assert late is None and series.current.open_time == MINUTE and not series.current.partial
+    assert series.current.high == 102.0 and len(series.closed) == 1
+
+
+def test_ring_buffer_wraparound():
+    """测试环形缓冲区写满后覆盖最旧的 K 线，查询和二分查找按时间顺序"""
+    print("\n=== 测试环形缓冲区 ===")
+    ring = RingBuffer(3)
+    for i in range(5):
+        ring.append(Bar(i * MINUTE, 100.0 + i, 1.0))
+    times = [ring[i].open_time // MINUTE for i in range(len(ring))]
+    print(f"✅ 写入 5 根后保留 {times}")
+    assert len(ring) == 3 and times == [2, 3, 4]
+    assert ring.bisect_left(0) == 0 and ring.bisect_left(3 * MINUTE) == 1 and ring.bisect_left(9 * MINUTE) == 3
+    assert [bar.open_time // MINUTE for bar in ring.slice(1, 10)] == [3, 4]
+
+    series = KlineSeries("1m", capacity=3)
+    for i in range(6):
+        series.add(i * MINUTE, 100.0 + i, 1.0)
+    queried = [bar.open_time // MINUTE for bar in series.query(3 * MINUTE, None)]
+    assert queried == [3, 4, 5]
+    assert series.earliest() == 2 * MINUTE
+
+
+async def _check_merge_with_database():
+    with Database() as database:
+        db = database.db
+        # 数据库中已有更早的 K 线
+        crud.save_klines(db, [{
+            "exchange": "binance", "symbol": "BTC/USDT", "interval": "1m", "open_time": i * MINUTE,
+            "open": 90.0 + i, "high": 91.0 + i, "low": 89.0 + i, "close": 90.0 + i, "volume": 1.0, "trade_count": 1,
+        } for i in range(5)])
+        engine = KlineEngine(capacity=10)
+        for i in range(5, 8):
+            engine.on_trade(_trade(i * MINUTE + 1_000, 100.0 + i))
+        latest = await engine.get_klines(db, "binance", "BTC/USDT", "1m", limit=6)
+        ranged = await engine.get_klines(db, "binance", "BTC/USDT", "1m", start=3 * MINUTE, limit=4)
+        memory_only = await engine.get_klines(db, "binance", "BTC/USDT", "1m", start=6 * MINUTE, limit=10)
+        return latest, ranged, memory_only
+
+
+def test_get_klines_merges_memory_and_database():
+    """测试内存不覆盖的更早部分从数据库补齐"""
+    print("\n=== 测试内存与数据库拼接 ===")
+    latest, ranged, memory_only = asyncio.run(_check_merge_with_database())
+    minutes = lambda bars: [bar["time"] // MINUTE for bar in bars]
+    print(f"✅ 最新 6 根 {minutes(latest)}，从第 3 分钟起 4 根 {minutes(ranged)}，仅内存 {minutes(memory_only)}")
+    assert minutes(latest) == [2, 3, 4, 5, 6, 7]
+    assert latest[2]["open"] == 94.0 and latest[3]["open"] == 105.0
+    assert minutes(ranged) == [3, 4, 5, 6]
+    assert minutes(memory_only) == [6, 7]
+
+
+async def _check_partial_bars():
+    def hourly(db):
+        return [(k.open, k.high, k.low, k.close, k.volume, k.trade_count)
+                for k in crud.get_klines(db, "binance", "BTC/USDT", "1h")]
+
+    with Database() as database:
+        db = database.db
+        crud.save_klines(db, [{
+            "exchange": "binance", "symbol": "BTC/USDT", "interval": "1h", "open_time": 0,
+            "open": 100.0, "high": 110.0, "low": 90.0, "close": 105.0, "volume": 10.0, "trade_count": 10,
+        }])
+
+        # 重启后从同一小时中途开始：第一根 1h K 线只有后半段的成交
+        engine = KlineEngine(capacity=10, session_factory=database.session_factory)
+        engine.on_trade(_trade(30 * MINUTE, 104.0, 1.0))
+        engine.on_trade(_trade(40 * MINUTE, 120.0, 1.0))
+        engine.on_trade(_trade(60 * MINUTE + 1_000, 121.0, 2.0))  # 收盘第一根，开始下一小时
+        await engine.flush()
+        merged = hourly(db)
+
+        # 关闭时写入未收盘的 K 线，之后的成交从新序列开始，与之合并
+        await engine.close()
+        after_close = hourly(db)
+        engine.on_trade(_trade(70 * MINUTE, 119.0, 3.0))
+        engine.on_trade(_trade(120 * MINUTE, 122.0, 1.0))
+        await engine.flush()
+        db.expire_all()
+        return merged, after_close, hourly(db)
+
+
+def test_partial_bars_merged():
+    """测试第一根 K 线和关闭时未收盘的 K 线与已保存的同一根合并"""
+    print("\n=== 测试 partial K 线合并 ===")
+    merged, after_close, bars = asyncio.run(_check_partial_bars())
+    print(f"✅ 重启后合并 {merged[0]}，关闭时写入 {after_close[1]}，再次合并 {bars[1]}")
+    assert merged == [(100.0, 120.0, 90.0, 120.0, 12.0, 12)]
+    assert after_close[1] == (121.0, 121.0, 121.0, 121.0, 2.0, 1)
+    assert bars == [merged[0], (121.0, 121.0, 119.0, 119.0, 5.0, 2)]
+
+
+def main():
+    tests = [
+        test_series_add,
+        test_ring_buffer_wraparound,
+        test_get_klines_merges_memory_and_database,
+        test_partial_bars_merged,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+    print("=" * 50)
+    print(f"测试完成: {len(tests) - failed}/{len(tests)} 通过")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+模拟 Hummingbot API 服务器的模拟模式测试
+固定随机种子短时间运行模拟，验证 /simulation 的统计与实际产生的成交、日志和 PnL 更新一致、同一种子产生相同的成交序列、
+GET /fills?after= 在事件日志按 fill_retention 截断后仍按序号连续返回，
+以及崩溃期间请求失败、重启后恢复（keep_strategies 决定运行中的策略是否保留）
+"""
+import asyncio
+import os
+import socket
+import sys
+import time
+
+sys.path.append(os.path.dirname(__file__))
+
+from mock_hummingbot_api_server import MockHummingbotAPIServer, SimulationConfig
+
+STRATEGY_CONFIG = {"type": "pure_market_making",
+                   "params": {"exchange": "binance", "market": "BTC-USDT", "bid_spread": 0.1, "ask_spread": 0.1,
+                              "order_amount": 0.01}}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class MockServer:
+    """在本进程中运行模拟服务器（与 start() 一样设置 runner 和 site，崩溃重启需要它们）"""
+
+    def __init__(self, simulation: SimulationConfig):
+        self.mock = MockHummingbotAPIServer(host="127.0.0.1", port=_free_port(), simulation=simulation)
+        self.url = f"http://{self.mock.host}:{self.mock.port}"
+
+    async def __aenter__(self):
+        from aiohttp import ClientSession, ClientTimeout, web
+
+        self.mock.runner = web.AppRunner(self.mock.app)
+        await self.mock.runner.setup()
+        self.mock.site = web.TCPSite(self.mock.runner, self.mock.host, self.mock.port)
+        await self.mock.site.start()
+        self.session = ClientSession(timeout=ClientTimeout(total=2))
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+        await self.mock.runner.cleanup()
+
+    async def request(self, method: str, path: str, **kwargs):
+        """返回 (状态码, JSON)，连接失败时返回 (None, 异常)"""
+        try:
+            async with self.session.request(method, f"{self.url}{path}", **kwargs) as response:
+                return response.status, await response.json()
+        except Exception as e:
+            return None, e
+
+    async def start_strategies(self, count: int):
+        for i in range(count):
+            status, _ = await self.request("POST", f"/strategies/s{i}/start", json=STRATEGY_CONFIG)
+            assert status == 200
+
+
+async def _run_simulation(seed: int, duration: float = 0.5):
+    simulation = SimulationConfig(fill_rate=20, log_rate=10, pnl_interval=0.1, tick=0.02, seed=seed)
+    async with MockServer(simulation) as server:
+        await server.start_strategies(3)
+        await asyncio.sleep(duration)
+        status, body = await server.request("GET", "/simulation")
+        mock = server.mock
+        fills = [(f["strategy_id"], f["side"], f["price"], f["amount"]) for f in mock.fills]
+        return status, body["data"], {
+            "fills": mock.fill_seq, "logs": sum(len(logs) for logs in mock.logs.values()),
+            "requests": mock.request_count, "pnl": {s["id"]: s["pnl"] for s in mock.running_strategies.values()},
+        }, fills
+
+
+def test_simulation_stats_and_seed():
+    """测试 /simulation 的统计与实际产生的事件一致，同一种子产生相同的成交序列"""
+    print("=== 测试模拟统计和随机种子 ===")
+    status, data, actual, fills = asyncio.run(_run_simulation(seed=42))
+    _, _, _, again = asyncio.run(_run_simulation(seed=42))
+    _, _, _, other = asyncio.run(_run_simulation(seed=7))
+    stats = data["stats"]
+    prefix = min(len(fills), len(again), 20)
+    print(f"✅ 统计 {stats}，前 {prefix} 笔成交与同一种子的另一次运行一致")
+    assert status == 200 and data["config"]["seed"] == 42 and data["config"]["fill_rate"] == 20
+    assert stats["fills"] == stats["fill_seq"] == actual["fills"] > 0
+    assert stats["logs"] == actual["logs"] > 0
+    assert stats["pnl_updates"] >= 3 and any(pnl != 0 for pnl in actual["pnl"].values())
+    assert stats["running_strategies"] == 3
+    # 3 个启动请求 + 本次 /simulation 请求
+    assert stats["requests"] == actual["requests"] == 4
+    assert stats["errors"] == stats["crashes"] == 0
+    assert prefix >= 10 and fills[:prefix] == again[:prefix]
+    assert fills[:prefix] != other[:prefix]
+
+
+async def _check_fill_continuity():
+    simulation = SimulationConfig(fill_rate=100, tick=0.01, seed=1)
+    async with MockServer(simulation) as server:
+        server.mock.fill_retention = 50
+        await server.start_strategies(2)
+        seqs, cursor, deadline = [], 0, time.monotonic() + 1.0
+        # 以小批量持续拉取，运行期间事件日志多次被截断
+        while time.monotonic() < deadline:
+            status, body = await server.request("GET", "/fills", params={"after": cursor, "limit": 20})
+            assert status == 200
+            seqs.extend(event["seq"] for event in body["data"])
+            cursor = body["next"]
+            await asyncio.sleep(0.01)
+        await server.request("POST", "/strategies/s0/stop")
+        await server.request("POST", "/strategies/s1/stop")
+        while True:
+            _, body = await server.request("GET", "/fills", params={"after": cursor, "limit": 20})
+            if not body["data"]:
+                break
+            seqs.extend(event["seq"] for event in body["data"])
+            cursor = body["next"]
+
+        mock = server.mock
+        oldest = mock.fills[0]["seq"]
+        _, inside = await server.request("GET", "/fills", params={"after": oldest + 9, "limit": 3})
+        _, behind = await server.request("GET", "/fills", params={"after": 0, "limit": 3})
+        _, caught_up = await server.request("GET", "/fills", params={"after": mock.fill_seq})
+        return seqs, mock.fill_seq, len(mock.fills), oldest, inside, behind, caught_up
+
+
+def test_fill_continuity_across_retention():
+    """测试事件日志截断后 after 游标仍准确定位：持续拉取的序号连续，落后于保留窗口时从最旧的事件开始"""
+    print("\n=== 测试成交游标跨截断连续 ===")
+    seqs, fill_seq, retained, oldest, inside, behind, caught_up = asyncio.run(_check_fill_continuity())
+    print(f"✅ 共 {fill_seq} 条事件（保留 {retained} 条），拉取 {len(seqs)} 条且序号连续；"
+          f"窗口内 after 返回 {[e['seq'] for e in inside['data']]}，落后时返回 {[e['seq'] for e in behind['data']]}")
+    assert fill_seq > 3 * retained and retained == 50
+    assert seqs == list(range(1, fill_seq + 1))
+    assert [e["seq"] for e in inside["data"]] == [oldest + 10, oldest + 11, oldest + 12]
+    assert [e["seq"] for e in behind["data"]] == [oldest, oldest + 1, oldest + 2]
+    assert caught_up["data"] == [] and caught_up["next"] == fill_seq
+
+
+async def _check_crash(keep_strategies: bool):
+    simulation = SimulationConfig(keep_strategies=keep_strategies, seed=3)
+    async with MockServer(simulation) as server:
+        await server.start_strategies(2)
+        status, _ = await server.request("POST", "/simulation/crash", params={"downtime": 0.4})
+        assert status == 202
+        await asyncio.sleep(0.15)
+        during = [await server.request("GET", "/health"), await server.request("GET", "/strategies/s0/status")]
+        deadline = time.monotonic() + 3.0
+        while time.monotonic() < deadline:
+            recovered, _ = await server.request("GET", "/health")
+            if recovered == 200:
+                break
+            await asyncio.sleep(0.05)
+        strategy, _ = await server.request("GET", "/strategies/s0/status")
+        _, simulation_data = await server.request("GET", "/simulation")
+        return [status for status, _ in during], recovered, strategy, simulation_data["data"]["stats"]
+
+
+def test_crash_and_recovery():
+    """测试崩溃期间请求失败、重启后恢复，keep_strategies 决定运行中的策略是否保留"""
+    print("\n=== 测试崩溃和恢复 ===")
+    for keep_strategies in (False, True):
+        during, recovered, strategy, stats = asyncio.run(_check_crash(keep_strategies))
+        print(f"  - keep_strategies={keep_strategies}: 崩溃期间 {during}，恢复后健康检查 {recovered}，"
+              f"策略状态 {strategy}，运行中 {stats['running_strategies']}")
+        assert during == [None, None]
+        assert recovered == 200 and stats["crashes"] == 1
+        if keep_strategies:
+            assert strategy == 200 and stats["running_strategies"] == 2
+        else:
+            assert strategy == 404 and stats["running_strategies"] == 0
+    print("✅ 崩溃期间请求失败，重启后恢复")
+
+
+def main():
+    tests = [
+        test_simulation_stats_and_seed,
+        test_fill_continuity_across_retention,
+        test_crash_and_recovery,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+    print("=" * 50)
+    print(f"测试完成: {len(tests) - failed}/{len(tests)} 通过")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+订单簿测试
+用录制格式的币安 depth 增量和 OKX books 推送驱动订单簿，验证过期事件丢弃、衔接事件、
+序列号缺口检测；在本地模拟币安 WebSocket 和 REST 快照，验证缺口后失效并重新同步；
+另外验证跨交易所合并订单簿随增量更新和交易所失效
+"""
+import asyncio
+import json
+import os
+import socket
+import sys
+
+sys.path.append(os.path.dirname(__file__))
+
+import orderbook
+from orderbook import (
+    BinanceDepthFeed,
+    BookSide,
+    ConsolidatedOrderBook,
+    L2OrderBook,
+    OKXBooksFeed,
+    SequenceGapError,
+)
+
+# 币安 REST 快照与之后的增量事件（U/u 为事件覆盖的首末更新 ID）
+BINANCE_SNAPSHOT = {"lastUpdateId": 100, "bids": [["100.0", "1"], ["99.0", "2"]], "asks": [["101.0", "1"], ["102.0", "2"]]}
+BINANCE_EVENTS = [
+    {"e": "depthUpdate", "U": 95, "u": 100, "b": [["100.0", "9"]], "a": []},  # 已包含在快照中，丢弃
+    {"e": "depthUpdate", "U": 99, "u": 102, "b": [["100.0", "3"]], "a": []},  # 跨越快照，应用
+    {"e": "depthUpdate", "U": 103, "u": 103, "b": [], "a": [["101.0", "0"], ["101.5", "4"]]},
+    {"e": "depthUpdate", "U": 104, "u": 105, "b": [["99.5", "1"]], "a": []},
+]
+BINANCE_GAP_EVENT = {"e": "depthUpdate", "U": 107, "u": 108, "b": [["98.0", "1"]], "a": []}  # 缺少 106
+
+# OKX 首条为全量快照，之后每条增量的 prevSeqId 等于上一条的 seqId
+OKX_MESSAGES = [
+    ("snapshot", {"bids": [["100", "1", "0", "1"]], "asks": [["101", "1", "0", "1"]], "seqId": 10, "prevSeqId": -1}),
+    ("update", {"bids": [["100", "0", "0", "0"], ["99.9", "2", "0", "1"]], "asks": [], "seqId": 11, "prevSeqId": 10}),
+    ("update", {"bids": [], "asks": [["100.5", "3", "0", "1"]], "seqId": 12, "prevSeqId": 11}),
+]
+OKX_GAP_MESSAGE = ("update", {"bids": [["99", "1", "0", "1"]], "asks": [], "seqId": 15, "prevSeqId": 13})
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _levels(levels):
+    return [(float(p), float(s)) for p, s, *_ in levels]
+
+
+def test_book_side_ordering():
+    """测试单边档位的插入、删除和按价格优先顺序读取"""
+    print("=== 测试订单簿单边 ===")
+    bids, asks = BookSide(descending=True), BookSide(descending=False)
+    for price, size in ((100, 1), (102, 2), (101, 3), (99, 4)):
+        bids.update(price, size)
+        asks.update(price, size)
+    bids.update(101, 0)
+    asks.update(98, 0)  # 删除不存在的档位
+    print(f"✅ 买盘 {bids.top(10)}，卖盘前两档 {asks.top(2)}")
+    assert bids.top(10) == [[102, 2], [100, 1], [99, 4]]
+    assert asks.top(2) == [[99, 4], [100, 1]]
+    assert bids.best() == (102, 2) and len(asks) == 4
+
+
+def test_binance_sequence():
+    """测试币安增量：丢弃过期事件、应用衔接事件、检测缺口"""
+    print("\n=== 测试币安增量序列 ===")
+    book = L2OrderBook("binance", "BTC/USDT")
+    feed = BinanceDepthFeed(book)
+    book.apply_snapshot(_levels(BINANCE_SNAPSHOT["bids"]), _levels(BINANCE_SNAPSHOT["asks"]),
+                        BINANCE_SNAPSHOT["lastUpdateId"])
+    for event in BINANCE_EVENTS:
+        feed._apply(event)
+    snapshot = book.snapshot()
+    try:
+        feed._apply(BINANCE_GAP_EVENT)
+        gap = False
+    except SequenceGapError:
+        gap = True
+    print(f"✅ 序列号 {snapshot['sequence']}，买盘 {snapshot['bids']}，卖盘 {snapshot['asks']}，缺口检测 {gap}")
+    assert snapshot["sequence"] == 105
+    assert snapshot["bids"] == [[100.0, 3.0], [99.5, 1.0], [99.0, 2.0]]
+    assert snapshot["asks"] == [[101.5, 4.0], [102.0, 2.0]]
+    assert gap and book.sequence == 105
+
+
+def test_okx_sequence():
+    """测试 OKX 推送：快照前的增量忽略、prevSeqId 衔接、检测缺口"""
+    print("\n=== 测试 OKX 增量序列 ===")
+    book = L2OrderBook("okx", "BTC/USDT")
+    feed = OKXBooksFeed(book)
+    feed._apply(*OKX_MESSAGES[1])  # 尚未收到快照
+    assert not book.synced and len(book.bids) == 0
+    for action, data in OKX_MESSAGES:
+        feed._apply(action, data)
+    snapshot = book.snapshot()
+    try:
+        feed._apply(*OKX_GAP_MESSAGE)
+        gap = False
+    except SequenceGapError:
+        gap = True
+    print(f"✅ 序列号 {snapshot['sequence']}，买盘 {snapshot['bids']}，卖盘 {snapshot['asks']}，缺口检测 {gap}")
+    assert snapshot["sequence"] == 12
+    assert snapshot["bids"] == [[99.9, 2.0]]
+    assert snapshot["asks"] == [[100.5, 3.0], [101.0, 1.0]]
+    assert gap and book.sequence == 12
+
+
+class MockBinance:
+    """模拟币安 depth 推送和 REST 快照：第一次连接在同步后推送缺口事件，重连后从新快照继续"""
+
+    def __init__(self):
+        self.connections = 0
+        self.snapshot_served = asyncio.Event()
+        self.snapshots = [BINANCE_SNAPSHOT, {"lastUpdateId": 200, "bids": [["100.0", "5"]], "asks": [["100.5", "5"]]}]
+
+    async def depth(self, request):
+        from aiohttp import web
+
+        snapshot = self.snapshots[min(self.connections, len(self.snapshots)) - 1]
+        self.snapshot_served.set()
+        return web.json_response(snapshot)
+
+    async def stream(self, request):
+        from aiohttp import web
+
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.connections += 1
+        self.snapshot_served.clear()
+        if self.connections == 1:
+            events = BINANCE_EVENTS + [BINANCE_GAP_EVENT]
+        else:
+            events = [{"e": "depthUpdate", "U": 199, "u": 201, "b": [], "a": [["100.5", "0"], ["100.6", "1"]]},
+                      {"e": "depthUpdate", "U": 202, "u": 202, "b": [["99.0", "1"]], "a": []}]
+        # 第一条事件在快照返回前到达并被缓存，其余事件在快照返回后推送
+        await ws.send_str(json.dumps(events[0]))
+        await self.snapshot_served.wait()
+        await asyncio.sleep(0.05)
+        for event in events[1:]:
+            await ws.send_str(json.dumps(event))
+        async for _ in ws:  # 等待客户端断开
+            pass
+        return ws
+
+    async def __aenter__(self):
+        from aiohttp import web
+
+        app = web.Application()
+        app.router.add_get("/api/v3/depth", self.depth)
+        app.router.add_get("/ws/{stream}", self.stream)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        port = _free_port()
+        await web.TCPSite(self.runner, "127.0.0.1", port).start()
+        self._urls = (orderbook.BINANCE_API_URL, orderbook.BINANCE_WS_URL, orderbook.ORDERBOOK_RECONNECT_DELAY)
+        orderbook.BINANCE_API_URL = f"http://127.0.0.1:{port}"
+        orderbook.BINANCE_WS_URL = f"ws://127.0.0.1:{port}/ws"
+        orderbook.ORDERBOOK_RECONNECT_DELAY = 0.05
+        return self
+
+    async def __aexit__(self, *exc):
+        orderbook.BINANCE_API_URL, orderbook.BINANCE_WS_URL, orderbook.ORDERBOOK_RECONNECT_DELAY = self._urls
+        await self.runner.shutdown()
+        await self.runner.cleanup()
+
+
+async def _check_binance_resync():
+    async with MockBinance() as mock:
+        book = L2OrderBook("binance", "BTC/USDT")
+        events = []
+        book.add_listener(lambda b, kind, bids, asks: events.append((kind, b.sequence)))
+        task = asyncio.create_task(BinanceDepthFeed(book).run())
+        try:
+            for _ in range(100):
+                if book.sequence == 202:
+                    break
+                await asyncio.sleep(0.02)
+            return events, book.snapshot(), mock.connections
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+
+def test_binance_resync_on_gap():
+    """测试推送出现缺口后订单簿失效，重连并从新快照恢复"""
+    print("\n=== 测试币安缺口后重新同步 ===")
+    events, snapshot, connections = asyncio.run(_check_binance_resync())
+    kinds = [kind for kind, _ in events]
+    print(f"✅ 事件序列 {events}，连接 {connections} 次")
+    assert kinds == ["snapshot", "update", "update", "update", "invalidate", "snapshot", "update", "update"]
+    assert events[3] == ("update", 105)
+    assert connections == 2
+    assert snapshot["sequence"] == 202
+    assert snapshot["bids"] == [[100.0, 5.0], [99.0, 1.0]] and snapshot["asks"] == [[100.6, 1.0]]
+
+
+def test_consolidated_book():
+    """测试合并订单簿随各交易所增量更新，交易所失效时移除其档位"""
+    print("\n=== 测试跨交易所合并订单簿 ===")
+    binance, okx = L2OrderBook("binance", "BTC/USDT"), L2OrderBook("okx", "BTC/USDT")
+    consolidated = ConsolidatedOrderBook("BTC/USDT")
+    binance.apply_snapshot([(100, 1), (99, 2)], [(101, 1)], 1)
+    consolidated.attach(binance)
+    consolidated.attach(okx)
+    okx.apply_snapshot([(100, 3)], [(100.5, 2), (101, 4)], 1)
+    binance.apply_update([(99, 0)], [(101, 2)], 2)
+    merged = consolidated.snapshot()
+    okx.invalidate()
+    after = consolidated.snapshot()
+    print(f"✅ 合并买盘 {merged['bids']}，OKX 失效后卖盘 {after['asks']}")
+    assert merged["bids"] == [[100, 4, {"binance": 1, "okx": 3}]]
+    assert merged["asks"] == [[100.5, 2, {"okx": 2}], [101, 6, {"binance": 2, "okx": 4}]]
+    assert after["asks"] == [[101, 2, {"binance": 2}]] and after["venues"] == ["binance"]
+
+
+def main():
+    tests = [
+        test_book_side_ordering,
+        test_binance_sequence,
+        test_okx_sequence,
+        test_binance_resync_on_gap,
+        test_consolidated_book,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+    print("=" * 50)
+    print(f"测试完成: {len(tests) - failed}/{len(tests)} 通过")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+API 限流测试
+验证 GCRA 的突发额度、拒绝后的等待时间和预算恢复，路由预算与客户端总预算同时检查
+（任一拒绝时都不计费），以及只有受信任代理传入的转发头才被采信
+"""
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.dirname(__file__))
+
+from rate_limiter import MemoryRateLimitStore, RateLimitMiddleware, gcra, route_rule
+
+LIMIT = 10
+PERIOD = 60.0
+
+
+def _burst(now: float, tat=None, cost: float = 1):
+    """从给定 TAT 开始在同一时刻连续请求，返回允许的次数、第一次拒绝的结果和最终 TAT"""
+    allowed = 0
+    while True:
+        result, tat = gcra(tat, now, LIMIT, PERIOD, cost)
+        if not result.allowed:
+            return allowed, result, tat
+        allowed += 1
+
+
+def test_gcra_burst_and_recovery():
+    """测试突发额度、等待时间和预算按速率恢复"""
+    print("=== 测试 GCRA 突发与恢复 ===")
+    allowed, rejected, tat = _burst(1000.0)
+    print(f"✅ 突发允许 {allowed} 次，拒绝后需等待 {rejected.retry_after:.1f}s")
+    assert allowed == LIMIT
+    assert rejected.remaining == 0
+    assert abs(rejected.retry_after - PERIOD / LIMIT) < 1e-9
+
+    # 等待一个发射间隔后恢复一次额度
+    emission_interval = PERIOD / LIMIT
+    again, _, _ = _burst(1000.0 + emission_interval, tat)
+    assert again == 1
+    # 等待一个完整周期后恢复全部额度
+    full, _, _ = _burst(1000.0 + PERIOD, tat)
+    assert full == LIMIT
+
+
+def test_gcra_cost():
+    """测试按成本计费"""
+    print("\n=== 测试 GCRA 成本计费 ===")
+    allowed, rejected, _ = _burst(0.0, cost=5)
+    print(f"✅ 成本 5 时突发允许 {allowed} 次")
+    assert allowed == LIMIT // 5
+    result, _ = gcra(None, 0.0, LIMIT, PERIOD, LIMIT + 1)
+    assert not result.allowed
+
+
+class App:
+    """记录被放行请求的 ASGI 应用"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def __call__(self, scope, receive, send):
+        self.calls += 1
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def _request(middleware, path: str = "/api/strategies", method: str = "GET", peer: str = "10.0.0.1",
+                   headers=None) -> int:
+    scope = {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "client": (peer, 12345),
+        "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        messages.append(message)
+
+    await middleware(scope, receive, send)
+    return messages[0]["status"]
+
+
+async def _check_spoofed_headers():
+    middleware = RateLimitMiddleware(App(), store=MemoryRateLimitStore(), limit=LIMIT, period=PERIOD, rules=[],
+                                     trusted_proxies="172.20.0.0/16")
+    # 不受信任的客户端伪造不同的转发头，仍按连接地址共享同一预算
+    spoofed = [await _request(middleware, headers={"X-Real-IP": f"1.2.3.{i}", "X-Forwarded-For": f"5.6.7.{i}"})
+               for i in range(LIMIT + 1)]
+    # 经受信任的代理转发时按真实 IP 分别计数
+    proxied = [await _request(middleware, peer="172.20.0.5", headers={"X-Real-IP": f"1.2.3.{i}"})
+               for i in range(LIMIT + 1)]
+    # X-Forwarded-For 最左侧由客户端填写，取最右侧不受信任的地址
+    forwarded = [await _request(middleware, peer="172.20.0.5",
+                                headers={"X-Forwarded-For": f"9.9.9.{i}, 8.8.8.8, 172.20.0.9"})
+                 for i in range(LIMIT + 1)]
+    return spoofed, proxied, forwarded
+
+
+def test_forwarded_headers_only_from_trusted_proxies():
+    """测试只采信受信任代理传入的转发头"""
+    print("\n=== 测试转发头只在受信任代理时采信 ===")
+    spoofed, proxied, forwarded = asyncio.run(_check_spoofed_headers())
+    print(f"✅ 伪造转发头: {spoofed.count(429)} 次被拒绝；代理转发的不同 IP: {proxied.count(429)} 次被拒绝")
+    assert spoofed.count(200) == LIMIT and spoofed[-1] == 429
+    assert proxied.count(200) == LIMIT + 1
+    assert forwarded.count(200) == LIMIT and forwarded[-1] == 429
+
+
+async def _check_budgets_charged_together():
+    app = App()
+    store = MemoryRateLimitStore()
+    middleware = RateLimitMiddleware(app, store=store, limit=LIMIT, period=PERIOD,
+                                     rules=[route_rule("expensive", "POST", r"/expensive", cost=1, limit=2)])
+    # 路由预算耗尽后被拒绝的请求不消耗客户端总预算
+    route = [await _request(middleware, "/expensive", "POST") for _ in range(5)]
+    rest = [await _request(middleware) for _ in range(LIMIT)]
+
+    # 客户端总预算耗尽后被拒绝的请求不消耗路由预算
+    store_b = MemoryRateLimitStore()
+    middleware_b = RateLimitMiddleware(App(), store=store_b, limit=LIMIT, period=PERIOD,
+                                       rules=[route_rule("expensive", "POST", r"/expensive", cost=1, limit=2)])
+    for _ in range(LIMIT):
+        await _request(middleware_b)
+    rejected = await _request(middleware_b, "/expensive", "POST")
+    route_tat = store_b._tat.get("route:expensive:10.0.0.1")
+    return route, rest, rejected, route_tat
+
+
+def test_budgets_charged_together():
+    """测试路由预算和客户端预算任一拒绝时都不计费"""
+    print("\n=== 测试路由预算与客户端预算同时检查 ===")
+    route, rest, rejected, route_tat = asyncio.run(_check_budgets_charged_together())
+    print(f"✅ 路由请求 {route}，之后其他路由仍可请求 {rest.count(200)} 次")
+    assert route == [200, 200, 429, 429, 429]
+    assert rest.count(200) == LIMIT - 2
+    assert rejected == 429 and route_tat is None
+
+
+def main():
+    tests = [
+        test_gcra_burst_and_recovery,
+        test_gcra_cost,
+        test_forwarded_headers_only_from_trusted_proxies,
+        test_budgets_charged_together,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+    print("=" * 50)
+    print(f"测试完成: {len(tests) - failed}/{len(tests)} 通过")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+后台调度器测试
+验证文件锁的互斥与接管、只有 leader 执行任务、leader 退出后其他 worker 接管、
+上一次执行未结束时跳过，以及单次执行超时
+"""
+import asyncio
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(__file__))
+
+from scheduler import BackgroundScheduler, FileLeaderLock
+
+JOB_INTERVAL = 0.05
+LEADER_CHECK_INTERVAL = 0.05
+
+
+async def _check_file_lock(path: str):
+    first, second = FileLeaderLock(path), FileLeaderLock(path)
+    acquired = [await first.acquire(), await second.acquire()]
+    renewed = await first.acquire()
+    await first.release()
+    taken_over = await second.acquire()
+    await second.release()
+    return acquired, renewed, taken_over
+
+
+def test_file_leader_lock():
+    """测试文件锁互斥，释放后由另一个持有者获取"""
+    print("=== 测试文件 leader 锁 ===")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        acquired, renewed, taken_over = asyncio.run(_check_file_lock(os.path.join(tmpdir, "leader.lock")))
+    print(f"✅ 首次获取 {acquired}，续期 {renewed}，释放后接管 {taken_over}")
+    assert acquired == [True, False]
+    assert renewed and taken_over
+
+
+def _scheduler(path: str, runs: list, name: str) -> BackgroundScheduler:
+    scheduler = BackgroundScheduler(FileLeaderLock(path), leader_check_interval=LEADER_CHECK_INTERVAL)
+
+    async def job():
+        runs.append(name)
+
+    scheduler.add_job("job", job, JOB_INTERVAL, jitter=0)
+    return scheduler
+
+
+async def _check_leader_only(path: str):
+    runs = []
+    leader, follower = _scheduler(path, runs, "leader"), _scheduler(path, runs, "follower")
+    await leader.start()
+    await follower.start()
+    try:
+        await asyncio.sleep(JOB_INTERVAL * 6)
+        before = list(runs)
+        roles = (leader.is_leader, follower.is_leader)
+
+        # leader 退出后，另一个 worker 在下一次选举时接管
+        await leader.stop()
+        runs.clear()
+        await asyncio.sleep(LEADER_CHECK_INTERVAL * 2 + JOB_INTERVAL * 4)
+        return before, roles, list(runs), follower.is_leader
+    finally:
+        await follower.stop()
+
+
+def test_only_leader_runs_jobs():
+    """测试只有 leader 执行任务，leader 退出后其他 worker 接管"""
+    print("\n=== 测试只有 leader 执行任务 ===")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        before, roles, after, taken_over = asyncio.run(_check_leader_only(os.path.join(tmpdir, "leader.lock")))
+    print(f"✅ leader 执行 {len(before)} 次，接管后执行 {len(after)} 次")
+    assert roles == (True, False)
+    assert before and set(before) == {"leader"}
+    assert taken_over and after and set(after) == {"follower"}
+
+
+async def _check_skip_and_timeout(path: str):
+    scheduler = BackgroundScheduler(FileLeaderLock(path), leader_check_interval=LEADER_CHECK_INTERVAL)
+
+    async def slow():
+        await asyncio.sleep(JOB_INTERVAL * 4)
+
+    async def hang():
+        await asyncio.sleep(10)
+
+    scheduler.add_job("slow", slow, JOB_INTERVAL, jitter=0)
+    scheduler.add_job("hang", hang, 10, jitter=0, timeout=JOB_INTERVAL)
+    await scheduler.start()
+    try:
+        assert scheduler.trigger("hang")
+        await asyncio.sleep(JOB_INTERVAL * 6)
+        return scheduler.get_status()["jobs"]
+    finally:
+        await scheduler.stop()
+
+
+def test_skip_overlapping_and_timeout():
+    """测试上一次执行未结束时跳过，以及超时后记录错误"""
+    print("\n=== 测试跳过重叠执行与超时 ===")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        jobs = asyncio.run(_check_skip_and_timeout(os.path.join(tmpdir, "leader.lock")))
+    print(f"✅ slow 跳过 {jobs['slow']['skipped_count']} 次，hang 执行 {jobs['hang']['run_count']} 次后超时")
+    assert jobs["slow"]["skipped_count"] > 0
+    assert jobs["hang"]["run_count"] == 1
+    assert jobs["hang"]["last_error"] is not None and not jobs["hang"]["running"]
+
+
+def main():
+    tests = [
+        test_file_leader_lock,
+        test_only_leader_runs_jobs,
+        test_skip_overlapping_and_timeout,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+    print("=" * 50)
+    print(f"测试完成: {len(tests) - failed}/{len(tests)} 通过")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
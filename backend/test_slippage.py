@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+滑点测试
+按深度计算的成交均价、最差价、滑点，以及深度不足时的部分成交
+"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(__file__))
+
+import numpy as np
+
+from slippage import DepthProfile
+
+
+def test_slippage_profile():
+    """测试按深度计算的成交均价、最差价、滑点和深度不足的情况"""
+    print("=== 测试深度成交均价与滑点 ===")
+    asks = [[100.0, 1.0], [101.0, 2.0], [103.0, 1.0]]
+    buy = DepthProfile.from_levels(asks, "buy").estimate([0.5, 1.0, 2.0, 5.0])
+    sell = DepthProfile.from_levels([[99.0, 1.0], [98.0, 1.0]], "sell").estimate([1.5])
+    print(f"✅ 买入均价 {buy['vwap'].round(4).tolist()}，卖出滑点 {sell['slippage_bps'].round(2).tolist()}bp")
+    assert np.allclose(buy["vwap"][:3], [100.0, 100.0, (100 + 101) / 2])
+    assert buy["worst_price"].tolist()[:3] == [100.0, 100.0, 101.0]
+    assert buy["levels"].tolist() == [1, 1, 2, 3]
+    assert buy["fully_filled"].tolist() == [True, True, True, False]
+    assert buy["filled"][3] == 4.0 and np.isclose(buy["vwap"][3], (100 + 202 + 103) / 4)
+    assert np.isclose(buy["slippage_bps"][2], 50.0)
+    assert np.isclose(sell["vwap"][0], (99 + 0.5 * 98) / 1.5)
+    assert np.isclose(sell["slippage_bps"][0], -(sell["vwap"][0] / 99 - 1) * 1e4)
+
+
+def main():
+    tests = [
+        test_slippage_profile,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+    print("=" * 50)
+    print(f"测试完成: {len(tests) - failed}/{len(tests)} 通过")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+启动时间回归测试
+在独立进程中导入 main 并启动 uvicorn，确保冷启动保持在固定预算内、
+重量级依赖不会在导入期被加载
+"""
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 固定预算（秒），超出即视为启动性能回退
+IMPORT_BUDGET = float(os.getenv('STARTUP_IMPORT_BUDGET', '2.5'))
+HEALTH_BUDGET = float(os.getenv('STARTUP_HEALTH_BUDGET', '5.0'))
+
+# 只允许在首次使用时加载的重量级模块
+LAZY_MODULES = ["pandas", "numpy", "ccxt", "requests"]
+
+
+def _run_python(code: str, cwd: str) -> str:
+    env = dict(os.environ, PYTHONPATH=BACKEND_DIR, SCHEDULER_ENABLED="false")
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=cwd, env=env,
+        capture_output=True, text=True, timeout=60
+    )
+    assert result.returncode == 0, result.stderr
+    return result.stdout.strip()
+
+
+def test_import_time_budget():
+    """测试导入 main 的耗时不超过预算"""
+    print("=== 测试 main 导入耗时 ===")
+    with tempfile.TemporaryDirectory() as workdir:
+        elapsed = float(_run_python(
+            "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)",
+            workdir
+        ))
+    print(f"✅ 导入 main 耗时 {elapsed:.3f}s（预算 {IMPORT_BUDGET}s）")
+    assert elapsed < IMPORT_BUDGET, f"导入 main 耗时 {elapsed:.3f}s 超出预算 {IMPORT_BUDGET}s"
+
+
+def test_no_heavy_imports():
+    """测试导入 main 时不会加载重量级依赖"""
+    print("\n=== 测试导入期不加载重量级依赖 ===")
+    with tempfile.TemporaryDirectory() as workdir:
+        loaded = _run_python(
+            "import sys, main; "
+            f"print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))",
+            workdir
+        )
+    assert not loaded, f"导入 main 时加载了重量级模块: {loaded}"
+    print(f"✅ 未加载 {', '.join(LAZY_MODULES)}")
+
+
+def test_health_ready_budget():
+    """测试从启动 uvicorn 到 /health 返回 200 的耗时不超过预算"""
+    print("\n=== 测试 /health 就绪耗时 ===")
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    env = dict(os.environ, PYTHONPATH=BACKEND_DIR, SCHEDULER_ENABLED="false")
+    with tempfile.TemporaryDirectory() as workdir:
+        started = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)],
+            cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            elapsed = None
+            while time.perf_counter() - started < HEALTH_BUDGET * 2:
+                try:
+                    with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                        if response.status == 200:
+                            elapsed = time.perf_counter() - started
+                            break
+                except OSError:
+                    time.sleep(0.05)
+        finally:
+            process.terminate()
+            process.wait(timeout=10)
+
+    assert elapsed is not None, "uvicorn 未能在预算时间内提供 /health"
+    print(f"✅ /health 就绪耗时 {elapsed:.3f}s（预算 {HEALTH_BUDGET}s）")
+    assert elapsed < HEALTH_BUDGET, f"/health 就绪耗时 {elapsed:.3f}s 超出预算 {HEALTH_BUDGET}s"
+
+
+def main():
+    """主测试函数"""
+    print("🚀 开始启动时间回归测试...\n")
+    test_import_time_budget()
+    test_no_heavy_imports()
+    test_health_ready_budget()
+    print("\n🎉 启动时间在预算之内。")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+策略参数网格测试
+在有效和无效取值混合的网格上，逐个候选用 schema_registry.validate 单独验证，
+与 validate_grid 的有效掩码和候选参数对比；数字参数包括空值、NaN、无穷和字符串取值
+"""
+import itertools
+import math
+import os
+import sys
+
+sys.path.append(os.path.dirname(__file__))
+os.environ.setdefault("SCHEDULER_ENABLED", "false")
+
+from hummingbot_integration import schema_registry
+from strategy_grid import validate_grid
+
+STRATEGY_TYPE = "pure_market_making"
+BASE = {"exchange": "binance", "market": "BTC-USDT", "ask_spread": 0.5, "order_amount": 0.01}
+GRID = {
+    "bid_spread": [0.1, None, float("nan"), 150, "0.2"],  # 必填：空值无效
+    "order_levels": [1, None, math.inf, "abc", 3],  # 可选：空值时不出现在参数中
+    "price_ceiling": [-1, float("nan")],
+    "ping_pong_enabled": [True, "false"],
+}
+
+
+def _single(params):
+    """单个配置验证的结果：有效时为验证后的参数，无效时为 None"""
+    try:
+        return schema_registry.validate(STRATEGY_TYPE, params)
+    except ValueError:
+        return None
+
+
+def test_grid_matches_single_validation():
+    """测试网格验证与逐个候选单独验证一致"""
+    print("=== 测试网格验证与单个配置验证一致 ===")
+    validation = validate_grid(STRATEGY_TYPE, BASE, GRID)
+    candidates = dict(validation.candidates())
+    # 候选按 validate_grid 的网格维度（模式中的参数顺序）以 C 顺序编号
+    axis_names = [name for name, _ in validation.axes]
+    mismatched = []
+    for index, position in enumerate(itertools.product(*[range(len(GRID[name])) for name in axis_names])):
+        params = {**BASE, **{name: GRID[name][i] for name, i in zip(axis_names, position)}}
+        expected = _single(params)
+        if expected != candidates.get(index):
+            mismatched.append((params, expected, candidates.get(index)))
+    print(f"✅ {validation.total} 个候选，有效 {validation.valid_count} 个，与单个配置验证不一致 {len(mismatched)} 个")
+    assert not mismatched, mismatched[:3]
+    assert 0 < validation.valid_count < validation.total
+    assert validation.errors
+
+
+def test_nan_rejected_by_single_validation():
+    """测试单个配置验证拒绝 NaN 和无穷，可选参数为空时不出现在参数中"""
+    print("\n=== 测试单个配置验证的数字参数 ===")
+    nan = _single({**BASE, "bid_spread": 0.1, "price_ceiling": float("nan")})
+    inf = _single({**BASE, "bid_spread": math.inf})
+    empty = _single({**BASE, "bid_spread": 0.1, "order_levels": None})
+    print(f"✅ NaN: {nan}，无穷: {inf}，可选参数为空: {'order_levels' in empty}")
+    assert nan is None and inf is None
+    assert "order_levels" not in empty
+
+
+def main():
+    tests = [
+        test_grid_matches_single_validation,
+        test_nan_rejected_by_single_validation,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+    print("=" * 50)
+    print(f"测试完成: {len(tests) - failed}/{len(tests)} 通过")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+策略命令队列测试
+两个队列实例共享临时数据库模拟两个 worker，验证同一策略的任务跨 worker 按提交顺序逐个执行、
+重复提交合并为同一任务、幂等键用于其他命令时返回 409、批量接口每个策略提交一个任务，
+以及崩溃的 worker 遗留的任务在租约过期后被接管：中断的任务标记为失败，排队的任务继续执行
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.append(os.path.dirname(__file__))
+os.environ.setdefault("SCHEDULER_ENABLED", "false")
+
+import models
+from strategy_jobs import IdempotencyKeyConflict, StrategyCommandQueue
+
+PARAMS = {"market": "BTC-USDT", "order_amount": 0.01}
+
+
+class Executor:
+    """记录命令执行顺序和同一策略并发数的执行器；order_amount 为负数的配置无效"""
+
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+        self.calls = []
+        self.active = {}
+        self.max_active = 0
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    @staticmethod
+    def validate_config(strategy_type, params):
+        if params.get("order_amount", 0) < 0:
+            raise ValueError("order_amount must be positive")
+        return dict(params)
+
+    async def _call(self, action, strategy_id):
+        self.active[strategy_id] = self.active.get(strategy_id, 0) + 1
+        self.max_active = max(self.max_active, self.active[strategy_id])
+        try:
+            await self.gate.wait()
+            await asyncio.sleep(self.delay)
+            self.calls.append((action, strategy_id))
+        finally:
+            self.active[strategy_id] -= 1
+        return {strategy_id: {"success": True}}
+
+    async def start_strategies(self, configs):
+        return await self._call("start", configs[0]["id"])
+
+    async def stop_strategies(self, strategy_ids):
+        return await self._call("stop", strategy_ids[0])
+
+
+class Cluster:
+    """临时数据库上共享同一执行器的多个队列实例"""
+
+    def __init__(self, workers: int = 2, lease_ttl: float = 30):
+        self.workers = workers
+        self.lease_ttl = lease_ttl
+
+    async def __aenter__(self):
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+
+        self.tmpdir = tempfile.TemporaryDirectory()
+        engine = create_engine(f"sqlite:///{self.tmpdir.name}/jobs.db", connect_args={"check_same_thread": False})
+        models.Base.metadata.create_all(bind=engine)
+        self.session_factory = sessionmaker(bind=engine)
+        self.executor = Executor()
+        self.queues = [
+            StrategyCommandQueue(executor=self.executor, session_factory=self.session_factory, lease_ttl=self.lease_ttl)
+            for _ in range(self.workers)
+        ]
+        return self
+
+    async def __aexit__(self, *exc):
+        for queue in self.queues:
+            await queue.close()
+        self.tmpdir.cleanup()
+
+    async def wait_finished(self, job_ids, timeout: float = 5.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            jobs = [await self.queues[0].get(job_id) for job_id in job_ids]
+            if all(job["status"] in ("succeeded", "failed") for job in jobs):
+                return jobs
+            await asyncio.sleep(0.02)
+        raise AssertionError(f"任务未在 {timeout} 秒内完成: {[job['status'] for job in jobs]}")
+
+    def add_orphans(self, strategy_id: str, expires_at: float):
+        """模拟崩溃的 worker：执行中的任务、排队的任务和它持有的租约"""
+        db = self.session_factory()
+        try:
+            now = datetime.now(timezone.utc)
+            for i, (action, status) in enumerate([("start", "running"), ("stop", "queued"), ("start", "queued")]):
+                db.add(models.StrategyJob(id=f"{strategy_id}-{i}", strategy_id=strategy_id, action=action,
+                                          type=None if action == "stop" else "pure_market_making",
+                                          params=None if action == "stop" else PARAMS, status=status,
+                                          created_at=now + timedelta(seconds=i)))
+            db.add(models.StrategyJobLease(strategy_id=strategy_id, owner="crashed", expires_at=expires_at))
+            db.commit()
+        finally:
+            db.close()
+
+
+async def _check_ordering():
+    async with Cluster() as cluster:
+        a, b = cluster.queues
+        # 两个 worker 交替收到同一策略的命令（各带幂等键，不合并），另一个策略的命令并发执行
+        submitted = []
+        for i, (queue, action) in enumerate([(a, "start"), (b, "stop"), (a, "restart"), (b, "stop"), (a, "start")]):
+            job, _ = await queue.submit("s1", action, "pure_market_making", PARAMS, idempotency_key=f"k{i}")
+            submitted.append(job["id"])
+        other, _ = await b.submit("s2", "start", "pure_market_making", PARAMS)
+        jobs = await cluster.wait_finished(submitted + [other["id"]])
+        calls = [action for action, strategy_id in cluster.executor.calls if strategy_id == "s1"]
+        return calls, cluster.executor.max_active, jobs
+
+
+def test_ordering_across_workers():
+    """测试同一策略的任务跨 worker 按提交顺序逐个执行"""
+    print("=== 测试跨 worker 的执行顺序 ===")
+    calls, max_active, jobs = asyncio.run(_check_ordering())
+    print(f"✅ s1 的调用顺序 {calls}，同一策略最大并发 {max_active}")
+    assert calls == ["start", "stop", "stop", "start", "stop", "start"]
+    assert max_active == 1
+    assert all(job["status"] == "succeeded" for job in jobs)
+    started = [job["started_at"] for job in jobs[:5]]
+    assert started == sorted(started)
+
+
+async def _check_dedup():
+    async with Cluster() as cluster:
+        a, b = cluster.queues
+        cluster.executor.gate.clear()  # 第一个任务执行中，后续任务排队
+        running, _ = await a.submit("s1", "start", "pure_market_making", PARAMS)
+        await asyncio.sleep(0.1)
+        first, first_created = await a.submit("s1", "stop")
+        again, again_created = await b.submit("s1", "stop")  # 另一个 worker 收到的重复点击
+        keyed, _ = await a.submit("s1", "start", "pure_market_making", PARAMS, idempotency_key="k1")
+        replay, replay_created = await b.submit("s1", "start", "pure_market_making", PARAMS, idempotency_key="k1")
+        try:
+            await b.submit("s1", "stop", idempotency_key="k1")
+            conflict = None
+        except IdempotencyKeyConflict as e:
+            conflict = e
+        cluster.executor.gate.set()
+        await cluster.wait_finished([running["id"], first["id"], keyed["id"]])
+        return (first, first_created), (again, again_created), (keyed, replay, replay_created), conflict, \
+            len(cluster.executor.calls)
+
+
+def test_dedup_and_conflict():
+    """测试排队中的相同命令合并、幂等键重放返回同一任务、幂等键用于其他命令时冲突"""
+    print("\n=== 测试任务去重 ===")
+    (first, first_created), (again, again_created), (keyed, replay, replay_created), conflict, calls = \
+        asyncio.run(_check_dedup())
+    print(f"✅ 重复点击合并为 {again['id']}，幂等键重放返回 {replay['id']}，冲突: {conflict}，共执行 {calls} 次")
+    assert first_created and not again_created and again["id"] == first["id"]
+    assert not replay_created and replay["id"] == keyed["id"]
+    assert conflict is not None
+    assert calls == 3
+
+
+async def _check_conflict_route():
+    import main
+    import strategy_jobs
+    from fastapi import HTTPException
+
+    async with Cluster(workers=1) as cluster:
+        saved, strategy_jobs.strategy_command_queue = strategy_jobs.strategy_command_queue, cluster.queues[0]
+        try:
+            accepted = await main._submit_strategy_job("s1", "stop", idempotency_key="k1")
+            try:
+                await main._submit_strategy_job("s1", "start", "pure_market_making", PARAMS, idempotency_key="k1")
+                status = None
+            except HTTPException as e:
+                status = e.status_code
+        finally:
+            strategy_jobs.strategy_command_queue = saved
+        return accepted.status_code, status
+
+
+def test_conflict_returns_409():
+    """测试幂等键用于其他命令时接口返回 409"""
+    print("\n=== 测试幂等键冲突 ===")
+    accepted, status = asyncio.run(_check_conflict_route())
+    print(f"✅ 首次提交 {accepted}，同一幂等键提交其他命令 {status}")
+    assert accepted == 202
+    assert status == 409
+
+
+async def _check_bulk_route():
+    import main
+    import schemas
+    import strategy_jobs
+    from fastapi import HTTPException
+
+    async with Cluster(workers=1) as cluster:
+        saved, strategy_jobs.strategy_command_queue = strategy_jobs.strategy_command_queue, cluster.queues[0]
+        try:
+            bad = schemas.BulkStrategyStart(strategies=[
+                {"id": "s1", "type": "pure_market_making", "params": PARAMS},
+                {"id": "s2", "type": "pure_market_making", "params": {**PARAMS, "order_amount": -1}},
+            ])
+            try:
+                await main.bulk_start_hummingbot_strategies(bad, idempotency_key=None)
+                rejected = None
+            except HTTPException as e:
+                rejected = (e.status_code, e.detail["errors"])
+            queued_after_reject = await cluster.queues[0].list()
+
+            good = schemas.BulkStrategyStart(strategies=[
+                {"id": f"s{i}", "type": "pure_market_making", "params": PARAMS} for i in range(3)
+            ])
+            started = await main.bulk_start_hummingbot_strategies(good, idempotency_key="bulk")
+            replay = await main.bulk_start_hummingbot_strategies(good, idempotency_key="bulk")
+            stopped = await main.bulk_stop_hummingbot_strategies(schemas.BulkStrategyStop(ids=["s0", "s0", "s1"]),
+                                                                 idempotency_key=None)
+            body, replay_body, stop_body = (json.loads(r.body)["data"] for r in (started, replay, stopped))
+            job_ids = [r["job"]["id"] for r in list(body["results"].values()) + list(stop_body["results"].values())]
+            await cluster.wait_finished(job_ids)
+        finally:
+            strategy_jobs.strategy_command_queue = saved
+        return rejected, queued_after_reject, (started.status_code, body), replay_body, stop_body, \
+            cluster.executor.calls
+
+
+def test_bulk_routes_submit_jobs():
+    """测试批量接口先验证全部配置，再每个策略经由命令队列提交一个任务"""
+    print("\n=== 测试批量提交任务 ===")
+    rejected, queued_after_reject, (status, body), replay, stopped, calls = asyncio.run(_check_bulk_route())
+    print(f"✅ 无效配置 {rejected}，之后排队任务 {len(queued_after_reject)} 个；批量启动 {status} 提交 "
+          f"{body['submitted']} 个，批量停止提交 {stopped['submitted']} 个，执行 {len(calls)} 次")
+    assert rejected == (400, {"s2": "order_amount must be positive"})
+    assert queued_after_reject == []
+    assert status == 202 and body["total"] == body["submitted"] == 3
+    assert [r["job"]["id"] for r in replay["results"].values()] == [r["job"]["id"] for r in body["results"].values()]
+    assert list(stopped["results"]) == ["s0", "s1"]
+    assert sorted(calls) == [("start", "s0"), ("start", "s1"), ("start", "s2"), ("stop", "s0"), ("stop", "s1")]
+    assert calls.index(("start", "s0")) < calls.index(("stop", "s0"))
+
+
+async def _check_recovery():
+    async with Cluster(workers=1) as cluster:
+        queue = cluster.queues[0]
+        cluster.add_orphans("crashed", expires_at=time.time() - 1)
+        cluster.add_orphans("alive", expires_at=time.time() + 60)  # 持有者仍在续期
+        recovered = await queue.recover()
+        crashed = await cluster.wait_finished([f"crashed-{i}" for i in range(3)])
+        alive = await queue.list(strategy_id="alive")
+        return recovered, crashed, {job["id"]: job["status"] for job in alive}, cluster.executor.calls
+
+
+def test_recover_orphaned_jobs():
+    """测试租约过期后接管遗留任务：中断的任务标记为失败，排队的任务按顺序执行，租约有效的策略不受影响"""
+    print("\n=== 测试接管遗留任务 ===")
+    recovered, crashed, alive, calls = asyncio.run(_check_recovery())
+    print(f"✅ 接管 {recovered} 个策略，遗留任务状态 {[job['status'] for job in crashed]}，执行 {calls}")
+    assert recovered == 1
+    assert crashed[0]["status"] == "failed" and crashed[0]["error"]
+    assert [job["status"] for job in crashed[1:]] == ["succeeded", "succeeded"]
+    assert calls == [("stop", "crashed"), ("start", "crashed")]
+    assert alive == {"alive-0": "running", "alive-1": "queued", "alive-2": "queued"}
+
+
+def main():
+    tests = [
+        test_ordering_across_workers,
+        test_dedup_and_conflict,
+        test_conflict_returns_409,
+        test_bulk_routes_submit_jobs,
+        test_recover_orphaned_jobs,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+    print("=" * 50)
+    print(f"测试完成: {len(tests) - failed}/{len(tests)} 通过")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+策略执行注册表测试
+在临时数据库上验证写入版本严格递增（时钟回拨时也不倒退）并同步 strategies 表状态；
+对模拟 Hummingbot 验证对账：批量接口下修正漂移，逐个查询时查询旧版本遗留的策略，
+Hummingbot 不可达时对账失败且不修改任何记录
+"""
+import asyncio
+import os
+import socket
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(__file__))
+os.environ.setdefault("SCHEDULER_ENABLED", "false")
+
+import models
+from hummingbot_integration import HummingbotAPIClient, strategy_executor
+from mock_hummingbot_api_server import MockHummingbotAPIServer
+from strategy_registry import StrategyRegistry
+from strategy_status import strategy_status_aggregator
+
+PARAMS = {"exchange": "binance", "market": "BTC-USDT", "bid_spread": 0.1, "ask_spread": 0.1, "order_amount": 0.01}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class Hummingbot(MockHummingbotAPIServer):
+    """可关闭批量状态接口、可让逐个查询返回 503 的模拟 Hummingbot"""
+
+    bulk = True
+    outage = False
+
+    async def get_strategies_status(self, request):
+        from aiohttp import web
+
+        if not self.bulk:
+            raise web.HTTPNotFound()
+        return await super().get_strategies_status(request)
+
+    async def get_strategy_status(self, request):
+        from aiohttp import web
+
+        if self.outage:
+            raise web.HTTPServiceUnavailable()
+        return await super().get_strategy_status(request)
+
+
+class Environment:
+    """临时数据库上的注册表 + 模拟 Hummingbot，临时替换全局执行器并重置全局状态缓存"""
+
+    def __init__(self, bulk: bool = True):
+        self.bulk = bulk
+
+    async def __aenter__(self):
+        from aiohttp import web
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+
+        self.tmpdir = tempfile.TemporaryDirectory()
+        engine = create_engine(f"sqlite:///{self.tmpdir.name}/registry.db", connect_args={"check_same_thread": False})
+        models.Base.metadata.create_all(bind=engine)
+        self.session_factory = sessionmaker(bind=engine)
+        self.registry = StrategyRegistry(session_factory=self.session_factory)
+        self.mock = Hummingbot(host="127.0.0.1", port=_free_port())
+        self.mock.bulk = self.bulk
+        self.runner = web.AppRunner(self.mock.app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.mock.host, self.mock.port).start()
+        self.client = HummingbotAPIClient(f"http://{self.mock.host}:{self.mock.port}", max_retries=0)
+        self._saved = strategy_executor.api_client, strategy_executor.registry
+        strategy_executor.api_client, strategy_executor.registry = self.client, self.registry
+        strategy_status_aggregator.statuses = {}
+        strategy_status_aggregator.fetched_at = None
+        strategy_status_aggregator.bulk_supported = True
+        return self
+
+    async def __aexit__(self, *exc):
+        strategy_executor.api_client, strategy_executor.registry = self._saved
+        strategy_status_aggregator.statuses = {}
+        strategy_status_aggregator.fetched_at = None
+        strategy_status_aggregator.bulk_supported = True
+        await self.client.close()
+        await self.runner.cleanup()
+        self.tmpdir.cleanup()
+
+    async def run_on_hummingbot(self, strategy_id: str):
+        await self.client.start_strategy(strategy_id, {"type": "pure_market_making", "params": PARAMS})
+
+    def add_legacy_strategy(self, name: str) -> str:
+        """旧版本只在 strategies 表中标记为运行、没有执行记录的策略"""
+        db = self.session_factory()
+        try:
+            strategy = models.Strategy(name=name, type="pure_market_making", status="running", params=PARAMS)
+            db.add(strategy)
+            db.commit()
+            return str(strategy.id)
+        finally:
+            db.close()
+
+    def strategy_status(self, strategy_id: str) -> str:
+        db = self.session_factory()
+        try:
+            return db.get(models.Strategy, int(strategy_id)).status
+        finally:
+            db.close()
+
+
+async def _check_versioning():
+    async with Environment() as env:
+        legacy_id = env.add_legacy_strategy("versioned")
+        first = (await env.registry.mark_running([(legacy_id, "pure_market_making", PARAMS, "hb-1")]))[0]
+        # 模拟另一个时钟落后的 worker 写入更小的版本号
+        stale = await asyncio.to_thread(env.registry._save, [{
+            "strategy_id": legacy_id, "type": None, "params": None, "status": "stopped", "instance": None,
+            "error": None, "version": first["version"] - 10 ** 6,
+        }])
+        stopped_status = env.strategy_status(legacy_id)
+        again = (await env.registry.mark_running([(legacy_id, None, None, None)]))[0]
+        return first, stale[0], stopped_status, again
+
+
+def test_versions_strictly_increase():
+    """测试写入版本严格递增，未给出的字段沿用已有记录，并同步 strategies 表状态"""
+    print("=== 测试注册表写入版本 ===")
+    first, stale, stopped_status, again = asyncio.run(_check_versioning())
+    print(f"✅ 版本 {first['version']} -> {stale['version']} -> {again['version']}")
+    assert stale["version"] == first["version"] + 1
+    assert again["version"] > stale["version"]
+    assert stopped_status == "stopped"
+    assert again["type"] == "pure_market_making" and again["params"] == PARAMS and again["instance"] == "hb-1"
+
+
+async def _check_reconcile_bulk():
+    async with Environment() as env:
+        await env.registry.mark_running([("drifted", "pure_market_making", PARAMS, None)])
+        await env.run_on_hummingbot("unrecorded")
+        result = await env.registry.reconcile()
+        return result, await env.registry.get("drifted"), await env.registry.get("unrecorded")
+
+
+def test_reconcile_bulk():
+    """测试批量接口下对账：记录为运行但未运行的标记为停止，运行但未记录的补录"""
+    print("\n=== 测试批量接口对账 ===")
+    result, drifted, unrecorded = asyncio.run(_check_reconcile_bulk())
+    print(f"✅ 对账结果 {result}，drifted: {drifted['status']}，unrecorded: {unrecorded['status']}")
+    assert result == {"running": 1, "corrected": 2}
+    assert drifted["status"] == "stopped" and drifted["error"]
+    assert unrecorded["status"] == "running"
+
+
+async def _check_reconcile_per_id():
+    async with Environment(bulk=False) as env:
+        running_id = env.add_legacy_strategy("still running")
+        stopped_id = env.add_legacy_strategy("gone")
+        await env.run_on_hummingbot(running_id)
+        result = await env.registry.reconcile()
+        entries = await env.registry.get(running_id), await env.registry.get(stopped_id)
+        return result, entries, env.strategy_status(stopped_id)
+
+
+def test_reconcile_per_id_queries_legacy():
+    """测试逐个查询时旧版本遗留的策略也被查询：仍在运行的补录，未运行的标记为停止"""
+    print("\n=== 测试逐个查询对账 ===")
+    result, (running, stopped), stopped_status = asyncio.run(_check_reconcile_per_id())
+    print(f"✅ 对账结果 {result}，仍在运行: {running['status']}，已停止: {stopped['status']}")
+    assert result == {"running": 1, "corrected": 2}
+    assert running["status"] == "running"
+    assert stopped["status"] == "stopped" and stopped_status == "stopped"
+
+
+async def _check_reconcile_outage():
+    async with Environment(bulk=False) as env:
+        await env.registry.mark_running([("recorded", "pure_market_making", PARAMS, None)])
+        legacy_id = env.add_legacy_strategy("legacy")
+        env.mock.outage = True
+        try:
+            await env.registry.reconcile()
+            error = None
+        except Exception as e:
+            error = e
+        return error, await env.registry.get("recorded"), env.strategy_status(legacy_id)
+
+
+def test_reconcile_fails_when_unreachable():
+    """测试逐个查询失败时对账抛出异常，不把策略标记为停止"""
+    print("\n=== 测试 Hummingbot 不可达时对账 ===")
+    error, recorded, legacy_status = asyncio.run(_check_reconcile_outage())
+    print(f"✅ 对账失败: {type(error).__name__}，已记录的策略仍为 {recorded['status']}")
+    assert error is not None
+    assert recorded["status"] == "running"
+    assert legacy_status == "running"
+
+
+def main():
+    tests = [
+        test_versions_strictly_increase,
+        test_reconcile_bulk,
+        test_reconcile_per_id_queries_legacy,
+        test_reconcile_fails_when_unreachable,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+    print("=" * 50)
+    print(f"测试完成: {len(tests) - failed}/{len(tests)} 通过")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+策略参数模式测试
+预编译的验证函数与编译前逐个解释模式的 validate_parameters（保留在本文件中作为参照）在有效值、
+越界、NaN、可选值和布尔字符串等输入上结果一致（NaN 按预期改为拒绝）；
+get_strategy_schema 返回副本，修改它不影响注册表；模式接口在 If-None-Match 匹配时返回 304
+"""
+import asyncio
+import json
+import os
+import sys
+
+sys.path.append(os.path.dirname(__file__))
+os.environ.setdefault("SCHEDULER_ENABLED", "false")
+
+from hummingbot_integration import ParameterValidator, compile_validator, get_strategy_schema, schema_registry
+
+PURE_MM = {"exchange": "binance", "market": "BTC-USDT", "bid_spread": 0.5, "ask_spread": 0.5, "order_amount": 0.01}
+SPOT_PERP = {"spot_connector": "binance", "perpetual_connector": "okx_perpetual", "market": "BTC-USDT",
+             "min_profitability": 0.5, "order_amount": 0.01}
+CASES = [
+    ("pure_market_making", PURE_MM),
+    ("pure_market_making", {**PURE_MM, "order_levels": "3", "price_ceiling": "-1"}),  # 数字字符串
+    ("pure_market_making", {**PURE_MM, "bid_spread": 0.001, "order_refresh_time": 7200}),  # 越界
+    ("pure_market_making", {**PURE_MM, "minimum_spread": -100, "order_levels": 10}),  # 边界值
+    ("pure_market_making", {**PURE_MM, "bid_spread": "abc"}),  # 非数字
+    ("pure_market_making", {**PURE_MM, "exchange": "bitmex"}),  # 不在可选值中
+    ("pure_market_making", {**PURE_MM, "exchange": "okx"}),
+    ("pure_market_making", {**PURE_MM, "ping_pong_enabled": "Yes", "inventory_skew_enabled": "off",
+                            "order_optimization_enabled": 1}),  # 布尔字符串
+    ("pure_market_making", {k: v for k, v in PURE_MM.items() if k != "market"}),  # 缺少必填参数
+    ("pure_market_making", {**PURE_MM, "order_levels": None}),  # 可选参数为空
+    ("spot_perpetual_arbitrage", SPOT_PERP),
+    ("spot_perpetual_arbitrage", {**SPOT_PERP, "funding_rate_threshold": -0.5, "leverage": 0}),
+    ("spot_perpetual_arbitrage", {**SPOT_PERP, "perpetual_connector": "binance"}),
+    ("cross_exchange_market_making", {"exchange_1": "binance", "exchange_2": "okx", "market": "ETH-USDT",
+                                      "min_profitability": 0.2, "order_amount": 0.1, "adjust_order_enabled": "false"}),
+]
+NAN_CASES = [
+    ("pure_market_making", {**PURE_MM, "bid_spread": float("nan")}),
+    ("pure_market_making", {**PURE_MM, "price_floor": "nan"}),
+]
+
+
+def validate_parameters(params, schema):
+    """编译前的验证实现（逐个参数解释模式），作为预编译验证函数的参照"""
+    validated_params = {}
+    errors = []
+
+    for param_name, param_def in schema.items():
+        value = params.get(param_name, param_def.default)
+
+        if param_def.required and value is None:
+            errors.append(f"Parameter '{param_name}' is required")
+            continue
+
+        if value is not None:
+            try:
+                if param_def.type == "number":
+                    value = float(value)
+                    if param_def.min_value is not None and value < param_def.min_value:
+                        errors.append(f"Parameter '{param_name}' must be >= {param_def.min_value}")
+                    if param_def.max_value is not None and value > param_def.max_value:
+                        errors.append(f"Parameter '{param_name}' must be <= {param_def.max_value}")
+                elif param_def.type == "boolean":
+                    if isinstance(value, str):
+                        value = value.lower() in ['true', '1', 'yes', 'on']
+                    else:
+                        value = bool(value)
+                elif param_def.type == "select":
+                    if param_def.options and value not in param_def.options:
+                        errors.append(f"Parameter '{param_name}' must be one of {param_def.options}")
+
+                validated_params[param_name] = value
+            except (ValueError, TypeError) as e:
+                errors.append(f"Invalid value for parameter '{param_name}': {e}")
+
+    if not errors:
+        errors.extend(ParameterValidator.validate_instrument_rules(validated_params))
+
+    if errors:
+        raise ValueError(f"Parameter validation failed: {'; '.join(errors)}")
+
+    return validated_params
+
+
+def _outcome(validate, params):
+    try:
+        return "ok", validate(params)
+    except ValueError as e:
+        return "error", str(e)
+
+
+def test_compiled_validator_parity():
+    """测试预编译的验证函数与参照实现结果一致"""
+    print("=== 测试预编译验证函数与参照实现一致 ===")
+    mismatched = []
+    for strategy_type, params in CASES:
+        parameters = schema_registry.get(strategy_type).parameters
+        expected = _outcome(lambda p: validate_parameters(p, parameters), params)
+        for validate in (compile_validator(parameters), schema_registry.get(strategy_type).validate):
+            actual = _outcome(validate, params)
+            if actual != expected:
+                mismatched.append((strategy_type, params, expected, actual))
+    outcomes = [_outcome(schema_registry.get(t).validate, p)[0] for t, p in CASES]
+    print(f"✅ {len(CASES)} 个输入（有效 {outcomes.count('ok')}，无效 {outcomes.count('error')}），不一致 {len(mismatched)} 个")
+    assert not mismatched, mismatched[:2]
+    assert 0 < outcomes.count("ok") < len(CASES)
+
+
+def test_nan_rejected():
+    """测试 NaN：参照实现会放过（比较结果恒为假），预编译的验证函数拒绝"""
+    print("\n=== 测试 NaN 输入 ===")
+    for strategy_type, params in NAN_CASES:
+        parameters = schema_registry.get(strategy_type).parameters
+        reference = _outcome(lambda p: validate_parameters(p, parameters), params)
+        compiled = _outcome(schema_registry.get(strategy_type).validate, params)
+        print(f"  - 参照实现 {reference[0]}，预编译 {compiled}")
+        assert reference[0] == "ok"
+        assert compiled[0] == "error" and "must be a finite number" in compiled[1]
+    print("✅ NaN 被拒绝")
+
+
+def test_schema_is_copy():
+    """测试修改 get_strategy_schema 的返回值不影响注册表和预先序列化的响应"""
+    print("\n=== 测试模式返回副本 ===")
+    compiled = schema_registry.get("pure_market_making")
+    body, etag = compiled.body, compiled.etag
+    schema = get_strategy_schema("pure_market_making")
+    schema["bid_spread"]["min_value"] = 999
+    schema["exchange"]["options"].append("bitmex")
+    del schema["market"]
+    again = get_strategy_schema("pure_market_making")
+    print(f"✅ 修改后再次获取 bid_spread.min_value={again['bid_spread']['min_value']}")
+    assert again == json.loads(body)["data"]
+    assert compiled.frontend["bid_spread"]["min_value"] == 0.01
+    assert "bitmex" not in compiled.parameters["exchange"].options
+    assert compiled.body == body and compiled.etag == etag
+
+
+def _request(headers):
+    from starlette.requests import Request
+
+    return Request({"type": "http", "method": "GET", "path": "/", "query_string": b"",
+                    "headers": [(name.lower().encode(), value.encode()) for name, value in headers.items()]})
+
+
+async def _check_schema_route():
+    import main
+
+    fresh = await main.get_strategy_parameter_schema("pure_market_making", _request({}))
+    etag = fresh.headers["etag"]
+    cached = await main.get_strategy_parameter_schema("pure_market_making", _request({"If-None-Match": etag}))
+    stale = await main.get_strategy_parameter_schema("pure_market_making", _request({"If-None-Match": '"stale"'}))
+    other = await main.get_strategy_parameter_schema("amm_arb", _request({"If-None-Match": etag}))
+    return fresh, cached, stale, other
+
+
+def test_schema_route_not_modified():
+    """测试模式接口带 ETag，If-None-Match 匹配时返回 304 且没有响应体"""
+    print("\n=== 测试模式接口的条件请求 ===")
+    fresh, cached, stale, other = asyncio.run(_check_schema_route())
+    print(f"✅ 首次 {fresh.status_code}，ETag 匹配 {cached.status_code}，不匹配 {stale.status_code}，其他策略 {other.status_code}")
+    assert fresh.status_code == 200 and json.loads(fresh.body)["data"] == get_strategy_schema("pure_market_making")
+    assert cached.status_code == 304 and cached.body == b"" and cached.headers["etag"] == fresh.headers["etag"]
+    assert stale.status_code == 200 and other.status_code == 200
+
+
+def main():
+    tests = [
+        test_compiled_validator_parity,
+        test_nan_rejected,
+        test_schema_is_copy,
+        test_schema_route_not_modified,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+    print("=" * 50)
+    print(f"测试完成: {len(tests) - failed}/{len(tests)} 通过")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
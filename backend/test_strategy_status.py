@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+策略状态聚合测试
+模拟不支持批量状态接口的 Hummingbot，验证逐个查询时并发读取不同策略的调用者各自拿到自己策略的状态，
+相同策略的并发读取仍只查询一次
+"""
+import asyncio
+import os
+import socket
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(__file__))
+os.environ.setdefault("SCHEDULER_ENABLED", "false")
+
+from hummingbot_integration import HummingbotAPIClient, strategy_executor
+from mock_hummingbot_api_server import MockHummingbotAPIServer
+from strategy_registry import StrategyRegistry
+from strategy_status import StrategyStatusAggregator
+
+PARAMS = {"exchange": "binance", "market": "BTC-USDT", "bid_spread": 0.1, "ask_spread": 0.1, "order_amount": 0.01}
+CALLERS = 5
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class LegacyHummingbot(MockHummingbotAPIServer):
+    """不支持批量状态接口的旧版 Hummingbot"""
+
+    async def get_strategies_status(self, request):
+        from aiohttp import web
+
+        raise web.HTTPNotFound()
+
+
+class Executor:
+    """临时替换全局执行器的 API 客户端和注册表：模拟实例 + 临时数据库"""
+
+    async def __aenter__(self):
+        from aiohttp import web
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+        import models
+
+        self.tmpdir = tempfile.TemporaryDirectory()
+        engine = create_engine(f"sqlite:///{self.tmpdir.name}/registry.db", connect_args={"check_same_thread": False})
+        models.Base.metadata.create_all(bind=engine)
+        self.mock = LegacyHummingbot(host="127.0.0.1", port=_free_port(), latency=0.1)
+        self.runner = web.AppRunner(self.mock.app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.mock.host, self.mock.port).start()
+        self._saved = strategy_executor.api_client, strategy_executor.registry
+        strategy_executor.api_client = HummingbotAPIClient(f"http://{self.mock.host}:{self.mock.port}")
+        strategy_executor.registry = StrategyRegistry(session_factory=sessionmaker(bind=engine))
+        return self
+
+    async def __aexit__(self, *exc):
+        await strategy_executor.api_client.close()
+        strategy_executor.api_client, strategy_executor.registry = self._saved
+        await self.runner.cleanup()
+        self.tmpdir.cleanup()
+
+
+async def _check_fallback_ids():
+    async with Executor() as executor:
+        client = strategy_executor.api_client
+        for strategy_id in ("a", "b"):
+            await client.start_strategy(strategy_id, {"type": "pure_market_making", "params": PARAMS})
+        aggregator = StrategyStatusAggregator(ttl=0)
+        await aggregator.refresh()  # 探测到不支持批量接口
+        aggregator.statuses = {}
+        executor.mock.request_count = 0
+        # 未记录在注册表中的策略只能由调用者传入
+        await asyncio.gather(*[aggregator.refresh([strategy_id]) for strategy_id in ("a", "b")])
+        found = set(aggregator.statuses)
+        a_then_b = executor.mock.request_count
+
+        executor.mock.request_count = 0
+        aggregator.statuses = {}
+        await asyncio.gather(*[aggregator.refresh(["a"]) for _ in range(CALLERS)])
+        same_ids = executor.mock.request_count
+        return aggregator.bulk_supported, found, a_then_b, same_ids
+
+
+def test_fallback_keeps_caller_ids():
+    """测试逐个查询时并发调用者的策略 ID 不丢失，相同 ID 的调用仍然合并"""
+    print("=== 测试逐个查询时的并发刷新 ===")
+    bulk_supported, found, a_then_b, same_ids = asyncio.run(_check_fallback_ids())
+    print(f"✅ 并发刷新 a、b 后缓存 {sorted(found)}（请求 {a_then_b} 次），{CALLERS} 个相同调用请求 {same_ids} 次")
+    assert not bulk_supported
+    assert {"a", "b"} <= found
+    assert same_ids == 1
+
+
+def main():
+    tests = [
+        test_fallback_keeps_caller_ids,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+    print("=" * 50)
+    print(f"测试完成: {len(tests) - failed}/{len(tests)} 通过")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
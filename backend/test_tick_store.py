@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+逐笔行情存储测试
+在临时目录中写入跨 UTC 日期的成交记录，验证按日期分文件、时间倒退的记录被丢弃、
+按时间范围和条数查询，以及崩溃留下的半条记录在下次写入前被截断；盘口记录只在最优价变化时追加
+"""
+import asyncio
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(__file__))
+
+from orderbook import L2OrderBook
+from tick_store import DAY_MS, TickSeries, TickStore
+
+# 2024-01-01 00:00:00 UTC 前后各 5 条成交，间隔 1 秒
+MIDNIGHT = 19723 * DAY_MS
+TRADES = [(MIDNIGHT + offset * 1000, 100.0 + offset, 0.1, 1 if offset % 2 else -1) for offset in range(-5, 5)]
+
+
+def _written_series(root: str) -> TickSeries:
+    series = TickSeries(root, "trade", "binance", "BTC/USDT")
+    for record in TRADES[:6]:
+        series.append(record)
+    series.append((TRADES[0][0], 1.0, 1.0, 1))  # 时间倒退，丢弃
+    for record in TRADES[6:]:
+        series.append(record)
+    series.write(series.buffer)
+    series.buffer = []
+    return series
+
+
+def test_day_files_and_order():
+    """测试按日期分文件写入，丢弃时间倒退的记录"""
+    print("=== 测试按日期分文件 ===")
+    with tempfile.TemporaryDirectory() as root:
+        series = _written_series(root)
+        days = series.days()
+        counts = [len(series.open_day(day)) for day in days]
+        everything = series.query()
+    print(f"✅ 文件 {days}，各 {counts} 条")
+    assert days == ["2023-12-31", "2024-01-01"]
+    assert counts == [5, 5]
+    assert everything["timestamp"].tolist() == [t for t, *_ in TRADES]
+    assert everything["side"].tolist() == [side for *_, side in TRADES]
+
+
+def test_range_queries():
+    """测试按时间范围和条数查询"""
+    print("\n=== 测试范围查询 ===")
+    with tempfile.TemporaryDirectory() as root:
+        series = _written_series(root)
+        same_day = series.query(MIDNIGHT + 1000, MIDNIGHT + 3000)
+        across = series.query(MIDNIGHT - 2000, MIDNIGHT + 1000)
+        earliest = series.query(MIDNIGHT - 3000, limit=4)
+        latest = series.query(limit=3)
+        empty = series.query(MIDNIGHT + 10 * DAY_MS)
+        prices = [same_day["price"].tolist(), across["price"].tolist(), earliest["price"].tolist(),
+                  latest["price"].tolist()]
+    print(f"✅ 同日 {prices[0]}，跨日 {prices[1]}，最早 4 条 {prices[2]}，最新 3 条 {prices[3]}")
+    assert prices[0] == [101.0, 102.0, 103.0]
+    assert prices[1] == [98.0, 99.0, 100.0, 101.0]
+    assert prices[2] == [97.0, 98.0, 99.0, 100.0]
+    assert prices[3] == [102.0, 103.0, 104.0]
+    assert len(empty) == 0
+
+
+def test_torn_record_repair():
+    """测试截断崩溃时写了一半的记录"""
+    print("\n=== 测试截断半条记录 ===")
+    with tempfile.TemporaryDirectory() as root:
+        series = _written_series(root)
+        path = series.path("2024-01-01")
+        with open(path, "ab") as f:
+            f.write(b"\x01\x02\x03")
+        reopened = TickSeries(root, "trade", "binance", "BTC/USDT")
+        reopened.write([(MIDNIGHT + 9000, 200.0, 1.0, 1)])
+        size = os.path.getsize(path)
+        tail = reopened.query(MIDNIGHT)
+    print(f"✅ 修复后文件 {size} 字节，当日 {len(tail)} 条")
+    assert size == 6 * reopened.dtype.itemsize
+    assert tail["price"].tolist() == [100.0, 101.0, 102.0, 103.0, 104.0, 200.0]
+
+
+async def _check_quotes(root: str):
+    store = TickStore(root=root, flush_interval=60)
+    book = L2OrderBook("okx", "BTC/USDT")
+    book.add_listener(store.on_book_event)
+    book.apply_snapshot([(100, 1)], [(101, 1)], 1)
+    book.apply_update([(99, 5)], [], 2)  # 最优价未变化
+    book.apply_update([(100, 2)], [], 3)
+    book.invalidate()
+    book.apply_snapshot([(100, 2)], [(101, 1)], 4)  # 与上一条盘口相同
+    book.apply_update([], [(100.5, 1)], 5)
+    await store.close()
+    return store.query("quote", "okx", "BTC/USDT")
+
+
+def test_quotes_only_on_change():
+    """测试盘口只在最优买卖价或数量变化时记录"""
+    print("\n=== 测试盘口记录 ===")
+    with tempfile.TemporaryDirectory() as root:
+        quotes = asyncio.run(_check_quotes(root))
+        rows = [(float(q["bid_price"]), float(q["bid_size"]), float(q["ask_price"])) for q in quotes]
+    print(f"✅ 记录 {len(rows)} 条盘口: {rows}")
+    assert rows == [(100.0, 1.0, 101.0), (100.0, 2.0, 101.0), (100.0, 2.0, 100.5)]
+
+
+def main():
+    tests = [
+        test_day_files_and_order,
+        test_range_queries,
+        test_torn_record_repair,
+        test_quotes_only_on_change,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+    print("=" * 50)
+    print(f"测试完成: {len(tests) - failed}/{len(tests)} 通过")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
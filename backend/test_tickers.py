@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+批量行情缓存测试
+用本地服务器模拟币安和 OKX 的全市场行情接口并统计请求次数，验证一次查询多个交易对时每个交易所只有一次上游请求、
+TTL 内的后续查询不再请求、并发的冷启动查询合并为一次请求，以及未知交易对被忽略、未知交易所返回 400、
+上游失败时没有快照返回 503、已有快照时继续使用旧快照
+"""
+import asyncio
+import json
+import os
+import socket
+import sys
+
+sys.path.append(os.path.dirname(__file__))
+os.environ.setdefault("SCHEDULER_ENABLED", "false")
+
+import tickers
+from tickers import TickerCache
+
+BASES = [f"C{i:02d}" for i in range(50)]
+BINANCE_TICKERS = [{
+    "symbol": f"{base}USDT", "lastPrice": "1.5", "bidPrice": "1.4", "bidQty": "10", "askPrice": "1.6", "askQty": "12",
+    "openPrice": "1.0", "highPrice": "2.0", "lowPrice": "0.9", "priceChangePercent": "50.0", "volume": "1000",
+    "quoteVolume": "1500", "closeTime": 1700000000000,
+} for base in BASES]
+OKX_TICKERS = {"code": "0", "data": [{
+    "instId": f"{base}-USDT", "last": "3", "bidPx": "2.9", "bidSz": "5", "askPx": "3.1", "askSz": "6",
+    "open24h": "2", "high24h": "3.5", "low24h": "1.9", "vol24h": "100", "volCcy24h": "300", "ts": "1700000000000",
+} for base in BASES]}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class CannedExchange:
+    """返回固定全市场行情的币安和 OKX 接口：统计请求次数，可设置响应延迟和失败"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls = {"binance": 0, "okx": 0}
+        self.failing = False
+
+    async def __aenter__(self):
+        from aiohttp import web
+
+        app = web.Application()
+        app.router.add_get("/api/v3/ticker/24hr", self._handler("binance", BINANCE_TICKERS))
+        app.router.add_get("/api/v5/market/tickers", self._handler("okx", OKX_TICKERS))
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        port = _free_port()
+        await web.TCPSite(self.runner, "127.0.0.1", port).start()
+        self.saved = tickers.BINANCE_API_URL, tickers.OKX_API_URL, tickers.ticker_cache
+        tickers.BINANCE_API_URL = tickers.OKX_API_URL = f"http://127.0.0.1:{port}"
+        self.cache = tickers.ticker_cache = TickerCache(ttl=60)
+        return self
+
+    async def __aexit__(self, *exc):
+        tickers.BINANCE_API_URL, tickers.OKX_API_URL, tickers.ticker_cache = self.saved
+        await self.runner.cleanup()
+
+    def _handler(self, exchange, payload):
+        from aiohttp import web
+
+        async def handler(request):
+            self.calls[exchange] += 1
+            await asyncio.sleep(self.delay)
+            if self.failing:
+                return web.json_response({"msg": "unavailable"}, status=503)
+            return web.json_response(payload)
+        return handler
+
+
+async def _route(symbols=None, exchange="binance"):
+    """调用 /api/markets/tickers，返回 (状态码, 数据)"""
+    import main
+    from fastapi import HTTPException
+
+    try:
+        response = await main.get_tickers(symbols=symbols, exchange=exchange)
+    except HTTPException as e:
+        return e.status_code, e.detail
+    return response.status_code, json.loads(response.body)
+
+
+async def _check_one_fetch_per_exchange():
+    async with CannedExchange() as exchange:
+        many = ",".join(f"{base}/USDT" for base in BASES)
+        binance = await _route(many, "binance")
+        okx = await _route(",".join(f"{base}-USDT" for base in BASES[:20]), "OKX")
+        again = await _route("C01USDT,C02/USDT,C01-USDT", "binance")
+        everything = await _route(None, "okx")
+        return binance, okx, again, everything, dict(exchange.calls)
+
+
+def test_one_fetch_per_exchange():
+    """测试一次查询很多交易对时每个交易所只有一次上游请求，TTL 内不再请求"""
+    print("=== 测试每个交易所一次上游请求 ===")
+    binance, okx, again, everything, calls = asyncio.run(_check_one_fetch_per_exchange())
+    print(f"✅ 币安 {len(binance[1])} 个、OKX {len(okx[1])} 个交易对，再次查询 {[t['symbol'] for t in again[1]]}，"
+          f"上游请求 {calls}")
+    assert binance[0] == okx[0] == again[0] == everything[0] == 200
+    assert [t["symbol"] for t in binance[1]] == [f"{base}/USDT" for base in BASES]
+    assert len(okx[1]) == 20 and len(everything[1]) == len(BASES)
+    assert binance[1][0]["last"] == 1.5 and okx[1][0]["change_percent"] == 50.0
+    assert [t["symbol"] for t in again[1]] == ["C01/USDT", "C02/USDT"]
+    assert calls == {"binance": 1, "okx": 1}
+
+
+async def _check_coalesced_cold_reads():
+    async with CannedExchange(delay=0.1) as exchange:
+        results = await asyncio.gather(*[
+            exchange.cache.get_tickers("binance", [f"{BASES[i]}/USDT"]) for i in range(20)
+        ], *[exchange.cache.get_tickers("okx") for _ in range(5)])
+        return results, dict(exchange.calls)
+
+
+def test_coalesced_cold_reads():
+    """测试并发的冷启动查询合并为每个交易所一次上游请求"""
+    print("\n=== 测试并发冷启动查询合并 ===")
+    results, calls = asyncio.run(_check_coalesced_cold_reads())
+    print(f"✅ 25 个并发查询，上游请求 {calls}")
+    assert [r[0]["symbol"] for r in results[:20]] == [f"{base}/USDT" for base in BASES[:20]]
+    assert all(len(r) == len(BASES) for r in results[20:])
+    assert calls == {"binance": 1, "okx": 1}
+
+
+async def _check_unknown_and_failures():
+    async with CannedExchange() as exchange:
+        unknown_symbols = await _route("XYZ/USDT,C03/USDT,,NOPE", "binance")
+        unknown_exchange = await _route("BTC/USDT", "kraken")
+        exchange.failing = True
+        cold_failure = await _route("C01/USDT", "okx")
+        # 已有快照时上游失败继续使用旧快照
+        exchange.cache.fetched_at["binance"] = -1e9
+        stale = await _route("C03/USDT", "binance")
+        return unknown_symbols, unknown_exchange, cold_failure, stale, dict(exchange.calls)
+
+
+def test_unknown_symbols_and_exchanges():
+    """测试未知交易对被忽略、未知交易所返回 400、上游失败时的处理"""
+    print("\n=== 测试未知交易对、交易所和上游失败 ===")
+    unknown_symbols, unknown_exchange, cold_failure, stale, calls = asyncio.run(_check_unknown_and_failures())
+    print(f"✅ 未知交易对 {[t['symbol'] for t in unknown_symbols[1]]}，未知交易所 {unknown_exchange[0]}，"
+          f"冷启动失败 {cold_failure[0]}，旧快照 {[t['symbol'] for t in stale[1]]}，上游请求 {calls}")
+    assert unknown_symbols[0] == 200 and [t["symbol"] for t in unknown_symbols[1]] == ["C03/USDT"]
+    assert unknown_exchange[0] == 400
+    assert cold_failure[0] == 503
+    assert stale[0] == 200 and [t["symbol"] for t in stale[1]] == ["C03/USDT"]
+    assert calls == {"binance": 2, "okx": 1}
+
+
+def main():
+    tests = [
+        test_one_fetch_per_exchange,
+        test_coalesced_cold_reads,
+        test_unknown_symbols_and_exchanges,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+    print("=" * 50)
+    print(f"测试完成: {len(tests) - failed}/{len(tests)} 通过")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,270 @@
+"""
+逐笔行情存储
+公开成交和盘口最优价（top-of-book）按 交易所/交易对/UTC 日期 分文件，以定长二进制记录追加写入；
+读取时用内存映射得到 numpy 结构化数组视图（零拷贝、无需解析），按时间范围二分查找
+"""
+
+import asyncio
+import logging
+import os
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from metrics import registry
+from trade_stream import MarketTrade
+
+logger = logging.getLogger(__name__)
+
+TICK_STORE_DIR = os.getenv('TICK_STORE_DIR', './data/ticks')
+TICK_FLUSH_INTERVAL = float(os.getenv('TICK_FLUSH_INTERVAL', '1'))  # 缓冲写盘间隔（秒）
+TICK_MAX_BUFFER = int(os.getenv('TICK_MAX_BUFFER', '1000000'))  # 单个序列未写盘记录上限
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+# 定长记录格式，itemsize 补齐到 8 字节的整数倍
+TICK_DTYPES: Dict[str, np.dtype] = {
+    "trade": np.dtype({
+        "names": ["timestamp", "price", "amount", "side"],
+        "formats": ["<i8", "<f8", "<f8", "i1"],  # side: 1 主动买，-1 主动卖
+        "offsets": [0, 8, 16, 24],
+        "itemsize": 32,
+    }),
+    "quote": np.dtype({
+        "names": ["timestamp", "bid_price", "bid_size", "ask_price", "ask_size"],
+        "formats": ["<i8", "<f8", "<f8", "<f8", "<f8"],
+        "offsets": [0, 8, 16, 24, 32],
+        "itemsize": 40,
+    }),
+}
+
+ticks_written = registry.counter("tick_store_records_total", "写入逐笔存储的记录数")
+ticks_out_of_order = registry.counter("tick_store_out_of_order_total", "时间戳倒退而被丢弃的记录数")
+
+
+def _day_of(timestamp: int) -> str:
+    return datetime.fromtimestamp(timestamp // 1000, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+class TickSeries:
+    """单个 (类型, 交易所, 交易对) 的逐笔序列：内存缓冲 + 按日期分片的追加文件"""
+
+    def __init__(self, root: str, kind: str, exchange: str, symbol: str):
+        self.kind = kind
+        self.dtype = TICK_DTYPES[kind]
+        self.directory = os.path.join(root, kind, exchange, symbol.replace("/", "_"))
+        self.buffer: List[Tuple] = []
+        self.last_timestamp: Optional[int] = None
+        self._checked_files = set()
+
+    def append(self, record: Tuple):
+        """追加一条记录，记录的第一个字段为毫秒时间戳，必须单调不减"""
+        timestamp = record[0]
+        if self.last_timestamp is not None and timestamp < self.last_timestamp:
+            ticks_out_of_order.inc(kind=self.kind)
+            return
+        self.last_timestamp = timestamp
+        self.buffer.append(record)
+        if len(self.buffer) > TICK_MAX_BUFFER:
+            # 一次丢弃到上限的 90%，避免之后每条记录都触发整段移动
+            dropped = len(self.buffer) - TICK_MAX_BUFFER * 9 // 10
+            del self.buffer[:dropped]
+            logger.warning(f"逐笔缓冲过多，丢弃最旧的 {dropped} 条: {self.directory}")
+
+    def path(self, day: str) -> str:
+        return os.path.join(self.directory, f"{day}.bin")
+
+    def write(self, records: List[Tuple]) -> int:
+        """把记录按日期追加到对应文件（阻塞 IO，在线程中调用）"""
+        if not records:
+            return 0
+        os.makedirs(self.directory, exist_ok=True)
+        array = np.array(records, dtype=self.dtype)
+        days = array["timestamp"] // DAY_MS
+        # 记录按时间有序，只需找到日期切换的位置
+        bounds = np.flatnonzero(np.diff(days)) + 1
+        for chunk in np.split(array, bounds):
+            path = self.path(_day_of(int(chunk["timestamp"][0])))
+            self._repair(path)
+            with open(path, "ab") as f:
+                f.write(chunk.tobytes())
+        ticks_written.inc(len(array), kind=self.kind)
+        return len(array)
+
+    def _repair(self, path: str):
+        """首次写入文件前截掉进程崩溃时可能留下的半条记录"""
+        if path in self._checked_files:
+            return
+        self._checked_files.add(path)
+        if os.path.exists(path):
+            size = os.path.getsize(path)
+            remainder = size % self.dtype.itemsize
+            if remainder:
+                logger.warning(f"截断不完整的记录: {path}")
+                with open(path, "r+b") as f:
+                    f.truncate(size - remainder)
+
+    def days(self) -> List[str]:
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name[:-4] for name in os.listdir(self.directory) if name.endswith(".bin"))
+
+    def open_day(self, day: str) -> np.ndarray:
+        """内存映射某一天的文件，返回只读的结构化数组"""
+        path = self.path(day)
+        count = os.path.getsize(path) // self.dtype.itemsize if os.path.exists(path) else 0
+        if count == 0:
+            return np.empty(0, dtype=self.dtype)
+        return np.memmap(path, dtype=self.dtype, mode="r", shape=(count,))
+
+    def query(self, start: Optional[int] = None, end: Optional[int] = None,
+              limit: Optional[int] = None) -> np.ndarray:
+        """查询 [start, end] 内已写盘的记录，按时间升序
+
+        范围落在同一天时返回内存映射上的切片（零拷贝），跨天时拼接各天的切片；
+        指定 limit 时，有 start 取最早的 limit 条，否则取最新的 limit 条
+        """
+        days = self.days()
+        if start is not None:
+            days = [day for day in days if day >= _day_of(start)]
+        if end is not None:
+            days = [day for day in days if day <= _day_of(end)]
+
+        # 只取最新数据时从最后一天往前读，够数即停
+        if start is None and limit is not None:
+            days = days[::-1]
+
+        parts: List[np.ndarray] = []
+        total = 0
+        for day in days:
+            array = self.open_day(day)
+            # 结构化数组的字段视图不连续，np.searchsorted 会先整列拷贝，这里直接二分
+            timestamps = array["timestamp"]
+            lo = 0 if start is None else bisect_left(timestamps, start)
+            hi = len(array) if end is None else bisect_right(timestamps, end)
+            if lo < hi:
+                parts.append(array[lo:hi])
+                total += hi - lo
+            if limit is not None and total >= limit:
+                break
+
+        if start is None and limit is not None:
+            parts.reverse()
+        if not parts:
+            return np.empty(0, dtype=self.dtype)
+        result = parts[0] if len(parts) == 1 else np.concatenate(parts)
+        if limit is not None and len(result) > limit:
+            result = result[:limit] if start is not None else result[-limit:]
+        return result
+
+
+class TickStore:
+    """逐笔行情存储：接收成交与盘口变化，定期批量追加写盘"""
+
+    def __init__(self, root: str = TICK_STORE_DIR, flush_interval: float = TICK_FLUSH_INTERVAL):
+        self.root = root
+        self.flush_interval = flush_interval
+        self.series: Dict[Tuple[str, str, str], TickSeries] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._last_quotes: Dict[Tuple[str, str], Tuple] = {}
+
+    def get_series(self, kind: str, exchange: str, symbol: str) -> TickSeries:
+        if kind not in TICK_DTYPES:
+            raise ValueError(f"不支持的逐笔类型: {kind}")
+        key = (kind, exchange, symbol)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = TickSeries(self.root, kind, exchange, symbol)
+        return series
+
+    def on_trade(self, trade: MarketTrade):
+        """成交推送回调"""
+        self.get_series("trade", trade.exchange, trade.symbol).append(
+            (trade.timestamp, trade.price, trade.amount, 1 if trade.side == "buy" else -1)
+        )
+
+    def on_book_event(self, book, kind: str, bids, asks):
+        """订单簿回调：最优买卖价或数量变化时记录一条盘口"""
+        if kind == "invalidate":
+            return
+        best_bid, best_ask = book.bids.best(), book.asks.best()
+        if best_bid is None or best_ask is None:
+            return
+        quote = (best_bid[0], best_bid[1], best_ask[0], best_ask[1])
+        key = (book.exchange, book.symbol)
+        if self._last_quotes.get(key) == quote:
+            return
+        self._last_quotes[key] = quote
+        self.get_series("quote", book.exchange, book.symbol).append(
+            (int(book.timestamp * 1000),) + quote
+        )
+
+    def track(self, kind: str, exchange: str, symbol: str):
+        """开始记录交易对的成交或盘口"""
+        if kind == "trade":
+            from trade_stream import trade_stream_service
+            trade_stream_service.add_listener(self.on_trade)
+            trade_stream_service.subscribe(exchange, symbol)
+        elif kind == "quote":
+            from orderbook import order_book_service
+            order_book_service.add_book_listener(self.on_book_event)
+            order_book_service.subscribe(exchange, symbol)
+        else:
+            raise ValueError(f"不支持的逐笔类型: {kind}")
+        self.start()
+
+    def query(self, kind: str, exchange: str, symbol: str, start: Optional[int] = None,
+              end: Optional[int] = None, limit: Optional[int] = None) -> np.ndarray:
+        return self.get_series(kind, exchange, symbol).query(start, end, limit)
+
+    def start(self):
+        """启动定期写盘任务"""
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"逐笔写盘失败: {e}")
+
+    async def flush(self) -> int:
+        """把所有序列的缓冲追加写入文件"""
+        batches = []
+        for series in self.series.values():
+            if series.buffer:
+                batches.append((series, series.buffer))
+                series.buffer = []
+        if not batches:
+            return 0
+        written, failed = await asyncio.to_thread(self._write, batches)
+        for series, records in failed:
+            # 写入失败时放回缓冲，下次重试
+            series.buffer = records + series.buffer
+        return written
+
+    @staticmethod
+    def _write(batches):
+        written, failed = 0, []
+        for series, records in batches:
+            try:
+                written += series.write(records)
+            except Exception as e:
+                failed.append((series, records))
+                logger.error(f"写入 {series.directory} 失败: {e}")
+        return written, failed
+
+    async def close(self):
+        if self._flush_task:
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            self._flush_task = None
+        await self.flush()
+
+
+# 全局逐笔存储实例
+tick_store = TickStore()
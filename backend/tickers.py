@@ -0,0 +1,162 @@
+"""
+批量行情缓存
+每个交易所用一次请求拉取全部交易对的 24 小时行情（币安 /api/v3/ticker/24hr、OKX /api/v5/market/tickers），
+在 TICKER_CACHE_TTL 内共享给所有请求，并发刷新通过 single-flight 合并；
+全市场行情推送（book_ticker）已在运行时，用推送中更新的最优买卖价覆盖快照中的买卖价
+"""
+
+import logging
+import os
+import sys
+import time
+from typing import Dict, List, Optional
+
+import aiohttp
+
+from exchange_connector import BINANCE_API_URL, OKX_API_URL, ExchangeType, normalize_symbol
+from metrics import registry
+from singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+TICKER_CACHE_TTL = float(os.getenv('TICKER_CACHE_TTL', '3'))
+TICKER_REQUEST_TIMEOUT = float(os.getenv('TICKER_REQUEST_TIMEOUT', '10'))
+
+ticker_refreshes = registry.counter("ticker_refreshes_total", "全市场行情快照的拉取次数")
+ticker_requests = registry.counter("ticker_requests_total", "批量行情查询次数")
+
+
+def _float(value) -> Optional[float]:
+    return float(value) if value not in (None, "") else None
+
+
+async def fetch_binance_tickers(session: aiohttp.ClientSession) -> List[Dict]:
+    async with session.get(f"{BINANCE_API_URL}/api/v3/ticker/24hr") as response:
+        response.raise_for_status()
+        data = await response.json()
+
+    return [{
+        "exchange": ExchangeType.BINANCE.value,
+        "symbol": normalize_symbol(item["symbol"]),
+        "last": _float(item.get("lastPrice")),
+        "bid": _float(item.get("bidPrice")),
+        "bid_size": _float(item.get("bidQty")),
+        "ask": _float(item.get("askPrice")),
+        "ask_size": _float(item.get("askQty")),
+        "open": _float(item.get("openPrice")),
+        "high": _float(item.get("highPrice")),
+        "low": _float(item.get("lowPrice")),
+        "change_percent": _float(item.get("priceChangePercent")),
+        "volume": _float(item.get("volume")),
+        "quote_volume": _float(item.get("quoteVolume")),
+        "timestamp": item.get("closeTime"),
+    } for item in data]
+
+
+async def fetch_okx_tickers(session: aiohttp.ClientSession) -> List[Dict]:
+    async with session.get(f"{OKX_API_URL}/api/v5/market/tickers", params={"instType": "SPOT"}) as response:
+        response.raise_for_status()
+        data = await response.json()
+
+    tickers = []
+    for item in data["data"]:
+        last, open_ = _float(item.get("last")), _float(item.get("open24h"))
+        tickers.append({
+            "exchange": ExchangeType.OKX.value,
+            "symbol": normalize_symbol(item["instId"]),
+            "last": last,
+            "bid": _float(item.get("bidPx")),
+            "bid_size": _float(item.get("bidSz")),
+            "ask": _float(item.get("askPx")),
+            "ask_size": _float(item.get("askSz")),
+            "open": open_,
+            "high": _float(item.get("high24h")),
+            "low": _float(item.get("low24h")),
+            "change_percent": (last / open_ - 1) * 100 if last is not None and open_ else None,
+            "volume": _float(item.get("vol24h")),
+            "quote_volume": _float(item.get("volCcy24h")),
+            "timestamp": int(item["ts"]) if item.get("ts") else None,
+        })
+    return tickers
+
+
+TICKER_FETCHERS = {
+    ExchangeType.BINANCE.value: fetch_binance_tickers,
+    ExchangeType.OKX.value: fetch_okx_tickers,
+}
+
+
+class TickerCache:
+    """按交易所缓存全市场行情快照"""
+
+    def __init__(self, ttl: float = TICKER_CACHE_TTL):
+        self.ttl = ttl
+        self.snapshots: Dict[str, Dict[str, Dict]] = {}  # 交易所 -> {交易对: 行情}
+        self.fetched_at: Dict[str, float] = {}
+        self._flight = SingleFlight("ticker_refresh")
+
+    def is_fresh(self, exchange: str) -> bool:
+        fetched_at = self.fetched_at.get(exchange)
+        return fetched_at is not None and time.monotonic() - fetched_at < self.ttl
+
+    async def refresh(self, exchange: str):
+        """拉取交易所的全市场行情；并发刷新同一交易所时只发一次请求"""
+        if exchange not in TICKER_FETCHERS:
+            raise ValueError(f"不支持的交易所类型: {exchange}")
+        await self._flight.do(exchange, lambda: self._refresh(exchange))
+
+    async def _refresh(self, exchange: str):
+        timeout = aiohttp.ClientTimeout(total=TICKER_REQUEST_TIMEOUT)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            tickers = await TICKER_FETCHERS[exchange](session)
+        self.snapshots[exchange] = {ticker["symbol"]: ticker for ticker in tickers}
+        self.fetched_at[exchange] = time.monotonic()
+        ticker_refreshes.inc(exchange=exchange)
+
+    async def ensure_fresh(self, exchange: str):
+        """快照缺失或过期时刷新；已有旧快照时刷新失败只记录日志，继续使用旧快照"""
+        if self.is_fresh(exchange):
+            return
+        try:
+            await self.refresh(exchange)
+        except Exception as e:
+            if exchange not in self.snapshots:
+                raise
+            logger.warning(f"{exchange} 行情快照刷新失败，继续使用缓存: {e}")
+
+    async def get_tickers(self, exchange: str, symbols: Optional[List[str]] = None) -> List[Dict]:
+        """返回交易所的行情，symbols 为空时返回全部交易对；未知交易对直接忽略"""
+        exchange = exchange.lower()
+        await self.ensure_fresh(exchange)
+        ticker_requests.inc(exchange=exchange)
+        snapshot = self.snapshots[exchange]
+        if symbols is None:
+            tickers = list(snapshot.values())
+        else:
+            tickers = [snapshot[s] for s in dict.fromkeys(normalize_symbol(s) for s in symbols) if s in snapshot]
+        return self._overlay_live(exchange, tickers)
+
+    def last_price(self, exchange: str, symbol: str) -> Optional[float]:
+        """快照中的最新成交价，只查内存（可能已过期），没有快照或未知交易对时返回 None"""
+        ticker = self.snapshots.get(exchange.lower(), {}).get(normalize_symbol(symbol))
+        return ticker["last"] if ticker is not None else None
+
+    @staticmethod
+    def _overlay_live(exchange: str, tickers: List[Dict]) -> List[Dict]:
+        """用全市场推送中更新的最优买卖价覆盖快照（只在推送服务已加载时）"""
+        module = sys.modules.get("book_ticker")
+        live = module.book_ticker_service.tickers if module is not None else None
+        if not live:
+            return tickers
+        result = []
+        for ticker in tickers:
+            book = live.get((exchange, ticker["symbol"]))
+            if book is not None and book.timestamp > (ticker["timestamp"] or 0):
+                ticker = {**ticker, "bid": book.bid, "bid_size": book.bid_size, "ask": book.ask,
+                          "ask_size": book.ask_size, "timestamp": book.timestamp}
+            result.append(ticker)
+        return result
+
+
+# 全局行情缓存实例
+ticker_cache = TickerCache()
@@ -0,0 +1,177 @@
+"""
+逐笔成交行情推送
+订阅交易所的公开成交流（币安 trade、OKX trades），把每笔成交分发给注册的监听者，
+K 线引擎、逐笔存储等模块通过监听者接入
+"""
+
+import asyncio
+import json
+import logging
+import os
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Tuple
+
+import aiohttp
+
+from exchange_connector import BINANCE_WS_URL, OKX_WS_URL, ExchangeType, normalize_symbol, to_exchange_symbol
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+MAX_TRADE_SUBSCRIPTIONS = int(os.getenv('MAX_TRADE_SUBSCRIPTIONS', '200'))
+TRADE_STREAM_RECONNECT_DELAY = float(os.getenv('TRADE_STREAM_RECONNECT_DELAY', '1'))
+
+trade_stream_messages = registry.counter(
+    "trade_stream_trades_total", "收到的公开成交笔数"
+)
+
+
+@dataclass
+class MarketTrade:
+    """一笔公开成交"""
+    exchange: str
+    symbol: str
+    timestamp: int  # 成交时间（毫秒）
+    price: float
+    amount: float
+    side: str  # 主动方向：buy, sell
+
+
+class TradeFeed:
+    """成交推送基类：负责断线重连"""
+
+    def __init__(self, exchange: str, symbol: str, on_trade: Callable[[MarketTrade], None]):
+        self.exchange = exchange
+        self.symbol = symbol
+        self.exchange_symbol = to_exchange_symbol(exchange, symbol)
+        self.on_trade = on_trade
+
+    async def run(self):
+        while True:
+            try:
+                async with aiohttp.ClientSession() as session:
+                    await self._stream(session)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"{self.exchange} {self.symbol} 成交推送中断: {e}")
+            await asyncio.sleep(TRADE_STREAM_RECONNECT_DELAY)
+
+    async def _stream(self, session: aiohttp.ClientSession):
+        raise NotImplementedError
+
+
+class BinanceTradeFeed(TradeFeed):
+    """币安逐笔成交推送"""
+
+    async def _stream(self, session: aiohttp.ClientSession):
+        url = f"{BINANCE_WS_URL}/{self.exchange_symbol.lower()}@trade"
+        async with session.ws_connect(url, heartbeat=30) as ws:
+            async for message in ws:
+                if message.type != aiohttp.WSMsgType.TEXT:
+                    break
+                event = json.loads(message.data)
+                self.on_trade(MarketTrade(
+                    exchange=self.exchange,
+                    symbol=self.symbol,
+                    timestamp=event["T"],
+                    price=float(event["p"]),
+                    amount=float(event["q"]),
+                    # m 为 true 表示买方是挂单方，即主动卖出
+                    side="sell" if event["m"] else "buy",
+                ))
+
+
+class OKXTradeFeed(TradeFeed):
+    """OKX 成交推送"""
+
+    async def _stream(self, session: aiohttp.ClientSession):
+        async with session.ws_connect(OKX_WS_URL) as ws:
+            await ws.send_json({
+                "op": "subscribe",
+                "args": [{"channel": "trades", "instId": self.exchange_symbol}]
+            })
+            keepalive = asyncio.create_task(self._keepalive(ws))
+            try:
+                async for message in ws:
+                    if message.type != aiohttp.WSMsgType.TEXT:
+                        break
+                    if message.data == "pong":
+                        continue
+                    payload = json.loads(message.data)
+                    if payload.get("event") == "error":
+                        raise RuntimeError(payload.get("msg"))
+                    for trade in payload.get("data", []):
+                        self.on_trade(MarketTrade(
+                            exchange=self.exchange,
+                            symbol=self.symbol,
+                            timestamp=int(trade["ts"]),
+                            price=float(trade["px"]),
+                            amount=float(trade["sz"]),
+                            side=trade["side"],
+                        ))
+            finally:
+                keepalive.cancel()
+
+    @staticmethod
+    async def _keepalive(ws):
+        while True:
+            await asyncio.sleep(20)
+            await ws.send_str("ping")
+
+
+TRADE_FEEDS = {
+    ExchangeType.BINANCE.value: BinanceTradeFeed,
+    ExchangeType.OKX.value: OKXTradeFeed,
+}
+
+
+class TradeStreamService:
+    """成交推送服务：按需订阅，并把成交分发给所有监听者"""
+
+    def __init__(self, max_subscriptions: int = MAX_TRADE_SUBSCRIPTIONS):
+        self.max_subscriptions = max_subscriptions
+        self.listeners: List[Callable[[MarketTrade], None]] = []
+        self._tasks: Dict[Tuple[str, str], asyncio.Task] = {}
+
+    def add_listener(self, listener: Callable[[MarketTrade], None]):
+        if listener not in self.listeners:
+            self.listeners.append(listener)
+
+    def is_subscribed(self, exchange: str, symbol: str) -> bool:
+        return (exchange.lower(), normalize_symbol(symbol)) in self._tasks
+
+    def subscribe(self, exchange: str, symbol: str):
+        """订阅成交推送，已订阅时忽略"""
+        exchange, symbol = exchange.lower(), normalize_symbol(symbol)
+        key = (exchange, symbol)
+        if key in self._tasks:
+            return
+        if exchange not in TRADE_FEEDS:
+            raise ValueError(f"不支持的交易所类型: {exchange}")
+        if len(self._tasks) >= self.max_subscriptions:
+            raise ValueError(f"成交推送订阅数量已达上限 {self.max_subscriptions}")
+
+        feed = TRADE_FEEDS[exchange](exchange, symbol, self.dispatch)
+        self._tasks[key] = asyncio.create_task(feed.run())
+        logger.info(f"订阅成交推送 {exchange} {symbol}")
+
+    def dispatch(self, trade: MarketTrade):
+        """把一笔成交分发给所有监听者"""
+        trade_stream_messages.inc(exchange=trade.exchange)
+        for listener in self.listeners:
+            try:
+                listener(trade)
+            except Exception as e:
+                logger.error(f"成交回调执行失败: {e}")
+
+    async def close(self):
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+
+
+# 全局成交推送服务实例
+trade_stream_service = TradeStreamService()
@@ -0,0 +1,277 @@
+"""
+三角套利检测
+每个交易所维护一张币种图：交易对 BASE/QUOTE 对应两条有向边
+（BASE→QUOTE 以买一价卖出，QUOTE→BASE 以卖一价买入，均扣除吃单手续费），边权为 -log(汇率)。
+三条边构成的环权重之和小于 0 即有利可图。新增交易对时枚举它参与的三角环并建立 边→环 索引，
+行情变化时只重新检查涉及变化边的环
+"""
+
+import logging
+import math
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from arbitrage_scanner import load_taker_fees
+from book_ticker import BookTicker
+from metrics import registry
+from pubsub import broadcaster
+
+logger = logging.getLogger(__name__)
+
+TRIANGULAR_MIN_PROFITABILITY = float(os.getenv('TRIANGULAR_MIN_PROFITABILITY', '0.05'))  # %
+TRIANGULAR_TOPIC = "triangular"
+
+# 一批变化的边数超过该值时，改为用掩码一次性筛选所有环
+INDEX_LOOKUP_MAX_EDGES = 8
+
+triangular_checks = registry.counter("triangular_cycle_checks_total", "重新检查的三角环数量")
+triangular_opportunities = registry.gauge("triangular_opportunities", "当前有利可图的三角环数量")
+
+
+class CurrencyGraph:
+    """单个交易所的币种图"""
+
+    def __init__(self, exchange: str, fee: float, min_profitability: float = TRIANGULAR_MIN_PROFITABILITY):
+        self.exchange = exchange
+        self.fee = fee
+        # 环权重之和需要小于该值：-log(1 + 最小收益率)
+        self.max_cycle_weight = -math.log1p(min_profitability / 100)
+
+        self.currencies: Dict[str, int] = {}
+        self.currency_names: List[str] = []
+        self.adjacency: List[Dict[int, int]] = []  # 币种 -> {目标币种: 边 ID}
+        self.pairs: Dict[str, Tuple[int, int]] = {}  # 交易对 -> (卖出边, 买入边)
+
+        # 边属性：权重 -log(汇率)、汇率、以起点币种计的可成交数量上限
+        self.edge_count = 0
+        self.weights = np.empty(0)
+        self.rates = np.empty(0)
+        self.limits = np.empty(0)
+        self.edge_info: List[Tuple[str, str, int, int]] = []  # (交易对, buy/sell, 起点, 终点)
+        self.edge_prices = np.empty(0)
+        self._grow_edges(256)
+
+        self.cycle_count = 0
+        self.cycles = np.empty((0, 3), dtype=np.int64)
+        self.profitable = np.empty(0, dtype=bool)  # 环当前是否有利可图
+        self.cycle_weights = np.empty(0)
+        self.edge_cycles: List[List[int]] = []
+        self._grow_cycles(1024)
+
+
+    def _grow_edges(self, capacity: int):
+        extra = capacity - len(self.weights)
+        self.weights = np.concatenate([self.weights, np.full(extra, np.inf)])
+        self.rates = np.concatenate([self.rates, np.zeros(extra)])
+        self.limits = np.concatenate([self.limits, np.zeros(extra)])
+        self.edge_prices = np.concatenate([self.edge_prices, np.zeros(extra)])
+
+    def _grow_cycles(self, capacity: int):
+        extra = capacity - len(self.cycles)
+        self.cycles = np.concatenate([self.cycles, np.zeros((extra, 3), dtype=np.int64)])
+        self.profitable = np.concatenate([self.profitable, np.zeros(extra, dtype=bool)])
+        self.cycle_weights = np.concatenate([self.cycle_weights, np.zeros(extra)])
+
+    def _currency(self, name: str) -> int:
+        index = self.currencies.get(name)
+        if index is None:
+            index = self.currencies[name] = len(self.currency_names)
+            self.currency_names.append(name)
+            self.adjacency.append({})
+        return index
+
+    def _add_edge(self, symbol: str, side: str, source: int, target: int) -> int:
+        edge = self.edge_count
+        if edge >= len(self.weights):
+            self._grow_edges(len(self.weights) * 2)
+        self.edge_count += 1
+        self.edge_info.append((symbol, side, source, target))
+        self.edge_cycles.append([])
+        self.adjacency[source][target] = edge
+        return edge
+
+    def _add_cycle(self, edges: Tuple[int, int, int]):
+        cycle = self.cycle_count
+        if cycle >= len(self.cycles):
+            self._grow_cycles(len(self.cycles) * 2)
+        self.cycles[cycle] = edges
+        self.cycle_count += 1
+        for edge in edges:
+            self.edge_cycles[edge].append(cycle)
+
+    def add_pair(self, symbol: str) -> Tuple[int, int]:
+        """加入交易对，枚举新形成的三角环"""
+        pair = self.pairs.get(symbol)
+        if pair is not None:
+            return pair
+        base_name, _, quote_name = symbol.partition("/")
+        base, quote = self._currency(base_name), self._currency(quote_name)
+        if quote in self.adjacency[base]:
+            # 同一对币种已有交易对（如 A/B 与 B/A 同时存在），只保留先出现的
+            pair = self.pairs[symbol] = (self.adjacency[base][quote], self.adjacency[quote][base])
+            return pair
+
+        sell = self._add_edge(symbol, "sell", base, quote)
+        buy = self._add_edge(symbol, "buy", quote, base)
+        self.pairs[symbol] = (sell, buy)
+
+        # 新边 u→v 与已有的 v→w、w→u 组成环；另一方向的新边给出反向的环
+        for edge, u, v in ((sell, base, quote), (buy, quote, base)):
+            for w, edge_vw in self.adjacency[v].items():
+                if w == u:
+                    continue
+                edge_wu = self.adjacency[w].get(u)
+                if edge_wu is not None:
+                    self._add_cycle((edge, edge_vw, edge_wu))
+        return sell, buy
+
+    def update(self, symbol: str, bid: float, bid_size: float, ask: float, ask_size: float) -> Tuple[int, int]:
+        """更新交易对的最优买卖价，返回变化的两条边"""
+        sell, buy = self.add_pair(symbol)
+        if self.edge_info[sell][0] != symbol:
+            return ()
+        keep = 1.0 - self.fee
+        if bid > 0 and bid_size > 0:
+            self.rates[sell] = bid * keep
+            self.weights[sell] = -math.log(bid * keep)
+            self.limits[sell] = bid_size  # 最多卖出 bid_size 个 BASE
+        else:
+            self.weights[sell] = np.inf
+        if ask > 0 and ask_size > 0:
+            self.rates[buy] = keep / ask
+            self.weights[buy] = -math.log(keep / ask)
+            self.limits[buy] = ask * ask_size  # 最多花费 ask*ask_size 个 QUOTE
+        else:
+            self.weights[buy] = np.inf
+        self.edge_prices[sell] = bid
+        self.edge_prices[buy] = ask
+        return sell, buy
+
+    def check(self, edges: List[int]) -> bool:
+        """重新检查涉及给定边的环，返回机会集合是否发生变化"""
+        if not edges or not self.cycle_count:
+            return False
+        cycles = self.cycles[:self.cycle_count]
+        if len(edges) <= INDEX_LOOKUP_MAX_EDGES:
+            ids = [cycle for edge in edges for cycle in self.edge_cycles[edge]]
+            if not ids:
+                return False
+            ids = np.unique(np.array(ids, dtype=np.int64))
+        else:
+            dirty = np.zeros(self.edge_count, dtype=bool)
+            dirty[edges] = True
+            ids = np.flatnonzero(dirty[cycles].any(axis=1))
+        triangular_checks.inc(len(ids), exchange=self.exchange)
+
+        sums = self.weights[cycles[ids]].sum(axis=1)
+        profitable = sums < self.max_cycle_weight
+
+        changed = bool((self.profitable[ids] != profitable).any())
+        self.profitable[ids] = profitable
+        self.cycle_weights[ids] = sums
+        return changed
+
+    @property
+    def opportunity_count(self) -> int:
+        return int(self.profitable[:self.cycle_count].sum())
+
+    def describe_opportunities(self) -> List[Dict]:
+        cycles = np.flatnonzero(self.profitable[:self.cycle_count])
+        return [self._describe(int(cycle), float(self.cycle_weights[cycle])) for cycle in cycles]
+
+    def _describe(self, cycle: int, weight: float) -> Dict:
+        """描述一个有利可图的环，可成交数量取三条腿盘口数量约束的最小值（以起始币种计）"""
+        edges = [int(edge) for edge in self.cycles[cycle]]
+        rate_before = 1.0
+        size = math.inf
+        legs = []
+        for edge in edges:
+            symbol, side, source, target = self.edge_info[edge]
+            size = min(size, float(self.limits[edge]) / rate_before)
+            rate_before *= float(self.rates[edge])
+            legs.append({"symbol": symbol, "side": side, "price": float(self.edge_prices[edge])})
+        start = self.edge_info[edges[0]][2]
+        path = [self.currency_names[self.edge_info[edge][2]] for edge in edges] + [self.currency_names[start]]
+        profitability = math.expm1(-weight)
+        return {
+            "exchange": self.exchange,
+            "path": path,
+            "legs": legs,
+            "profitability": profitability * 100,
+            "size": size,
+            "size_currency": self.currency_names[start],
+            "expected_profit": size * profitability,
+        }
+
+
+class TriangularArbitrageDetector:
+    """按交易所维护币种图，随行情增量检测三角套利"""
+
+    def __init__(self, min_profitability: float = TRIANGULAR_MIN_PROFITABILITY):
+        self.min_profitability = min_profitability
+        self.fees = load_taker_fees()
+        self.graphs: Dict[str, CurrencyGraph] = {}
+        self.updated_at: Optional[float] = None
+
+    def graph(self, exchange: str) -> CurrencyGraph:
+        graph = self.graphs.get(exchange)
+        if graph is None:
+            graph = self.graphs[exchange] = CurrencyGraph(
+                exchange, self.fees.get(exchange, 0.001), self.min_profitability
+            )
+        return graph
+
+    def on_tickers(self, batch: List[BookTicker]):
+        """一批行情：先更新所有边，再一次性检查受影响的环"""
+        changed_edges: Dict[str, List[int]] = {}
+        for ticker in batch:
+            if "/" not in ticker.symbol:
+                continue
+            graph = self.graph(ticker.exchange)
+            changed_edges.setdefault(ticker.exchange, []).extend(
+                graph.update(ticker.symbol, ticker.bid, ticker.bid_size, ticker.ask, ticker.ask_size)
+            )
+        changed = [exchange for exchange, edges in changed_edges.items() if self.graphs[exchange].check(edges)]
+        self.updated_at = time.time()
+        triangular_opportunities.set(sum(g.opportunity_count for g in self.graphs.values()))
+        if changed:
+            self._publish(changed)
+
+    def get_opportunities(self, exchange: Optional[str] = None, min_profitability: Optional[float] = None) -> List[Dict]:
+        """当前有利可图的三角环，按收益率降序"""
+        graphs = [self.graphs[exchange]] if exchange in self.graphs else ([] if exchange else self.graphs.values())
+        result = [o for graph in graphs for o in graph.describe_opportunities()]
+        if min_profitability is not None:
+            result = [o for o in result if o["profitability"] >= min_profitability]
+        return sorted(result, key=lambda o: o["profitability"], reverse=True)
+
+    def _publish(self, exchanges: List[str]):
+        """机会变化时推送：TRIANGULAR_TOPIC 推送所有交易所，TRIANGULAR_TOPIC:交易所 只推送该交易所"""
+        for exchange in exchanges:
+            topic = f"{TRIANGULAR_TOPIC}:{exchange}"
+            if broadcaster.has_subscribers(topic):
+                broadcaster.publish(topic, {
+                    "type": TRIANGULAR_TOPIC,
+                    "timestamp": self.updated_at,
+                    "data": self.get_opportunities(exchange),
+                })
+        if broadcaster.has_subscribers(TRIANGULAR_TOPIC):
+            broadcaster.publish(TRIANGULAR_TOPIC, {
+                "type": TRIANGULAR_TOPIC,
+                "timestamp": self.updated_at,
+                "data": self.get_opportunities(),
+            })
+
+    def track(self, exchange: str):
+        """订阅交易所的全市场行情"""
+        from book_ticker import book_ticker_service
+
+        book_ticker_service.add_listener(self.on_tickers)
+        book_ticker_service.subscribe(exchange)
+
+
+# 全局三角套利检测器实例
+triangular_detector = TriangularArbitrageDetector()
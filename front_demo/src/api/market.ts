@@ -34,4 +34,15 @@ export const getOrderBook = async (symbol: string) => {
     console.error('获取订单簿失败:', error);
     throw error; // 抛出错误而不是返回 mock 数据
   }
-}; 
\ No newline at end of file
+}; 
+export const getTickers = async (symbols: string[], exchange: string = 'binance') => {
+  try {
+    const response = await axios.get(`${API_BASE_URL}/markets/tickers`, {
+      params: { symbols: symbols.join(','), exchange }
+    });
+    return response.data;
+  } catch (error) {
+    console.error('获取行情失败:', error);
+    throw error;
+  }
+};
@@ -0,0 +1,542 @@
+#!/usr/bin/env python3
+"""
+端到端压测与延迟基准脚本
+在独立进程中启动模拟交易所、模拟 Hummingbot（模拟模式）和后端，按配置的接口比例施加负载，
+统计每个接口的吞吐量和 p50/p95/p99 延迟；结果可保存为 JSON 基准，之后的运行与基准对比发现性能回归。
+全部依赖本地进程，不访问任何外部服务
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import deque
+
+import aiohttp
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+BACKEND_DIR = os.path.join(ROOT_DIR, "backend")
+
+# 默认接口比例：以前端轮询的读接口为主，夹杂策略启停、成交推送和批量创建
+DEFAULT_MIX = ("health=5,strategies=15,schema=10,tickers=15,symbols=5,hb_status=10,"
+               "job_status=10,start=5,stop=5,events=10,trades=5,overview=5")
+STRATEGY_PARAMS = {
+    "exchange": "binance",
+    "market": "BTC-USDT",
+    "bid_spread": 0.1,
+    "ask_spread": 0.1,
+    "order_amount": 0.01,
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# ---------------------------------------------------------------------------
+# 模拟交易所：提供后端行情、交易对元数据和资金费率用到的 Binance / OKX REST 接口
+# ---------------------------------------------------------------------------
+
+def _mock_markets(count: int):
+    bases = ["BTC", "ETH", "SOL", "BNB", "XRP", "DOGE", "ADA", "AVAX"]
+    bases += [f"C{i}" for i in range(max(0, count - len(bases)))]
+    prices = {"BTC": 60000.0, "ETH": 3000.0, "SOL": 150.0, "BNB": 500.0}
+    return [(base, prices.get(base, 1.0 + i)) for i, base in enumerate(bases[:count])]
+
+
+def create_mock_exchange_app(symbols: int, latency: float):
+    from aiohttp import web
+
+    markets = _mock_markets(symbols)
+    now_ms = lambda: int(time.time() * 1000)  # noqa: E731
+
+    @web.middleware
+    async def delay(request, handler):
+        if latency > 0:
+            await asyncio.sleep(latency)
+        return await handler(request)
+
+    def jitter(price: float) -> float:
+        return round(price * (1 + random.uniform(-0.001, 0.001)), 8)
+
+    async def binance_tickers(request):
+        return web.json_response([{
+            "symbol": f"{base}USDT", "lastPrice": str(jitter(price)), "bidPrice": str(price * 0.9999),
+            "bidQty": "1.5", "askPrice": str(price * 1.0001), "askQty": "1.2", "openPrice": str(price),
+            "highPrice": str(price * 1.02), "lowPrice": str(price * 0.98), "priceChangePercent": "0.5",
+            "volume": "1000", "quoteVolume": str(price * 1000), "closeTime": now_ms(),
+        } for base, price in markets])
+
+    async def binance_exchange_info(request):
+        return web.json_response({"symbols": [{
+            "symbol": f"{base}USDT", "baseAsset": base, "quoteAsset": "USDT", "status": "TRADING",
+            "filters": [
+                {"filterType": "PRICE_FILTER", "tickSize": "0.01"},
+                {"filterType": "LOT_SIZE", "stepSize": "0.00001", "minQty": "0.00001", "maxQty": "9000"},
+                {"filterType": "NOTIONAL", "minNotional": "5"},
+            ],
+        } for base, _ in markets]})
+
+    async def binance_depth(request):
+        price = dict(markets).get(request.query.get("symbol", "BTCUSDT")[:-4], 1.0)
+        limit = int(request.query.get("limit", 100))
+        return web.json_response({
+            "lastUpdateId": now_ms(),
+            "bids": [[str(price * (1 - 0.0001 * (i + 1))), "1.0"] for i in range(limit)],
+            "asks": [[str(price * (1 + 0.0001 * (i + 1))), "1.0"] for i in range(limit)],
+        })
+
+    async def binance_premium_index(request):
+        return web.json_response([{
+            "symbol": f"{base}USDT", "lastFundingRate": "0.0001", "nextFundingTime": now_ms() + 3600_000,
+            "markPrice": str(price), "indexPrice": str(price),
+        } for base, price in markets])
+
+    async def okx_tickers(request):
+        return web.json_response({"code": "0", "data": [{
+            "instId": f"{base}-USDT", "last": str(jitter(price)), "bidPx": str(price * 0.9999), "bidSz": "1.5",
+            "askPx": str(price * 1.0001), "askSz": "1.2", "open24h": str(price), "high24h": str(price * 1.02),
+            "low24h": str(price * 0.98), "vol24h": "1000", "volCcy24h": str(price * 1000), "ts": str(now_ms()),
+        } for base, price in markets]})
+
+    async def okx_instruments(request):
+        return web.json_response({"code": "0", "data": [{
+            "instId": f"{base}-USDT", "baseCcy": base, "quoteCcy": "USDT", "tickSz": "0.01", "lotSz": "0.00001",
+            "minSz": "0.00001", "maxLmtSz": "9000", "state": "live",
+        } for base, _ in markets]})
+
+    async def okx_mark_price(request):
+        return web.json_response({"code": "0", "data": [
+            {"instId": f"{base}-USDT-SWAP", "markPx": str(price)} for base, price in markets]})
+
+    async def okx_index_tickers(request):
+        return web.json_response({"code": "0", "data": [
+            {"instId": f"{base}-USDT", "idxPx": str(price)} for base, price in markets]})
+
+    async def okx_funding_rate(request):
+        return web.json_response({"code": "0", "data": [{
+            "instId": request.query.get("instId"), "fundingRate": "0.0001", "nextFundingRate": "0.0001",
+            "fundingTime": str(now_ms() + 3600_000),
+        }]})
+
+    app = web.Application(middlewares=[delay])
+    app.router.add_get("/api/v3/ticker/24hr", binance_tickers)
+    app.router.add_get("/api/v3/exchangeInfo", binance_exchange_info)
+    app.router.add_get("/api/v3/depth", binance_depth)
+    app.router.add_get("/fapi/v1/premiumIndex", binance_premium_index)
+    app.router.add_get("/api/v5/market/tickers", okx_tickers)
+    app.router.add_get("/api/v5/public/instruments", okx_instruments)
+    app.router.add_get("/api/v5/public/mark-price", okx_mark_price)
+    app.router.add_get("/api/v5/market/index-tickers", okx_index_tickers)
+    app.router.add_get("/api/v5/public/funding-rate", okx_funding_rate)
+    return app
+
+
+def serve_mock_exchange(port: int, symbols: int, latency: float):
+    from aiohttp import web
+
+    web.run_app(create_mock_exchange_app(symbols, latency), host="127.0.0.1", port=port, print=None)
+
+
+# ---------------------------------------------------------------------------
+# 进程管理
+# ---------------------------------------------------------------------------
+
+class Services:
+    """启动模拟交易所、模拟 Hummingbot 和后端进程，日志写入临时目录"""
+
+    def __init__(self, args):
+        self.args = args
+        self.workdir = tempfile.mkdtemp(prefix="load_test_")
+        self.processes = []
+        self.exchange_url = f"http://127.0.0.1:{_free_port()}"
+        self.hummingbot_url = f"http://127.0.0.1:{_free_port()}"
+        self.backend_url = args.backend_url or f"http://127.0.0.1:{_free_port()}"
+
+    def _spawn(self, name: str, command, env=None, cwd=None):
+        log = open(os.path.join(self.workdir, f"{name}.log"), "w")
+        process = subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT, env=env, cwd=cwd or self.workdir)
+        self.processes.append((name, process, log))
+
+    async def start(self):
+        args = self.args
+        if args.backend_url:
+            await self._wait_ready("backend", f"{self.backend_url}/health")
+            return
+
+        self._spawn("exchange", [sys.executable, os.path.abspath(__file__), "--serve-mock-exchange",
+                                 "--port", self.exchange_url.rsplit(":", 1)[1], "--symbols", str(args.symbols),
+                                 "--exchange-latency", str(args.exchange_latency)])
+        mock_command = [
+            sys.executable, os.path.join(BACKEND_DIR, "mock_hummingbot_api_server.py"),
+            "--host", "127.0.0.1", "--port", self.hummingbot_url.rsplit(":", 1)[1],
+            "--latency", str(args.mock_latency), "--latency-dist", args.mock_latency_dist,
+            "--latency-jitter", str(args.mock_latency_jitter), "--error-rate", str(args.mock_error_rate),
+            "--fill-rate", str(args.mock_fill_rate), "--pnl-interval", str(args.mock_pnl_interval),
+            "--log-rate", str(args.mock_log_rate), "--seed", str(args.seed),
+        ]
+        if args.mock_webhook:
+            mock_command += ["--webhook-url", f"{self.backend_url}/api/hummingbot/events"]
+        self._spawn("hummingbot", mock_command)
+
+        env = dict(
+            os.environ,
+            PYTHONPATH=BACKEND_DIR,
+            HUMMINGBOT_API_URLS=self.hummingbot_url,
+            BINANCE_API_URL=self.exchange_url,
+            BINANCE_FUTURES_API_URL=self.exchange_url,
+            OKX_API_URL=self.exchange_url,
+            RATE_LIMIT_ENABLED="true" if args.rate_limit else "false",
+            SCHEDULER_ENABLED="true" if args.scheduler else "false",
+        )
+        env.pop("REDIS_URL", None)
+        self._spawn("backend", [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+                                "--port", self.backend_url.rsplit(":", 1)[1], "--log-level", "warning",
+                                "--workers", str(args.workers)], env=env)
+
+        await self._wait_ready("exchange", f"{self.exchange_url}/api/v3/exchangeInfo")
+        await self._wait_ready("hummingbot", f"{self.hummingbot_url}/health")
+        await self._wait_ready("backend", f"{self.backend_url}/health")
+
+    async def _wait_ready(self, name: str, url: str, timeout: float = 30):
+        deadline = time.monotonic() + timeout
+        async with aiohttp.ClientSession() as session:
+            while time.monotonic() < deadline:
+                for proc_name, process, _ in self.processes:
+                    if process.poll() is not None:
+                        raise RuntimeError(f"{proc_name} 进程已退出，日志见 {self.workdir}/{proc_name}.log")
+                try:
+                    async with session.get(url, timeout=aiohttp.ClientTimeout(total=2)) as response:
+                        if response.status < 500:
+                            return
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    pass
+                await asyncio.sleep(0.2)
+        raise RuntimeError(f"{name} 未在 {timeout}s 内就绪（{url}），日志见 {self.workdir}")
+
+    def stop(self):
+        for _, process, _ in self.processes:
+            if process.poll() is None:
+                process.terminate()
+        for _, process, log in self.processes:
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+            log.close()
+
+
+# ---------------------------------------------------------------------------
+# 负载场景：每个场景发出一个请求，返回 (接口名, 响应)
+# ---------------------------------------------------------------------------
+
+class LoadContext:
+    """场景共享的状态：预先创建的策略和最近提交的任务"""
+
+    def __init__(self, batch_size: int):
+        self.strategy_ids = []
+        self.job_ids = deque(maxlen=200)
+        self.batch_size = batch_size
+        self.fill_seq = 0
+
+
+async def _request(session, method: str, url: str, ctx: LoadContext = None, **kwargs):
+    async with session.request(method, url, **kwargs) as response:
+        body = await response.read()
+        if ctx is not None and response.status == 202:
+            ctx.job_ids.append(json.loads(body)["data"]["id"])
+        return response.status
+
+
+def _scenarios(base: str):
+    def strategy_id(ctx):
+        return random.choice(ctx.strategy_ids) if ctx.strategy_ids else 1
+
+    def fill_batch(ctx):
+        events = []
+        for _ in range(ctx.batch_size):
+            ctx.fill_seq += 1
+            events.append({"strategy_id": str(strategy_id(ctx)), "exchange": "binance", "symbol": "BTC-USDT",
+                           "order_id": f"load-{os.getpid()}-{ctx.fill_seq}", "side": random.choice(("buy", "sell")),
+                           "price": 60000.0, "amount": 0.01, "fee": 0.6})
+        return {"events": events}
+
+    def ids_param(ctx):
+        sample = random.sample(ctx.strategy_ids, min(20, len(ctx.strategy_ids))) or [1]
+        return ",".join(str(i) for i in sample)
+
+    return {
+        "health": ("GET /health", lambda s, ctx: _request(s, "GET", f"{base}/health")),
+        "strategies": ("GET /api/strategies", lambda s, ctx: _request(s, "GET", f"{base}/api/strategies")),
+        "schema": ("GET /api/hummingbot/strategies/{type}/schema", lambda s, ctx: _request(
+            s, "GET", f"{base}/api/hummingbot/strategies/pure_market_making/schema")),
+        "tickers": ("GET /api/markets/tickers", lambda s, ctx: _request(
+            s, "GET", f"{base}/api/markets/tickers", params={"exchange": "binance", "symbols": "BTC/USDT,ETH/USDT"})),
+        "symbols": ("GET /api/markets/symbols", lambda s, ctx: _request(
+            s, "GET", f"{base}/api/markets/symbols", params={"exchange": "binance"})),
+        "hb_status": ("GET /api/hummingbot/strategies/status", lambda s, ctx: _request(
+            s, "GET", f"{base}/api/hummingbot/strategies/status", params={"ids": ids_param(ctx)})),
+        "job_status": ("GET /api/strategy-jobs/{id}", lambda s, ctx: _request(
+            s, "GET", f"{base}/api/strategy-jobs/{random.choice(ctx.job_ids)}") if ctx.job_ids
+            else _request(s, "GET", f"{base}/api/strategy-jobs", params={"limit": 20})),
+        "start": ("POST /api/strategies/{id}/start", lambda s, ctx: _request(
+            s, "POST", f"{base}/api/strategies/{strategy_id(ctx)}/start", ctx)),
+        "stop": ("POST /api/strategies/{id}/stop", lambda s, ctx: _request(
+            s, "POST", f"{base}/api/strategies/{strategy_id(ctx)}/stop", ctx)),
+        "events": ("POST /api/hummingbot/events", lambda s, ctx: _request(
+            s, "POST", f"{base}/api/hummingbot/events", json=fill_batch(ctx))),
+        "trades": ("GET /api/trades", lambda s, ctx: _request(s, "GET", f"{base}/api/trades")),
+        "overview": ("GET /api/overview", lambda s, ctx: _request(s, "GET", f"{base}/api/overview")),
+        "grid": ("POST /api/strategies/grid", lambda s, ctx: _request(s, "POST", f"{base}/api/strategies/grid", json={
+            "name": "load-grid", "type": "pure_market_making", "params": STRATEGY_PARAMS, "dry_run": True,
+            "grid": {"bid_spread": {"start": 0.01, "stop": 1, "step": 0.01},
+                     "ask_spread": {"start": 0.01, "stop": 1, "step": 0.01}}})),
+        "metrics": ("GET /metrics", lambda s, ctx: _request(s, "GET", f"{base}/metrics")),
+    }
+
+
+def parse_mix(mix: str, scenarios) -> dict:
+    weights = {}
+    for item in mix.split(","):
+        name, _, weight = item.strip().partition("=")
+        if name not in scenarios:
+            raise ValueError(f"未知场景 {name}，可选: {', '.join(scenarios)}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+async def prepare(session, base: str, ctx: LoadContext, count: int):
+    """用参数网格一次创建压测策略，并通过命令队列启动"""
+    async with session.post(f"{base}/api/strategies/grid", json={
+        "name": "load", "type": "pure_market_making", "params": STRATEGY_PARAMS,
+        "grid": {"bid_spread": {"values": [round(0.1 + 0.01 * i, 4) for i in range(count)]}},
+    }) as response:
+        response.raise_for_status()
+        ctx.strategy_ids = (await response.json())["data"]["ids"]
+    await asyncio.gather(*[
+        _request(session, "POST", f"{base}/api/strategies/{i}/start", ctx) for i in ctx.strategy_ids
+    ])
+
+
+# ---------------------------------------------------------------------------
+# 负载生成与统计
+# ---------------------------------------------------------------------------
+
+def percentile(sorted_values, q: float) -> float:
+    """最近秩百分位数"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+async def run_load(base: str, ctx: LoadContext, weights: dict, concurrency: int, duration: float,
+                   warmup: float, rate: float):
+    """按权重随机选择场景施加负载；rate 为 0 时为闭环（concurrency 个并发持续请求），否则按固定速率到达
+
+    开环模式的延迟从请求的计划到达时间算起，包括等待并发名额和连接的时间，避免协调遗漏（coordinated omission）
+    """
+    scenarios = _scenarios(base)
+    names, probabilities = list(weights), list(weights.values())
+    samples = {}
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=30)
+    start = time.monotonic()
+    measure_from, stop_at = start + warmup, start + warmup + duration
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        async def one(scheduled=None):
+            route, call = scenarios[random.choices(names, probabilities)[0]]
+            began = time.monotonic() if scheduled is None else scheduled
+            try:
+                status = await call(session, ctx)
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                status = 0
+            if began >= measure_from:
+                stats = samples.setdefault(route, {"latencies": [], "statuses": {}})
+                stats["latencies"].append(time.monotonic() - began)
+                stats["statuses"][status] = stats["statuses"].get(status, 0) + 1
+
+        if rate > 0:
+            semaphore = asyncio.Semaphore(concurrency)
+            pending = set()
+
+            async def bounded(scheduled):
+                async with semaphore:
+                    await one(scheduled)
+
+            next_at = start
+            while next_at < stop_at:
+                task = asyncio.create_task(bounded(next_at))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                next_at += random.expovariate(rate)
+                await asyncio.sleep(max(0.0, next_at - time.monotonic()))
+            await asyncio.gather(*pending)
+        else:
+            async def worker():
+                while time.monotonic() < stop_at:
+                    await one()
+
+            await asyncio.gather(*[worker() for _ in range(concurrency)])
+
+    elapsed = max(time.monotonic(), stop_at) - measure_from
+    return build_report(samples, elapsed)
+
+
+def build_report(samples: dict, elapsed: float) -> dict:
+    routes = {}
+    total = errors = 0
+    for route, stats in sorted(samples.items()):
+        latencies = sorted(stats["latencies"])
+        failed = sum(count for status, count in stats["statuses"].items() if status == 0 or status >= 500)
+        total += len(latencies)
+        errors += failed
+        routes[route] = {
+            "count": len(latencies),
+            "throughput": len(latencies) / elapsed,
+            "errors": failed,
+            "statuses": {str(status): count for status, count in sorted(stats["statuses"].items())},
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+            "max_ms": latencies[-1] * 1000,
+            "mean_ms": sum(latencies) / len(latencies) * 1000,
+        }
+    return {"duration_s": elapsed, "total": total, "errors": errors,
+            "throughput": total / elapsed if elapsed else 0.0, "routes": routes}
+
+
+def print_report(report: dict):
+    print("📊 压测结果")
+    print("=" * 110)
+    print(f"{'接口':<48}{'请求数':>8}{'吞吐(/s)':>10}{'错误':>6}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'max(ms)':>10}")
+    for route, r in report["routes"].items():
+        print(f"{route:<48}{r['count']:>8}{r['throughput']:>10.1f}{r['errors']:>6}"
+              f"{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['p99_ms']:>10.1f}{r['max_ms']:>10.1f}")
+    print("-" * 110)
+    print(f"总计 {report['total']} 个请求，{report['throughput']:.1f} req/s，错误 {report['errors']}，"
+          f"统计时长 {report['duration_s']:.1f}s")
+
+
+def compare(report: dict, baseline: dict, tolerance: float, min_count: int):
+    """与基准对比：p95/p99 延迟上升或吞吐量下降超过容差、错误率上升的接口视为回归"""
+    regressions = []
+    for route, base in baseline["routes"].items():
+        current = report["routes"].get(route)
+        if current is None or current["count"] < min_count or base["count"] < min_count:
+            continue
+        for key in ("p95_ms", "p99_ms"):
+            if current[key] > base[key] * (1 + tolerance):
+                regressions.append(f"{route} {key}: {base[key]:.1f} -> {current[key]:.1f}")
+        if current["throughput"] < base["throughput"] * (1 - tolerance):
+            regressions.append(f"{route} throughput: {base['throughput']:.1f} -> {current['throughput']:.1f}")
+        base_rate, rate = base["errors"] / base["count"], current["errors"] / current["count"]
+        if rate > base_rate + 0.01:
+            regressions.append(f"{route} error rate: {base_rate:.2%} -> {rate:.2%}")
+    return regressions
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR,
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+async def run(args) -> int:
+    services = Services(args)
+    try:
+        print(f"🚀 启动压测环境（日志目录 {services.workdir}）")
+        await services.start()
+        ctx = LoadContext(args.events_batch)
+        async with aiohttp.ClientSession() as session:
+            await prepare(session, services.backend_url, ctx, args.seed_strategies)
+        print(f"✅ 已创建并启动 {len(ctx.strategy_ids)} 个策略，预热 {args.warmup}s，压测 {args.duration}s")
+
+        weights = parse_mix(args.mix, _scenarios(services.backend_url))
+        report = await run_load(services.backend_url, ctx, weights, args.concurrency, args.duration,
+                                args.warmup, args.rate)
+    finally:
+        services.stop()
+
+    report["config"] = {
+        "mix": args.mix, "concurrency": args.concurrency, "rate": args.rate, "duration": args.duration,
+        "warmup": args.warmup, "workers": args.workers, "seed_strategies": args.seed_strategies,
+        "events_batch": args.events_batch, "mock_latency": args.mock_latency,
+        "mock_latency_dist": args.mock_latency_dist, "mock_error_rate": args.mock_error_rate,
+        "mock_fill_rate": args.mock_fill_rate, "exchange_latency": args.exchange_latency,
+    }
+    report["environment"] = {"commit": _git_commit(), "python": platform.python_version(),
+                             "platform": platform.platform(), "created_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    print_report(report)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n✅ 结果已保存到 {args.save}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance, args.min_count)
+        if regressions:
+            print(f"\n❌ 与基准 {args.baseline} 相比发现 {len(regressions)} 项回归（容差 {args.tolerance:.0%}）:")
+            for item in regressions:
+                print(f"   {item}")
+            return 1
+        print(f"\n✅ 与基准 {args.baseline} 相比未发现回归（容差 {args.tolerance:.0%}）")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="端到端压测与延迟基准")
+    parser.add_argument("--duration", type=float, default=30, help="统计时长（秒）")
+    parser.add_argument("--warmup", type=float, default=5, help="预热时长（秒），不计入统计")
+    parser.add_argument("--concurrency", type=int, default=32, help="并发请求数")
+    parser.add_argument("--rate", type=float, default=0, help="开环模式的总请求速率（req/s），0 为闭环")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="场景权重，如 health=5,tickers=10,events=5")
+    parser.add_argument("--seed-strategies", type=int, default=50, help="压测前创建并启动的策略数")
+    parser.add_argument("--events-batch", type=int, default=100, help="每次成交推送的事件数")
+    parser.add_argument("--workers", type=int, default=1, help="后端 uvicorn worker 数")
+    parser.add_argument("--scheduler", action="store_true", help="启用后端调度器（对账、成交拉取等周期任务）")
+    parser.add_argument("--rate-limit", action="store_true", help="启用后端 API 限流")
+    parser.add_argument("--backend-url", help="压测已运行的后端，不启动本地进程")
+    parser.add_argument("--symbols", type=int, default=200, help="模拟交易所的交易对数量")
+    parser.add_argument("--exchange-latency", type=float, default=0.0, help="模拟交易所的响应延迟（秒）")
+    parser.add_argument("--mock-latency", type=float, default=0.02, help="模拟 Hummingbot 的响应延迟（秒）")
+    parser.add_argument("--mock-latency-dist", default="lognormal", help="模拟 Hummingbot 的延迟分布")
+    parser.add_argument("--mock-latency-jitter", type=float, default=0.5, help="延迟分布的抖动参数")
+    parser.add_argument("--mock-error-rate", type=float, default=0.0, help="模拟 Hummingbot 返回 503 的比例")
+    parser.add_argument("--mock-fill-rate", type=float, default=1.0, help="每个运行中策略每秒的成交数")
+    parser.add_argument("--mock-pnl-interval", type=float, default=1.0, help="PnL 更新间隔（秒）")
+    parser.add_argument("--mock-log-rate", type=float, default=1.0, help="每个策略每秒的日志条数")
+    parser.add_argument("--mock-webhook", action="store_true", help="模拟 Hummingbot 把成交推送到后端")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--save", help="将结果保存为 JSON 基准文件")
+    parser.add_argument("--baseline", help="与 JSON 基准对比，发现回归时退出码为 1")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="回归判定容差（比例）")
+    parser.add_argument("--min-count", type=int, default=50, help="请求数少于该值的接口不参与对比")
+    parser.add_argument("--serve-mock-exchange", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve_mock_exchange:
+        serve_mock_exchange(args.port, args.symbols, args.exchange_latency)
+        return
+    random.seed(args.seed)
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+后端导入耗时分析脚本
+使用 python -X importtime 统计导入 main 时各模块的耗时，输出最慢的模块，
+可选保存为 JSON 报告，便于对比冷启动优化前后的差异
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "backend"))
+
+
+def collect_import_times(module: str = "main"):
+    """在独立进程中导入模块并解析 -X importtime 输出"""
+    env = dict(os.environ, PYTHONPATH=BACKEND_DIR)
+    with tempfile.TemporaryDirectory() as workdir:
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=workdir, env=env, capture_output=True, text=True
+        )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    records = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        records.append({
+            "module": name.strip(),
+            "depth": (len(name) - len(name.lstrip()) - 1) // 2,
+            "self_ms": int(self_us) / 1000,
+            "cumulative_ms": int(cumulative_us) / 1000,
+        })
+    return records
+
+
+def build_report(records, top: int):
+    """汇总报告：总耗时、main 的直接依赖耗时、自身耗时最高的模块"""
+    total = next((r["cumulative_ms"] for r in records if r["depth"] == 0 and r["module"] == "main"), 0.0)
+    direct = [r for r in records if r["depth"] == 1]
+    return {
+        "total_ms": total,
+        "direct_imports": sorted(direct, key=lambda r: r["cumulative_ms"], reverse=True)[:top],
+        "slowest_self": sorted(records, key=lambda r: r["self_ms"], reverse=True)[:top],
+    }
+
+
+def print_report(report):
+    print("🔍 后端导入耗时分析")
+    print("=" * 50)
+    print(f"导入 main 总耗时: {report['total_ms']:.1f} ms\n")
+
+    print("main 的直接依赖（按累计耗时）:")
+    for r in report["direct_imports"]:
+        print(f"  {r['cumulative_ms']:9.1f} ms  {r['module']}")
+
+    print("\n自身耗时最高的模块:")
+    for r in report["slowest_self"]:
+        print(f"  {r['self_ms']:9.1f} ms  {r['module']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分析后端导入耗时")
+    parser.add_argument("--top", type=int, default=15, help="显示最慢的 N 个模块")
+    parser.add_argument("--json", help="将报告保存为 JSON 文件")
+    args = parser.parse_args()
+
+    report = build_report(collect_import_times(), args.top)
+    print_report(report)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n✅ 报告已保存到 {args.json}")
+
+
+if __name__ == "__main__":
+    main()